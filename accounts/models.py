@@ -69,38 +69,24 @@ class User(AbstractUser):
     def get_subscription_type(self):
         """
         Get the user's current subscription type
+        Resolved once per user object through the subscription cache; expired
+        subscriptions count as inactive (deactivated later by check_expired_subscriptions)
         """
+        from subscriptions.subscription_cache import SubscriptionResolver
         try:
-            user_subscription = self.subscription
-            if user_subscription.is_active:
-                # Check if subscription has expired
-                if user_subscription.end_date and user_subscription.end_date < timezone.now():
-                    # Subscription has expired, deactivate it
-                    user_subscription.is_active = False
-                    user_subscription.save()
-                    return None
-                return user_subscription.subscription_type
-        except:
-            pass
-        return None
+            return SubscriptionResolver.get_subscription_type(self)
+        except Exception:
+            return None
     
     def get_subscription_info(self):
         """
         Get detailed subscription information including expiration date and usage
         """
+        from subscriptions.subscription_cache import SubscriptionResolver
         try:
-            user_subscription = self.subscription
-            if user_subscription.is_active:
-                # Check if subscription has expired
-                if user_subscription.end_date and user_subscription.end_date < timezone.now():
-                    # Subscription has expired, deactivate it
-                    user_subscription.is_active = False
-                    user_subscription.save()
-                    return None
-                return user_subscription
-        except:
-            pass
-        return None
+            return SubscriptionResolver.get_subscription(self)
+        except Exception:
+            return None
     
     def has_access_to_model(self, ai_model):
         """
@@ -118,12 +104,9 @@ class User(AbstractUser):
         # Check if the model is available for this subscription type
         # The model can be accessed if it's linked to the user's subscription type through ModelSubscription
         try:
-            # Check if there's a ModelSubscription that links this AI model to the user's subscription type
-            from ai_models.models import ModelSubscription
-            return ModelSubscription.objects.filter(
-                ai_model=ai_model, 
-                subscription_types=subscription_type
-            ).exists()
+            # Read the link from the precomputed access matrix instead of querying per model
+            from subscriptions.access_matrix import AccessMatrixService
+            return AccessMatrixService.get_matrix().model_allowed(subscription_type.id, ai_model)
         except Exception as e:
             # Log the error for debugging
             import logging
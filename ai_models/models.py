@@ -104,6 +104,17 @@ class WebSearchSettings(models.Model):
     def __str__(self):
         return self.name
     
+    def is_enabled_for(self, subscription_type):
+        """
+        Whether users of ``subscription_type`` may use web search
+        Users without a subscription are allowed when the 'Free' type is enabled.
+        Reads the (prefetched) enabled types without further queries.
+        """
+        enabled_types = list(self.enabled_subscription_types.all())
+        if subscription_type:
+            return any(enabled.pk == subscription_type.pk for enabled in enabled_types)
+        return any(enabled.name == 'Free' for enabled in enabled_types)
+    
     class Meta:
         db_table = 'web_search_settings'
         verbose_name = "Web Search Settings"
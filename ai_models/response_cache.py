@@ -0,0 +1,139 @@
+"""
+کش پاسخ‌های تکراری OpenRouter
+Prompt-level response cache for repeated OpenRouter requests.
+
+Entries are keyed by a hash of the model id, the normalized messages and the
+request parameters. Caching is opt-in per Chatbot, which also sets the TTL and
+a byte budget for the responses it may keep in the cache.
+"""
+import hashlib
+import json
+import logging
+
+from django.core.cache import cache
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'openrouter_response'
+
+# Payload keys that never change the answer and are excluded from the key
+NON_SEMANTIC_PAYLOAD_KEYS = ('messages', 'stream', 'usage')
+
+
+class ResponseCachePolicy:
+    """
+    TTL and byte budget for one cache namespace (a Chatbot)
+    """
+
+    def __init__(self, namespace, ttl_seconds, max_bytes):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def for_chatbot(cls, chatbot):
+        """Return the chatbot's cache policy, or None if it has not opted in"""
+        if not chatbot or not chatbot.response_cache_enabled:
+            return None
+        if chatbot.response_cache_ttl_seconds <= 0 or chatbot.response_cache_max_bytes <= 0:
+            return None
+        return cls(
+            namespace=f"chatbot:{chatbot.pk}",
+            ttl_seconds=chatbot.response_cache_ttl_seconds,
+            max_bytes=chatbot.response_cache_max_bytes,
+        )
+
+    def budget_key(self):
+        return f"{CACHE_KEY_PREFIX}:bytes:{self.namespace}"
+
+
+class ResponseCacheService:
+    """Lookup and storage of cached OpenRouter responses"""
+
+    @staticmethod
+    def is_cacheable(payload):
+        """
+        Only plain text completions are cached: web search results are time-sensitive
+        and generated images have to be produced (and stored) per request
+        """
+        if payload.get('modalities') or payload.get('web_search_options'):
+            return False
+        if payload.get('model', '').endswith(':online'):
+            return False
+        return True
+
+    @staticmethod
+    def normalize_messages(messages):
+        """Strip whitespace noise so trivially different prompts share an entry"""
+        normalized = []
+        for message in messages:
+            content = message.get('content', '')
+            if isinstance(content, str):
+                content = ' '.join(content.split())
+            normalized.append({'role': message.get('role'), 'content': content})
+        return normalized
+
+    @staticmethod
+    def build_key(policy, payload):
+        params = {key: value for key, value in payload.items() if key not in NON_SEMANTIC_PAYLOAD_KEYS}
+        key_material = json.dumps(
+            {
+                'model': payload.get('model'),
+                'messages': ResponseCacheService.normalize_messages(payload.get('messages', [])),
+                'params': params,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        digest = hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+        return f"{CACHE_KEY_PREFIX}:{policy.namespace}:{digest}"
+
+    @staticmethod
+    def get(policy, payload):
+        """Return the cached entry for this request, or None"""
+        if not policy or not ResponseCacheService.is_cacheable(payload):
+            return None
+        try:
+            entry = cache.get(ResponseCacheService.build_key(policy, payload))
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {str(e)}")
+            return None
+        metrics.CACHE_REQUESTS.inc(cache='response', result='hit' if entry else 'miss')
+        return entry
+
+    @staticmethod
+    def set(policy, payload, entry):
+        """
+        Store a response if it fits the namespace's byte budget
+        The budget counter expires with the TTL, so it always over-approximates the live bytes
+        """
+        if not policy or not ResponseCacheService.is_cacheable(payload):
+            return False
+        try:
+            size = len(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+            budget_key = policy.budget_key()
+            cache.add(budget_key, 0, policy.ttl_seconds)
+            used = cache.incr(budget_key, size)
+            if used > policy.max_bytes:
+                cache.decr(budget_key, size)
+                logger.debug(f"Response cache budget full for {policy.namespace}")
+                return False
+            cache.set(ResponseCacheService.build_key(policy, payload), entry, policy.ttl_seconds)
+            return True
+        except Exception as e:
+            logger.warning(f"Response cache store failed: {str(e)}")
+            return False
+
+    @staticmethod
+    def cached_usage():
+        """Usage block reported for a cache hit: nothing was sent upstream"""
+        return {
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'total_tokens': 0,
+            'cost': 0,
+            'total_cost_usd': 0,
+            'cached': True,
+        }
@@ -1,13 +1,17 @@
 import requests
 import json
 import base64
+import time
 from django.conf import settings
 from django.utils import timezone
 from django.http import StreamingHttpResponse
 from .models import AIModel
+from .response_cache import ResponseCacheService
+from .upstream_timing import UpstreamTiming
+from core import metrics
 from chatbot.models import ChatSession, ChatMessage
 from chatbot.models import UploadedFile  # Explicit import for linter
-from subscriptions.models import UserUsage
+from chatbot.media_delivery import MediaDeliveryService
 from pathlib import Path
 from typing import List, Optional, Union
 import mimetypes
@@ -126,14 +130,11 @@ class OpenRouterService:
         
         return messages
     
-    def send_text_message(self, ai_model, messages, stream=False, web_search=False, 
-                         modalities=None, plugins=None):
+    def build_payload(self, ai_model, messages, stream=False, web_search=False,
+                      modalities=None, plugins=None):
         """
-        Send text message to OpenRouter API with usage tracking
-        Enhanced to support images, files, and modalities
+        Build the chat completion payload sent to OpenRouter
         """
-        url = f"{self.base_url}/chat/completions"
-        
         payload = {
             "model": ai_model.model_id,
             "messages": messages,
@@ -160,19 +161,64 @@ class OpenRouterService:
         if plugins:
             payload["plugins"] = plugins
         
+        return payload
+    
+    def send_text_message(self, ai_model, messages, stream=False, web_search=False, 
+                         modalities=None, plugins=None, cache_policy=None, timing=None):
+        """
+        Send text message to OpenRouter API with usage tracking
+        Enhanced to support images, files, and modalities
+        
+        cache_policy (ResponseCachePolicy) enables the response cache for
+        non-streaming requests; cache hits carry 'cached': True and zero usage.
+        Non-streaming responses carry the request's UpstreamTiming as 'timing';
+        streams record into the ``timing`` passed by stream_text_response.
+        """
+        url = f"{self.base_url}/chat/completions"
+        
+        payload = self.build_payload(
+            ai_model, messages, stream=stream, web_search=web_search,
+            modalities=modalities, plugins=plugins
+        )
+        
+        if not stream:
+            cached_entry = ResponseCacheService.get(cache_policy, payload)
+            if cached_entry:
+                # Entries written by the streaming path only carry the text
+                response_data = dict(cached_entry.get('response') or {
+                    'choices': [{'message': {'role': 'assistant', 'content': cached_entry['content']}}]
+                })
+                response_data['usage'] = ResponseCacheService.cached_usage()
+                response_data['cached'] = True
+                response_data.pop('generation_id', None)
+                response_data.pop('timing', None)
+                return response_data
+        
         try:
             headers = self.get_headers()
         except ValueError as e:
             return {"error": str(e)}
         
+        model_label = getattr(ai_model, 'model_id', '')
+        stream_label = 'true' if stream else 'false'
+        if timing is None:
+            timing = UpstreamTiming()
+        started = time.monotonic()
         try:
             if stream:
                 response = requests.post(url, headers=headers, json=payload, stream=True)
+                metrics.OPENROUTER_REQUEST_SECONDS.observe(time.monotonic() - started, model=model_label, stream=stream_label)
+                timing.response_received(response)
                 return response
             else:
                 response = requests.post(url, headers=headers, json=payload)
+                metrics.OPENROUTER_REQUEST_SECONDS.observe(time.monotonic() - started, model=model_label, stream=stream_label)
+                timing.response_received(response)
                 response.raise_for_status()  # Raise an exception for bad status codes
                 response_data = response.json()
+                timing.finish()
+                timing.set_provider(response_data.get('provider'))
+                response_data['timing'] = timing.as_dict((response_data.get('usage') or {}).get('completion_tokens'))
                 
                 # Extract usage and cost information if available
                 if 'usage' in response_data:
@@ -189,8 +235,14 @@ class OpenRouterService:
                 if 'id' in response_data:
                     response_data['generation_id'] = response_data['id']
                 
+                if cache_policy and response_data.get('choices'):
+                    content = response_data['choices'][0].get('message', {}).get('content')
+                    if content:
+                        ResponseCacheService.set(cache_policy, payload, {'content': content, 'response': response_data})
+                
                 return response_data
         except requests.exceptions.RequestException as e:
+            metrics.OPENROUTER_ERRORS.inc(model=model_label, stream=stream_label)
             # Check if this is a web search error
             if web_search:
                 error_msg = str(e)
@@ -200,15 +252,32 @@ class OpenRouterService:
         except Exception as e:
             return {"error": f"Unexpected error: {str(e)}"}
     
-    def stream_text_response(self, ai_model, messages, web_search=False, modalities=None, plugins=None):
+    def stream_text_response(self, ai_model, messages, web_search=False, modalities=None, plugins=None,
+                             cache_policy=None):
         """
         Stream text response from OpenRouter API with usage tracking
         Enhanced to support images, files, and modalities
+        
+        With a cache_policy, completed answers are cached and later replayed in a
+        single chunk, followed by zero-cost usage data flagged as 'cached'.
         """
         try:
+            payload = self.build_payload(
+                ai_model, messages, stream=True, web_search=web_search,
+                modalities=modalities, plugins=plugins
+            )
+            cached_entry = ResponseCacheService.get(cache_policy, payload)
+            if cached_entry:
+                def replay():
+                    yield cached_entry['content']
+                    yield f"\n\n[USAGE_DATA]{json.dumps(ResponseCacheService.cached_usage())}[USAGE_DATA_END]"
+                return replay()
+            
+            model_label = getattr(ai_model, 'model_id', '')
+            timing = UpstreamTiming()
             response = self.send_text_message(
                 ai_model, messages, stream=True, web_search=web_search, 
-                modalities=modalities, plugins=plugins
+                modalities=modalities, plugins=plugins, timing=timing
             )
             if isinstance(response, dict) and 'error' in response:
                 return response
@@ -220,6 +289,10 @@ class OpenRouterService:
             def generate():
                 buffer = ""
                 usage_data = None
+                # Collected only to populate the response cache
+                content_parts = []
+                completed = False
+                bytes_received = 0
                 try:
                     # Type check: ensure response has iter_content method
                     if not isinstance(response, requests.Response):
@@ -228,6 +301,7 @@ class OpenRouterService:
                     
                     for chunk in response.iter_content(chunk_size=1024):
                         if chunk:
+                            bytes_received += len(chunk)
                             # Decode chunk with UTF-8
                             try:
                                 chunk_str = chunk.decode('utf-8')
@@ -249,12 +323,17 @@ class OpenRouterService:
                                 if line.startswith('data: '):
                                     data = line[6:]  # Remove 'data: ' prefix
                                     if data == '[DONE]':
+                                        completed = True
+                                        timing.finish()
                                         # Send usage data at the end
                                         if usage_data:
+                                            # The cost ledger row is written from this data; no extra write here
+                                            usage_data['timing'] = timing.as_dict(usage_data.get('completion_tokens'))
                                             yield f"\n\n[USAGE_DATA]{json.dumps(usage_data)}[USAGE_DATA_END]"
                                         break
                                     try:
                                         data_obj = json.loads(data)
+                                        timing.set_provider(data_obj.get('provider'))
                                         # Capture usage data if present
                                         if 'usage' in data_obj:
                                             usage_data = data_obj['usage']
@@ -283,12 +362,29 @@ class OpenRouterService:
                                                 yield f"\n\n[IMAGES]{json.dumps(images)}[IMAGES_END]"
                                             
                                             if content:
+                                                if timing.first_token_at is None:
+                                                    timing.first_token()
+                                                    metrics.OPENROUTER_TTFT_SECONDS.observe(
+                                                        timing.time_to_first_token, model=model_label
+                                                    )
+                                                if cache_policy:
+                                                    content_parts.append(content)
                                                 yield content
                                     except json.JSONDecodeError:
                                         # Skip invalid JSON
                                         continue
+                    
+                    if completed and content_parts:
+                        ResponseCacheService.set(cache_policy, payload, {'content': ''.join(content_parts)})
                 except Exception as e:
                     yield f"Error in streaming: {str(e)}"
+                finally:
+                    timing.finish()
+                    metrics.OPENROUTER_STREAM_SECONDS.observe(timing.duration, model=model_label)
+                    metrics.OPENROUTER_STREAM_BYTES.inc(bytes_received, model=model_label)
+                    tokens_per_second = timing.tokens_per_second((usage_data or {}).get('completion_tokens'))
+                    if tokens_per_second is not None and timing.first_token_at is not None:
+                        metrics.OPENROUTER_TOKENS_PER_SECOND.observe(tokens_per_second, model=model_label)
             
             return generate()
         except Exception as e:
@@ -345,7 +441,8 @@ class OpenRouterService:
                     img_record.save()
                     
                     saved_image_ids.append(img_record.pk)
-                    saved_image_urls.append(f"/media/uploads/{filename}")
+                    # Only the owner can fetch it, through the delivery view
+                    saved_image_urls.append(MediaDeliveryService.protected_url(f"{settings.MEDIA_URL}uploads/{filename}"))
                 except Exception as e:
                     print(f"Error processing image: {e}")
                     continue
@@ -1,3 +1,90 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import requests
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from core import metrics
+
+from .models import AIModel
+from .response_cache import ResponseCachePolicy
+from .services import OpenRouterService
+
+
+class ResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ai_model = AIModel._default_manager.create(
+            model_id='cache-model',
+            name='Cache Model',
+            is_active=True,
+            is_free=True,
+            model_type='text'
+        )
+        self.policy = ResponseCachePolicy(namespace='chatbot:test', ttl_seconds=60, max_bytes=10000)
+        self.messages = [{'role': 'user', 'content': 'سلام'}]
+
+    @patch('ai_models.services.requests.post')
+    def test_send_text_message_hit_is_flagged_and_free(self, mock_post):
+        mock_post.return_value.json.return_value = {
+            'id': 'gen-1',
+            'choices': [{'message': {'role': 'assistant', 'content': 'درود'}}],
+            'usage': {'prompt_tokens': 5, 'completion_tokens': 3, 'total_tokens': 8, 'cost': 0.001},
+        }
+        service = OpenRouterService()
+
+        first = service.send_text_message(self.ai_model, self.messages, cache_policy=self.policy)
+        # Whitespace differences normalize to the same key
+        second = service.send_text_message(self.ai_model, [{'role': 'user', 'content': ' سلام '}], cache_policy=self.policy)
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertNotIn('cached', first)
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['choices'][0]['message']['content'], 'درود')
+        self.assertEqual(second['usage']['total_tokens'], 0)
+
+    @patch('ai_models.services.requests.post')
+    def test_stream_is_cached_and_replayed(self, mock_post):
+        stream_response = MagicMock(spec=requests.Response)
+        stream_response.iter_content.return_value = [
+            b'data: {"id": "gen-2", "provider": "Example", "choices": [{"delta": {"content": "Hel"}}]}\n',
+            b'data: {"choices": [{"delta": {"content": "lo"}}]}\n',
+            b'data: [DONE]\n',
+        ]
+        mock_post.return_value = stream_response
+        service = OpenRouterService()
+        model = self.ai_model.model_id
+        ttft_before = metrics.OPENROUTER_TTFT_SECONDS.count(model=model)
+        bytes_before = metrics.OPENROUTER_STREAM_BYTES.get(model=model)
+
+        streamed = list(service.stream_text_response(self.ai_model, self.messages, cache_policy=self.policy))
+        self.assertEqual(streamed[:2], ['Hel', 'lo'])
+        # Timing travels with the usage data to the cost ledger
+        timing = json.loads(streamed[2].split('[USAGE_DATA]')[1].split('[USAGE_DATA_END]')[0])['timing']
+        self.assertEqual(timing['provider'], 'Example')
+        self.assertIsNotNone(timing['ttft_ms'])
+        self.assertGreaterEqual(timing['duration_ms'], timing['ttft_ms'])
+        self.assertEqual(metrics.OPENROUTER_TTFT_SECONDS.count(model=model), ttft_before + 1)
+        self.assertEqual(
+            metrics.OPENROUTER_STREAM_BYTES.get(model=model),
+            bytes_before + sum(len(chunk) for chunk in stream_response.iter_content.return_value),
+        )
+        replayed = list(service.stream_text_response(self.ai_model, self.messages, cache_policy=self.policy))
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(replayed[0], 'Hello')
+        self.assertIn('"cached": true', replayed[1])
+
+    @patch('ai_models.services.requests.post')
+    def test_byte_budget_limits_stored_entries(self, mock_post):
+        mock_post.return_value.json.return_value = {
+            'choices': [{'message': {'role': 'assistant', 'content': 'x' * 500}}],
+        }
+        service = OpenRouterService()
+        small_policy = ResponseCachePolicy(namespace='chatbot:small', ttl_seconds=60, max_bytes=100)
+
+        service.send_text_message(self.ai_model, self.messages, cache_policy=small_policy)
+        service.send_text_message(self.ai_model, self.messages, cache_policy=small_policy)
+
+        self.assertEqual(mock_post.call_count, 2)
@@ -0,0 +1,104 @@
+"""
+زمان‌بندی درخواست‌های OpenRouter
+Latency and throughput of one OpenRouter request for the cost ledger.
+
+UpstreamTiming is filled in memory while the request runs. Its as_dict()
+travels with the usage data (``usage['timing']``) to the code that already
+writes the OpenRouterRequestCost row, so recording it adds no database write
+of its own; ledger_fields() turns it into that row's field values.
+"""
+import time
+from datetime import datetime
+
+from django.utils import timezone
+
+MAX_PROVIDER_LENGTH = 100
+
+
+class UpstreamTiming:
+    """
+    Start, time to first token, end, HTTP status, retries and provider of one request
+    """
+
+    def __init__(self):
+        self.started_at = timezone.now()
+        self.started = time.monotonic()
+        self.first_token_at = None
+        self.finished_at = None
+        self.status = None
+        self.retries = 0
+        self.provider = ''
+
+    def response_received(self, response):
+        """Record the HTTP status and the retries urllib3 made before this response"""
+        status = getattr(response, 'status_code', None)
+        self.status = status if isinstance(status, int) else None
+        retry_state = getattr(getattr(response, 'raw', None), 'retries', None)
+        history = getattr(retry_state, 'history', None)
+        self.retries = len(history) if isinstance(history, tuple) else 0
+
+    def set_provider(self, provider):
+        if provider and isinstance(provider, str):
+            self.provider = provider[:MAX_PROVIDER_LENGTH]
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+    def finish(self):
+        if self.finished_at is None:
+            self.finished_at = time.monotonic()
+
+    @property
+    def time_to_first_token(self):
+        return self.first_token_at - self.started if self.first_token_at is not None else None
+
+    @property
+    def duration(self):
+        return self.finished_at - self.started if self.finished_at is not None else None
+
+    def tokens_per_second(self, completion_tokens):
+        """Completion tokens per second after the first token (over the whole request without streaming)"""
+        if not completion_tokens or self.finished_at is None:
+            return None
+        generation_started = self.first_token_at if self.first_token_at is not None else self.started
+        elapsed = self.finished_at - generation_started
+        return completion_tokens / elapsed if elapsed > 0 else None
+
+    def as_dict(self, completion_tokens=None):
+        """JSON-ready values, attached to the usage data as 'timing'"""
+        tokens_per_second = self.tokens_per_second(completion_tokens)
+        return {
+            'started_at': self.started_at.isoformat(),
+            'ttft_ms': _milliseconds(self.time_to_first_token),
+            'duration_ms': _milliseconds(self.duration),
+            'tokens_per_second': round(tokens_per_second, 2) if tokens_per_second is not None else None,
+            'status': self.status,
+            'retries': self.retries,
+            'provider': self.provider,
+        }
+
+
+def _milliseconds(seconds):
+    return int(round(seconds * 1000)) if seconds is not None else None
+
+
+def ledger_fields(timing):
+    """
+    OpenRouterRequestCost field values from a timing dict (as_dict()); empty when there is none
+    """
+    if not isinstance(timing, dict):
+        return {}
+    try:
+        started_at = datetime.fromisoformat(timing['started_at']) if timing.get('started_at') else None
+    except (TypeError, ValueError):
+        started_at = None
+    return {
+        'request_started_at': started_at,
+        'time_to_first_token_ms': timing.get('ttft_ms'),
+        'duration_ms': timing.get('duration_ms'),
+        'tokens_per_second': timing.get('tokens_per_second'),
+        'upstream_status': timing.get('status'),
+        'retry_count': timing.get('retries') or 0,
+        'provider': (timing.get('provider') or '')[:MAX_PROVIDER_LENGTH],
+    }
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Chatbot, ChatSession, ChatMessage, UploadedFile, FileUploadSettings, VisionProcessingSettings, UploadedImage, FileUploadUsage, ImageGenerationUsage, DefaultChatSettings, SidebarMenuItem, LimitationMessage, OpenRouterRequestCost
+from django.apps import apps
+from core.admin_tools import LargeTableAdminMixin, UserAutocompleteFilter
+from .models import Chatbot, ChatSession, ChatMessage, UploadedFile, UploadSession, FileUploadSettings, VisionProcessingSettings, UploadedImage, FileUploadUsage, ImageGenerationUsage, DefaultChatSettings, SidebarMenuItem, LimitationMessage, OpenRouterRequestCost
 
 class ChatSessionInline(admin.TabularInline):
     model = ChatSession
@@ -14,7 +16,15 @@ class ChatbotAdmin(admin.ModelAdmin):
     list_editable = ('is_active',)
     filter_horizontal = ('subscription_types',)
     inlines = [ChatSessionInline]
-    fields = ('name', 'description', 'image', 'chatbot_type', 'is_active', 'system_prompt', 'subscription_types')
+    fieldsets = (
+        (None, {
+            'fields': ('name', 'description', 'image', 'chatbot_type', 'is_active', 'system_prompt', 'subscription_types')
+        }),
+        ('Response Cache', {
+            'fields': ('response_cache_enabled', 'response_cache_ttl_seconds', 'response_cache_max_bytes'),
+            'description': 'Reuse answers for identical prompts (same model, messages and parameters)'
+        }),
+    )
 
 class ChatMessageInline(admin.TabularInline):
     model = ChatMessage
@@ -22,18 +32,25 @@ class ChatMessageInline(admin.TabularInline):
     readonly_fields = ('created_at',)
 
 @admin.register(ChatSession)
-class ChatSessionAdmin(admin.ModelAdmin):
+class ChatSessionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'chatbot', 'title', 'created_at', 'updated_at', 'is_active')
-    list_filter = ('chatbot', 'is_active', 'created_at', 'updated_at')
-    search_fields = ('user__name', 'user__phone_number', 'title')
+    list_filter = ('chatbot', 'is_active', 'created_at', 'updated_at', UserAutocompleteFilter)
+    list_select_related = ('user', 'chatbot')
+    # Exact id and prefix matches can use the primary key and the unique phone number index
+    search_fields = ('=id', '^user__phone_number', '^user__name', '^title')
+    autocomplete_fields = ('user',)
     inlines = [ChatMessageInline]
     readonly_fields = ('created_at', 'updated_at')
 
 @admin.register(ChatMessage)
-class ChatMessageAdmin(admin.ModelAdmin):
+class ChatMessageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('session', 'message_type', 'content_preview', 'tokens_count', 'created_at')
     list_filter = ('message_type', 'created_at')
-    search_fields = ('content', 'session__user__name')
+    # The session column's __str__ reads the user and the chatbot or model
+    list_select_related = ('session__user', 'session__chatbot', 'session__ai_model')
+    # No LIKE '%...%' over message content; find messages through their session or user
+    search_fields = ('=session__id', '^session__user__phone_number')
+    raw_id_fields = ('session',)
     readonly_fields = ('created_at',)
     
     @admin.display(description='Content Preview')
@@ -41,12 +58,22 @@ class ChatMessageAdmin(admin.ModelAdmin):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
 
 @admin.register(UploadedFile)
-class UploadedFileAdmin(admin.ModelAdmin):
+class UploadedFileAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'session', 'original_filename', 'size', 'uploaded_at')
-    list_filter = ('uploaded_at', 'user')
-    search_fields = ('original_filename', 'user__name', 'user__phone_number')
+    list_filter = ('uploaded_at', UserAutocompleteFilter)
+    list_select_related = ('user', 'session__user', 'session__chatbot', 'session__ai_model')
+    search_fields = ('^original_filename', '^user__phone_number', '^user__name')
+    autocomplete_fields = ('user',)
+    raw_id_fields = ('session',)
     readonly_fields = ('filename', 'original_filename', 'mimetype', 'size', 'uploaded_at')
 
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'original_filename', 'total_size', 'received_bytes', 'status', 'created_at', 'expires_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('original_filename', 'user__name', 'user__phone_number')
+    readonly_fields = ('upload_id', 'storage_name', 'total_size', 'received_bytes', 'mimetype', 'sha256', 'uploaded_file', 'created_at', 'updated_at')
+
 @admin.register(FileUploadSettings)
 class FileUploadSettingsAdmin(admin.ModelAdmin):
     list_display = ('subscription_type', 'max_file_size', 'max_files_per_chat', 
@@ -61,7 +88,8 @@ class FileUploadSettingsAdmin(admin.ModelAdmin):
 class FileUploadUsageAdmin(admin.ModelAdmin):
     list_display = ('user', 'subscription_type', 'daily_files_count', 
                    'weekly_files_count', 'monthly_files_count', 'session_files_count')
-    list_filter = ('subscription_type', 'user')
+    list_filter = ('subscription_type', UserAutocompleteFilter)
+    list_select_related = ('user', 'subscription_type')
     search_fields = ('user__name', 'user__phone_number')
     readonly_fields = ('daily_period_start', 'weekly_period_start', 'monthly_period_start', 
                       'created_at', 'updated_at')
@@ -70,7 +98,8 @@ class FileUploadUsageAdmin(admin.ModelAdmin):
 class ImageGenerationUsageAdmin(admin.ModelAdmin):
     list_display = ('user', 'subscription_type', 'daily_images_count', 
                    'weekly_images_count', 'monthly_images_count')
-    list_filter = ('subscription_type', 'user')
+    list_filter = ('subscription_type', UserAutocompleteFilter)
+    list_select_related = ('user', 'subscription_type')
     search_fields = ('user__name', 'user__phone_number')
     readonly_fields = ('daily_period_start', 'weekly_period_start', 'monthly_period_start', 
                       'created_at', 'updated_at')
@@ -93,7 +122,8 @@ class VisionProcessingSettingsAdmin(admin.ModelAdmin):
 @admin.register(UploadedImage)
 class UploadedImageAdmin(admin.ModelAdmin):
     list_display = ('user', 'session', 'uploaded_at')
-    list_filter = ('uploaded_at', 'user')
+    list_filter = ('uploaded_at', UserAutocompleteFilter)
+    list_select_related = ('user', 'session__user', 'session__chatbot', 'session__ai_model')
     search_fields = ('user__name', 'session__title')
     readonly_fields = ('uploaded_at',)
 
@@ -119,13 +149,33 @@ class LimitationMessageAdmin(admin.ModelAdmin):
 
 from django.utils import timezone
 import datetime
-
-class OpenRouterRequestCostAdmin(admin.ModelAdmin):
-    list_display = ('user', 'model_name', 'total_tokens', 'formatted_created_at', 'formatted_updated_at')
-    list_filter = ('model_name', 'request_type', 'subscription_type')
-    search_fields = ('user__name', 'user__phone_number', 'model_name', 'model_id')
+from reports.exports import export_actions
+
+class AIModelFilter(admin.SimpleListFilter):
+    """
+    Filter by model id with choices from the AI model table instead of a
+    DISTINCT scan over every request cost row
+    """
+    title = 'model'
+    parameter_name = 'model_id'
+
+    def lookups(self, request, model_admin):
+        AIModel = apps.get_model('ai_models', 'AIModel')
+        return list(AIModel.objects.order_by('name').values_list('model_id', 'name'))
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(model_id=self.value())
+        return queryset
+
+class OpenRouterRequestCostAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('user', 'model_name', 'total_tokens', 'duration_ms', 'provider', 'cached', 'formatted_created_at', 'formatted_updated_at')
+    list_filter = (AIModelFilter, 'request_type', 'subscription_type', 'cached', 'created_at', UserAutocompleteFilter)
+    list_select_related = ('user',)
+    search_fields = ('=model_id', '^user__phone_number', '^user__name')
     readonly_fields = ('user', 'session', 'subscription_type', 'created_at', 'updated_at')
     date_hierarchy = None  # Disable date hierarchy to avoid timezone issues
+    actions = export_actions('openrouter_costs')
     
     @admin.display(description='Created At')
     def formatted_created_at(self, obj):
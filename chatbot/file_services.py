@@ -1,7 +1,15 @@
+import hashlib
+import os
+import uuid
 from django.utils import timezone
+from django.utils.text import get_valid_filename
 from datetime import timedelta
-from .models import FileUploadSettings, FileUploadUsage, UploadedFile
+from .models import FileUploadSettings, FileUploadUsage, UploadedFile, UploadSession
+from .upload_handlers import (
+    SNIFF_BYTES, StoredUploadedFile, make_storage_name, resolve_content_type, sniff_content_type
+)
 from subscriptions.models import SubscriptionType
+from core import metrics
 from core.models import GlobalSettings
 
 class FileUploadService:
@@ -67,6 +75,7 @@ class FileUploadService:
         return usage_record
 
     @staticmethod
+    @metrics.QUOTA_CHECK_SECONDS.time(check='file_upload')
     def check_file_upload_limit(user, subscription_type, session=None):
         """
         Check if user has exceeded file upload limits
@@ -237,3 +246,229 @@ class GlobalFileService:
                 return False, f"فایل {file.name}: {ext_msg}"
         
         return True, ""
+
+
+class ChunkedUploadService:
+    """
+    سرویس آپلود تکه‌ای و قابل ادامه
+    Service for chunked, resumable uploads. Chunks must arrive in order; a client
+    that lost its connection asks for the session status and resumes from
+    received_bytes. A finalized upload is referenced by its blob id (upload_id).
+    """
+
+    # Suggested chunk size for clients and the largest chunk accepted in one request
+    CHUNK_SIZE = 1024 * 1024
+    MAX_CHUNK_SIZE = 8 * 1024 * 1024
+    # How long an upload session (and the finished blob) stays usable
+    SESSION_TTL = timedelta(hours=24)
+    READ_SIZE = 64 * 1024
+
+    @staticmethod
+    def validate_upload(user, filename, total_size):
+        """
+        Validate a declared upload against global and subscription limits
+        Returns (is_valid, message)
+        """
+        if total_size <= 0:
+            return False, "حجم فایل نامعتبر است"
+
+        size_valid, size_msg = GlobalFileService.check_file_size_limit(total_size)
+        if not size_valid:
+            return False, f"فایل {filename}: {size_msg}"
+
+        file_extension = filename.split('.')[-1] if '.' in filename else ''
+        ext_valid, ext_msg = GlobalFileService.check_file_extension_allowed(file_extension)
+        if not ext_valid:
+            return False, f"فایل {filename}: {ext_msg}"
+
+        subscription_type = user.get_subscription_type()
+        if subscription_type:
+            within_limit, message = FileUploadService.check_file_upload_limit(user, subscription_type)
+            if not within_limit:
+                return False, message
+
+            within_limit, message = FileUploadService.check_file_size_limit(subscription_type, total_size)
+            if not within_limit:
+                return False, f"فایل {filename}: {message}"
+
+            if file_extension and not FileUploadService.check_file_extension_allowed(subscription_type, file_extension):
+                return False, f"فرمت فایل {file_extension} در '{filename}' مجاز نیست"
+
+        return True, ""
+
+    @staticmethod
+    def create_upload(user, filename, total_size):
+        """
+        Start a new upload session and reserve its file on disk
+        """
+        original_filename = os.path.basename(filename)
+        storage_name = make_storage_name(get_valid_filename(original_filename))
+        file_path = StoredUploadedFile.stored_path(storage_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        open(file_path, 'wb').close()
+
+        return UploadSession.objects.create(
+            user=user,
+            original_filename=original_filename,
+            storage_name=storage_name,
+            total_size=total_size,
+            expires_at=timezone.now() + ChunkedUploadService.SESSION_TTL
+        )
+
+    @staticmethod
+    @metrics.UPLOAD_CHUNK_SECONDS.time()
+    def write_chunk(upload, start, length, stream):
+        """
+        Write a chunk of ``length`` bytes read from ``stream`` at offset ``start``
+        Returns (success, message); on success upload.received_bytes is updated
+        """
+        if upload.status != 'pending':
+            return False, "این آپلود قبلاً تکمیل شده است"
+        if upload.is_expired:
+            return False, "مهلت این آپلود به پایان رسیده است"
+        if start != upload.received_bytes:
+            return False, f"تکه باید از بایت {upload.received_bytes} شروع شود"
+        if length <= 0 or length > ChunkedUploadService.MAX_CHUNK_SIZE:
+            return False, "اندازه تکه نامعتبر است"
+        if start + length > upload.total_size:
+            return False, "تکه از حجم اعلام شده فایل بیشتر است"
+
+        written = 0
+        with open(StoredUploadedFile.stored_path(upload.storage_name), 'r+b') as destination:
+            destination.seek(start)
+            while written < length:
+                data = stream.read(min(ChunkedUploadService.READ_SIZE, length - written))
+                if not data:
+                    break
+                destination.write(data)
+                written += len(data)
+            destination.truncate(start + written)
+
+        if written != length:
+            return False, "تکه به صورت کامل دریافت نشد"
+
+        # Only advance if no concurrent request already wrote this range
+        updated = UploadSession.objects.filter(
+            pk=upload.pk, status='pending', received_bytes=start
+        ).update(received_bytes=start + written, updated_at=timezone.now())
+        if not updated:
+            upload.refresh_from_db()
+            return False, f"تکه باید از بایت {upload.received_bytes} شروع شود"
+
+        upload.received_bytes = start + written
+        metrics.UPLOAD_BYTES.inc(written)
+        return True, ""
+
+    @staticmethod
+    def finalize_upload(upload, expected_sha256=None):
+        """
+        Hash and sniff a fully received upload and turn it into a usable blob
+        Returns (success, message)
+        """
+        if upload.status == 'complete':
+            return True, ""
+        if upload.status != 'pending':
+            return False, "این آپلود قبلاً استفاده شده است"
+        if upload.is_expired:
+            return False, "مهلت این آپلود به پایان رسیده است"
+        if upload.received_bytes != upload.total_size:
+            return False, f"آپلود کامل نیست ({upload.received_bytes} از {upload.total_size} بایت)"
+
+        # Limits may have changed since the session was created
+        is_valid, message = ChunkedUploadService.validate_upload(upload.user, upload.original_filename, upload.total_size)
+        if not is_valid:
+            metrics.UPLOADS_FINALIZED.inc(result='rejected')
+            return False, message
+
+        hasher = hashlib.sha256()
+        head = b''
+        with open(StoredUploadedFile.stored_path(upload.storage_name), 'rb') as stored:
+            for data in iter(lambda: stored.read(ChunkedUploadService.READ_SIZE), b''):
+                if len(head) < SNIFF_BYTES:
+                    head += data[:SNIFF_BYTES - len(head)]
+                hasher.update(data)
+        sha256 = hasher.hexdigest()
+
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            metrics.UPLOADS_FINALIZED.inc(result='hash_mismatch')
+            return False, "هش فایل با مقدار ارسال شده مطابقت ندارد"
+
+        upload.sha256 = sha256
+        upload.mimetype = resolve_content_type(upload.original_filename, sniff_content_type(head)) or ''
+        upload.status = 'complete'
+        upload.expires_at = timezone.now() + ChunkedUploadService.SESSION_TTL
+        upload.save()
+        metrics.UPLOADS_FINALIZED.inc(result='complete')
+        return True, ""
+
+    @staticmethod
+    def get_stored_files(user, blob_ids):
+        """
+        Claim blob ids and resolve them into StoredUploadedFile objects, preserving the given order
+        Returns (files, message); files is None when any blob id is invalid or already claimed
+
+        Each blob is claimed with a conditional UPDATE (complete -> consumed), so two
+        concurrent messages naming the same blob cannot both attach it. A claim that is
+        not followed by mark_consumed is handed back when the file is discarded.
+        """
+        try:
+            upload_ids = [uuid.UUID(str(blob_id)) for blob_id in blob_ids]
+        except ValueError:
+            return None, "شناسه فایل نامعتبر است"
+
+        uploads = {
+            upload.upload_id: upload
+            for upload in UploadSession.objects.filter(
+                user=user,
+                upload_id__in=upload_ids,
+                status='complete',
+                expires_at__gt=timezone.now()
+            )
+        }
+        if len(uploads) != len(set(upload_ids)):
+            return None, "فایل آپلود شده یافت نشد یا منقضی شده است"
+
+        claimed = []
+        for upload in uploads.values():
+            if not UploadSession.objects.filter(pk=upload.pk, status='complete').update(
+                status='consumed', updated_at=timezone.now()
+            ):
+                ChunkedUploadService.release_claims(claimed)
+                return None, "فایل آپلود شده یافت نشد یا منقضی شده است"
+            upload.status = 'consumed'
+            claimed.append(upload)
+
+        stored_files = []
+        for upload_id in upload_ids:
+            upload = uploads[upload_id]
+            stored_files.append(StoredUploadedFile(
+                name=upload.original_filename,
+                content_type=upload.mimetype or None,
+                size=upload.total_size,
+                charset=None,
+                storage_name=upload.storage_name,
+                sha256=upload.sha256,
+                upload_session=upload,
+            ))
+        return stored_files, ""
+
+    @staticmethod
+    def release_claims(uploads):
+        """
+        Return claimed blobs that were not attached to a message to 'complete',
+        so the client can retry with the same blob ids
+        """
+        UploadSession.objects.filter(
+            pk__in=[upload.pk for upload in uploads], status='consumed', uploaded_file__isnull=True
+        ).update(status='complete', updated_at=timezone.now())
+        for upload in uploads:
+            upload.status = 'complete'
+
+    @staticmethod
+    def mark_consumed(upload, uploaded_file_record):
+        """
+        Link a claimed blob to the UploadedFile record created from it
+        """
+        upload.status = 'consumed'
+        upload.uploaded_file = uploaded_file_record
+        upload.save(update_fields=['status', 'uploaded_file', 'updated_at'])
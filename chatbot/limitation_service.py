@@ -1,7 +1,7 @@
 """
 Service for handling limitation messages
 """
-from django.apps import apps
+from core.config_cache import ConfigCache
 
 
 class LimitationMessageService:
@@ -22,17 +22,10 @@ class LimitationMessageService:
             dict: Message data with title and content
         """
         try:
-            LimitationMessage = apps.get_model('chatbot', 'LimitationMessage')
-            limitation_msg = LimitationMessage.objects.filter(
-                limitation_type=limitation_type,
-                is_active=True
-            ).first()
+            limitation_msg = ConfigCache.get('limitation_messages').get(limitation_type)
             
             if limitation_msg:
-                return {
-                    'title': limitation_msg.title,
-                    'message': limitation_msg.message
-                }
+                return dict(limitation_msg)
             
         except Exception:
             pass
@@ -0,0 +1,175 @@
+import heapq
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chatbot.models import MediaGCState, UploadedFile, UploadedImage, UploadSession
+
+logger = logging.getLogger(__name__)
+
+# Directories under MEDIA_ROOT scanned by the collector, in sweep order
+GC_DIRECTORIES = ['uploaded_files', 'uploads', 'image_uploads']
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete media files that are no longer referenced by UploadedFile, UploadedImage or '
+        'UploadSession rows. Storage is walked incrementally from a persisted cursor so a full '
+        'sweep can be spread over many runs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget',
+            type=int,
+            default=10000,
+            help='Maximum number of files to examine in this run (default: 10000)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of file names checked against the database per query (default: 1000)',
+        )
+        parser.add_argument(
+            '--min-age-hours',
+            type=int,
+            default=24,
+            help='Never delete files modified more recently than this (default: 24)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report orphaned files without deleting them or moving the cursor',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Restart the sweep from the beginning',
+        )
+
+    def handle(self, *args, **options):
+        budget = options['budget']
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        min_mtime = (timezone.now() - timedelta(hours=options['min_age_hours'])).timestamp()
+
+        state = MediaGCState.get_state()
+        if options['reset'] or state.directory not in GC_DIRECTORIES:
+            state.directory = GC_DIRECTORIES[0]
+            state.last_name = ''
+
+        expired_uploads = self.delete_expired_upload_sessions(dry_run)
+
+        scanned = 0
+        orphaned = 0
+        reclaimed_bytes = 0
+        directory_index = GC_DIRECTORIES.index(state.directory)
+        last_name = state.last_name
+        directories_visited = 0
+
+        while scanned < budget and directories_visited < len(GC_DIRECTORIES):
+            directory = GC_DIRECTORIES[directory_index]
+            limit = budget - scanned
+            names = self.next_names(directory, last_name, limit)
+
+            for start in range(0, len(names), batch_size):
+                batch = names[start:start + batch_size]
+                referenced = self.referenced_names(directory, batch)
+                for name in batch:
+                    if name in referenced:
+                        continue
+                    file_path = os.path.join(settings.MEDIA_ROOT, directory, name)
+                    try:
+                        stat_result = os.stat(file_path)
+                    except FileNotFoundError:
+                        continue
+                    if stat_result.st_mtime > min_mtime:
+                        continue
+                    orphaned += 1
+                    reclaimed_bytes += stat_result.st_size
+                    if dry_run:
+                        self.stdout.write(f'Would delete {directory}/{name} ({stat_result.st_size} bytes)')
+                    else:
+                        os.remove(file_path)
+                        logger.info(f"Deleted orphaned media file {directory}/{name}")
+
+            scanned += len(names)
+            if len(names) < limit:
+                # Directory exhausted: continue with the next one from its beginning
+                directory_index = (directory_index + 1) % len(GC_DIRECTORIES)
+                last_name = ''
+                directories_visited += 1
+                if directory_index == 0 and not dry_run:
+                    state.passes_completed += 1
+            else:
+                last_name = names[-1]
+
+        if not dry_run:
+            state.directory = GC_DIRECTORIES[directory_index]
+            state.last_name = last_name
+            state.files_deleted += orphaned
+            state.bytes_reclaimed += reclaimed_bytes
+            state.save()
+
+        reclaimed_mb = reclaimed_bytes / (1024 * 1024)
+        verb = 'Would reclaim' if dry_run else 'Reclaimed'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Scanned {scanned} files, {orphaned} orphaned, {expired_uploads} expired upload sessions. '
+                f'{verb} {reclaimed_bytes} bytes ({reclaimed_mb:.2f} MB). '
+                f'Cursor: {state.directory}/{state.last_name or "-"}'
+            )
+        )
+
+    def next_names(self, directory, after, limit):
+        """
+        Return up to ``limit`` file names in ``directory`` sorted after ``after``
+        Only ``limit`` names are held in memory regardless of the directory size
+        """
+        path = os.path.join(settings.MEDIA_ROOT, directory)
+        if limit <= 0 or not os.path.isdir(path):
+            return []
+        with os.scandir(path) as entries:
+            candidates = (
+                entry.name for entry in entries
+                if entry.name > after and not entry.name.startswith('.') and entry.is_file(follow_symlinks=False)
+            )
+            return heapq.nsmallest(limit, candidates)
+
+    def referenced_names(self, directory, names):
+        """Names from ``names`` that are still referenced by a database row"""
+        referenced = set()
+        if directory in ('uploaded_files', 'uploads'):
+            referenced.update(
+                UploadedFile.objects.filter(filename__in=names).values_list('filename', flat=True)
+            )
+        if directory == 'uploaded_files':
+            referenced.update(
+                UploadSession.objects.filter(storage_name__in=names).values_list('storage_name', flat=True)
+            )
+        if directory in ('uploaded_files', 'image_uploads'):
+            image_paths = [f'{directory}/{name}' for name in names]
+            referenced.update(
+                image_path.split('/', 1)[1]
+                for image_path in UploadedImage.objects.filter(image_file__in=image_paths).values_list('image_file', flat=True)
+            )
+        return referenced
+
+    def delete_expired_upload_sessions(self, dry_run):
+        """
+        Drop chunked uploads that expired before being attached to a message
+        Their files become orphans and are collected when the cursor reaches them
+        """
+        expired = UploadSession.objects.filter(
+            status__in=['pending', 'complete'],
+            expires_at__lt=timezone.now()
+        )
+        if dry_run:
+            return expired.count()
+        deleted, _ = expired.delete()
+        return deleted
@@ -0,0 +1,225 @@
+"""
+تحویل امن فایل‌های رسانه‌ای کاربران
+Authenticated media delivery for chat attachments and generated images.
+
+The Python worker only checks ownership and builds headers; the bytes are sent
+by the web server (X-Accel-Redirect for nginx, X-Sendfile for Apache) or, as a
+fallback, by FileResponse so WSGI servers can use sendfile().
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import Resolver404, resolve, reverse
+from django.utils.http import content_disposition_header, http_date
+
+from .models import UploadedFile, UploadedImage, UploadSession
+from .upload_handlers import UPLOAD_SUBDIR
+
+# Directories under MEDIA_ROOT that hold user-owned files
+GENERATED_IMAGES_SUBDIR = 'uploads'
+IMAGE_UPLOADS_SUBDIR = 'image_uploads'
+PROTECTED_SUBDIRS = (UPLOAD_SUBDIR, GENERATED_IMAGES_SUBDIR, IMAGE_UPLOADS_SUBDIR)
+
+# Content types that are safe to render inline; everything else is downloaded
+INLINE_CONTENT_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'application/pdf')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class MediaDeliveryService:
+    """Ownership checks and zero-copy responses for files under MEDIA_ROOT"""
+
+    @staticmethod
+    def get_backend():
+        """'nginx' (X-Accel-Redirect), 'apache' (X-Sendfile) or 'django' (FileResponse)"""
+        return getattr(settings, 'MEDIA_DELIVERY_BACKEND', 'django')
+
+    @staticmethod
+    def normalize_path(relative_path):
+        """
+        Validate a path relative to MEDIA_ROOT
+        Returns (subdir, name) or None when the path is not a protected media file
+        """
+        parts = relative_path.split('/')
+        if len(parts) != 2 or parts[0] not in PROTECTED_SUBDIRS:
+            return None
+        name = parts[1]
+        if not name or name in ('.', '..') or '\\' in name or '\x00' in name:
+            return None
+        return parts[0], name
+
+    @staticmethod
+    def get_owned_file(user, relative_path):
+        """
+        Return (absolute_path, original_filename, sha256) if ``user`` owns the file, otherwise None
+        """
+        normalized = MediaDeliveryService.normalize_path(relative_path)
+        if not normalized:
+            return None
+        subdir, name = normalized
+        relative_path = f"{subdir}/{name}"
+
+        original_filename = name
+        sha256 = ''
+        if subdir in (UPLOAD_SUBDIR, GENERATED_IMAGES_SUBDIR):
+            # Generated images are recorded as UploadedFile rows too (see OpenRouterService.process_image_response)
+            record = UploadedFile.objects.filter(user=user, filename=name).only('original_filename', 'sha256').first()
+            if record:
+                original_filename, sha256 = record.original_filename, record.sha256
+            elif not (subdir == UPLOAD_SUBDIR and (
+                UploadedImage.objects.filter(user=user, image_file=relative_path).exists()
+                or UploadSession.objects.filter(user=user, storage_name=name).exists()
+            )):
+                return None
+        elif not UploadedImage.objects.filter(user=user, image_file=relative_path).exists():
+            return None
+
+        absolute_path = os.path.join(settings.MEDIA_ROOT, subdir, name)
+        if not os.path.isfile(absolute_path):
+            return None
+        return absolute_path, original_filename, sha256
+
+    @staticmethod
+    def get_etag(stat_result, sha256=''):
+        """Strong ETag: the content hash when known, otherwise mtime and size"""
+        if sha256:
+            return f'"{sha256}"'
+        return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+    @staticmethod
+    def parse_range(range_header, file_size):
+        """
+        Parse a single-range "bytes=" header
+        Returns (start, end) inclusive, None to ignore the header, or False when unsatisfiable
+        """
+        match = RANGE_RE.match(range_header.strip())
+        if not match or match.group(1) == match.group(2) == '':
+            return None
+        if match.group(1) == '':
+            suffix_length = int(match.group(2))
+            if suffix_length == 0:
+                return False
+            return max(file_size - suffix_length, 0), file_size - 1
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else file_size - 1
+        if start >= file_size or end < start:
+            return False
+        return start, min(end, file_size - 1)
+
+    @staticmethod
+    def protected_url(media_url):
+        """
+        Map a stored "/media/<subdir>/<name>" URL to the authenticated delivery URL
+        URLs that do not point to protected media are returned unchanged
+        """
+        if not media_url or not media_url.startswith(settings.MEDIA_URL):
+            return media_url
+        relative_path = media_url[len(settings.MEDIA_URL):]
+        if not MediaDeliveryService.normalize_path(relative_path):
+            return media_url
+        return reverse('serve_media', args=[relative_path])
+
+    @staticmethod
+    def local_path(url):
+        """
+        Absolute path of a protected file from its stored URL (the delivery URL or a
+        legacy "/media/<subdir>/<name>" one), or None
+        """
+        if not url:
+            return None
+        if url.startswith(settings.MEDIA_URL):
+            relative_path = url[len(settings.MEDIA_URL):]
+        else:
+            try:
+                match = resolve(urlsplit(url).path)
+            except Resolver404:
+                return None
+            if match.url_name != 'serve_media':
+                return None
+            relative_path = match.kwargs['path']
+        normalized = MediaDeliveryService.normalize_path(relative_path)
+        if not normalized:
+            return None
+        return os.path.join(settings.MEDIA_ROOT, *normalized)
+
+    @staticmethod
+    def build_response(request, absolute_path, relative_path, original_filename, sha256=''):
+        stat_result = os.stat(absolute_path)
+        file_size = stat_result.st_size
+        etag = MediaDeliveryService.get_etag(stat_result, sha256)
+
+        content_type = mimetypes.guess_type(original_filename)[0] or 'application/octet-stream'
+        as_attachment = content_type not in INLINE_CONTENT_TYPES
+
+        def add_headers(response):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(stat_result.st_mtime)
+            response['Cache-Control'] = 'private, max-age=86400'
+            response['Accept-Ranges'] = 'bytes'
+            response['Content-Disposition'] = content_disposition_header(as_attachment, original_filename)
+            return response
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+            return add_headers(HttpResponseNotModified())
+
+        backend = MediaDeliveryService.get_backend()
+        if backend == 'nginx':
+            # nginx serves the file (including Range/If-Range) from an internal location
+            response = HttpResponse(content_type=content_type)
+            prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative_path)
+            return add_headers(response)
+        if backend == 'apache':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = absolute_path
+            return add_headers(response)
+
+        # Fallback: Range handling here, bytes sent by the WSGI server's file wrapper
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if range_header and (not if_range or if_range.strip() == etag):
+            byte_range = MediaDeliveryService.parse_range(range_header, file_size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{file_size}'
+            return add_headers(response)
+
+        file_handle = open(absolute_path, 'rb')
+        if byte_range is None:
+            response = FileResponse(file_handle, content_type=content_type)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            file_handle.seek(start)
+            if end == file_size - 1:
+                # Open-ended range: the file object itself keeps sendfile() usable
+                response = FileResponse(file_handle, content_type=content_type, status=206)
+            else:
+                response = StreamingHttpResponse(
+                    MediaDeliveryService._read_range(file_handle, length),
+                    content_type=content_type,
+                    status=206
+                )
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+        return add_headers(response)
+
+    @staticmethod
+    def _read_range(file_handle, length):
+        try:
+            while length > 0:
+                data = file_handle.read(min(STREAM_BLOCK_SIZE, length))
+                if not data:
+                    break
+                length -= len(data)
+                yield data
+        finally:
+            file_handle.close()
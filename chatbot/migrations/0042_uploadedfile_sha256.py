@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0041_fix_invalid_datetime_values'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 digest computed while the file was streamed to storage', max_length=64),
+        ),
+    ]
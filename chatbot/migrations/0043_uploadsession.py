@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:12
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0042_uploadedfile_sha256'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('original_filename', models.CharField(help_text='Original filename from user', max_length=255)),
+                ('storage_name', models.CharField(help_text='Filename under MEDIA_ROOT/uploaded_files', max_length=255)),
+                ('total_size', models.PositiveIntegerField(help_text='Declared file size in bytes')),
+                ('received_bytes', models.PositiveIntegerField(default=0, help_text='Bytes received so far; the next chunk must start here')),
+                ('mimetype', models.CharField(blank=True, help_text='MIME type resolved on finalize', max_length=100)),
+                ('sha256', models.CharField(blank=True, help_text='SHA-256 digest computed on finalize', max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('complete', 'Complete'), ('consumed', 'Consumed')], db_index=True, default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField(help_text='Unfinished or unused uploads are rejected after this time')),
+                ('uploaded_file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='chatbot.uploadedfile')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'upload_sessions',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
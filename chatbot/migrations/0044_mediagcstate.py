@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0043_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaGCState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('directory', models.CharField(blank=True, help_text='Directory under MEDIA_ROOT currently being scanned', max_length=100)),
+                ('last_name', models.CharField(blank=True, help_text='Last file name scanned in that directory', max_length=255)),
+                ('passes_completed', models.PositiveIntegerField(default=0, help_text='Number of full sweeps over all media directories')),
+                ('files_deleted', models.PositiveIntegerField(default=0, help_text='Total orphaned files deleted')),
+                ('bytes_reclaimed', models.BigIntegerField(default=0, help_text='Total bytes reclaimed')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Media GC State',
+                'verbose_name_plural': 'Media GC State',
+                'db_table': 'media_gc_state',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0044_mediagcstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatbot',
+            name='response_cache_enabled',
+            field=models.BooleanField(default=False, help_text='Reuse answers for identical prompts instead of calling OpenRouter again'),
+        ),
+        migrations.AddField(
+            model_name='chatbot',
+            name='response_cache_max_bytes',
+            field=models.PositiveIntegerField(default=5242880, help_text='Maximum bytes of answers this chatbot may keep in the cache'),
+        ),
+        migrations.AddField(
+            model_name='chatbot',
+            name='response_cache_ttl_seconds',
+            field=models.PositiveIntegerField(default=3600, help_text='How long a cached answer is reused'),
+        ),
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='cached',
+            field=models.BooleanField(default=False, help_text='Answered from the response cache; no upstream cost'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0046_chatmessage_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=0, help_text='Session revision at which this message last changed'),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=0, help_text='Bumped whenever a message of this session is created, edited or disabled'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'revision'], name='chat_msg_session_rev_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+
+def populate_sidebar_fields(apps, schema_editor):
+    """Count and last message of every session from its enabled messages, in one UPDATE"""
+    ChatSession = apps.get_model('chatbot', 'ChatSession')
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    enabled = ChatMessage.objects.filter(session_id=OuterRef('pk'), disabled=False)
+    latest = enabled.order_by('-created_at', '-id')
+    ChatSession.objects.update(
+        message_count=Coalesce(Subquery(enabled.order_by().values('session_id').annotate(total=Count('id')).values('total')), 0),
+        last_message_at=Subquery(latest.values('created_at')[:1]),
+        last_message_preview=Coalesce(Substr(Subquery(latest.values('content')[:1]), 1, 120), Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_models', '0006_modelarticle_show_login_register'),
+        ('chatbot', '0047_session_revision'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, help_text='Creation time of the latest message', null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_preview',
+            field=models.CharField(blank=True, help_text='Beginning of the latest message', max_length=120),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of messages in this session'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user', 'is_active', 'updated_at', 'id'], name='chat_session_sidebar_idx'),
+        ),
+        migrations.RunPython(populate_sidebar_fields, migrations.RunPython.noop),
+    ]
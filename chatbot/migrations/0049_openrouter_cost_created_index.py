@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0048_session_sidebar_denormalization'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='openrouterrequestcost',
+            index=models.Index(fields=['created_at'], name='openrouter_cost_created_idx'),
+        ),
+    ]
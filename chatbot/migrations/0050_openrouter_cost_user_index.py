@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0049_openrouter_cost_created_index'),
+        ('subscriptions', '0018_subscriptiontype_max_openrouter_cost_usd'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='openrouterrequestcost',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='openrouter_cost_user_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0050_openrouter_cost_user_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='duration_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Milliseconds until the stream ended or the response arrived', null=True),
+        ),
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='provider',
+            field=models.CharField(blank=True, help_text='Provider that served the request, as reported by OpenRouter', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='request_started_at',
+            field=models.DateTimeField(blank=True, help_text='When the request was sent to OpenRouter', null=True),
+        ),
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='retry_count',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Retries made before the final response'),
+        ),
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='time_to_first_token_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Milliseconds until the first streamed token', null=True),
+        ),
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='tokens_per_second',
+            field=models.FloatField(blank=True, help_text='Completion tokens per second after the first token', null=True),
+        ),
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='upstream_status',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='HTTP status returned by OpenRouter', null=True),
+        ),
+    ]
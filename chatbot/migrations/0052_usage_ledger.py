@@ -0,0 +1,69 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_usage_ledger(apps, schema_editor):
+    """
+    Fill the quota fields of the existing ledger rows
+    Free-model rows are recognised by the models' current is_free flag
+    """
+    OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+    AIModel = apps.get_model('ai_models', 'AIModel')
+    UserUsage = apps.get_model('subscriptions', 'UserUsage')
+
+    # Titles and image analysis were never counted towards the quotas
+    OpenRouterRequestCost.objects.filter(request_type__in=('title', 'vision')).update(messages_count=0, excluded_from_quota=True)
+
+    free_model_ids = list(AIModel.objects.filter(is_free=True).values_list('model_id', flat=True))
+    OpenRouterRequestCost.objects.filter(model_id__in=free_model_ids).update(is_free_model=True)
+
+    # A usage reset zeroed the UserUsage rows (and set their updated_at); rows recorded before it stop counting
+    resets = UserUsage.objects.filter(
+        messages_count=0, tokens_count=0, free_model_messages_count=0, free_model_tokens_count=0
+    ).values('user_id', 'subscription_type_id').annotate(reset_at=Max('updated_at'))
+    for reset in resets.iterator():
+        OpenRouterRequestCost.objects.filter(
+            user_id=reset['user_id'], subscription_type_id=reset['subscription_type_id'], created_at__lte=reset['reset_at']
+        ).update(excluded_from_quota=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_models', '0006_modelarticle_show_login_register'),
+        ('chatbot', '0051_openrouter_cost_upstream_timing'),
+        ('subscriptions', '0018_subscriptiontype_max_openrouter_cost_usd'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='excluded_from_quota',
+            field=models.BooleanField(default=False, help_text='Not counted towards message and token quotas (title/vision requests, usage reset)'),
+        ),
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='is_free_model',
+            field=models.BooleanField(default=False, help_text='Answered by a free model; counted against the free-model quotas'),
+        ),
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='messages_count',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Messages this request counts as'),
+        ),
+        migrations.AlterField(
+            model_name='openrouterrequestcost',
+            name='session',
+            field=models.ForeignKey(blank=True, help_text='Chat session of the request (empty for usage recorded outside a session)', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='openrouter_costs', to='chatbot.chatsession'),
+        ),
+        migrations.AddIndex(
+            model_name='openrouterrequestcost',
+            index=models.Index(fields=['user', 'subscription_type', 'created_at'], name='openrouter_cost_quota_idx'),
+        ),
+        migrations.RunPython(backfill_usage_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0052_usage_ledger'),
+        ('subscriptions', '0018_subscriptiontype_max_openrouter_cost_usd'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='openrouterrequestcost',
+            name='reserved_until',
+            field=models.DateTimeField(blank=True, help_text='Set while the request is in flight and the row holds an estimate; ignored after this time unless settled', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='openrouterrequestcost',
+            index=models.Index(fields=['reserved_until'], name='openrouter_cost_reserved_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:49
+
+from django.db import migrations
+from django.db.models import Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+LEGACY_MODEL_ID = 'legacy-usage'
+# messages_count is a PositiveSmallIntegerField
+MAX_MESSAGES_PER_ROW = 32767
+
+
+def add_legacy_usage_rows(apps, schema_editor):
+    """
+    Add ledger rows for usage that only UserUsage recorded
+    Usage counted in UserUsage without a matching cost row would otherwise drop out of
+    the quotas and lifetime totals when the table goes; the difference per user,
+    subscription type and day becomes one row per model kind, dated at the day's last usage.
+    """
+    OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+    UserUsage = apps.get_model('subscriptions', 'UserUsage')
+
+    def daily_totals(queryset, **sums):
+        rows = queryset.annotate(day=TruncDate('created_at')).values(
+            'user_id', 'subscription_type_id', 'day'
+        ).annotate(last_used_at=Max('created_at'), **sums).order_by()
+        return {(row['user_id'], row['subscription_type_id'], row['day']): row for row in rows.iterator()}
+
+    # Reset UserUsage rows are zeroed and their ledger rows excluded, so both sides cover the same usage
+    legacy = daily_totals(
+        UserUsage.objects.all(),
+        messages=Sum('messages_count'), tokens=Sum('tokens_count'),
+        free_messages=Sum('free_model_messages_count'), free_tokens=Sum('free_model_tokens_count'),
+    )
+    paid = Q(is_free_model=False)
+    free = Q(is_free_model=True)
+    counted = OpenRouterRequestCost.objects.filter(excluded_from_quota=False).filter(
+        Q(reserved_until__isnull=True) | Q(reserved_until__gt=timezone.now())
+    )
+    ledger = daily_totals(
+        counted,
+        messages=Sum('messages_count', filter=paid), tokens=Sum('effective_cost_tokens', filter=paid),
+        free_messages=Sum('messages_count', filter=free), free_tokens=Sum('total_tokens', filter=free),
+    )
+
+    rows = []
+    for key, usage in legacy.items():
+        recorded = ledger.get(key, {})
+        for is_free_model, messages_field, tokens_field in ((False, 'messages', 'tokens'), (True, 'free_messages', 'free_tokens')):
+            messages = max((usage[messages_field] or 0) - (recorded.get(messages_field) or 0), 0)
+            tokens = max((usage[tokens_field] or 0) - (recorded.get(tokens_field) or 0), 0)
+            while messages or tokens:
+                batch = min(messages, MAX_MESSAGES_PER_ROW)
+                rows.append(OpenRouterRequestCost(
+                    user_id=usage['user_id'],
+                    subscription_type_id=usage['subscription_type_id'],
+                    model_id=LEGACY_MODEL_ID,
+                    model_name='Usage recorded before the cost ledger',
+                    request_type='chat',
+                    total_tokens=tokens,
+                    effective_cost_tokens=tokens,
+                    is_free_model=is_free_model,
+                    messages_count=batch,
+                    created_at=usage['last_used_at'],
+                ))
+                messages -= batch
+                tokens = 0
+        if len(rows) >= 1000:
+            OpenRouterRequestCost.objects.bulk_create(rows)
+            rows = []
+    OpenRouterRequestCost.objects.bulk_create(rows)
+
+
+def remove_legacy_usage_rows(apps, schema_editor):
+    OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+    OpenRouterRequestCost.objects.filter(model_id=LEGACY_MODEL_ID, session=None).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0053_usage_reservations'),
+        ('subscriptions', '0018_subscriptiontype_max_openrouter_cost_usd'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_legacy_usage_rows, remove_legacy_usage_rows),
+        migrations.DeleteModel(
+            name='ChatSessionUsage',
+        ),
+    ]
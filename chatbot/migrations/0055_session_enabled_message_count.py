@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:52
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+
+def recount_enabled_messages(apps, schema_editor):
+    """message_count counts enabled messages only; recompute it and the last message in one UPDATE"""
+    ChatSession = apps.get_model('chatbot', 'ChatSession')
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    enabled = ChatMessage.objects.filter(session_id=OuterRef('pk'), disabled=False)
+    latest = enabled.order_by('-created_at', '-id')
+    ChatSession.objects.update(
+        message_count=Coalesce(Subquery(enabled.order_by().values('session_id').annotate(total=Count('id')).values('total')), 0),
+        last_message_at=Subquery(latest.values('created_at')[:1]),
+        last_message_preview=Coalesce(Substr(Subquery(latest.values('content')[:1]), 1, 120), Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0054_legacy_usage_ledger_rows'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of enabled messages in this session'),
+        ),
+        migrations.RunPython(recount_enabled_messages, migrations.RunPython.noop),
+    ]
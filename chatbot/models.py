@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from accounts.models import User
@@ -6,6 +8,14 @@ from ai_models.models import AIModel
 from subscriptions.models import SubscriptionType
 import uuid
 
+# Characters of the latest message shown under a session in the sidebar
+LAST_MESSAGE_PREVIEW_LENGTH = 120
+
+
+def message_preview(content):
+    """Sidebar preview of a message: whitespace collapsed, cut to LAST_MESSAGE_PREVIEW_LENGTH"""
+    return ' '.join(content.split())[:LAST_MESSAGE_PREVIEW_LENGTH]
+
 class Chatbot(models.Model):
     CHATBOT_TYPES = [
         ('text', 'Text Generator'),
@@ -19,6 +29,10 @@ class Chatbot(models.Model):
     is_active = models.BooleanField(default=True)
     system_prompt = models.TextField(blank=True, help_text="System prompt for the AI model")
     chatbot_type = models.CharField(max_length=20, choices=CHATBOT_TYPES, default='text', help_text="Type of chatbot (text generation)")
+    # کش پاسخ‌های تکراری - Prompt-level response cache (opt-in)
+    response_cache_enabled = models.BooleanField(default=False, help_text="Reuse answers for identical prompts instead of calling OpenRouter again")
+    response_cache_ttl_seconds = models.PositiveIntegerField(default=3600, help_text="How long a cached answer is reused")
+    response_cache_max_bytes = models.PositiveIntegerField(default=5 * 1024 * 1024, help_text="Maximum bytes of answers this chatbot may keep in the cache")
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -37,6 +51,41 @@ class ChatSession(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    revision = models.PositiveBigIntegerField(default=0, help_text="Bumped whenever a message of this session is created, edited or disabled")
+    # Denormalized for the sidebar; maintained by ChatMessage.save
+    message_count = models.PositiveIntegerField(default=0, help_text="Number of enabled messages in this session")
+    last_message_at = models.DateTimeField(null=True, blank=True, help_text="Creation time of the latest message")
+    last_message_preview = models.CharField(max_length=LAST_MESSAGE_PREVIEW_LENGTH, blank=True, help_text="Beginning of the latest message")
+    
+    # Columns written only with conditional UPDATEs; a full save() never writes them back
+    DENORMALIZED_FIELDS = ('revision', 'message_count', 'last_message_at', 'last_message_preview')
+    
+    @classmethod
+    def bump_revision(cls, session_id):
+        """
+        افزایش اتمیک شماره نسخه جلسه
+        Atomically increment the session revision and return the new value
+        """
+        with transaction.atomic():
+            cls.objects.filter(pk=session_id).update(revision=F('revision') + 1)
+            return cls.objects.filter(pk=session_id).values_list('revision', flat=True).get()
+    
+    @classmethod
+    def refresh_sidebar_fields(cls, session_id):
+        """
+        بازمحاسبه تعداد و آخرین پیام جلسه
+        Recompute message_count and the last message from the enabled messages
+        (after messages were disabled, re-enabled or deleted)
+        """
+        enabled = ChatMessage.objects.filter(session_id=session_id, disabled=False)
+        last_message = enabled.order_by('-created_at', '-id').only('content', 'created_at').first()
+        cls.objects.filter(pk=session_id).update(
+            message_count=Coalesce(Subquery(
+                enabled.order_by().values('session_id').annotate(total=Count('id')).values('total')
+            ), 0),
+            last_message_at=last_message.created_at if last_message else None,
+            last_message_preview=message_preview(last_message.content) if last_message else '',
+        )
     
     def clean(self):
         # Ensure either chatbot or ai_model is set
@@ -54,6 +103,12 @@ class ChatSession(models.Model):
     
     def save(self, *args, **kwargs):
         self.clean()
+        # Denormalized columns are only changed by ChatMessage.save; never overwrite them with stale in-memory values
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DENORMALIZED_FIELDS
+            ]
         super().save(*args, **kwargs)
     
     def should_auto_generate_title(self):
@@ -121,6 +176,10 @@ class ChatSession(models.Model):
     class Meta:
         db_table = 'chat_sessions'
         ordering = ['-updated_at']
+        indexes = [
+            # Keyset pagination of the sidebar: (user, is_active, updated_at, id)
+            models.Index(fields=['user', 'is_active', 'updated_at', 'id'], name='chat_session_sidebar_idx'),
+        ]
 
 class ChatMessage(models.Model):
     MESSAGE_TYPES = [
@@ -140,6 +199,51 @@ class ChatMessage(models.Model):
     needs_regeneration = models.BooleanField(default=False)
     edited_at = models.DateTimeField(null=True, blank=True)
     disabled = models.BooleanField(default=False)
+    revision = models.PositiveBigIntegerField(default=0, help_text="Session revision at which this message last changed")
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Disabled state as stored, so save() notices when the message is disabled or re-enabled
+        instance._stored_disabled = instance.__dict__.get('disabled')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        adding = self._state.adding
+        # Content-only saves are streaming progress; the final save of the message bumps the revision
+        final_save = update_fields is None or bool(set(update_fields) - {'content'})
+        disabled_changed = not adding and getattr(self, '_stored_disabled', self.disabled) != self.disabled and (
+            update_fields is None or 'disabled' in update_fields
+        )
+        if final_save:
+            self.revision = ChatSession.bump_revision(self.session_id)
+            if update_fields is not None:
+                kwargs['update_fields'] = list(update_fields) + ['revision']
+        super().save(*args, **kwargs)
+        self._stored_disabled = self.disabled
+        if disabled_changed:
+            # The message left or rejoined the history: count and last message must be recomputed
+            ChatSession.refresh_sidebar_fields(self.session_id)
+            return
+        if adding and not self.disabled:
+            ChatSession.objects.filter(pk=self.session_id).update(message_count=F('message_count') + 1)
+        if adding or final_save:
+            self.update_session_preview()
+    
+    def update_session_preview(self):
+        """
+        به‌روزرسانی پیش‌نمایش آخرین پیام جلسه
+        Make this message the session's last message unless a newer one is already recorded
+        """
+        if self.disabled:
+            return
+        ChatSession.objects.filter(pk=self.session_id).filter(
+            Q(last_message_at__isnull=True) | Q(last_message_at__lte=self.created_at)
+        ).update(
+            last_message_at=self.created_at,
+            last_message_preview=message_preview(self.content)
+        )
     
     def __str__(self):
         return f"{self.message_type}: {self.content[:50]}..."
@@ -147,28 +251,12 @@ class ChatMessage(models.Model):
     class Meta:
         db_table = 'chat_messages'
         ordering = ['created_at']
-
-class ChatSessionUsage(models.Model):
-    """
-    Track token usage per chat session
-    This model ensures that usage data is never deleted even if chat sessions are deleted
-    """
-    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='usage_records')
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_session_usages')
-    subscription_type = models.ForeignKey(SubscriptionType, on_delete=models.CASCADE)
-    tokens_count = models.IntegerField(default=0, help_text="Total tokens used in this session")
-    free_model_tokens_count = models.IntegerField(default=0, help_text="Tokens used with free models in this session")
-    is_free_model = models.BooleanField(default=False, help_text="Whether this session used free models")
-    created_at = models.DateTimeField(default=timezone.now)
-    updated_at = models.DateTimeField(auto_now=True)
-    
-    def __str__(self):
-        return f"{self.user.name} - {self.session.title} - {self.tokens_count} tokens"
-    
-    class Meta:
-        db_table = 'chat_session_usages'
-        ordering = ['-created_at']
-
+        indexes = [
+            # Keyset pagination of session history: (session, created_at, id)
+            models.Index(fields=['session', 'created_at', 'id'], name='chat_msg_session_keyset_idx'),
+            # Delta sync: messages changed after a given session revision
+            models.Index(fields=['session', 'revision'], name='chat_msg_session_rev_idx'),
+        ]
 
 class UploadedFile(models.Model):
     """
@@ -180,6 +268,7 @@ class UploadedFile(models.Model):
     original_filename = models.CharField(max_length=255, help_text="Original filename from user")
     mimetype = models.CharField(max_length=100, help_text="MIME type of the file")
     size = models.PositiveIntegerField(help_text="File size in bytes")
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True, help_text="SHA-256 digest computed while the file was streamed to storage")
     uploaded_at = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
@@ -190,6 +279,44 @@ class UploadedFile(models.Model):
         ordering = ['-uploaded_at']
 
 
+class UploadSession(models.Model):
+    """
+    جلسه آپلود تکه‌ای و قابل ادامه برای فایل‌های بزرگ
+    Chunked, resumable upload of a single attachment. Once finalized, its
+    upload_id is the blob id that send_message/edit_message accept.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('complete', 'Complete'),
+        ('consumed', 'Consumed'),
+    ]
+
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    original_filename = models.CharField(max_length=255, help_text="Original filename from user")
+    storage_name = models.CharField(max_length=255, help_text="Filename under MEDIA_ROOT/uploaded_files")
+    total_size = models.PositiveIntegerField(help_text="Declared file size in bytes")
+    received_bytes = models.PositiveIntegerField(default=0, help_text="Bytes received so far; the next chunk must start here")
+    mimetype = models.CharField(max_length=100, blank=True, help_text="MIME type resolved on finalize")
+    sha256 = models.CharField(max_length=64, blank=True, help_text="SHA-256 digest computed on finalize")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    uploaded_file = models.ForeignKey(UploadedFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_sessions')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(help_text="Unfinished or unused uploads are rejected after this time")
+
+    def __str__(self):
+        return f"{self.user.name} - {self.original_filename} ({self.status})"
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    class Meta:
+        db_table = 'upload_sessions'
+        ordering = ['-created_at']
+
+
 class FileUploadSettings(models.Model):
     """
     Model to manage file upload settings per subscription type
@@ -442,7 +569,76 @@ class LimitationMessage(models.Model):
         ordering = ['limitation_type']
 
 
-class OpenRouterRequestCostManager(models.Manager):
+class UsageLedgerQuerySet(models.QuerySet):
+    """
+    Projections of the usage ledger (OpenRouterRequestCost)
+
+    Each answered request is one ledger row. Per-period usage counters and
+    per-session token totals (once the UserUsage and ChatSessionUsage tables)
+    are derived from it: rows marked excluded_from_quota
+    (title and vision requests, image edits without images, usage reset after
+    a payment) only count towards the cost.
+
+    A row with reserved_until is a reservation of a request still in flight
+    (subscriptions/reservations.py); once that time has passed without the row
+    being settled it counts for nothing.
+    """
+    @staticmethod
+    def live_filter():
+        """Settled rows and reservations that have not expired"""
+        return Q(reserved_until__isnull=True) | Q(reserved_until__gt=timezone.now())
+
+    def live(self):
+        return self.filter(self.live_filter())
+
+    def counted(self):
+        """Rows that count towards the message and token quotas"""
+        return self.live().filter(excluded_from_quota=False)
+
+    def stale_reservations(self):
+        """Reservations whose request never settled them"""
+        return self.filter(reserved_until__lte=timezone.now())
+
+    @staticmethod
+    def usage_aggregates(extra_filter=None):
+        """
+        Aggregate expressions named like the usage counters; paid tokens are the
+        effective (multiplied) tokens, free-model tokens the raw ones
+        """
+        counted = Q(excluded_from_quota=False) & UsageLedgerQuerySet.live_filter()
+        if extra_filter is not None:
+            counted &= extra_filter
+        paid = counted & Q(is_free_model=False)
+        free = counted & Q(is_free_model=True)
+        return {
+            'messages_count': Sum('messages_count', filter=paid),
+            'tokens_count': Sum('effective_cost_tokens', filter=paid),
+            'free_model_messages_count': Sum('messages_count', filter=free),
+            'free_model_tokens_count': Sum('total_tokens', filter=free),
+        }
+
+    def user_usage(self):
+        """Usage counters of the rows in the queryset (0 when empty)"""
+        # Aggregate aliases may not shadow model fields (messages_count)
+        totals = self.aggregate(**{f'total_{field}': expression for field, expression in self.usage_aggregates().items()})
+        return {field[len('total_'):]: value or 0 for field, value in totals.items()}
+
+    def session_usage(self):
+        """Token totals per session"""
+        aggregates = self.usage_aggregates()
+        return self.counted().exclude(session=None).values('session_id', 'user_id', 'subscription_type_id').annotate(
+            tokens_count=Coalesce(aggregates['tokens_count'], 0),
+            free_model_tokens_count=Coalesce(aggregates['free_model_tokens_count'], 0),
+            first_used_at=Min('created_at'),
+            last_used_at=Max('created_at'),
+        ).order_by('-last_used_at')
+
+    def exclude_from_quota(self):
+        """Stop counting the rows towards the quotas (cost data is kept); returns the number of rows"""
+        return self.counted().update(excluded_from_quota=True, updated_at=timezone.now())
+
+
+class OpenRouterRequestCostManager(models.Manager.from_queryset(UsageLedgerQuerySet)):
     """
     Custom manager for OpenRouterRequestCost to handle timezone issues
     """
@@ -454,12 +650,17 @@ class OpenRouterRequestCostManager(models.Manager):
 class OpenRouterRequestCost(models.Model):
     """
     Model to track the cost of each OpenRouter API request
+    This is the usage ledger: one row per request, written once; quota checks,
+    usage statistics and reports all read it (see UsageLedgerQuerySet)
     """
     # Add custom manager
     objects = OpenRouterRequestCostManager()
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='openrouter_costs')
-    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='openrouter_costs')
+    session = models.ForeignKey(
+        ChatSession, on_delete=models.CASCADE, related_name='openrouter_costs', null=True, blank=True,
+        help_text="Chat session of the request (empty for usage recorded outside a session)"
+    )
     subscription_type = models.ForeignKey(SubscriptionType, on_delete=models.CASCADE)
     
     # Request details
@@ -511,6 +712,27 @@ class OpenRouterRequestCost(models.Model):
         default='chat',
         help_text="Type of request"
     )
+    cached = models.BooleanField(default=False, help_text="Answered from the response cache; no upstream cost")
+    
+    # Quota accounting
+    is_free_model = models.BooleanField(default=False, help_text="Answered by a free model; counted against the free-model quotas")
+    messages_count = models.PositiveSmallIntegerField(default=1, help_text="Messages this request counts as")
+    excluded_from_quota = models.BooleanField(
+        default=False, help_text="Not counted towards message and token quotas (title/vision requests, usage reset)"
+    )
+    reserved_until = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Set while the request is in flight and the row holds an estimate; ignored after this time unless settled"
+    )
+    
+    # Upstream latency and throughput (empty for cached answers and rows recorded before they were tracked)
+    request_started_at = models.DateTimeField(null=True, blank=True, help_text="When the request was sent to OpenRouter")
+    time_to_first_token_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Milliseconds until the first streamed token")
+    duration_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Milliseconds until the stream ended or the response arrived")
+    tokens_per_second = models.FloatField(null=True, blank=True, help_text="Completion tokens per second after the first token")
+    upstream_status = models.PositiveSmallIntegerField(null=True, blank=True, help_text="HTTP status returned by OpenRouter")
+    retry_count = models.PositiveSmallIntegerField(default=0, help_text="Retries made before the final response")
+    provider = models.CharField(max_length=100, blank=True, help_text="Provider that served the request, as reported by OpenRouter")
     
     # Timestamps - Using timezone-naive approach to avoid MySQL timezone issues
     created_at = models.DateTimeField(default=timezone.now)
@@ -522,5 +744,42 @@ class OpenRouterRequestCost(models.Model):
     class Meta:
         db_table = 'openrouter_request_costs'
         ordering = ['-created_at']
+        indexes = [
+            # Date-range scans of refresh_report_facts
+            models.Index(fields=['created_at'], name='openrouter_cost_created_idx'),
+            # Per-user aggregates and keyset pages of the costs page
+            models.Index(fields=['user', 'created_at', 'id'], name='openrouter_cost_user_idx'),
+            # Quota windows and lifetime totals of one subscription
+            models.Index(fields=['user', 'subscription_type', 'created_at'], name='openrouter_cost_quota_idx'),
+            # Stale reservations removed by expire_usage_reservations
+            models.Index(fields=['reserved_until'], name='openrouter_cost_reserved_idx'),
+        ]
         verbose_name = "OpenRouter Request Cost"
         verbose_name_plural = "OpenRouter Request Costs"
+
+
+class MediaGCState(models.Model):
+    """
+    وضعیت پاکسازی فایل‌های بدون استفاده
+    Persisted cursor of the gc_media command so a full storage sweep can span many runs
+    """
+    directory = models.CharField(max_length=100, blank=True, help_text="Directory under MEDIA_ROOT currently being scanned")
+    last_name = models.CharField(max_length=255, blank=True, help_text="Last file name scanned in that directory")
+    passes_completed = models.PositiveIntegerField(default=0, help_text="Number of full sweeps over all media directories")
+    files_deleted = models.PositiveIntegerField(default=0, help_text="Total orphaned files deleted")
+    bytes_reclaimed = models.BigIntegerField(default=0, help_text="Total bytes reclaimed")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Media GC cursor: {self.directory}/{self.last_name}"
+
+    @classmethod
+    def get_state(cls):
+        """Get the single persisted cursor"""
+        state, created = cls.objects.get_or_create(pk=1)
+        return state
+
+    class Meta:
+        db_table = 'media_gc_state'
+        verbose_name = "Media GC State"
+        verbose_name_plural = "Media GC State"
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import ChatMessage, ChatSession
+
+
+@receiver(post_delete, sender=ChatMessage)
+def refresh_session_after_message_delete(sender, instance, **kwargs):
+    """
+    Recompute the sidebar fields of the deleted message's session
+    Deferred to the commit, when every message of a bulk or cascading delete is gone
+    """
+    session_id = instance.session_id
+    transaction.on_commit(lambda: ChatSession.refresh_sidebar_fields(session_id))
@@ -88,6 +88,25 @@ class MessageEditingTestCase(TestCase):
         assistant_message = ChatMessage._default_manager.get(id=self.assistant_message.id)
         self.assertTrue(assistant_message.disabled)
 
+    @patch('chatbot.views.OpenRouterService')
+    def test_refused_reservation_leaves_history_untouched(self, mock_openrouter_service):
+        """An edit refused by the usage reservation (e.g. the cost limit) changes nothing"""
+        from subscriptions.models import SubscriptionType
+        gold = SubscriptionType._default_manager.create(name='Gold', sku='gold', price=1)
+        url = reverse('edit_message', kwargs={
+            'session_id': self.session.id,
+            'message_id': str(self.user_message.message_id)
+        })
+        with patch.object(User, 'get_subscription_type', return_value=gold), \
+                patch('chatbot.views.UsageService.comprehensive_check', return_value=(True, '')), \
+                patch('chatbot.views.UsageReservationService.reserve', return_value=(None, 'cost', 'سقف هزینه')):
+            response = self.client.post(url, json.dumps({'content': 'Updated message content'}), content_type='application/json')
+        
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(ChatMessage._default_manager.get(id=self.user_message.id).content, 'Hello, this is a test message')
+        self.assertFalse(ChatMessage._default_manager.get(id=self.assistant_message.id).disabled)
+        mock_openrouter_service.return_value.stream_text_response.assert_not_called()
+
     def test_edit_message_wrong_user(self):
         """Test that users can't edit other users' messages"""
         # Create another user
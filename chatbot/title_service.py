@@ -4,7 +4,9 @@ Chat Title Auto-Generation Service
 """
 import logging
 from django.apps import apps
+from ai_models.response_cache import ResponseCachePolicy
 from ai_models.services import OpenRouterService
+from ai_models.upstream_timing import ledger_fields
 from django.db.models import Q
 from typing import Optional, Tuple
 
@@ -84,14 +86,22 @@ class ChatTitleService:
             return None
     
     @staticmethod
-    def generate_title_with_ai(first_message: str, ai_model) -> str:
+    def generate_title_with_ai(first_message: str, ai_model, cache_policy=None) -> str:
         """
         تولید عنوان با استفاده از AI
-        Generate title using AI
+        Generate title using AI (optionally through the response cache)
+        """
+        title, response = ChatTitleService._request_title(first_message, ai_model, cache_policy)
+        return title
+    
+    @staticmethod
+    def _request_title(first_message: str, ai_model, cache_policy=None):
+        """
+        Generated title and the OpenRouter response it came from (None when none was received)
         """
         try:
             if not ai_model:
-                return 'چت جدید'
+                return 'چت جدید', None
                 
             # پرامپت فارسی برای تولید عنوان بهتر
             prompt = f"""لطفاً برای این پیام یک عنوان کوتاه و توصیفی (حداکثر 5 کلمه) به زبان فارسی تولید کن:
@@ -105,11 +115,11 @@ class ChatTitleService:
                 {"role": "user", "content": prompt}
             ]
             
-            response = openrouter_service.send_text_message(ai_model, messages)
+            response = openrouter_service.send_text_message(ai_model, messages, cache_policy=cache_policy)
             
             if isinstance(response, dict) and 'error' in response:
                 logger.warning(f"AI title generation failed: {response['error']}")
-                return ChatTitleService._generate_fallback_title(first_message)
+                return ChatTitleService._generate_fallback_title(first_message), None
             
             if isinstance(response, dict) and 'choices' in response:
                 try:
@@ -127,15 +137,50 @@ class ChatTitleService:
                                     # محدود کردن طول عنوان
                                     if len(title) > 50:
                                         title = title[:50] + "..."
-                                    return title if title else 'چت جدید'
+                                    return (title if title else 'چت جدید'), response
                 except (KeyError, IndexError, TypeError) as e:
                     logger.warning(f"Error parsing AI response: {str(e)}")
             
-            return ChatTitleService._generate_fallback_title(first_message)
+            return ChatTitleService._generate_fallback_title(first_message), response
             
         except Exception as e:
             logger.error(f"Error generating title with AI: {str(e)}")
-            return ChatTitleService._generate_fallback_title(first_message)
+            return ChatTitleService._generate_fallback_title(first_message), None
+    
+    @staticmethod
+    def _title_cost(session, user, ai_model, response):
+        """
+        Unsaved OpenRouterRequestCost row of a title request, or None without usage or subscription
+        """
+        usage = response.get('usage') if isinstance(response, dict) else None
+        subscription_type = user.get_subscription_type()
+        if not usage or not subscription_type:
+            return None
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        prompt_tokens = usage.get('prompt_tokens', 0)
+        completion_tokens = usage.get('completion_tokens', 0)
+        total_tokens = usage.get('total_tokens', prompt_tokens + completion_tokens)
+        cost_multiplier = float(ai_model.token_cost_multiplier)
+        return OpenRouterRequestCost(
+            user=user,
+            session=session,
+            subscription_type=subscription_type,
+            model_id=ai_model.model_id,
+            model_name=ai_model.name,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=total_tokens,
+            token_cost_multiplier=cost_multiplier,
+            effective_cost_tokens=int(total_tokens * cost_multiplier),
+            total_cost_usd=usage.get('total_cost_usd', usage.get('cost')),
+            request_type='title',
+            cached=bool(response.get('cached')),
+            # Titles are not counted towards the user's message and token quotas
+            is_free_model=ai_model.is_free,
+            messages_count=0,
+            excluded_from_quota=True,
+            **ledger_fields(response.get('timing')),
+        )
     
     @staticmethod
     def _generate_fallback_title(first_message: str) -> str:
@@ -184,11 +229,14 @@ class ChatTitleService:
             return 'چت جدید'
     
     @staticmethod
-    def generate_and_update_title(session, first_message: str, user) -> Tuple[bool, str]:
+    def generate_and_update_title(session, first_message: str, user, ledger_rows=None) -> Tuple[bool, str]:
         """
         تولید و به‌روزرسانی عنوان چت
         Generate and update chat title
         
+        With a ``ledger_rows`` list the unsaved cost row of the title request is
+        appended to it, for the caller to write together with its own rows
+        
         Returns:
             Tuple[bool, str]: (success, title)
         """
@@ -201,7 +249,13 @@ class ChatTitleService:
             ai_model = ChatTitleService.get_suitable_ai_model(user, session)
             
             # تولید عنوان
-            new_title = ChatTitleService.generate_title_with_ai(first_message, ai_model)
+            new_title, response = ChatTitleService._request_title(
+                first_message, ai_model, cache_policy=ResponseCachePolicy.for_chatbot(session.chatbot)
+            )
+            if ledger_rows is not None and ai_model:
+                title_cost = ChatTitleService._title_cost(session, user, ai_model, response)
+                if title_cost:
+                    ledger_rows.append(title_cost)
             
             # به‌روزرسانی session
             session.title = new_title
@@ -0,0 +1,255 @@
+"""
+Upload handlers that stream chat attachments straight to their final storage location
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+logger = logging.getLogger(__name__)
+
+# Directory (relative to MEDIA_ROOT) where chat attachments are stored
+UPLOAD_SUBDIR = 'uploaded_files'
+
+# Longest relative path of a stored file: image attachments are referenced from
+# UploadedImage.image_file, an ImageField with the default max_length of 100
+STORED_PATH_MAX_LENGTH = 100
+
+# Number of leading bytes kept for MIME sniffing
+SNIFF_BYTES = 512
+
+# Magic-number signatures used to sniff the real content type of a file
+MAGIC_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+    (b'PK\x03\x04', 'application/zip'),
+    (b'Rar!\x1a\x07', 'application/x-rar-compressed'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/msword'),
+]
+
+
+def sniff_content_type(head):
+    """
+    Guess the content type of a file from its first bytes
+    Returns None when the signature is unknown
+    """
+    if not head:
+        return None
+    for signature, content_type in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    # Treat content without NUL bytes that decodes as UTF-8 as plain text
+    if b'\x00' not in head:
+        try:
+            head.decode('utf-8')
+            return 'text/plain'
+        except UnicodeDecodeError:
+            # The sniff window may cut a multi-byte character in half
+            try:
+                head[:-3].decode('utf-8')
+                return 'text/plain'
+            except UnicodeDecodeError:
+                pass
+    return None
+
+
+def make_storage_name(file_name):
+    """
+    Unique name for a file under UPLOAD_SUBDIR: a UUID prefix and the original name,
+    shortened (keeping the extension) so the relative path fits STORED_PATH_MAX_LENGTH
+    """
+    prefix = f"{uuid.uuid4()}_"
+    available = STORED_PATH_MAX_LENGTH - len(UPLOAD_SUBDIR) - 1 - len(prefix)
+    stem, extension = os.path.splitext(file_name)
+    if len(stem) + len(extension) > available:
+        extension = extension[:available // 2]
+        stem = stem[:available - len(extension)]
+    return f"{prefix}{stem}{extension}"
+
+
+def resolve_content_type(file_name, sniffed_content_type=None):
+    """
+    Resolve the MIME type of an upload: the extension wins, sniffing is the fallback
+    """
+    mime_type, _ = mimetypes.guess_type(file_name)
+    return mime_type or sniffed_content_type
+
+
+class StoredUploadedFile(UploadedFile):
+    """
+    An uploaded file that has already been written to its final location under MEDIA_ROOT
+    """
+
+    def __init__(self, name, content_type, size, charset, storage_name, sha256,
+                 sniffed_content_type=None, content_type_extra=None, upload_session=None):
+        self.storage_name = storage_name
+        self.sha256 = sha256
+        self.sniffed_content_type = sniffed_content_type
+        # Set when the file is a pre-uploaded blob (chatbot.UploadSession)
+        self.upload_session = upload_session
+        # Set once the file has been recorded in the database; uncommitted files get discarded
+        self.committed = False
+        file = open(self.stored_path(storage_name), 'rb')
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+
+    @staticmethod
+    def stored_path(storage_name):
+        return os.path.join(settings.MEDIA_ROOT, UPLOAD_SUBDIR, storage_name)
+
+    @property
+    def path(self):
+        """Absolute path of the stored file"""
+        return self.stored_path(self.storage_name)
+
+    @property
+    def relative_path(self):
+        """Path of the stored file relative to MEDIA_ROOT (usable as a FileField name)"""
+        return f"{UPLOAD_SUBDIR}/{self.storage_name}"
+
+    def temporary_file_path(self):
+        # Lets code that understands on-disk uploads (e.g. Django storages) avoid re-reading
+        return self.path
+
+    def discard(self):
+        """Remove the stored file, used when the upload is rejected after it was written"""
+        try:
+            self.close()
+        except Exception:
+            pass
+        if self.upload_session is not None:
+            # Blobs stay on disk and their claim is handed back, so the client can retry
+            # the message with the same blob id
+            from .file_services import ChunkedUploadService
+            ChunkedUploadService.release_claims([self.upload_session])
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class StreamingStorageUploadHandler(FileUploadHandler):
+    """
+    Stream each uploaded file directly into MEDIA_ROOT/uploaded_files while
+    computing its SHA-256, size and sniffed MIME type in a single pass.
+
+    Files bigger than the effective size limit (the smaller of the global limit in
+    GlobalSettings and the subscription's FileUploadSettings.max_file_size) are
+    rejected as soon as the limit is crossed; they are never buffered in memory.
+    Rejected files are reported through ``rejected_files`` as (file_name, max_bytes).
+    """
+
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, request=None, max_file_size=None):
+        super().__init__(request)
+        self._max_file_size = max_file_size
+        self.rejected_files = []
+        self.stored_files = []
+        self._reset_state()
+
+    def _reset_state(self):
+        self.destination = None
+        self.storage_name = None
+        self.hasher = None
+        self.head = b''
+        self.bytes_written = 0
+
+    @property
+    def max_file_size(self):
+        """
+        Effective per-file size limit in bytes, resolved lazily on the first file
+        """
+        if self._max_file_size is None:
+            self._max_file_size = self.get_max_file_size()
+        return self._max_file_size
+
+    def get_max_file_size(self):
+        from .file_services import FileUploadService, GlobalFileService
+
+        max_size = GlobalFileService.get_global_settings().get_max_file_size_bytes()
+
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated:
+            subscription_type = user.get_subscription_type()
+            if subscription_type:
+                upload_settings = FileUploadService.get_file_upload_settings(subscription_type)
+                if upload_settings and upload_settings.max_file_size > 0:
+                    max_size = min(max_size, upload_settings.max_file_size)
+        return max_size
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._reset_state()
+
+        # A declared per-part length lets us reject the file before reading any of it
+        if self.content_length and self.content_length > self.max_file_size:
+            self._reject()
+
+        upload_dir = os.path.join(settings.MEDIA_ROOT, UPLOAD_SUBDIR)
+        os.makedirs(upload_dir, exist_ok=True)
+        self.storage_name = make_storage_name(self.file_name)
+        self.destination = open(os.path.join(upload_dir, self.storage_name), 'wb')
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.bytes_written + len(raw_data) > self.max_file_size:
+            self._reject()
+
+        if len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+        self.hasher.update(raw_data)
+        self.destination.write(raw_data)
+        self.bytes_written += len(raw_data)
+        # Returning None stops the chunk from being passed to any other handler
+        return None
+
+    def file_complete(self, file_size):
+        if self.destination is None:
+            return None
+        self.destination.close()
+
+        sniffed_content_type = sniff_content_type(self.head)
+        stored_file = StoredUploadedFile(
+            name=self.file_name,
+            content_type=resolve_content_type(self.file_name, sniffed_content_type) or self.content_type,
+            size=self.bytes_written,
+            charset=self.charset,
+            storage_name=self.storage_name,
+            sha256=self.hasher.hexdigest(),
+            sniffed_content_type=sniffed_content_type,
+            content_type_extra=self.content_type_extra,
+        )
+        self.stored_files.append(stored_file)
+        self._reset_state()
+        return stored_file
+
+    def upload_interrupted(self):
+        self._remove_partial_file()
+        for stored_file in self.stored_files:
+            stored_file.discard()
+
+    def _remove_partial_file(self):
+        if self.destination is not None:
+            self.destination.close()
+            try:
+                os.remove(os.path.join(settings.MEDIA_ROOT, UPLOAD_SUBDIR, self.storage_name))
+            except FileNotFoundError:
+                pass
+        self._reset_state()
+
+    def _reject(self):
+        logger.info(f"Rejecting upload '{self.file_name}': larger than {self.max_file_size} bytes")
+        self.rejected_files.append((self.file_name, self.max_file_size))
+        self._remove_partial_file()
+        raise SkipFile()
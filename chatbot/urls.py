@@ -8,6 +8,8 @@ urlpatterns = [
     path('session/create/', views.create_session, name='create_session'),
     path('session/create-default/', views.create_default_session, name='create_default_session'),
     path('session/<int:session_id>/messages/', views.get_session_messages, name='get_session_messages'),
+    path('session/<int:session_id>/history/', views.get_session_history, name='get_session_history'),
+    path('session/<int:session_id>/changes/', views.get_session_changes, name='get_session_changes'),
     path('session/<int:session_id>/send/', views.send_message, name='send_message'),
     path('session/<int:session_id>/delete/', views.delete_session, name='delete_session'),
     path('generate-title/', views.generate_chat_title, name='generate_chat_title'),
@@ -20,5 +22,10 @@ urlpatterns = [
     path('session/<int:session_id>/update-model/', views.update_session_model, name='update_session_model'),
     path('models/', views.get_available_models_for_user, name='get_available_models_for_user'),
     path('sidebar-menu-items/', views.get_sidebar_menu_items, name='get_sidebar_menu_items'),
+    path('bootstrap/', views.chat_bootstrap, name='chat_bootstrap'),
     path('session/<int:session_id>/message/<uuid:message_id>/edit/', views.edit_message, name='edit_message'),
+    path('uploads/', views.create_upload_session, name='create_upload_session'),
+    path('uploads/<uuid:upload_id>/', views.upload_session_detail, name='upload_session_detail'),
+    path('uploads/<uuid:upload_id>/finalize/', views.finalize_upload_session, name='finalize_upload_session'),
+    path('media/<path:path>', views.serve_media, name='serve_media'),
 ]
\ No newline at end of file
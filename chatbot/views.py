@@ -1,20 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import condition
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Q
 from django.apps import apps
 from django.conf import settings
 from django.urls import reverse
+from ai_models.response_cache import ResponseCachePolicy
 from ai_models.services import OpenRouterService
+from ai_models.upstream_timing import ledger_fields
+from core import metrics
+from core.config_cache import ConfigCache
+from core.query_budget import query_budget
+from core.rate_limit import rate_limit
+from subscriptions.access_matrix import AccessMatrixService
 from subscriptions.models import UserSubscription
+from subscriptions.quota_status import QuotaStatusService
+from subscriptions.reservations import LIMIT_COST, UsageReservationService
 from subscriptions.services import UsageService
-from .file_services import FileUploadService, GlobalFileService
+from .file_services import ChunkedUploadService, FileUploadService, GlobalFileService
 from .limitation_service import LimitationMessageService
-from .models import UploadedFile, UploadedImage, SidebarMenuItem, MessageFile  # Add UploadedFile import and SidebarMenuItem
+from .media_delivery import MediaDeliveryService
+from .models import UploadedFile, UploadedImage, SidebarMenuItem, MessageFile, UploadSession  # Add UploadedFile import and SidebarMenuItem
+from .upload_handlers import StreamingStorageUploadHandler, StoredUploadedFile, make_storage_name
 import logging
 import json
+import hashlib
+import re
+from datetime import datetime
 
 # Add these imports for image handling
 import base64
@@ -65,76 +82,70 @@ def _send_initial_welcome_message(session, chatbot, ai_model):
         logger = logging.getLogger(__name__)
         logger.error(f"Error sending welcome message: {str(e)}")
 
+def _record_usage_events(ledger_rows, reply_row=None, reservation=None):
+    """
+    Write the usage ledger rows (OpenRouterRequestCost) of one request in one
+    transaction; they carry both the cost and the quota usage
+    The extra rows (titles) go in a single INSERT and the reply's row replaces the
+    request's reservation (it is released when there is no reply row)
+    bulk_create sends no post_save, so the quota status is invalidated here
+    """
+    OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+    with transaction.atomic():
+        if ledger_rows:
+            OpenRouterRequestCost.objects.bulk_create(ledger_rows)
+            user_id = ledger_rows[0].user_id
+            transaction.on_commit(lambda: QuotaStatusService.invalidate(user_id))
+        if reply_row is not None:
+            UsageReservationService.settle(reservation, reply_row)
+        else:
+            UsageReservationService.release(reservation)
+
+
+def _discard_stored_uploads(uploaded_files):
+    """
+    Delete files written by the streaming upload handler that were not saved as UploadedFile records
+    """
+    for uploaded_file in uploaded_files:
+        if isinstance(uploaded_file, StoredUploadedFile) and not uploaded_file.committed:
+            uploaded_file.discard()
+
 @login_required
+@query_budget(6)
 def chat(request):
-    # Get all chatbots and AI models (visible to all users)
-    Chatbot = apps.get_model('chatbot', 'Chatbot')
-    ChatSession = apps.get_model('chatbot', 'ChatSession')
-    AIModel = apps.get_model('ai_models', 'AIModel')
-    user_subscription = request.user.get_subscription_type()
-    
-    # Get ALL active chatbots (not just those available to user)
-    all_chatbots = Chatbot.objects.filter(is_active=True)
-    
-    # Add access information to each chatbot without modifying the original objects
-    available_chatbots = []
-    for chatbot in all_chatbots:
-        has_access = True
-        if chatbot.subscription_types.exists():
-            if not user_subscription or not chatbot.subscription_types.filter(id=user_subscription.id).exists():
-                has_access = False
-        
-        # Only add chatbots that user has access to
-        if has_access:
-            # Create a dictionary representation with access information
-            chatbot_data = {
-                'id': chatbot.id,
-                'name': chatbot.name,
-                'description': chatbot.description,
-                'is_active': chatbot.is_active,
-                'user_has_access': has_access
-            }
-            available_chatbots.append(chatbot_data)
-    
-    # Get ALL active AI models (not just those available to user)
-    all_models = AIModel.objects.filter(is_active=True)
-    
-    # Add access information to each model without modifying the original objects
-    available_models = []
-    for model in all_models:
-        has_access = model.is_free  # Free models are always accessible
-        if not model.is_free and user_subscription:
-            # Check if user's subscription has access to this model
-            if model.subscriptions.filter(subscription_types=user_subscription).exists():
-                has_access = True
-        
-        # Get image URL if image exists
-        image_url = None
-        if model.image:
-            image_url = model.image.url
-        
-        # Create a dictionary representation with access information
-        model_data = {
-            'model_id': model.model_id,
-            'name': model.name,
-            'description': model.description,
-            'is_free': model.is_free,
-            'model_type': model.model_type,
-            'is_active': model.is_active,
-            'user_has_access': has_access,
-            'image_url': image_url
-        }
-        available_models.append(model_data)
-    
-    # Get user's chat sessions
-    chat_sessions = ChatSession.objects.filter(user=request.user, is_active=True).order_by('-updated_at')
-    
-    context = {
-        'available_chatbots': available_chatbots,
-        'available_models': available_models,
-        'chat_sessions': chat_sessions,
+    """
+    صفحه چت
+    The chat page shell; models, chatbots, sessions and settings are loaded by the page
+    from the bootstrap endpoint, so rendering it needs no catalogue queries.
+    """
+    return render(request, 'chatbot/chat.html')
+
+def _serialize_model_for_user(model, has_access):
+    """Model entry of the model-selection lists"""
+    return {
+        'model_id': model.model_id,
+        'name': model.name,
+        'description': model.description,
+        'is_free': model.is_free,
+        'model_type': model.model_type,
+        'token_cost_multiplier': float(model.token_cost_multiplier) if hasattr(model, 'token_cost_multiplier') else 1.0,
+        'user_has_access': has_access,
+        'image_url': model.image.url if model.image else None
     }
-    return render(request, 'chatbot/chat.html', context)
+
+
+def _available_models_for_user(subscription_type_id, model_type='text'):
+    """Active models of a type from the config snapshot, accessible ones first"""
+    access_matrix = AccessMatrixService.get_matrix()
+    model_list = [
+        _serialize_model_for_user(model, access_matrix.model_allowed(subscription_type_id, model))
+        for model in ConfigCache.get('active_ai_models')
+        if model.model_type == model_type
+    ]
+    # Sort models: accessible models first, then by name
+    model_list.sort(key=lambda x: (not x['user_has_access'], x['name']))
+    return model_list
+
 
 @login_required
 def get_available_models_for_user(request):
@@ -145,50 +156,31 @@ def get_available_models_for_user(request):
         return JsonResponse({'error': 'Invalid request method'}, status=400)
     
     try:
-        AIModel = apps.get_model('ai_models', 'AIModel')
         user_subscription = request.user.get_subscription_type()
+        subscription_type_id = user_subscription.id if user_subscription else None
         
         # Get ALL text generation models (for chat)
-        all_models = AIModel.objects.filter(
-            is_active=True,
-            model_type='text'
-        )
-        
-        # Format models for JSON response with access information
-        model_list = []
-        for model in all_models:
-            has_access = model.is_free  # Free models are always accessible
-            if not model.is_free and user_subscription:
-                # Check if user's subscription has access to this model
-                if model.subscriptions.filter(subscription_types=user_subscription).exists():
-                    has_access = True
-            
-            # Get image URL if image exists
-            image_url = None
-            if model.image:
-                image_url = model.image.url
-            
-            model_list.append({
-                'model_id': model.model_id,
-                'name': model.name,
-                'description': model.description,  # Add description
-                'is_free': model.is_free,
-                'model_type': model.model_type,
-                'token_cost_multiplier': float(model.token_cost_multiplier) if hasattr(model, 'token_cost_multiplier') else 1.0,
-                'user_has_access': has_access,
-                'image_url': image_url
-            })
-        
-        # Sort models: accessible models first, then by name
-        model_list.sort(key=lambda x: (not x['user_has_access'], x['name']))
-        
         return JsonResponse({
-            'models': model_list
+            'models': _available_models_for_user(subscription_type_id)
         })
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def _serialize_chatbot_for_user(chatbot, access_matrix, subscription_type_id):
+    """Chatbot entry of the chatbot-selection lists"""
+    # Chatbots without subscription types are public
+    has_access = access_matrix.chatbot_allowed(subscription_type_id, chatbot.id)
+    return {
+        'id': chatbot.id,
+        'name': chatbot.name,
+        'description': chatbot.description or '',
+        'image': chatbot.image.url if chatbot.image else None,
+        'has_access': has_access,
+        'subscription_types': access_matrix.chatbot_subscription_type_names(chatbot.id) if has_access else []
+    }
+
+
 @login_required
 def get_available_chatbots(request, type):
     """
@@ -200,26 +192,16 @@ def get_available_chatbots(request, type):
     try:
         Chatbot = apps.get_model('chatbot', 'Chatbot')
         user_subscription = request.user.get_subscription_type()
+        subscription_type_id = user_subscription.id if user_subscription else None
+        access_matrix = AccessMatrixService.get_matrix()
         
         # Filter chatbots based on type and active status
         chatbots = Chatbot.objects.filter(is_active=True, chatbot_type=type)
         
-        available_chatbots = []
-        for chatbot in chatbots:
-            has_access = False
-            if not chatbot.subscription_types.exists():
-                has_access = True  # Public chatbots
-            elif user_subscription:
-                has_access = chatbot.subscription_types.filter(id=user_subscription.id).exists()
-            
-            available_chatbots.append({
-                'id': chatbot.id,
-                'name': chatbot.name,
-                'description': chatbot.description or '',
-                'image': chatbot.image.url if chatbot.image else None,
-                'has_access': has_access,
-                'subscription_types': [str(st) for st in chatbot.subscription_types.all()] if has_access else []
-            })
+        available_chatbots = [
+            _serialize_chatbot_for_user(chatbot, access_matrix, subscription_type_id)
+            for chatbot in chatbots
+        ]
         
         return JsonResponse({'chatbots': available_chatbots})
     except Exception as e:
@@ -243,6 +225,8 @@ def get_available_models_for_chatbot(request, chatbot_id):
         AIModel = apps.get_model('ai_models', 'AIModel')
         chatbot = get_object_or_404(Chatbot, id=chatbot_id, is_active=True)
         user_subscription = request.user.get_subscription_type()
+        subscription_type_id = user_subscription.id if user_subscription else None
+        access_matrix = AccessMatrixService.get_matrix()
         
         # Filter models based on chatbot type
         if chatbot.chatbot_type == 'image_editing':
@@ -261,27 +245,9 @@ def get_available_models_for_chatbot(request, chatbot_id):
         # Format models for JSON response with access information
         model_list = []
         for model in models_query:
-            has_access = model.is_free  # Free models are always accessible
-            if not model.is_free and user_subscription:
-                # Check if user's subscription has access to this model
-                if model.subscriptions.filter(subscription_types=user_subscription).exists():
-                    has_access = True
-            
-            # Get image URL if image exists
-            image_url = None
-            if model.image:
-                image_url = model.image.url
-            
-            model_list.append({
-                'model_id': model.model_id,
-                'name': model.name,
-                'description': model.description,  # Add description
-                'is_free': model.is_free,
-                'model_type': model.model_type,
-                'token_cost_multiplier': float(model.token_cost_multiplier) if hasattr(model, 'token_cost_multiplier') else 1.0,
-                'user_has_access': has_access,
-                'image_url': image_url
-            })
+            # Free models are always accessible
+            has_access = access_matrix.model_allowed(subscription_type_id, model)
+            model_list.append(_serialize_model_for_user(model, has_access))
         
         # Sort models: accessible models first, then by name
         model_list.sort(key=lambda x: (not x['user_has_access'], x['name']))
@@ -305,7 +271,6 @@ def create_default_session(request):
             Chatbot = apps.get_model('chatbot', 'Chatbot')
             ChatSession = apps.get_model('chatbot', 'ChatSession')
             AIModel = apps.get_model('ai_models', 'AIModel')
-            DefaultChatSettings = apps.get_model('chatbot', 'DefaultChatSettings')
             
             # Get data from request
             data = json.loads(request.body) if request.body else {}
@@ -329,7 +294,7 @@ def create_default_session(request):
                     }, status=400)
             
             # Get default settings
-            default_settings = DefaultChatSettings.objects.filter(is_active=True).first()
+            default_settings = ConfigCache.get('default_chat_settings')
             if not default_settings:
                 # If no default settings, create one or use fallback
                 # Try to find a free chatbot and model
@@ -356,9 +321,10 @@ def create_default_session(request):
                 ai_model = selected_ai_model if selected_ai_model else default_settings.default_ai_model
             
             # Check if user has access to this chatbot
-            if chatbot.subscription_types.exists():
+            access_matrix = AccessMatrixService.get_matrix()
+            if access_matrix.chatbot_is_restricted(chatbot.id):
                 user_subscription = request.user.get_subscription_type()
-                if not user_subscription or not chatbot.subscription_types.filter(id=user_subscription.id).exists():
+                if not access_matrix.chatbot_allowed(user_subscription.id if user_subscription else None, chatbot.id):
                     # Use configurable limitation message
                     limitation_msg = LimitationMessageService.get_subscription_required_message()
                     return JsonResponse({'error': limitation_msg['message']}, status=403)
@@ -413,9 +379,10 @@ def create_session(request):
             chatbot = get_object_or_404(Chatbot, id=chatbot_id, is_active=True)
             
             # Check if user has access to this chatbot
-            if chatbot.subscription_types.exists():
+            access_matrix = AccessMatrixService.get_matrix()
+            if access_matrix.chatbot_is_restricted(chatbot.id):
                 user_subscription = request.user.get_subscription_type()
-                if not user_subscription or not chatbot.subscription_types.filter(id=user_subscription.id).exists():
+                if not access_matrix.chatbot_allowed(user_subscription.id if user_subscription else None, chatbot.id):
                     # Use configurable limitation message
                     limitation_msg = LimitationMessageService.get_subscription_required_message()
                     return JsonResponse({'error': limitation_msg['message']}, status=403)
@@ -458,82 +425,238 @@ def create_session(request):
     
     return JsonResponse({'error': 'روش درخواست نامعتبر است'}, status=400)
 
+# ستون‌های مورد نیاز برای نمایش تاریخچه - Columns needed to render chat history
+HISTORY_MESSAGE_FIELDS = ('id', 'message_id', 'session', 'message_type', 'content', 'image_url', 'created_at', 'disabled', 'revision')
+HISTORY_FILE_FIELDS = (
+    'message', 'file_order', 'created_at', 'uploaded_file',
+    'uploaded_file__filename', 'uploaded_file__original_filename',
+    'uploaded_file__mimetype', 'uploaded_file__size',
+)
+# Upper bound for the page_size query parameter of the history API
+MAX_HISTORY_PAGE_SIZE = 200
+
+
+def _history_queryset(session, include_disabled=False):
+    """
+    Messages of a session with their files prefetched in one extra query
+    """
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    messages = ChatMessage.objects.filter(session=session)
+    if not include_disabled:
+        messages = messages.filter(disabled=False)
+    return messages.only(
+        *HISTORY_MESSAGE_FIELDS
+    ).prefetch_related(
+        Prefetch(
+            'uploaded_files',
+            queryset=MessageFile.objects.select_related('uploaded_file').only(*HISTORY_FILE_FIELDS).order_by('file_order', 'created_at')
+        )
+    )
+
+
+def _serialize_history_message(message):
+    message_data = {
+        'id': message.message_id,  # Use message_id for editing functionality
+        'db_id': message.id,  # Keep database ID for other functionality
+        'type': message.message_type,
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+        'disabled': message.disabled,
+        'revision': message.revision
+    }
+    # Include image_url if it exists
+    if message.image_url:
+        message_data['image_url'] = ",".join(
+            MediaDeliveryService.protected_url(url.strip()) for url in message.image_url.split(',')
+        )
+    
+    # اضافه کردن فایل‌های آپلود شده - Add uploaded files (already prefetched)
+    message_files = message.uploaded_files.all()
+    if message_files:
+        message_data['uploaded_files'] = [
+            {
+                'filename': message_file.uploaded_file.original_filename,
+                'mimetype': message_file.uploaded_file.mimetype,
+                'size': message_file.uploaded_file.size,
+                'download_url': reverse('serve_media', args=[f'uploaded_files/{message_file.uploaded_file.filename}'])
+            }
+            for message_file in message_files
+        ]
+    return message_data
+
+
+def _session_display_info(session):
+    """Determine session type and name"""
+    if session.chatbot:
+        return {
+            'session_name': session.chatbot.name,
+            'chatbot_type': session.chatbot.chatbot_type,
+            'chatbot_id': session.chatbot.id,
+            # Get AI model name for chatbot sessions
+            'ai_model_name': session.ai_model.name if session.ai_model else None,
+        }
+    if session.ai_model:
+        return {
+            'session_name': session.ai_model.name,
+            'chatbot_type': 'text',  # Default to text for direct AI model sessions
+            'chatbot_id': None,
+            'ai_model_name': session.ai_model.name,
+        }
+    return {
+        'session_name': "Unknown",
+        'chatbot_type': 'text',
+        'chatbot_id': None,
+        'ai_model_name': None,
+    }
+
+
+def _encode_keyset_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_keyset_cursor(cursor):
+    """Return (timestamp, id) or None when the cursor is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def _session_etag(request, session_id):
+    """
+    ETag of a session's history: changes with every message revision and session update
+    """
+    ChatSession = apps.get_model('chatbot', 'ChatSession')
+    state = ChatSession.objects.filter(id=session_id, user=request.user).values_list('revision', 'updated_at').first()
+    if state is None:
+        return None
+    revision, updated_at = state
+    return f"session-{session_id}-r{revision}-{updated_at.timestamp():.6f}"
+
+
+def _session_changes_etag(request, session_id):
+    etag = _session_etag(request, session_id)
+    if etag is None:
+        return None
+    return f"{etag}-since{request.GET.get('since', '0')}"
+
+
 @login_required
+@condition(etag_func=_session_etag)
+@query_budget(10)
 def get_session_messages(request, session_id):
+    """
+    Full history of a session (kept for existing clients; see get_session_history for paging)
+    """
+    ChatSession = apps.get_model('chatbot', 'ChatSession')
+    session = get_object_or_404(
+        ChatSession.objects.select_related('chatbot', 'ai_model'), id=session_id, user=request.user
+    )
+    
+    messages = _history_queryset(session).order_by('created_at', 'id')
+    message_list = [_serialize_history_message(message) for message in messages]
+    
+    return JsonResponse({
+        'messages': message_list,
+        'revision': session.revision,
+        'session_title': session.title,
+        **_session_display_info(session)
+    })
+
+
+@login_required
+@condition(etag_func=_session_changes_etag)
+def get_session_changes(request, session_id):
+    """
+    تغییرات تاریخچه جلسه از یک نسخه مشخص
+    Delta sync: messages created, edited or disabled after ?since=<revision>.
+    Clients keep the returned revision and send it back on the next sync;
+    an unchanged session answers 304 to If-None-Match.
+    """
     ChatSession = apps.get_model('chatbot', 'ChatSession')
-    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
     session = get_object_or_404(ChatSession, id=session_id, user=request.user)
     
-    messages = session.messages.filter(disabled=False).all()
-    message_list = []
-    for message in messages:
-        message_data = {
-            'id': message.message_id,  # Use message_id for editing functionality
-            'db_id': message.id,  # Keep database ID for other functionality
-            'type': message.message_type,
-            'content': message.content,
-            'created_at': message.created_at.isoformat(),
-            'disabled': message.disabled
-        }
-        # Include image_url if it exists
-        if message.image_url:
-            message_data['image_url'] = message.image_url
-        
-        # اضافه کردن فایل‌های آپلود شده - Add uploaded files
-        uploaded_files = message.uploaded_files.all().order_by('file_order')
-        if uploaded_files:
-            files_data = []
-            for message_file in uploaded_files:
-                file_record = message_file.uploaded_file
-                files_data.append({
-                    'filename': file_record.original_filename,
-                    'mimetype': file_record.mimetype,
-                    'size': file_record.size,
-                    'download_url': f'/media/uploaded_files/{file_record.filename}'
-                })
-            message_data['uploaded_files'] = files_data
-        
-        message_list.append(message_data)
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        return JsonResponse({'error': 'شماره نسخه نامعتبر است'}, status=400)
     
-    # Determine session type and name
-    if session.chatbot:
-        session_name = session.chatbot.name
-        chatbot_type = session.chatbot.chatbot_type
-        chatbot_id = session.chatbot.id
-        # Get AI model name for chatbot sessions
-        ai_model_name = session.ai_model.name if session.ai_model else None
-    elif session.ai_model:
-        session_name = session.ai_model.name
-        chatbot_type = 'text'  # Default to text for direct AI model sessions
-        chatbot_id = None
-        ai_model_name = session.ai_model.name
-    else:
-        session_name = "Unknown"
-        chatbot_type = 'text'
-        chatbot_id = None
-        ai_model_name = None
+    changed_messages = _history_queryset(session, include_disabled=True).filter(
+        revision__gt=since
+    ).order_by('created_at', 'id')
     
     return JsonResponse({
-        'messages': message_list,
+        'messages': [_serialize_history_message(message) for message in changed_messages],
+        'since': since,
+        'revision': session.revision,
+        'session_title': session.title,
+    })
+
+
+@login_required
+def get_session_history(request, session_id):
+    """
+    تاریخچه صفحه‌بندی شده جلسه (جدیدترین اول)
+    Keyset-paginated session history, newest first.
+    Pass the returned next_cursor as ?before=<cursor> to load older messages.
+    """
+    ChatSession = apps.get_model('chatbot', 'ChatSession')
+    session = get_object_or_404(
+        ChatSession.objects.select_related('chatbot', 'ai_model'), id=session_id, user=request.user
+    )
+    
+    try:
+        page_size = int(request.GET.get('page_size') or GlobalFileService.get_global_settings().messages_per_page)
+    except ValueError:
+        return JsonResponse({'error': 'اندازه صفحه نامعتبر است'}, status=400)
+    page_size = max(1, min(page_size, MAX_HISTORY_PAGE_SIZE))
+    
+    messages = _history_queryset(session)
+    cursor = request.GET.get('before')
+    if cursor:
+        decoded = _decode_keyset_cursor(cursor)
+        if not decoded:
+            return JsonResponse({'error': 'نشانگر صفحه نامعتبر است'}, status=400)
+        created_at, message_pk = decoded
+        messages = messages.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_pk)
+        )
+    
+    # One extra row tells whether an older page exists
+    page = list(messages.order_by('-created_at', '-id')[:page_size + 1])
+    has_more = len(page) > page_size
+    page = page[:page_size]
+    
+    return JsonResponse({
+        'messages': [_serialize_history_message(message) for message in page],
+        'has_more': has_more,
+        'next_cursor': _encode_keyset_cursor(page[-1].created_at, page[-1].id) if has_more else None,
+        'page_size': page_size,
+        'revision': session.revision,
         'session_title': session.title,
-        'session_name': session_name,
-        'chatbot_type': chatbot_type,
-        'chatbot_id': chatbot_id,
-        'ai_model_name': ai_model_name
+        **_session_display_info(session)
     })
 
 @csrf_exempt
 @login_required
+@rate_limit(weight=5)
+@query_budget(37)
 def send_message(request, session_id):
     # Define logger at the function level to ensure it's accessible in all blocks
     import logging
     logger = logging.getLogger(__name__)
     
     if request.method == 'POST':
+        uploaded_files = []
+        # Usage reserved before the upstream call; the stream settles it once it is handed over
+        reservation = None
+        reservation_streamed = False
         try:
             ChatSession = apps.get_model('chatbot', 'ChatSession')
             ChatMessage = apps.get_model('chatbot', 'ChatMessage')
-            ChatSessionUsage = apps.get_model('chatbot', 'ChatSessionUsage')
             session = get_object_or_404(ChatSession, id=session_id, user=request.user)
 
             # Check user access to AI model
@@ -544,20 +667,37 @@ def send_message(request, session_id):
             # Handle both multipart/form-data (for file uploads) and JSON</new_str
             logger.info(f"Request content type: {request.content_type}")
             if request.content_type.startswith('multipart/form-data'):
+                # Stream files straight to storage instead of buffering them in memory
+                upload_handler = StreamingStorageUploadHandler(request)
+                request.upload_handlers = [upload_handler]
                 user_message_content = request.POST.get('message', '')
                 # پردازش چندین فایل
                 uploaded_files = request.FILES.getlist('files')  # تغییر از 'file' به 'files'
+                if upload_handler.rejected_files:
+                    _discard_stored_uploads(uploaded_files)
+                    rejected_name, max_size_bytes = upload_handler.rejected_files[0]
+                    max_size_mb = max_size_bytes / (1024 * 1024)
+                    return JsonResponse({'error': f"فایل {rejected_name}: حجم فایل بیشتر از حد مجاز ({max_size_mb:.2f} MB) است"}, status=403)
                 logger.info(f"Uploaded files count: {len(uploaded_files)}")
                 for i, f in enumerate(uploaded_files):
                     logger.info(f"File {i}: {f.name}, size: {f.size}")
                 use_web_search = request.POST.get('use_web_search', 'false') == 'true'
                 generate_image = request.POST.get('generate_image', 'false') == 'true'
+                blob_ids = request.POST.getlist('blob_ids')
             else:  # Handle regular JSON request
                 data = json.loads(request.body.decode('utf-8'))
                 user_message_content = data.get('message', '')
                 uploaded_files = []
                 use_web_search = data.get('use_web_search', False)
                 generate_image = data.get('generate_image', False)
+                blob_ids = data.get('blob_ids', [])
+
+            # فایل‌هایی که قبلاً با آپلود تکه‌ای ارسال شده‌اند - Files pre-uploaded through the chunked upload API
+            if blob_ids:
+                blob_files, blob_message = ChunkedUploadService.get_stored_files(request.user, blob_ids)
+                if blob_files is None:
+                    return JsonResponse({'error': blob_message}, status=400)
+                uploaded_files = list(uploaded_files) + blob_files
                 
             logger.info(f"Message: {user_message_content}")
             logger.info(f"Files count: {len(uploaded_files)}")
@@ -569,22 +709,18 @@ def send_message(request, session_id):
             if not user_message_content and not uploaded_files:
                 return JsonResponse({'error': 'محتوای پیام یا فایل الزامی است'}, status=400)
 
-            # Check usage limits
-            subscription_type = request.user.get_subscription_type()
+            # Check usage limits (the subscription is resolved once per request by SubscriptionMiddleware)
+            subscription = request.subscription
+            subscription_type = subscription.subscription_type if subscription else None
 
             is_free_model = False
             ai_model = None
 
             if use_web_search:
                 try:
-                    WebSearchSettings = apps.get_model('ai_models', 'WebSearchSettings')
-                    web_search_settings = WebSearchSettings.objects.get(is_active=True)
-                    enabled_subscription_types = web_search_settings.enabled_subscription_types.all()
+                    web_search_settings = ConfigCache.get('web_search_settings')
 
-                    if subscription_type and subscription_type in enabled_subscription_types:
-                        ai_model = web_search_settings.web_search_model
-                        is_free_model = ai_model.is_free
-                    elif not subscription_type and enabled_subscription_types.filter(name='Free').exists():
+                    if web_search_settings and web_search_settings.is_enabled_for(subscription_type):
                         ai_model = web_search_settings.web_search_model
                         is_free_model = ai_model.is_free
                     else:
@@ -602,30 +738,6 @@ def send_message(request, session_id):
             # فقط توکن‌های پیام جدید کاربر را محاسبه کن
             user_message_tokens = UsageService.calculate_tokens_for_message(user_message_content)
 
-            # Perform comprehensive usage limit checking before sending any message to AI
-            if subscription_type:
-                # Update the comprehensive check to use actual token count
-                within_limit, message = UsageService.comprehensive_check(
-                    request.user, ai_model, subscription_type
-                )
-                if not within_limit:
-                    # Use configurable limitation message
-                    limitation_msg = LimitationMessageService.get_token_limit_message()
-                    return JsonResponse({'error': limitation_msg['message']}, status=403)
-
-                # Check OpenRouter cost limit before sending message
-                # Since we don't know the exact cost yet, we'll do a preliminary check
-                # with a small estimated cost to prevent users from exceeding their limit
-                within_limit, message = UsageService.check_openrouter_cost_limit(
-                    request.user, subscription_type, 0  # No additional cost for preliminary check
-                )
-                if not within_limit:
-                    # Use configurable limitation message for OpenRouter cost limit
-                    limitation_msg = LimitationMessageService.get_openrouter_cost_limit_message()
-                    return JsonResponse({'error': limitation_msg['message']}, status=403)
-
-                # We'll check the actual cost limit after we get the actual cost from the API response
-
             # Check image generation limits if requested
             if generate_image and subscription_type:
                 within_limit, message = UsageService.check_image_generation_limit(
@@ -634,6 +746,23 @@ def send_message(request, session_id):
                 if not within_limit:
                     # Use configurable limitation message
                     limitation_msg = LimitationMessageService.get_image_generation_limit_message()
+                    metrics.CHAT_MESSAGES.inc(mode='stream', outcome='limited')
+                    return JsonResponse({'error': limitation_msg['message']}, status=403)
+
+            # Check the quotas and reserve this reply's estimated usage in one per-user transaction,
+            # so parallel requests of the user cannot all pass the checks before any usage is recorded
+            if subscription_type:
+                reservation, limit_reason, message = UsageReservationService.reserve(
+                    request.user, subscription_type, ai_model, session=session,
+                    prompt_tokens=user_message_tokens, is_free_model=is_free_model
+                )
+                if reservation is None:
+                    # Use configurable limitation message
+                    if limit_reason == LIMIT_COST:
+                        limitation_msg = LimitationMessageService.get_openrouter_cost_limit_message()
+                    else:
+                        limitation_msg = LimitationMessageService.get_token_limit_message()
+                    metrics.CHAT_MESSAGES.inc(mode='stream', outcome='limited')
                     return JsonResponse({'error': limitation_msg['message']}, status=403)
 
             # Handle file upload if present
@@ -663,12 +792,12 @@ def send_message(request, session_id):
                         image_urls = last_image_message.image_url.split(',')
                         if image_urls:
                             first_image_url = image_urls[0].strip()
-                            # Convert to absolute path if it's a relative path
+                            # Path of the stored image under MEDIA_ROOT
                             from django.conf import settings
                             import os
-                            image_path = os.path.join(settings.MEDIA_ROOT, first_image_url[7:])  # Remove '/media/' prefix
+                            image_path = MediaDeliveryService.local_path(first_image_url)
                             # Check if file exists
-                            if os.path.exists(image_path):
+                            if image_path and os.path.exists(image_path):
                                 # Read and encode the previous image
                                 with open(image_path, "rb") as image_file:
                                     encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
@@ -727,12 +856,12 @@ def send_message(request, session_id):
                         image_urls = last_image_message.image_url.split(',')
                         if image_urls:
                             first_image_url = image_urls[0].strip()
-                            # Convert to absolute path if it's a relative path
+                            # Path of the stored image under MEDIA_ROOT
                             from django.conf import settings
                             import os
-                            image_path = os.path.join(settings.MEDIA_ROOT, first_image_url[7:])  # Remove '/media/' prefix
+                            image_path = MediaDeliveryService.local_path(first_image_url)
                             # Check if file exists
-                            if os.path.exists(image_path):
+                            if image_path and os.path.exists(image_path):
                                 # Read and encode the image
                                 with open(image_path, "rb") as image_file:
                                     encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
@@ -775,10 +904,26 @@ def send_message(request, session_id):
                         ):
                             return JsonResponse({'error': f"فرمت فایل {file_extension} در '{uploaded_file.name}' مجاز نیست"}, status=403)
                     
-                    # Save file information to database
-                    import uuid
-                    filename = f"{uuid.uuid4()}_{uploaded_file.name}"
-                    mime_type, _ = mimetypes.guess_type(uploaded_file.name)
+                    # Persist the file (already on disk when it came through the streaming upload handler)
+                    import os
+                    from django.conf import settings
+                    if isinstance(uploaded_file, StoredUploadedFile):
+                        filename = uploaded_file.storage_name
+                        file_path = uploaded_file.path
+                        mime_type = uploaded_file.content_type
+                        file_sha256 = uploaded_file.sha256
+                    else:
+                        filename = make_storage_name(uploaded_file.name)
+                        mime_type, _ = mimetypes.guess_type(uploaded_file.name)
+                        upload_dir = os.path.join(settings.MEDIA_ROOT, 'uploaded_files')
+                        os.makedirs(upload_dir, exist_ok=True)
+                        file_path = os.path.join(upload_dir, filename)
+                        hasher = hashlib.sha256()
+                        with open(file_path, 'wb+') as destination:
+                            for chunk in uploaded_file.chunks():
+                                hasher.update(chunk)
+                                destination.write(chunk)
+                        file_sha256 = hasher.hexdigest()
                     
                     # Save uploaded file record
                     uploaded_file_record = UploadedFile(
@@ -787,33 +932,25 @@ def send_message(request, session_id):
                         filename=filename,
                         original_filename=uploaded_file.name,
                         mimetype=mime_type or 'application/octet-stream',
-                        size=uploaded_file.size
+                        size=uploaded_file.size,
+                        sha256=file_sha256
                     )
                     uploaded_file_record.save()
                     uploaded_file_records.append(uploaded_file_record)
+                    uploaded_file.committed = True
+                    if isinstance(uploaded_file, StoredUploadedFile) and uploaded_file.upload_session is not None:
+                        ChunkedUploadService.mark_consumed(uploaded_file.upload_session, uploaded_file_record)
                     
-                    # Save the actual file
-                    import os
-                    from django.conf import settings
-                    upload_dir = os.path.join(settings.MEDIA_ROOT, 'uploaded_files')
-                    os.makedirs(upload_dir, exist_ok=True)
-                    
-                    # Save file to disk
-                    file_path = os.path.join(upload_dir, filename)
-                    with open(file_path, 'wb+') as destination:
-                        for chunk in uploaded_file.chunks():
-                            destination.write(chunk)
-                    
-                    # Handle different file types
+                    # Handle different file types - all processing reads from the stored file
                     if mime_type and mime_type.startswith('image/'):
                         # Image processing (vision capability)
-                        uploaded_image = UploadedImage(user=request.user, session=session, image_file=uploaded_file)
+                        # Point the image record at the stored file instead of writing a second copy
+                        uploaded_image = UploadedImage(user=request.user, session=session)
+                        uploaded_image.image_file.name = os.path.relpath(file_path, settings.MEDIA_ROOT).replace(os.sep, '/')
                         uploaded_image.save()
 
                         # Read and encode image properly
-                        image_file_path = str(uploaded_image.image_file)
-                        full_image_path = os.path.join(str(settings.MEDIA_ROOT), image_file_path)
-                        with open(full_image_path, "rb") as image_file:
+                        with open(file_path, "rb") as image_file:
                             image_data = image_file.read()
                         encoded_image = base64.b64encode(image_data).decode('utf-8')
                         image_url = f"data:{mime_type};base64,{encoded_image}"
@@ -823,8 +960,9 @@ def send_message(request, session_id):
                     elif mime_type and (mime_type.startswith('text/') or 
                                        mime_type in ['application/json', 'application/xml', 'application/javascript', 
                                                     'text/html', 'text/css', 'text/csv']):
-                        # Text file processing
-                        file_content = uploaded_file.read().decode('utf-8', errors='ignore')
+                        # Text file processing - only read as much as we are going to use
+                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                            file_content = f.read(10001)
                         # Limit file content to prevent token overflow
                         if len(file_content) > 10000:  # Limit to 10KB
                             file_content = file_content[:10000] + "... (محتوای اضافی حذف شد)"
@@ -835,10 +973,14 @@ def send_message(request, session_id):
                     elif mime_type and mime_type == 'application/pdf':
                         # PDF file processing
                         try:
-                            pdf_reader = PyPDF2.PdfReader(io.BytesIO(uploaded_file.read()))
-                            text_content = ""
-                            for page in pdf_reader.pages:
-                                text_content += page.extract_text() + "\n"
+                            with open(file_path, 'rb') as f:
+                                pdf_reader = PyPDF2.PdfReader(f)
+                                text_content = ""
+                                for page in pdf_reader.pages:
+                                    text_content += page.extract_text() + "\n"
+                                    # Stop extracting once we have more than we will send
+                                    if len(text_content) > 10000:
+                                        break
                             
                             # Limit PDF content to prevent token overflow
                             if len(text_content) > 10000:
@@ -920,10 +1062,12 @@ def send_message(request, session_id):
                 modalities = ["image", "text"]
             
             response = openrouter_service.stream_text_response(
-                ai_model, openrouter_messages, modalities=modalities
+                ai_model, openrouter_messages, modalities=modalities,
+                cache_policy=ResponseCachePolicy.for_chatbot(session.chatbot)
             )
 
             if isinstance(response, dict) and 'error' in response:
+                metrics.CHAT_MESSAGES.inc(mode='stream', outcome='upstream_error')
                 return JsonResponse({'error': response['error']}, status=500)
 
             def generate():
@@ -942,6 +1086,7 @@ def send_message(request, session_id):
                 usage_data = None
                 images_data = None
                 assistant_message_obj = None  # Object to hold assistant message for updating
+                client_gone = False
 
                 try:
                     # Create an empty assistant message object to update later
@@ -984,6 +1129,10 @@ def send_message(request, session_id):
 
                         yield chunk.encode('utf-8')
 
+                except GeneratorExit:
+                    # The client disconnected: nothing more can be sent
+                    client_gone = True
+                    raise
                 except Exception as e:
                     # In case of an error, log it and inform the user
                     logger.error(f"Error in streaming: {str(e)}", exc_info=True)
@@ -1057,6 +1206,14 @@ def send_message(request, session_id):
                         
                         assistant_message_obj.save()
                         
+                        if images_saved and not client_gone:
+                            # Delivery URLs of the saved images, never the upstream data or raw media paths
+                            images_payload = [{'image_url': {'url': url}} for url in saved_image_urls]
+                            yield f"[IMAGES]{json.dumps(images_payload)}[IMAGES_END]".encode('utf-8')
+                        
+                        # Cost rows of this request, written with a single INSERT at the end
+                        ledger_rows = []
+                        
                         # Auto-generate title after first user message if needed
                         title_generated = False
                         new_title = None
@@ -1064,7 +1221,7 @@ def send_message(request, session_id):
                             if session.should_auto_generate_title():
                                 from .title_service import ChatTitleService
                                 success, new_title = ChatTitleService.generate_and_update_title(
-                                    session, user_message_content, request.user
+                                    session, user_message_content, request.user, ledger_rows=ledger_rows
                                 )
                                 if success:
                                     title_generated = True
@@ -1079,134 +1236,52 @@ def send_message(request, session_id):
                         session.updated_at = timezone.now()
                         session.save()
                         
-                        # Update usage counters - only for image editing chatbots if images were successfully generated
+                        reply_row = None
                         if subscription_type:
                             # For image editing chatbots, only increment usage if images were successfully generated
-                            if session.chatbot and session.chatbot.chatbot_type == 'image_editing':
-                                if images_saved:
-                                    # Only increment usage if images were successfully saved
-                                    UsageService.increment_image_generation_usage(
-                                        request.user, subscription_type
-                                    )
-                            
-                            # For other chatbots or if images were generated successfully, increment regular usage
-                            if not (session.chatbot and session.chatbot.chatbot_type == 'image_editing') or images_saved:
-                                if usage_data:
-                                    # Use actual token counts from API
-                                    prompt_tokens = usage_data.get('prompt_tokens', 0)
-                                    completion_tokens = usage_data.get('completion_tokens', 0)
-                                    total_tokens_used = usage_data.get('total_tokens', prompt_tokens + completion_tokens)
-                                    
-                                    # Extract cost information according to OpenRouter documentation
-                                    if 'cost' in usage_data:
-                                        total_cost_usd = usage_data.get('cost')
-                                    elif 'total_cost_usd' in usage_data:
-                                        total_cost_usd = usage_data.get('total_cost_usd')
-                                    
-                                    # Extract cost per million tokens if available
-                                    if 'cost_per_million_tokens' in usage_data:
-                                        cost_per_million_tokens = usage_data.get('cost_per_million_tokens')
-                                    
-                                    # Log token usage for debugging
-                                    logger.info(f"Token usage from API - Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {total_tokens_used}")
-                                    
-                                    UsageService.increment_usage(
-                                        request.user, subscription_type,
-                                        messages_count=1,  # Only count one message interaction
-                                        tokens_count=total_tokens_used,
-                                        is_free_model=is_free_model,
-                                        ai_model=ai_model  # Pass the AI model for cost calculation
-                                    )
-                                else:
-                                    # Fallback to our calculation if API doesn't provide usage data
-                                    # **اصلاح منطق:** توکن‌های ورودی فقط پیام کاربر است
-                                    # توکن‌های خروجی پاسخ دستیار است
-                                    prompt_tokens = user_message_tokens
-                                    completion_tokens = UsageService.calculate_tokens_for_message(full_response)
-                                    total_tokens_used = prompt_tokens + completion_tokens
-                                    
-                                    # Log token usage for debugging
-                                    logger.info(f"Token usage calculated - Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {total_tokens_used}")
-                                    
-                                    UsageService.increment_usage(
-                                        request.user, subscription_type,
-                                        messages_count=1,  # Only count one message interaction
-                                        tokens_count=total_tokens_used,
-                                        is_free_model=is_free_model,
-                                        ai_model=ai_model  # Pass the AI model for cost calculation
-                                    )
-                                    
-                                    # Also update ChatSessionUsage با دقت بیشتر
-                                    try:
-                                        chat_session_usage, created = ChatSessionUsage.objects.get_or_create(
-                                            session=session,
-                                            user=request.user,
-                                            subscription_type=subscription_type,
-                                            defaults={
-                                                'is_free_model': is_free_model,
-                                                'tokens_count': 0,
-                                                'free_model_tokens_count': 0
-                                            }
-                                        )
-                                        
-                                        # به‌روزرسانی توکن‌ها بر اساس نوع مدل
-                                        if is_free_model:
-                                            chat_session_usage.free_model_tokens_count += total_tokens_used
-                                            logger.debug(f"Free model tokens updated: +{total_tokens_used}, Total: {chat_session_usage.free_model_tokens_count}")
-                                        else:
-                                            chat_session_usage.tokens_count += total_tokens_used
-                                            logger.debug(f"Paid model tokens updated: +{total_tokens_used}, Total: {chat_session_usage.tokens_count}")
-                                        
-                                        # اطمینان از اینکه is_free_model به‌روز است
-                                        if chat_session_usage.is_free_model != is_free_model:
-                                            chat_session_usage.is_free_model = is_free_model
-                                            logger.debug(f"Model type updated to: {'Free' if is_free_model else 'Paid'}")
-                                        
-                                        chat_session_usage.save()
-                                        logger.info(f"ChatSessionUsage updated - Session: {session.id}, {'Free' if is_free_model else 'Paid'} Tokens: {total_tokens_used}")
-                                    except Exception as e:
-                                        logger.error(f"Error updating ChatSessionUsage: {str(e)}")
-                            
-                            # Save OpenRouter request cost information
-                            try:
-                                # Calculate effective cost tokens with multiplier
-                                cost_multiplier = float(ai_model.token_cost_multiplier) if hasattr(ai_model, 'token_cost_multiplier') else 1.0
-                                effective_cost_tokens = int(total_tokens_used * cost_multiplier)
-                                
-                                # Check OpenRouter cost limit before saving
-                                # We need to check if total_cost_usd is defined and not None
-                                if 'total_cost_usd' in locals() and locals().get('total_cost_usd') and subscription_type:
-                                    cost_to_check = locals().get('total_cost_usd')
-                                    if cost_to_check is not None:
-                                        # Pass the cost as-is (Decimal or convertible value) without converting to float
-                                        within_limit, message = UsageService.check_openrouter_cost_limit(
-                                            request.user, subscription_type, cost_to_check
-                                        )
-                                        if not within_limit:
-                                            # Use configurable limitation message for OpenRouter cost limit
-                                            limitation_msg = LimitationMessageService.get_openrouter_cost_limit_message()
-                                            return JsonResponse({'error': limitation_msg['message']}, status=403)
-                                
-                                OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
-                                OpenRouterRequestCost.objects.create(
-                                    user=request.user,
-                                    session=session,
-                                    subscription_type=subscription_type,
-                                    model_id=ai_model.model_id,
-                                    model_name=ai_model.name,
-                                    prompt_tokens=prompt_tokens,
-                                    completion_tokens=completion_tokens,
-                                    total_tokens=total_tokens_used,
-                                    token_cost_multiplier=cost_multiplier,
-                                    effective_cost_tokens=effective_cost_tokens,
-                                    cost_per_million_tokens=cost_per_million_tokens,
-                                    total_cost_usd=total_cost_usd if 'total_cost_usd' in locals() else None,
-                                    request_type='chat'
+                            is_image_editing = bool(session.chatbot and session.chatbot.chatbot_type == 'image_editing')
+                            if is_image_editing and images_saved:
+                                UsageService.increment_image_generation_usage(
+                                    request.user, subscription_type
                                 )
-                                logger.info(f"OpenRouter request cost saved - User: {request.user.id}, Model: {ai_model.name}, Tokens: {total_tokens_used}")
-                            except Exception as e:
-                                logger.error(f"Error saving OpenRouter request cost: {str(e)}")
+                            
+                            # One ledger row carries the cost and the message/token usage of this reply;
+                            # image editing without a saved image only records the cost
+                            logger.info(f"Token usage - Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {total_tokens_used}")
+                            cost_multiplier = float(ai_model.token_cost_multiplier) if hasattr(ai_model, 'token_cost_multiplier') else 1.0
+                            OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+                            reply_row = OpenRouterRequestCost(
+                                user=request.user,
+                                session=session,
+                                subscription_type=subscription_type,
+                                model_id=ai_model.model_id,
+                                model_name=ai_model.name,
+                                prompt_tokens=prompt_tokens,
+                                completion_tokens=completion_tokens,
+                                total_tokens=total_tokens_used,
+                                token_cost_multiplier=cost_multiplier,
+                                effective_cost_tokens=int(total_tokens_used * cost_multiplier),
+                                cost_per_million_tokens=cost_per_million_tokens,
+                                total_cost_usd=total_cost_usd,
+                                request_type='chat',
+                                cached=bool(usage_data and usage_data.get('cached')),
+                                is_free_model=is_free_model,
+                                excluded_from_quota=is_image_editing and not images_saved,
+                                **ledger_fields((usage_data or {}).get('timing'))
+                            )
+                        
+                        try:
+                            _record_usage_events(ledger_rows, reply_row, reservation)
+                            if reply_row is not None:
+                                logger.info(f"Usage recorded - User: {request.user.id}, Model: {ai_model.name}, Tokens: {total_tokens_used}")
+                        except Exception as e:
+                            logger.error(f"Error recording usage: {str(e)}")
+                    else:
+                        # Nothing was answered: the reserved usage is given back
+                        UsageReservationService.release(reservation)
 
+            metrics.CHAT_MESSAGES.inc(mode='stream', outcome='streamed')
+            reservation_streamed = True
             return StreamingHttpResponse(
                 generate(),
                 content_type='text/plain; charset=utf-8',
@@ -1218,42 +1293,61 @@ def send_message(request, session_id):
             import logging
             logger = logging.getLogger(__name__)
             logger.error(f"Error in send_message: {str(e)}", exc_info=True)
+            metrics.CHAT_MESSAGES.inc(mode='stream', outcome='error')
             # Return a more user-friendly error message in Persian
             error_message = "خطای داخلی سرور. لطفاً مجدد تلاش کنید."
             return JsonResponse({'error': error_message}, status=500)
+        finally:
+            # Remove streamed files that were rejected or never attached to a message
+            _discard_stored_uploads(uploaded_files)
+            if not reservation_streamed:
+                UsageReservationService.release(reservation)
 
     return JsonResponse({'error': 'روش درخواست نامعتبر است'}, status=400)
 
-@login_required
-def get_user_sessions(request):
+SIDEBAR_SESSION_FIELDS = (
+    'id', 'title', 'updated_at', 'message_count', 'last_message_at', 'last_message_preview', 'revision',
+    'chatbot__id', 'chatbot__name', 'ai_model__id', 'ai_model__name', 'ai_model__is_free',
+)
+MAX_SIDEBAR_PAGE_SIZE = 50
+
+
+def _sidebar_sessions_page(user, page_size, cursor=None):
+    """
+    One page of the sidebar session list, newest first, keyset-paginated on (updated_at, id)
+    Raises ValueError for an invalid cursor
+    """
     ChatSession = apps.get_model('chatbot', 'ChatSession')
+    Chatbot = apps.get_model('chatbot', 'Chatbot')
     
-    # Get pagination parameters
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 20))
-    
-    # Ensure page_size is within reasonable limits
-    page_size = min(page_size, 50)  # Maximum 50 sessions per page
-    
-    # Get sessions with pagination
-    sessions_queryset = ChatSession.objects.filter(user=request.user, is_active=True).order_by('-updated_at')
-    total_sessions = sessions_queryset.count()
+    sessions_queryset = ChatSession.objects.filter(
+        user=user, is_active=True
+    ).select_related('chatbot', 'ai_model').only(*SIDEBAR_SESSION_FIELDS).annotate(
+        chatbot_requires_premium=Exists(
+            Chatbot.subscription_types.through.objects.filter(chatbot_id=OuterRef('chatbot_id'))
+        )
+    )
     
-    # Calculate start and end indices for pagination
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
+    if cursor:
+        decoded = _decode_keyset_cursor(cursor)
+        if not decoded:
+            raise ValueError('invalid cursor')
+        updated_at, session_pk = decoded
+        sessions_queryset = sessions_queryset.filter(
+            Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=session_pk)
+        )
     
-    # Get paginated sessions
-    sessions = sessions_queryset[start_index:end_index]
+    # One extra row tells whether another page exists
+    sessions = list(sessions_queryset.order_by('-updated_at', '-id')[:page_size + 1])
+    has_more = len(sessions) > page_size
+    sessions = sessions[:page_size]
     
     session_list = []
     for session in sessions:
         # Determine session type and access level
         if session.chatbot:
             session_name = session.chatbot.name
-            # Check if chatbot requires premium access
-            requires_premium = session.chatbot.subscription_types.exists()
-            model_access = "Premium" if requires_premium else "Free"
+            model_access = "Premium" if session.chatbot_requires_premium else "Free"
         elif session.ai_model:
             session_name = session.ai_model.name
             model_access = "Free" if session.ai_model.is_free else "Premium"
@@ -1267,24 +1361,60 @@ def get_user_sessions(request):
             'session_name': session_name,
             'model_access': model_access,
             'updated_at': session.updated_at.isoformat(),
-            'message_count': session.messages.count()
+            'message_count': session.message_count,
+            'last_message_at': session.last_message_at.isoformat() if session.last_message_at else None,
+            'last_message_preview': session.last_message_preview,
+            'revision': session.revision
         })
     
-    # Correctly calculate has_more - there are more sessions if:
-    # 1. We haven't reached the total count
-    # 2. We have a full page of results (meaning there might be more)
-    has_more = end_index < total_sessions
-    
-    return JsonResponse({
+    return {
         'sessions': session_list,
-        'page': page,
         'page_size': page_size,
-        'total_sessions': total_sessions,
-        'has_more': has_more
-    })
+        'has_more': has_more,
+        'next_cursor': _encode_keyset_cursor(sessions[-1].updated_at, sessions[-1].id) if has_more else None
+    }
+
+
+def _json_response_with_etag(request, data, prefix):
+    """
+    JSON response with an ETag hashed from its body; 304 when the client's copy matches
+    Revalidation re-runs the view but sends no body
+    """
+    response = JsonResponse(data)
+    etag = '"%s-%s"' % (prefix, hashlib.sha256(response.content).hexdigest()[:32])
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    response['ETag'] = etag
+    return response
+
+
+@login_required
+@query_budget(7)
+def get_user_sessions(request):
+    """
+    فهرست جلسات نوار کناری با صفحه‌بندی کلیدی
+    Sidebar session list, newest first, keyset-paginated on (updated_at, id) with ?cursor=.
+    Counts and previews come from denormalized columns and the premium flag from an
+    EXISTS annotation, so a page is a single query.
+    """
+    try:
+        page_size = int(request.GET.get('page_size', 20))
+    except ValueError:
+        page_size = 20
+    page_size = max(1, min(page_size, MAX_SIDEBAR_PAGE_SIZE))
+    
+    try:
+        page = _sidebar_sessions_page(request.user, page_size, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'error': 'نشانگر صفحه نامعتبر است'}, status=400)
+    
+    # The ETag is derived from the page itself, so revalidation costs no extra query
+    return _json_response_with_etag(request, page, 'sessions')
 
 @csrf_exempt
 @login_required
+@rate_limit(weight=2)
 def generate_chat_title(request):
     if request.method == 'POST':
         data = json.loads(request.body)
@@ -1417,17 +1547,13 @@ def check_web_search_access(request, session_id):
             
             # Check if web search is enabled and if user has access
             try:
-                WebSearchSettings = apps.get_model('ai_models', 'WebSearchSettings')
-                web_search_settings = WebSearchSettings.objects.get(is_active=True)
-                enabled_subscription_types = web_search_settings.enabled_subscription_types.all()
+                web_search_settings = ConfigCache.get('web_search_settings')
+                if not web_search_settings:
+                    raise LookupError('web search is not configured')
                 
                 # Check if user's subscription type is in the enabled list
-                has_access = False
-                if user_subscription and user_subscription in enabled_subscription_types:
-                    has_access = True
-                elif not user_subscription and enabled_subscription_types.filter(name='Free').exists():
-                    # If user has no subscription, check if Free subscription is enabled
-                    has_access = True
+                # (users without a subscription need the Free type enabled)
+                has_access = web_search_settings.is_enabled_for(user_subscription)
                 
                 return JsonResponse({
                     'has_access': has_access,
@@ -1467,6 +1593,7 @@ def check_image_generation_access(request, session_id):
 
 @csrf_exempt
 @login_required
+@rate_limit(weight=5)
 def analyze_image(request, session_id):
     """
     Handle image upload and analysis for vision-capable AI models
@@ -1529,8 +1656,7 @@ def analyze_image(request, session_id):
             # Get AI model for vision processing
             # Try to get from VisionProcessingSettings first, fallback to session model
             try:
-                VisionProcessingSettings = apps.get_model('chatbot', 'VisionProcessingSettings')
-                vision_settings = VisionProcessingSettings.objects.filter(is_active=True).first()
+                vision_settings = ConfigCache.get('vision_processing_settings')
                 if vision_settings:
                     ai_model = vision_settings.ai_model
                 else:
@@ -1541,30 +1667,40 @@ def analyze_image(request, session_id):
             if not ai_model:
                 return JsonResponse({'error': 'هیچ مدل هوش مصنوعی با این جلسه مرتبط نیست'}, status=500)
             
-            # Use the configured vision model or a default one
-            vision_model_id = ai_model.model_id if ai_model else "anthropic/claude-3-haiku-20240307"
-            
             # Send to OpenRouter API
-            headers = {
-                "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": vision_model_id,
-                "messages": openrouter_messages
-            }
-            
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            
-            response.raise_for_status()
-            response_data = response.json()
+            response_data = OpenRouterService().send_text_message(ai_model, openrouter_messages)
+            if 'error' in response_data:
+                return JsonResponse({'error': response_data['error']}, status=500)
             bot_response = response_data['choices'][0]['message']['content']
             
+            # Record the request in the cost ledger
+            usage = response_data.get('usage')
+            subscription_type = request.user.get_subscription_type()
+            if usage and subscription_type:
+                prompt_tokens = usage.get('prompt_tokens', 0)
+                completion_tokens = usage.get('completion_tokens', 0)
+                total_tokens = usage.get('total_tokens', prompt_tokens + completion_tokens)
+                cost_multiplier = float(ai_model.token_cost_multiplier)
+                OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+                OpenRouterRequestCost.objects.create(
+                    user=request.user,
+                    session=session,
+                    subscription_type=subscription_type,
+                    model_id=ai_model.model_id,
+                    model_name=ai_model.name,
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    total_tokens=total_tokens,
+                    token_cost_multiplier=cost_multiplier,
+                    effective_cost_tokens=int(total_tokens * cost_multiplier),
+                    total_cost_usd=usage.get('total_cost_usd', usage.get('cost')),
+                    request_type='vision',
+                    is_free_model=ai_model.is_free,
+                    messages_count=0,
+                    excluded_from_quota=True,
+                    **ledger_fields(response_data.get('timing'))
+                )
+            
             # Save messages to database
             # Save user message
             user_message = ChatMessage.objects.create(
@@ -1593,55 +1729,11 @@ def analyze_image(request, session_id):
 
 @login_required
 def chat_session(request, session_id):
-    """Dedicated view for a specific chat session"""
+    """Dedicated view for a specific chat session (the page loads its data like the chat page)"""
     # Verify the session exists and belongs to the user
-    Chatbot = apps.get_model('chatbot', 'Chatbot')
     ChatSession = apps.get_model('chatbot', 'ChatSession')
-    AIModel = apps.get_model('ai_models', 'AIModel')
-    session = get_object_or_404(ChatSession, id=session_id, user=request.user, is_active=True)
-    
-    # Get all available chatbots for the user
-    user_subscription = request.user.get_subscription_type()
-    
-    if user_subscription:
-        # Get chatbots available for user's subscription
-        available_chatbots = Chatbot.objects.filter(
-            Q(is_active=True) & 
-            (Q(subscription_types=user_subscription) | Q(subscription_types=None))
-        ).distinct()
-    else:
-        # If no subscription, only show chatbots with no subscription requirement
-        available_chatbots = Chatbot.objects.filter(
-            is_active=True,
-            subscription_types=None
-        )
-    
-    # Also get available AI models for backward compatibility
-    available_models = []
-    if user_subscription:
-        # Get models available for user's subscription
-        models = AIModel.objects.filter(
-            is_active=True,
-            subscriptions__subscription_types=user_subscription
-        ).distinct()
-        available_models.extend(models)
-    
-    # Add free models (available to all users)
-    free_models = AIModel.objects.filter(is_active=True, is_free=True)
-    available_models.extend(free_models)
-    
-    # Remove duplicates
-    available_models = list(set(available_models))
-    
-    # Get user's chat sessions
-    chat_sessions = ChatSession.objects.filter(user=request.user, is_active=True).order_by('-updated_at')
-    
-    context = {
-        'available_chatbots': available_chatbots,
-        'available_models': available_models,
-        'chat_sessions': chat_sessions,
-    }
-    return render(request, 'chatbot/chat.html', context)
+    get_object_or_404(ChatSession.objects.only('id'), id=session_id, user=request.user, is_active=True)
+    return render(request, 'chatbot/chat.html')
 
 @csrf_exempt
 @login_required
@@ -1697,17 +1789,13 @@ def check_web_search_access_no_session(request):
             
             # Check if web search is enabled and if user has access
             try:
-                WebSearchSettings = apps.get_model('ai_models', 'WebSearchSettings')
-                web_search_settings = WebSearchSettings.objects.get(is_active=True)
-                enabled_subscription_types = web_search_settings.enabled_subscription_types.all()
+                web_search_settings = ConfigCache.get('web_search_settings')
+                if not web_search_settings:
+                    raise LookupError('web search is not configured')
                 
                 # Check if user's subscription type is in the enabled list
-                has_access = False
-                if user_subscription and user_subscription in enabled_subscription_types:
-                    has_access = True
-                elif not user_subscription and enabled_subscription_types.filter(name='Free').exists():
-                    # If user has no subscription, check if Free subscription is enabled
-                    has_access = True
+                # (users without a subscription need the Free type enabled)
+                has_access = web_search_settings.is_enabled_for(user_subscription)
                 
                 return JsonResponse({
                     'has_access': has_access
@@ -1722,6 +1810,49 @@ def check_web_search_access_no_session(request):
     
     return JsonResponse({'error': 'روش درخواست نامعتبر است'}, status=400)
 
+def _user_sidebar_menu_items(user):
+    """Active sidebar menu items the user may see, with their URLs resolved"""
+    # Get all active menu items ordered by display order
+    menu_items = ConfigCache.get('sidebar_menu_items')
+    
+    # Filter items based on user permissions
+    user_menu_items = []
+    for item in menu_items:
+        # If item should only be shown to authenticated users and user is not authenticated, skip it
+        if item.show_only_for_authenticated and not user.is_authenticated:
+            continue
+            
+        # If item should only be shown to non-authenticated users and user is authenticated, skip it
+        if item.show_only_for_non_authenticated and user.is_authenticated:
+            continue
+        
+        # If no permission is required, or user has the required permission
+        if not item.required_permission or user.has_perm(item.required_permission):
+            # Resolve the URL
+            try:
+                # Handle namespaced URLs (e.g., 'chat:chat')
+                if ':' in item.url_name:
+                    url = reverse(item.url_name)
+                else:
+                    # Try to resolve as a chat app URL first, then fall back to global
+                    try:
+                        url = reverse(f'chat:{item.url_name}')
+                    except:
+                        url = reverse(item.url_name)
+                user_menu_items.append({
+                    'name': item.name,
+                    'url': url,
+                    'icon_class': item.icon_class,
+                    'order': item.order,
+                    'show_only_for_authenticated': item.show_only_for_authenticated,
+                    'show_only_for_non_authenticated': item.show_only_for_non_authenticated
+                })
+            except:
+                # Skip items with invalid URLs
+                continue
+    return user_menu_items
+
+
 @login_required
 def get_sidebar_menu_items(request):
     """
@@ -1731,49 +1862,8 @@ def get_sidebar_menu_items(request):
         return JsonResponse({'error': 'Invalid request method'}, status=400)
     
     try:
-        SidebarMenuItem = apps.get_model('chatbot', 'SidebarMenuItem')
-        
-        # Get all active menu items ordered by display order
-        menu_items = SidebarMenuItem.objects.filter(is_active=True).order_by('order')
-        
-        # Filter items based on user permissions
-        user_menu_items = []
-        for item in menu_items:
-            # If item should only be shown to authenticated users and user is not authenticated, skip it
-            if item.show_only_for_authenticated and not request.user.is_authenticated:
-                continue
-                
-            # If item should only be shown to non-authenticated users and user is authenticated, skip it
-            if item.show_only_for_non_authenticated and request.user.is_authenticated:
-                continue
-            
-            # If no permission is required, or user has the required permission
-            if not item.required_permission or request.user.has_perm(item.required_permission):
-                # Resolve the URL
-                try:
-                    # Handle namespaced URLs (e.g., 'chat:chat')
-                    if ':' in item.url_name:
-                        url = reverse(item.url_name)
-                    else:
-                        # Try to resolve as a chat app URL first, then fall back to global
-                        try:
-                            url = reverse(f'chat:{item.url_name}')
-                        except:
-                            url = reverse(item.url_name)
-                    user_menu_items.append({
-                        'name': item.name,
-                        'url': url,
-                        'icon_class': item.icon_class,
-                        'order': item.order,
-                        'show_only_for_authenticated': item.show_only_for_authenticated,
-                        'show_only_for_non_authenticated': item.show_only_for_non_authenticated
-                    })
-                except:
-                    # Skip items with invalid URLs
-                    continue
-        
         return JsonResponse({
-            'menu_items': user_menu_items
+            'menu_items': _user_sidebar_menu_items(request.user)
         })
         
     except Exception as e:
@@ -1781,6 +1871,7 @@ def get_sidebar_menu_items(request):
 
 @csrf_exempt
 @login_required
+@rate_limit(weight=5)
 def edit_message(request, session_id, message_id):
     """
     Edit a user message and regenerate subsequent assistant messages
@@ -1792,6 +1883,7 @@ def edit_message(request, session_id, message_id):
     if request.method != 'POST':
         return JsonResponse({'error': 'Invalid request method'}, status=400)
     
+    reservation = None
     try:
         ChatSession = apps.get_model('chatbot', 'ChatSession')
         ChatMessage = apps.get_model('chatbot', 'ChatMessage')
@@ -1825,6 +1917,65 @@ def edit_message(request, session_id, message_id):
             if not within_limit:
                 return JsonResponse({'error': message_limit}, status=403)
         
+        # The regeneration runs on the session's model
+        ai_model = session.ai_model
+        if not ai_model:
+            return JsonResponse({'error': 'No AI model available for this session'}, status=500)
+        
+        # Reserve the regeneration's usage before anything in the conversation changes, so a
+        # refusal (including the OpenRouter cost limit) leaves the history as it was
+        if subscription_type:
+            reservation, limit_reason, message_limit = UsageReservationService.reserve(
+                request.user, subscription_type, ai_model, session=session,
+                prompt_tokens=UsageService.calculate_tokens_for_message(new_content), request_type='edit'
+            )
+            if reservation is None:
+                return JsonResponse({'error': message_limit}, status=403)
+        
+        # فایل‌های جدید (آپلود تکه‌ای) برای پیام ویرایش شده - Pre-uploaded blobs attached to the edited message
+        blob_ids = data.get('blob_ids', [])
+        if blob_ids:
+            blob_files, blob_message = ChunkedUploadService.get_stored_files(request.user, blob_ids)
+            if blob_files is None:
+                UsageReservationService.release(reservation)
+                return JsonResponse({'error': blob_message}, status=400)
+            
+            count_valid, count_msg = GlobalFileService.check_files_count_per_message(
+                len(uploaded_file_records) + len(blob_files)
+            )
+            if not count_valid:
+                _discard_stored_uploads(blob_files)
+                UsageReservationService.release(reservation)
+                return JsonResponse({'error': count_msg}, status=403)
+            
+            for blob_file in blob_files:
+                is_valid, validation_msg = ChunkedUploadService.validate_upload(request.user, blob_file.name, blob_file.size)
+                if not is_valid:
+                    _discard_stored_uploads(blob_files)
+                    UsageReservationService.release(reservation)
+                    return JsonResponse({'error': validation_msg}, status=403)
+            
+            for blob_file in blob_files:
+                uploaded_file_record = UploadedFile.objects.create(
+                    user=request.user,
+                    session=session,
+                    filename=blob_file.storage_name,
+                    original_filename=blob_file.name,
+                    mimetype=blob_file.content_type or 'application/octet-stream',
+                    size=blob_file.size,
+                    sha256=blob_file.sha256
+                )
+                ChunkedUploadService.mark_consumed(blob_file.upload_session, uploaded_file_record)
+                blob_file.close()
+                MessageFile.objects.create(
+                    message=message,
+                    uploaded_file=uploaded_file_record,
+                    file_order=len(uploaded_file_records)
+                )
+                uploaded_file_records.append(uploaded_file_record)
+                if subscription_type:
+                    FileUploadService.increment_file_upload_usage(request.user, subscription_type, session)
+        
         # Update the message content
         message.content = new_content
         message.edited_at = timezone.now()
@@ -1941,22 +2092,12 @@ def edit_message(request, session_id, message_id):
         
         # Send to AI for regeneration
         openrouter_service = OpenRouterService()
-        
-        # Get the AI model for this session
-        if session.chatbot:
-            # For chatbots, we might need to get a model from the chatbot configuration
-            ai_model = session.ai_model
-        else:
-            ai_model = session.ai_model
-        
-        if not ai_model:
-            return JsonResponse({'error': 'No AI model available for this session'}, status=500)
-        
         response = openrouter_service.stream_text_response(
             ai_model, openrouter_messages
         )
         
         if isinstance(response, dict) and 'error' in response:
+            UsageReservationService.release(reservation)
             return JsonResponse({'error': response['error']}, status=500)
         
         # Create a new assistant message for the response
@@ -2033,9 +2174,10 @@ def edit_message(request, session_id, message_id):
                 else:
                     # Fallback to character counting if API doesn't provide usage data
                     assistant_message.tokens_count = UsageService.calculate_tokens_for_message(full_response)
-                    prompt_tokens = 0
+                    # Estimate prompt tokens: edited message plus a small overhead for the system prompt
+                    prompt_tokens = assistant_message.tokens_count + 50
                     completion_tokens = assistant_message.tokens_count
-                    total_tokens = completion_tokens
+                    total_tokens = prompt_tokens + completion_tokens
                     cost_per_million_tokens = None
                     total_cost_usd = None
                     generation_id = None
@@ -2068,88 +2210,36 @@ def edit_message(request, session_id, message_id):
                 session.updated_at = timezone.now()
                 session.save()
                 
-                # Update usage counters - only for image editing chatbots if images were successfully generated
+                # Record the edit in the usage ledger: one row with its cost and usage
                 if subscription_type:
-                    # Initialize variables for cost tracking
-                    prompt_tokens = 0
-                    completion_tokens = 0
-                    total_tokens = 0
-                    cost_per_million_tokens = None
-                    total_cost_usd = None
-                    
-                    # For image editing chatbots, increment usage (images are processed in the main send_message function)
-                    # In edit_message, we don't generate new images, so we don't increment image usage here
-                    if session.chatbot and session.chatbot.chatbot_type == 'image_editing':
-                        # For image editing chatbots during edit, we don't increment usage as no new images are generated
-                        pass
-                    else:
-                        # For other chatbots, increment regular usage
-                        if usage_data:
-                            # Use actual token counts from API - these are the REAL consumption
-                            prompt_tokens = usage_data.get('prompt_tokens', 0)
-                            completion_tokens = usage_data.get('completion_tokens', 0)
-                            total_tokens = usage_data.get('total_tokens', prompt_tokens + completion_tokens)
-                            
-                            # Extract cost information according to OpenRouter documentation
-                            if 'cost' in usage_data:
-                                total_cost_usd = usage_data.get('cost')
-                            elif 'total_cost_usd' in usage_data:
-                                total_cost_usd = usage_data.get('total_cost_usd')
-                            
-                            # Extract cost per million tokens if available
-                            cost_per_million_tokens = usage_data.get('cost_per_million_tokens', None)
-                            
-                            UsageService.increment_usage(
-                                request.user, subscription_type,
-                                messages_count=1,  # Only count one interaction
-                                tokens_count=total_tokens,  # Use actual API consumption
-                                is_free_model=ai_model.is_free if ai_model else False,
-                                ai_model=ai_model  # Pass the AI model for cost calculation
-                            )
-                        else:
-                            # Fallback calculation - only the actual assistant response tokens
-                            # Don't re-calculate conversation history as it's already been paid for
-                            assistant_output_tokens = assistant_message.tokens_count
-                            # Estimate prompt tokens based on edited message + small context overhead
-                            edited_message_tokens = UsageService.calculate_tokens_for_message(full_response)
-                            estimated_prompt_tokens = edited_message_tokens + 50  # Small overhead for system prompt
-                            total_tokens = estimated_prompt_tokens + assistant_output_tokens
-                            prompt_tokens = estimated_prompt_tokens
-                            completion_tokens = assistant_output_tokens
-                            
-                            UsageService.increment_usage(
-                                request.user, subscription_type,
-                                messages_count=1,  # Only count one interaction
-                                tokens_count=total_tokens,  # Only actual new consumption
-                                is_free_model=ai_model.is_free if ai_model else False,
-                                ai_model=ai_model  # Pass the AI model for cost calculation
-                            )
-                    
-                    # Save OpenRouter request cost information
+                    # Edits of image editing chatbots generate no new images and are not counted
+                    # towards the message quotas; their cost is still recorded
+                    is_image_editing = bool(session.chatbot and session.chatbot.chatbot_type == 'image_editing')
                     try:
-                        # Calculate effective cost tokens with multiplier
                         cost_multiplier = float(ai_model.token_cost_multiplier) if hasattr(ai_model, 'token_cost_multiplier') else 1.0
-                        effective_cost_tokens = int(total_tokens * cost_multiplier)
-                        
                         OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
-                        OpenRouterRequestCost.objects.create(
-                            user=request.user,
-                            session=session,
-                            subscription_type=subscription_type,
-                            model_id=ai_model.model_id,
-                            model_name=ai_model.name,
-                            prompt_tokens=prompt_tokens,
-                            completion_tokens=completion_tokens,
-                            total_tokens=total_tokens,
-                            token_cost_multiplier=cost_multiplier,
-                            effective_cost_tokens=effective_cost_tokens,
-                            cost_per_million_tokens=cost_per_million_tokens,
-                            total_cost_usd=total_cost_usd,
-                            request_type='edit'
-                        )
-                        logger.info(f"OpenRouter request cost saved - User: {request.user.id}, Model: {ai_model.name}, Tokens: {total_tokens}")
+                        with transaction.atomic():
+                            UsageReservationService.settle(reservation, OpenRouterRequestCost(
+                                user=request.user,
+                                session=session,
+                                subscription_type=subscription_type,
+                                model_id=ai_model.model_id,
+                                model_name=ai_model.name,
+                                prompt_tokens=prompt_tokens,
+                                completion_tokens=completion_tokens,
+                                total_tokens=total_tokens,
+                                token_cost_multiplier=cost_multiplier,
+                                effective_cost_tokens=int(total_tokens * cost_multiplier),
+                                cost_per_million_tokens=cost_per_million_tokens,
+                                total_cost_usd=total_cost_usd,
+                                request_type='edit',
+                                is_free_model=bool(ai_model and ai_model.is_free),
+                                excluded_from_quota=is_image_editing,
+                                **ledger_fields((usage_data or {}).get('timing'))
+                            ))
+                        logger.info(f"Usage recorded - User: {request.user.id}, Model: {ai_model.name}, Tokens: {total_tokens}")
                     except Exception as e:
-                        logger.error(f"Error saving OpenRouter request cost: {str(e)}")
+                        logger.error(f"Error recording usage: {str(e)}")
         
         return StreamingHttpResponse(
             generate(),
@@ -2159,9 +2249,22 @@ def edit_message(request, session_id, message_id):
         
     except Exception as e:
         logger.error(f"Error in edit_message: {str(e)}", exc_info=True)
+        UsageReservationService.release(reservation)
         return JsonResponse({'error': 'Internal server error'}, status=500)
 
 
+def _global_settings_data():
+    """Global upload and pagination settings exposed to the frontend"""
+    settings = GlobalFileService.get_global_settings()
+    return {
+        'max_file_size_mb': settings.max_file_size_mb,
+        'max_files_per_message': settings.max_files_per_message,
+        'allowed_extensions': settings.get_allowed_extensions_list(),
+        'messages_per_page': settings.messages_per_page,
+        'api_requests_per_minute': settings.api_requests_per_minute
+    }
+
+
 @login_required
 def get_global_settings(request):
     """API endpoint to get global file upload settings"""
@@ -2169,13 +2272,206 @@ def get_global_settings(request):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
-        settings = GlobalFileService.get_global_settings()
-        return JsonResponse({
-            'max_file_size_mb': settings.max_file_size_mb,
-            'max_files_per_message': settings.max_files_per_message,
-            'allowed_extensions': settings.get_allowed_extensions_list(),
-            'messages_per_page': settings.messages_per_page,
-            'api_requests_per_minute': settings.api_requests_per_minute
-        })
+        return JsonResponse(_global_settings_data())
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+
+@login_required
+def chat_bootstrap(request):
+    """
+    داده‌های اولیه صفحه چت در یک درخواست
+    Everything the chat page loads on start-up in one response: models, chatbots by type,
+    sidebar menu items, global settings, the first page of sessions, web search access and
+    the quota status.
+    Catalogue data comes from the config snapshot and the access matrix, so the only
+    queries are the session page and (when not cached) the user's subscription and quota.
+    The ETag is per user because it is hashed from the user-specific payload.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method'}, status=400)
+    
+    try:
+        user_subscription = request.user.get_subscription_type()
+        subscription_type_id = user_subscription.id if user_subscription else None
+        access_matrix = AccessMatrixService.get_matrix()
+        
+        chatbots = {chatbot_type: [] for chatbot_type, _ in apps.get_model('chatbot', 'Chatbot').CHATBOT_TYPES}
+        for chatbot in ConfigCache.get('active_chatbots'):
+            chatbots.setdefault(chatbot.chatbot_type, []).append(
+                _serialize_chatbot_for_user(chatbot, access_matrix, subscription_type_id)
+            )
+        
+        quota = QuotaStatusService.get_status(request.user)
+        
+        data = {
+            'models': _available_models_for_user(subscription_type_id),
+            'chatbots': chatbots,
+            'menu_items': _user_sidebar_menu_items(request.user),
+            'global_settings': _global_settings_data(),
+            'sessions': _sidebar_sessions_page(request.user, 20),
+            'web_search_access': quota['web_search_access'],
+            'subscription_type': user_subscription.name if user_subscription else None,
+            'quota': quota
+        }
+    except Exception as e:
+        logger = logging.getLogger(__name__)
+        logger.error(f"Error building chat bootstrap for user {request.user.id}: {str(e)}")
+        return JsonResponse({'error': 'خطا در بارگذاری اطلاعات صفحه چت'}, status=500)
+    
+    return _json_response_with_etag(request, data, 'bootstrap')
+
+
+# Content-Range header of a chunk PUT, e.g. "bytes 0-1048575/5242880"
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+def _upload_session_data(upload):
+    """Serialize an upload session for the chunked upload API"""
+    data = {
+        'upload_id': str(upload.upload_id),
+        'filename': upload.original_filename,
+        'size': upload.total_size,
+        'received_bytes': upload.received_bytes,
+        'chunk_size': ChunkedUploadService.CHUNK_SIZE,
+        'status': upload.status,
+        'expires_at': upload.expires_at.isoformat(),
+    }
+    if upload.status == 'complete':
+        data.update({
+            'blob_id': str(upload.upload_id),
+            'mimetype': upload.mimetype,
+            'sha256': upload.sha256,
+        })
+    return data
+
+
+@csrf_exempt
+@login_required
+def create_upload_session(request):
+    """
+    شروع آپلود تکه‌ای فایل
+    Start a chunked upload. Body: {"filename": "...", "size": <bytes>}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'روش درخواست نامعتبر است'}, status=400)
+    
+    try:
+        data = json.loads(request.body)
+        filename = str(data.get('filename', '')).strip()
+        total_size = int(data.get('size', 0))
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'داده‌های ارسالی نامعتبر است'}, status=400)
+    
+    if not filename:
+        return JsonResponse({'error': 'نام فایل الزامی است'}, status=400)
+    
+    is_valid, message = ChunkedUploadService.validate_upload(request.user, filename, total_size)
+    if not is_valid:
+        return JsonResponse({'error': message}, status=403)
+    
+    upload = ChunkedUploadService.create_upload(request.user, filename, total_size)
+    return JsonResponse(_upload_session_data(upload), status=201)
+
+
+@csrf_exempt
+@login_required
+def upload_session_detail(request, upload_id):
+    """
+    GET: وضعیت آپلود برای ادامه - upload status, used to resume from received_bytes
+    PUT: ارسال یک تکه - upload one chunk; the body is the raw bytes and
+         Content-Range (bytes start-end/total) gives its position
+    DELETE: لغو آپلود - cancel the upload and remove its data
+    """
+    upload = get_object_or_404(UploadSession, upload_id=upload_id, user=request.user)
+    
+    if request.method == 'GET':
+        return JsonResponse(_upload_session_data(upload))
+    
+    if request.method == 'DELETE':
+        if upload.status == 'consumed':
+            return JsonResponse({'error': 'این فایل در پیام استفاده شده است'}, status=400)
+        import os
+        try:
+            os.remove(StoredUploadedFile.stored_path(upload.storage_name))
+        except FileNotFoundError:
+            pass
+        upload.delete()
+        return JsonResponse({'success': True})
+    
+    if request.method != 'PUT':
+        return JsonResponse({'error': 'روش درخواست نامعتبر است'}, status=400)
+    
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        match = CONTENT_RANGE_RE.match(content_range.strip())
+        if not match:
+            return JsonResponse({'error': 'هدر Content-Range نامعتبر است'}, status=400)
+        start, end = int(match.group(1)), int(match.group(2))
+        if match.group(3) != '*' and int(match.group(3)) != upload.total_size:
+            return JsonResponse({'error': 'حجم کل فایل با مقدار اعلام شده مطابقت ندارد'}, status=400)
+        if end < start or end - start + 1 != length:
+            return JsonResponse({'error': 'هدر Content-Range با حجم تکه مطابقت ندارد'}, status=400)
+    else:
+        # Without Content-Range the chunk is appended at the current offset
+        start = upload.received_bytes
+    
+    success, message = ChunkedUploadService.write_chunk(upload, start, length, request)
+    if not success:
+        response_data = _upload_session_data(upload)
+        response_data['error'] = message
+        return JsonResponse(response_data, status=409)
+    
+    return JsonResponse(_upload_session_data(upload))
+
+
+@csrf_exempt
+@login_required
+def finalize_upload_session(request, upload_id):
+    """
+    پایان آپلود تکه‌ای و دریافت شناسه فایل (blob id)
+    Finalize a fully received upload. Optional body: {"sha256": "<hex digest>"}
+    The returned blob_id can be passed as blob_ids to send_message / edit_message.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'روش درخواست نامعتبر است'}, status=400)
+    
+    upload = get_object_or_404(UploadSession, upload_id=upload_id, user=request.user)
+    
+    expected_sha256 = None
+    if request.content_type == 'application/json' and request.body:
+        try:
+            expected_sha256 = json.loads(request.body).get('sha256')
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'داده‌های ارسالی نامعتبر است'}, status=400)
+    
+    success, message = ChunkedUploadService.finalize_upload(upload, expected_sha256)
+    if not success:
+        response_data = _upload_session_data(upload)
+        response_data['error'] = message
+        return JsonResponse(response_data, status=400)
+    
+    return JsonResponse(_upload_session_data(upload))
+
+
+@login_required
+def serve_media(request, path):
+    """
+    تحویل فایل‌های کاربر پس از بررسی مالکیت
+    Serve an uploaded or generated file owned by the current user. The bytes are
+    sent by the web server (X-Accel-Redirect / X-Sendfile) or via sendfile().
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    
+    owned_file = MediaDeliveryService.get_owned_file(request.user, path)
+    if not owned_file:
+        raise Http404
+    
+    absolute_path, original_filename, sha256 = owned_file
+    return MediaDeliveryService.build_response(request, absolute_path, path, original_filename, sha256)
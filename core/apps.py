@@ -7,4 +7,5 @@ class CoreConfig(AppConfig):
     
     def ready(self):
         # Import signal handlers or other initialization code here if needed
-        pass
\ No newline at end of file
+        import core.checks
+        import core.signals
\ No newline at end of file
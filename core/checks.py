@@ -0,0 +1,54 @@
+"""
+بررسی‌های پیکربندی استقرار
+System checks for settings the caching layers depend on.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+CACHE_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias='default'):
+    """Whether the cache is seen by every worker process (not LocMem/Dummy)"""
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    return backend not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Version stamps, cached subscriptions and rate-limit counters live in the default
+    cache; with several workers a process-local cache leaves the others stale
+    """
+    if not getattr(settings, 'REQUIRE_SHARED_CACHE', False) or cache_is_shared():
+        return []
+    return [Error(
+        'The default cache is process-local, so cache invalidations and rate limits only reach one worker.',
+        hint='Set CACHE_URL to a Redis or Memcached server shared by every worker, '
+             'or REQUIRE_SHARED_CACHE=False when the site runs a single process.',
+        id='core.E001',
+    )]
+
+
+@register(Tags.caches, Tags.security)
+def check_session_cache(app_configs, **kwargs):
+    """
+    A logout deletes the session from the database and from this process's cache only;
+    other workers would keep accepting the cookie from their own copy
+    """
+    if settings.SESSION_ENGINE not in CACHE_SESSION_ENGINES:
+        return []
+    if cache_is_shared(getattr(settings, 'SESSION_CACHE_ALIAS', 'default')):
+        return []
+    return [Warning(
+        'Sessions are cached in a process-local cache, so a logout only ends the session in one worker.',
+        hint='Configure CACHE_URL or use SESSION_ENGINE=django.contrib.sessions.backends.db.',
+        id='core.W002',
+    )]
@@ -0,0 +1,55 @@
+"""
+آدرس IP کاربر پشت پراکسی
+Client address of a request behind trusted reverse proxies.
+
+Behind nginx, REMOTE_ADDR is the proxy's own address. The header named by
+CLIENT_IP_HEADER (X-Forwarded-For or X-Real-IP) is only believed when the
+request comes from one of TRUSTED_PROXIES, and X-Forwarded-For is read from
+the right, skipping trusted proxies, so an address the client wrote into the
+header itself is never used.
+"""
+import ipaddress
+from functools import lru_cache
+
+from django.conf import settings
+
+DEFAULT_TRUSTED_PROXIES = ('127.0.0.1', '::1')
+
+
+@lru_cache(maxsize=8)
+def _networks(trusted_proxies):
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in trusted_proxies if proxy)
+
+
+def _address(value):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+
+def is_trusted_proxy(value):
+    address = _address(value or '')
+    if address is None:
+        return False
+    trusted = tuple(getattr(settings, 'TRUSTED_PROXIES', DEFAULT_TRUSTED_PROXIES))
+    return any(address in network for network in _networks(trusted))
+
+
+def get_client_ip(request):
+    """Address of the client that sent the request, or '' when unknown"""
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    header = getattr(settings, 'CLIENT_IP_HEADER', '')
+    if not header or not is_trusted_proxy(remote_addr):
+        return remote_addr
+
+    forwarded = request.META.get('HTTP_' + header.upper().replace('-', '_'), '')
+    client = remote_addr
+    for hop in reversed(forwarded.split(',')):
+        if _address(hop) is None:
+            # A malformed entry: nothing left of it can be trusted
+            break
+        client = hop.strip()
+        if not is_trusted_proxy(client):
+            break
+    return client
@@ -0,0 +1,172 @@
+"""
+کش درون‌فرایندی تنظیمات مدیریتی
+Versioned in-process cache for admin-managed configuration.
+
+Singleton settings and small configuration tables are loaded once per process
+and served from memory. A version stamp in the shared Django cache (CACHE_URL;
+core/checks.py refuses a process-local cache in production) is bumped by the
+save/delete signals in core/signals.py; each process compares its snapshot
+with the stamp at most once per VERSION_CHECK_INTERVAL seconds and reloads
+lazily when it moved, so admin edits reach every worker within a second.
+
+Inside a database transaction the snapshot is bypassed: values read there may
+belong to uncommitted (or later rolled back) edits and must not be shared.
+When the shared cache is unreachable the stamp cannot be checked, so values are
+read from the database until it is back.
+"""
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CONFIG_VERSION_KEY = 'config_cache:version'
+VERSION_CHECK_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_state = {'version': None, 'checked_at': 0.0, 'values': {}}
+
+
+def load_global_settings():
+    GlobalSettings = apps.get_model('core', 'GlobalSettings')
+    return GlobalSettings.load_settings()
+
+
+def load_limitation_messages():
+    LimitationMessage = apps.get_model('chatbot', 'LimitationMessage')
+    return {
+        limitation_type: {'title': title, 'message': message}
+        for limitation_type, title, message in LimitationMessage.objects.filter(
+            is_active=True
+        ).values_list('limitation_type', 'title', 'message')
+    }
+
+
+def load_web_search_settings():
+    WebSearchSettings = apps.get_model('ai_models', 'WebSearchSettings')
+    return WebSearchSettings.objects.filter(is_active=True).select_related(
+        'web_search_model'
+    ).prefetch_related('enabled_subscription_types').first()
+
+
+def load_vision_processing_settings():
+    VisionProcessingSettings = apps.get_model('chatbot', 'VisionProcessingSettings')
+    return VisionProcessingSettings.objects.filter(is_active=True).select_related('ai_model').first()
+
+
+def load_default_chat_settings():
+    DefaultChatSettings = apps.get_model('chatbot', 'DefaultChatSettings')
+    return DefaultChatSettings.objects.filter(is_active=True).select_related(
+        'default_chatbot', 'default_ai_model'
+    ).first()
+
+
+def load_sidebar_menu_items():
+    SidebarMenuItem = apps.get_model('chatbot', 'SidebarMenuItem')
+    return tuple(SidebarMenuItem.objects.filter(is_active=True).order_by('order'))
+
+
+def load_active_ai_models():
+    AIModel = apps.get_model('ai_models', 'AIModel')
+    return tuple(AIModel.objects.filter(is_active=True).order_by('name'))
+
+
+def load_active_chatbots():
+    Chatbot = apps.get_model('chatbot', 'Chatbot')
+    return tuple(Chatbot.objects.filter(is_active=True).order_by('id'))
+
+
+CONFIG_LOADERS = {
+    'global_settings': load_global_settings,
+    'limitation_messages': load_limitation_messages,
+    'web_search_settings': load_web_search_settings,
+    'vision_processing_settings': load_vision_processing_settings,
+    'default_chat_settings': load_default_chat_settings,
+    'sidebar_menu_items': load_sidebar_menu_items,
+    'active_ai_models': load_active_ai_models,
+    'active_chatbots': load_active_chatbots,
+}
+
+
+class ConfigCache:
+    """
+    Read-through snapshot of configuration values
+    Returned objects are shared by every request of the process: treat them as read-only
+    unless the change is saved (which invalidates the snapshot)
+    """
+
+    @staticmethod
+    def get(name):
+        loader = CONFIG_LOADERS[name]
+        if connection.in_atomic_block:
+            metrics.CACHE_REQUESTS.inc(cache='config', result='bypass')
+            return loader()
+
+        values = ConfigCache._current_values()
+        if values is None:
+            metrics.CACHE_REQUESTS.inc(cache='config', result='bypass')
+            return loader()
+        if name in values:
+            metrics.CACHE_REQUESTS.inc(cache='config', result='hit')
+            return values[name]
+        metrics.CACHE_REQUESTS.inc(cache='config', result='miss')
+        with _lock:
+            if name not in values:
+                values[name] = loader()
+            return values[name]
+
+    @staticmethod
+    def _current_values():
+        """The snapshot of the current version, or None when the version is unknown (cache outage)"""
+        now = time.monotonic()
+        if now - _state['checked_at'] >= VERSION_CHECK_INTERVAL:
+            version = ConfigCache.get_version()
+            if version is None:
+                # Another process may have moved the stamp meanwhile; the snapshot cannot be trusted
+                _state['values'] = {}
+                _state['version'] = None
+                return None
+            if version != _state['version']:
+                _state['values'] = {}
+                _state['version'] = version
+            _state['checked_at'] = now
+        return _state['values']
+
+    @staticmethod
+    def current_version():
+        """The version stamp this process last saw (checked at most once per interval)"""
+        ConfigCache._current_values()
+        return _state['version']
+
+    @staticmethod
+    def get_version():
+        """The shared version stamp, or None when the cache is unreachable"""
+        try:
+            version = cache.get(CONFIG_VERSION_KEY)
+            if version is None:
+                # A time-based start value never collides with a stamp another process already saw
+                cache.add(CONFIG_VERSION_KEY, time.time_ns(), None)
+                version = cache.get(CONFIG_VERSION_KEY)
+            return version
+        except Exception as e:
+            logger.warning(f"Config cache version lookup failed: {str(e)}")
+            return None
+
+    @staticmethod
+    def invalidate():
+        """Drop this process's snapshot and move the shared stamp for the others"""
+        _state['values'] = {}
+        _state['checked_at'] = 0.0
+        try:
+            try:
+                cache.incr(CONFIG_VERSION_KEY)
+            except ValueError:
+                cache.set(CONFIG_VERSION_KEY, time.time_ns(), None)
+        except Exception as e:
+            logger.warning(f"Config cache invalidation failed: {str(e)}")
@@ -0,0 +1,131 @@
+"""
+مسیریابی خواندن‌های تحلیلی به پایگاه داده replica
+Optional read-replica routing for analytics and statistics reads.
+
+Nothing is routed implicitly: code opts in with ``use_replica()``, as a context
+manager or a decorator, around read-only analytics work (reports, usage
+statistics, the cost page). Everything else, and every write, goes to
+``default``.
+
+Reads stay on the primary (read-your-writes) when:
+- the current request has already written to the primary;
+- the current user wrote within the last REPLICA_STICKY_SECONDS (tracked in
+  the cache by ReplicaStickinessMiddleware), so replication lag never hides
+  their own changes;
+- the code runs inside a transaction on the primary.
+
+Without a ``replica`` entry in DATABASES the router is a no-op.
+"""
+import contextvars
+from contextlib import ContextDecorator
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+REPLICA_DB_ALIAS = 'replica'
+PRIMARY_DB_ALIAS = 'default'
+DEFAULT_STICKY_SECONDS = 10
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+_pinned_to_primary = contextvars.ContextVar('pinned_to_primary', default=False)
+_wrote = contextvars.ContextVar('wrote_to_primary', default=False)
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def sticky_key(user_id):
+    return f"db_sticky:{user_id}"
+
+
+def _track_writes(execute, sql, params, many, context):
+    """
+    Execute wrapper flagging data-changing statements on the primary
+    (db_for_write alone is not a signal: get_or_create routes its read there too)
+    """
+    if not _wrote.get() and sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        _wrote.set(True)
+    return execute(sql, params, many, context)
+
+
+class use_replica(ContextDecorator):
+    """
+    Route reads inside the block (or the decorated function) to the replica
+
+        with use_replica():
+            ...
+
+        @use_replica()
+        def get_dashboard(...):
+            ...
+    """
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call keeps the reset token thread-safe
+        return type(self)()
+
+    def __enter__(self):
+        self._token = _replica_reads.set(True)
+        return self
+
+    def __exit__(self, *exc):
+        _replica_reads.reset(self._token)
+        return False
+
+
+class ReplicaRouter:
+    """Database router sending opted-in reads to the replica and everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or not replica_configured():
+            return None
+        if _pinned_to_primary.get() or _wrote.get():
+            return PRIMARY_DB_ALIAS
+        if connections[PRIMARY_DB_ALIAS].in_atomic_block:
+            return PRIMARY_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Read-your-writes for the replica router
+
+    Pins a request to the primary when its user wrote within REPLICA_STICKY_SECONDS,
+    and starts that window when the request itself writes. Must come after
+    AuthenticationMiddleware; it does nothing when no replica is configured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_configured():
+            return self.get_response(request)
+
+        user = getattr(request, 'user', None)
+        user_id = user.pk if user is not None and user.is_authenticated else None
+        pinned_token = _pinned_to_primary.set(bool(user_id and cache.get(sticky_key(user_id))))
+        wrote_token = _wrote.set(False)
+        try:
+            with connections[PRIMARY_DB_ALIAS].execute_wrapper(_track_writes):
+                response = self.get_response(request)
+            if user_id and _wrote.get():
+                sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+                cache.set(sticky_key(user_id), 1, sticky_seconds)
+            return response
+        finally:
+            _wrote.reset(wrote_token)
+            _pinned_to_primary.reset(pinned_token)
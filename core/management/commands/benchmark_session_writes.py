@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+# Session configuration before and after the sliding-expiry change
+PROFILES = {
+    'legacy': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'SESSION_SAVE_EVERY_REQUEST': True,
+        'remove_middleware': 'core.middleware.SlidingSessionMiddleware',
+    },
+    # The configured engine: cached_db with a shared cache, db otherwise
+    'current': {
+        'SESSION_ENGINE': None,
+        'SESSION_SAVE_EVERY_REQUEST': False,
+        'remove_middleware': None,
+    },
+}
+
+
+class BenchmarkRollback(Exception):
+    """Raised to roll back the benchmark's user and sessions"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Count django_session database writes and reads for a number of authenticated requests '
+        'under the legacy (db engine, save every request) and current (configured engine, sliding expiry) '
+        'session configurations. Everything runs in a rolled-back transaction in one process, so '
+        'cached_db reads are only avoided like this in production when CACHE_URL is a shared cache.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Number of requests per profile (default: 1000)',
+        )
+        parser.add_argument(
+            '--url',
+            default=None,
+            help='Path to request (default: the sidebar session list)',
+        )
+
+    def handle(self, *args, **options):
+        request_count = options['requests']
+        url = options['url'] or reverse('get_user_sessions')
+
+        self.stdout.write(f'{request_count} authenticated GET requests to {url} (configured engine: {settings.SESSION_ENGINE})')
+        self.stdout.write(f'{"profile":<10} {"session writes":>15} {"session reads":>15}')
+        for name, profile in PROFILES.items():
+            writes, reads = self.run_profile(profile, url, request_count)
+            self.stdout.write(f'{name:<10} {writes:>15} {reads:>15}')
+
+    def run_profile(self, profile, url, request_count):
+        middleware = [item for item in settings.MIDDLEWARE if item != profile['remove_middleware']]
+        overrides = override_settings(
+            SESSION_ENGINE=profile['SESSION_ENGINE'] or settings.SESSION_ENGINE,
+            SESSION_SAVE_EVERY_REQUEST=profile['SESSION_SAVE_EVERY_REQUEST'],
+            MIDDLEWARE=middleware,
+            ALLOWED_HOSTS=['testserver'],
+            SECURE_SSL_REDIRECT=False,
+            RATE_LIMIT_ENABLED=False,
+        )
+        counts = {'writes': 0, 'reads': 0}
+
+        def count_session_queries(execute, sql, params, many, context):
+            # A wrapper rather than the query log, which only keeps the last 9000 queries
+            statement = sql.lstrip().upper()
+            if 'DJANGO_SESSION' in statement:
+                counts['reads' if statement.startswith('SELECT') else 'writes'] += 1
+            return execute(sql, params, many, context)
+
+        try:
+            with overrides, transaction.atomic():
+                user = get_user_model().objects.create_user(
+                    phone_number='+10000000000', password='benchmark', name='Session Benchmark'
+                )
+                client = Client()
+                client.force_login(user)
+                with connection.execute_wrapper(count_session_queries):
+                    for _ in range(request_count):
+                        client.get(url)
+                raise BenchmarkRollback()
+        except BenchmarkRollback:
+            pass
+        return counts['writes'], counts['reads']
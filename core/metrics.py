@@ -0,0 +1,275 @@
+"""
+شاخص‌های عملکرد و خروجی متنی Prometheus
+Process-local counters and histograms exposed in the Prometheus text format.
+
+Metrics are plain in-memory values guarded by a lock. With several worker
+processes (Gunicorn), set METRICS_MULTIPROC_DIR to a directory shared by the
+workers: every process writes a snapshot of its values there at most every
+METRICS_FLUSH_SECONDS (and at exit), and /metrics adds up the snapshots of all
+processes. Empty the directory when the service starts, as with the
+prometheus_client multiprocess mode.
+
+    REQUEST_SECONDS.observe(0.12, view='chat_session')
+    with QUOTA_CHECK_SECONDS.time(check='comprehensive'):
+        ...
+    CACHE_REQUESTS.inc(cache='config', result='hit')
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+DEFAULT_FLUSH_SECONDS = 5
+SNAPSHOT_PATTERN = 'metrics-*.json'
+
+_lock = threading.Lock()
+_registry = {}
+_flush_state = {'flushed_at': 0.0}
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        with _lock:
+            if name in _registry:
+                raise ValueError(f'Metric {name} is already registered')
+            _registry[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def reset(self):
+        with _lock:
+            self.values = {}
+
+    def snapshot(self):
+        """JSON-ready state: samples keyed by their label values"""
+        return {
+            'type': self.type,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'samples': {json.dumps(list(key)): value for key, value in self.values.items()},
+        }
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        _maybe_flush()
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(float(bucket) for bucket in buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            # [count per bucket..., +Inf count, sum]
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+        _maybe_flush()
+
+    def time(self, **labels):
+        """Context manager / decorator observing the elapsed seconds"""
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        state = self.values.get(self._key(labels))
+        return sum(state[:-1]) if state else 0
+
+    def snapshot(self):
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.monotonic() - self.started, **self.labels)
+        return False
+
+
+def _multiproc_dir():
+    return getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+
+
+def _snapshot():
+    with _lock:
+        return {name: metric.snapshot() for name, metric in _registry.items()}
+
+
+def flush(force=False):
+    """Write this process's snapshot to the shared directory (atomically)"""
+    directory = _multiproc_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    interval = getattr(settings, 'METRICS_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS)
+    if not force and now - _flush_state['flushed_at'] < interval:
+        return
+    _flush_state['flushed_at'] = now
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temporary_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'w') as snapshot_file:
+            json.dump(_snapshot(), snapshot_file)
+        os.replace(temporary_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics snapshot {path}: {str(e)}")
+
+
+def _maybe_flush():
+    if _multiproc_dir():
+        flush()
+
+
+def _reset_after_fork():
+    # A forked worker starts from zero; the parent's values stay in the parent's snapshot
+    for metric in _registry.values():
+        metric.values = {}
+    _flush_state['flushed_at'] = 0.0
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(flush, force=True)
+
+
+def collect():
+    """Snapshots of every process (or only this one without a shared directory), merged"""
+    directory = _multiproc_dir()
+    if not directory:
+        return _snapshot()
+
+    flush(force=True)
+    merged = {}
+    for path in glob.glob(os.path.join(directory, SNAPSHOT_PATTERN)):
+        try:
+            with open(path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            continue
+        for name, data in snapshot.items():
+            target = merged.setdefault(name, {**data, 'samples': {}})
+            for key, value in data['samples'].items():
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = value
+                elif data['type'] == 'histogram':
+                    target['samples'][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target['samples'][key] = current + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, data in sorted(collect().items()):
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        labelnames = data['labelnames']
+        for key, value in sorted(data['samples'].items()):
+            label_values = json.loads(key)
+            if data['type'] == 'counter':
+                lines.append(f"{name}{_format_labels(labelnames, label_values)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(list(data['buckets']) + [float('inf')], value[:-1]):
+                cumulative += bucket_count
+                le = _format_labels(labelnames, label_values, [('le', _format_value(float(bound)))])
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, label_values)} {_format_value(float(value[-1]))}")
+            lines.append(f"{name}_count{_format_labels(labelnames, label_values)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+# HTTP and database
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time until the view returned a response', ['view', 'method'])
+REQUESTS = Counter('http_requests_total', 'Responses by view and status code', ['view', 'method', 'status'])
+REQUEST_QUEUE_WAIT_SECONDS = Histogram(
+    'http_request_queue_wait_seconds', 'Time between the proxy accepting a request (X-Request-Start) and a worker starting it'
+)
+DB_QUERIES = Histogram('db_queries_per_request', 'Database queries executed per request', ['view'], buckets=COUNT_BUCKETS)
+
+# OpenRouter
+OPENROUTER_REQUEST_SECONDS = Histogram(
+    'openrouter_request_duration_seconds', 'Time until OpenRouter answered (headers for streams)', ['model', 'stream']
+)
+OPENROUTER_ERRORS = Counter('openrouter_errors_total', 'Failed OpenRouter requests', ['model', 'stream'])
+OPENROUTER_TTFT_SECONDS = Histogram('openrouter_time_to_first_token_seconds', 'Time until the first streamed content', ['model'])
+OPENROUTER_STREAM_SECONDS = Histogram(
+    'openrouter_stream_duration_seconds', 'Total duration of a streamed completion', ['model'], buckets=DEFAULT_BUCKETS + (120.0, 300.0)
+)
+OPENROUTER_STREAM_BYTES = Counter('openrouter_stream_bytes_total', 'Bytes received from OpenRouter streams', ['model'])
+OPENROUTER_TOKENS_PER_SECOND = Histogram(
+    'openrouter_tokens_per_second', 'Completion tokens per second after the first token', ['model'], buckets=RATE_BUCKETS
+)
+
+# Chat, quotas, uploads and caches
+CHAT_MESSAGES = Counter('chat_messages_total', 'Messages handled by send_message', ['mode', 'outcome'])
+QUOTA_CHECK_SECONDS = Histogram('quota_check_duration_seconds', 'Duration of usage and quota checks', ['check'])
+UPLOAD_BYTES = Counter('upload_bytes_total', 'Bytes written by chunked uploads')
+UPLOAD_CHUNK_SECONDS = Histogram('upload_chunk_duration_seconds', 'Time to validate and store one upload chunk')
+UPLOADS_FINALIZED = Counter('uploads_finalized_total', 'Chunked uploads finalized', ['result'])
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result (hit, miss, bypass)', ['cache', 'result'])
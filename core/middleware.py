@@ -1,31 +1,143 @@
 """
 Middleware for optimizing subscription queries
 """
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from subscriptions.subscription_cache import SubscriptionResolver
+from . import metrics
+from .models import GlobalSettings
+from .rate_limit import DEFAULT_EXEMPT_PATHS, DEFAULT_WEIGHT, RateLimiter
 
 
 class SubscriptionMiddleware(MiddlewareMixin):
     """
-    Middleware to cache user subscription data to reduce database queries
+    Attach the user's subscription to the request lazily
+    
+    ``request.subscription`` is the active UserSubscription (or a proxy to None,
+    so test it for truthiness), resolved on first use with a single cached lookup.
+    Requests that never touch it cost nothing.
     """
     
     def process_request(self, request):
-        """
-        Cache subscription data in request object if user is authenticated
-        """
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            # Cache subscription type to avoid repeated database queries
-            try:
-                subscription_type = request.user.get_subscription_type()
-                request.cached_subscription_type = subscription_type
-            except Exception:
-                request.cached_subscription_type = None
-            
-            # Cache subscription info as well
-            try:
-                subscription_info = request.user.get_subscription_info()
-                request.cached_subscription_info = subscription_info
-            except Exception:
-                request.cached_subscription_info = None
+        request.subscription = SimpleLazyObject(lambda: SubscriptionResolver.get_subscription(request.user))
+        request.subscription_type = SimpleLazyObject(lambda: SubscriptionResolver.get_subscription_type(request.user))
+        # Backwards-compatible aliases of the previously precomputed attributes
+        request.cached_subscription_info = request.subscription
+        request.cached_subscription_type = request.subscription_type
+        return None
+
+
+class SlidingSessionMiddleware(MiddlewareMixin):
+    """
+    Sliding session expiry without a write on every request
+    
+    Authenticated sessions live for GlobalSettings.session_timeout_hours after
+    their last refresh. The session is only re-saved (which moves the expiry
+    forward) once less than SESSION_REFRESH_THRESHOLD of that lifetime remains,
+    so an active user causes a handful of session writes per day instead of one
+    per request. Must come after SessionMiddleware and AuthenticationMiddleware.
+    """
+    
+    REFRESHED_AT_KEY = '_session_refreshed_at'
+    
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        user = getattr(request, 'user', None)
+        if session is None or user is None or not user.is_authenticated:
+            return response
+        try:
+            timeout_seconds = GlobalSettings.get_settings().session_timeout_hours * 3600
+        except Exception:
+            return response
+        
+        now = int(time.time())
+        refreshed_at = session.get(self.REFRESHED_AT_KEY)
+        threshold = getattr(settings, 'SESSION_REFRESH_THRESHOLD', 0.5)
+        expiry_changed = session.get('_session_expiry') != timeout_seconds
+        if expiry_changed or refreshed_at is None or now - refreshed_at >= timeout_seconds * (1 - threshold):
+            # Marks the session modified; SessionMiddleware saves it with a new expiry date
+            session.set_expiry(timeout_seconds)
+            session[self.REFRESHED_AT_KEY] = now
+        return response
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Enforce GlobalSettings.api_requests_per_minute for every view
+    
+    Runs in process_view, before the view (and its quota checks) executes. Views
+    decorated with @rate_limit(weight=...) count as that many requests, others as one.
+    Must come after SessionMiddleware.
+    """
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        exempt_paths = getattr(settings, 'RATE_LIMIT_EXEMPT_PATHS', DEFAULT_EXEMPT_PATHS)
+        if request.path.startswith(tuple(exempt_paths)):
+            return None
+        weight = getattr(view_func, 'rate_limit_weight', DEFAULT_WEIGHT)
+        return RateLimiter.check_request(request, weight)
+
+
+KNOWN_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+
+def queue_wait_seconds(header, now=None):
+    """
+    Seconds since the proxy stamped X-Request-Start ("t=<seconds|ms|us>"), or None
+    """
+    if not header:
+        return None
+    try:
+        stamp = float(header.strip().removeprefix('t='))
+    except ValueError:
+        return None
+    # nginx $msec is seconds with a fraction; other proxies send milli- or microseconds
+    if stamp > 1e14:
+        stamp /= 1e6
+    elif stamp > 1e11:
+        stamp /= 1e3
+    return max(0.0, (now if now is not None else time.time()) - stamp)
+
+
+class MetricsMiddleware:
+    """
+    Per-view latency, response status and database query count for /metrics
+    
+    Queries are counted with an execute wrapper on every configured connection.
+    For streaming responses the latency ends when the view returns the response;
+    the stream itself is measured by OpenRouterService. Should come first.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        started = time.monotonic()
+        queue_wait = queue_wait_seconds(request.META.get('HTTP_X_REQUEST_START'))
+        if queue_wait is not None:
+            metrics.REQUEST_QUEUE_WAIT_SECONDS.observe(queue_wait)
+        
+        query_count = [0]
+        
+        def count_queries(execute, sql, params, many, context):
+            query_count[0] += 1
+            return execute(sql, params, many, context)
+        
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_queries))
+            response = self.get_response(request)
         
-        return None
\ No newline at end of file
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match else 'unresolved'
+        method = request.method if request.method in KNOWN_METHODS else 'other'
+        metrics.REQUEST_SECONDS.observe(time.monotonic() - started, view=view, method=method)
+        metrics.REQUESTS.inc(view=view, method=method, status=response.status_code)
+        metrics.DB_QUERIES.observe(query_count[0], view=view)
+        return response
@@ -100,7 +100,13 @@ class GlobalSettings(models.Model):
     
     @classmethod
     def get_settings(cls):
-        """Get the active global settings instance"""
+        """Get the active global settings instance from the in-process config cache"""
+        from .config_cache import ConfigCache
+        return ConfigCache.get('global_settings')
+    
+    @classmethod
+    def load_settings(cls):
+        """Load (or create) the active global settings instance from the database"""
         settings, created = cls.objects.get_or_create(
             is_active=True,
             defaults={
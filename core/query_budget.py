@@ -0,0 +1,83 @@
+"""
+سقف تعداد کوئری‌های هر درخواست
+Per-view query budgets.
+
+Hot views declare the most database queries a request may run with
+``@query_budget(n)``. The ceiling must not depend on the amount of data (a
+user with a thousand sessions costs as many queries as one with a single
+session), so a breach almost always means a new N+1 loop.
+
+- The query-budget tests (core/tests.py) run every budgeted view against small
+  and large fixtures and fail when it goes over its budget or its query count
+  grows with the data.
+- QueryBudgetMiddleware logs every request that goes over its view's budget. It
+  is only active with QUERY_BUDGET_CHECKS (defaults to DEBUG).
+
+    @login_required
+    @query_budget(8)
+    def get_user_sessions(request):
+        ...
+"""
+import logging
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def query_budget(max_queries):
+    """
+    Declare the most queries one call of the view may run
+    Works on function views and admin view methods, in any decorator position
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    """Declared budget of a (possibly decorated) view, or None"""
+    return getattr(view_func, 'query_budget', None)
+
+
+class QueryBudgetMiddleware:
+    """
+    Log requests that run more queries than their view's @query_budget
+
+    Enabled by QUERY_BUDGET_CHECKS (defaults to DEBUG). For streaming responses
+    only the queries run before the view returns are counted. Should come
+    right after MetricsMiddleware.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_CHECKS', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        statements = []
+
+        def record_query(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            response = self.get_response(request)
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        budget = get_query_budget(resolver_match.func) if resolver_match else None
+        if budget is not None and len(statements) > budget:
+            repeated_sql, repeats = Counter(statements).most_common(1)[0]
+            logger.warning(
+                f"Query budget exceeded: {resolver_match.view_name} ran {len(statements)} queries "
+                f"(budget {budget}) for {request.method} {request.path}; "
+                f"most repeated ({repeats}x): {repeated_sql[:300]}"
+            )
+        return response
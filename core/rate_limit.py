@@ -0,0 +1,141 @@
+"""
+محدودیت نرخ درخواست‌های API برای هر کاربر
+Per-user API rate limiting driven by GlobalSettings.api_requests_per_minute.
+
+A sliding-window counter: each user (or client IP for anonymous requests)
+may make ``api_requests_per_minute`` requests in any 60 seconds. The window is
+kept in the shared cache (CACHE_URL, required in production by core.E001, so
+all workers count against one limit) as two atomically incremented per-minute
+counters; the previous minute's count is weighted by how much of it still
+overlaps the last 60 seconds. Endpoints can count as more than one request
+(``@rate_limit(weight=5)``), and rejected requests are not counted.
+
+Identification uses the user id stored in the session, so rejected requests
+never load the user or run any quota query. Anonymous clients are told apart
+by their address behind the reverse proxy (core/client_ip.py).
+"""
+import logging
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import JsonResponse
+
+from .client_ip import get_client_ip
+from .config_cache import ConfigCache
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_PREFIX = 'ratelimit'
+RATE_LIMIT_WINDOW = 60
+DEFAULT_WEIGHT = 1
+# Paths never counted: admin, static files and media delivery
+DEFAULT_EXEMPT_PATHS = ('/admin/', '/static/', '/media/', '/chat/media/')
+
+# Used when the shared cache is unavailable, so limiting degrades to per-process
+_fallback_cache = LocMemCache('rate-limit-fallback', {})
+
+
+class RateLimiter:
+    """Sliding-window request counter on atomic cache counters"""
+
+    @staticmethod
+    def is_enabled():
+        return getattr(settings, 'RATE_LIMIT_ENABLED', True)
+
+    @staticmethod
+    def get_limit():
+        try:
+            return ConfigCache.get('global_settings').api_requests_per_minute
+        except Exception:
+            return 60
+
+    @staticmethod
+    def get_identity(request):
+        """'user:<id>' from the session without touching the database, else 'ip:<client address>'"""
+        session = getattr(request, 'session', None)
+        user_id = session.get(SESSION_KEY) if session is not None else None
+        if user_id:
+            return f"user:{user_id}"
+        return f"ip:{get_client_ip(request) or 'unknown'}"
+
+    @staticmethod
+    def consume(identity, weight, limit, now=None):
+        """
+        Count ``weight`` requests in the identity's window
+        Returns (allowed, retry_after_seconds)
+        """
+        now = time.time() if now is None else now
+        window = int(now // RATE_LIMIT_WINDOW)
+        elapsed = (now % RATE_LIMIT_WINDOW) / RATE_LIMIT_WINDOW
+        key = f"{RATE_LIMIT_PREFIX}:{identity}:{window}"
+        previous_key = f"{RATE_LIMIT_PREFIX}:{identity}:{window - 1}"
+
+        try:
+            return RateLimiter._consume(cache, key, previous_key, weight, limit, elapsed)
+        except Exception as e:
+            logger.warning(f"Rate limit cache unavailable, using process-local counters: {str(e)}")
+            return RateLimiter._consume(_fallback_cache, key, previous_key, weight, limit, elapsed)
+
+    @staticmethod
+    def _consume(backend, key, previous_key, weight, limit, elapsed):
+        backend.add(key, 0, RATE_LIMIT_WINDOW * 2)
+        used = backend.incr(key, weight)
+        previous = backend.get(previous_key, 0)
+        # Requests in the last 60 seconds: the part of the previous minute still inside the window
+        in_use = previous * (1 - elapsed) + used
+        if in_use <= limit:
+            return True, 0
+
+        backend.decr(key, weight)
+        # The weighted previous minute drops by limit/window requests per second
+        retry_after = (in_use - limit) / (limit / RATE_LIMIT_WINDOW) if limit > 0 else RATE_LIMIT_WINDOW
+        return False, max(1, math.ceil(retry_after))
+
+    @staticmethod
+    def check_request(request, weight):
+        """
+        Count a request once; returns a 429 response or None
+        Requests already counted (by the middleware or an outer decorator) pass through
+        """
+        if getattr(request, '_rate_limit_checked', False) or not RateLimiter.is_enabled():
+            return None
+        request._rate_limit_checked = True
+
+        identity = RateLimiter.get_identity(request)
+        limit = RateLimiter.get_limit()
+        # A request heavier than the whole window could never pass
+        allowed, retry_after = RateLimiter.consume(identity, min(weight, max(limit, 1)), limit)
+        if allowed:
+            return None
+
+        logger.warning(f"Rate limit exceeded for {identity} on {request.path}")
+        response = JsonResponse(
+            {'error': 'تعداد درخواست‌های شما بیش از حد مجاز است. لطفاً کمی بعد دوباره تلاش کنید.'},
+            status=429
+        )
+        response['Retry-After'] = str(retry_after)
+        return response
+
+
+def rate_limit(weight=DEFAULT_WEIGHT):
+    """
+    Count each call of the view as ``weight`` requests
+    With RateLimitMiddleware installed the middleware charges the weight before
+    any other view code runs; without it the decorator enforces the limit itself.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            rejected = RateLimiter.check_request(request, weight)
+            if rejected is not None:
+                return rejected
+            return view_func(request, *args, **kwargs)
+
+        wrapped_view.rate_limit_weight = weight
+        return wrapped_view
+    return decorator
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from ai_models.models import AIModel, WebSearchSettings
+from chatbot.models import Chatbot, DefaultChatSettings, LimitationMessage, SidebarMenuItem, VisionProcessingSettings
+from subscriptions.models import SubscriptionType
+from .config_cache import ConfigCache
+from .models import GlobalSettings
+
+# Cached configuration models, plus the models their snapshots embed through foreign keys
+CONFIG_MODELS = (
+    GlobalSettings,
+    LimitationMessage,
+    WebSearchSettings,
+    VisionProcessingSettings,
+    DefaultChatSettings,
+    SidebarMenuItem,
+    AIModel,
+    Chatbot,
+    SubscriptionType,
+)
+
+
+def invalidate_config_cache(sender, **kwargs):
+    """
+    Invalidate the configuration snapshot when an admin-managed row changes
+    Invalidated again after commit so other processes cannot cache pre-commit rows
+    """
+    if kwargs.get('action', 'post_').startswith('pre_'):
+        return
+    ConfigCache.invalidate()
+    transaction.on_commit(ConfigCache.invalidate)
+
+
+for config_model in CONFIG_MODELS:
+    post_save.connect(invalidate_config_cache, sender=config_model, dispatch_uid=f'config_cache_save_{config_model.__name__}')
+    post_delete.connect(invalidate_config_cache, sender=config_model, dispatch_uid=f'config_cache_delete_{config_model.__name__}')
+
+m2m_changed.connect(
+    invalidate_config_cache,
+    sender=WebSearchSettings.enabled_subscription_types.through,
+    dispatch_uid='config_cache_web_search_subscription_types'
+)
@@ -1,3 +1,419 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from ai_models.models import AIModel, ModelSubscription
+from chatbot.limitation_service import LimitationMessageService
+from chatbot.models import (
+    ChatMessage, ChatSession, Chatbot, LimitationMessage, MessageFile, OpenRouterRequestCost, UploadedFile,
+)
+from subscriptions.models import FinancialTransaction, SubscriptionType, UserSubscription
+from . import metrics
+from .admin_tools import EstimatedCountPaginator
+from .checks import check_session_cache, check_shared_cache
+from .config_cache import ConfigCache
+from .db_router import ReplicaRouter, ReplicaStickinessMiddleware, _wrote, sticky_key, use_replica
+from .models import GlobalSettings
+from .query_budget import QueryBudgetMiddleware, get_query_budget
+from .rate_limit import RateLimiter
+
+
+class ConfigCacheTestCase(TransactionTestCase):
+    # Snapshots are only taken outside transactions, so this needs real commits
+
+    def setUp(self):
+        ConfigCache.invalidate()
+
+    def tearDown(self):
+        ConfigCache.invalidate()
+
+    def test_reads_are_served_from_memory_until_a_save(self):
+        GlobalSettings.load_settings()
+        GlobalSettings.get_settings()
+        LimitationMessageService.get_token_limit_message()
+        with self.assertNumQueries(0):
+            self.assertEqual(GlobalSettings.get_settings().max_file_size_mb, 10)
+            self.assertEqual(LimitationMessageService.get_token_limit_message()['title'], 'محدودیت دسترسی')
+
+        LimitationMessage._default_manager.create(limitation_type='token_limit', title='Tokens', message='No more tokens')
+        settings = GlobalSettings.objects.get()
+        settings.max_file_size_mb = 3
+        settings.save()
+
+        self.assertEqual(GlobalSettings.get_settings().max_file_size_mb, 3)
+        self.assertEqual(LimitationMessageService.get_token_limit_message()['message'], 'No more tokens')
+
+    def test_cache_outage_reads_from_the_database(self):
+        GlobalSettings.get_settings()
+        with patch('core.config_cache.cache.get', side_effect=ConnectionError('cache down')):
+            ConfigCache.invalidate()
+            with self.assertNumQueries(1):
+                self.assertEqual(GlobalSettings.get_settings().max_file_size_mb, 10)
+            # Nothing is kept while the stamp cannot be checked
+            with self.assertNumQueries(1):
+                GlobalSettings.get_settings()
+
+
+class ConfigCacheTransactionTestCase(TestCase):
+    def test_reads_inside_a_transaction_bypass_the_snapshot(self):
+        settings = GlobalSettings.get_settings()
+        GlobalSettings.objects.filter(pk=settings.pk).update(max_file_size_mb=7)
+        self.assertEqual(GlobalSettings.get_settings().max_file_size_mb, 7)
+
+
+class SharedCacheCheckTestCase(SimpleTestCase):
+    def test_process_local_cache_is_refused_when_required(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379/0'}}
+        with override_settings(REQUIRE_SHARED_CACHE=True, CACHES=locmem):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['core.E001'])
+        with override_settings(REQUIRE_SHARED_CACHE=True, CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(REQUIRE_SHARED_CACHE=False, CACHES=locmem):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_cached_sessions_need_the_shared_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379/0'}}
+        cached_db = 'django.contrib.sessions.backends.cached_db'
+        with override_settings(SESSION_ENGINE=cached_db, CACHES=locmem):
+            self.assertEqual([warning.id for warning in check_session_cache(None)], ['core.W002'])
+        with override_settings(SESSION_ENGINE=cached_db, CACHES=redis):
+            self.assertEqual(check_session_cache(None), [])
+        self.assertEqual(settings.SESSION_ENGINE, 'django.contrib.sessions.backends.db')
+
+
+class SlidingSessionTestCase(TestCase):
+    def setUp(self):
+        settings = GlobalSettings.get_settings()
+        settings.session_timeout_hours = 2
+        settings.save()
+        user = get_user_model().objects.create_user(phone_number='+1234567896', password='testpass123', name='Session User')
+        self.client.force_login(user)
+        self.url = reverse('get_user_sessions')
+
+    def test_expiry_is_refreshed_only_below_threshold(self):
+        with patch('core.middleware.time.time', return_value=1_000_000):
+            self.client.get(self.url)
+        session = self.client.session
+        self.assertEqual(session.get_expiry_age(), 2 * 3600)
+        self.assertEqual(session['_session_refreshed_at'], 1_000_000)
+
+        # Half an hour later: more than half of the lifetime is left, nothing is written
+        with patch('core.middleware.time.time', return_value=1_000_000 + 1800):
+            self.client.get(self.url)
+        self.assertEqual(self.client.session['_session_refreshed_at'], 1_000_000)
+
+        with patch('core.middleware.time.time', return_value=1_000_000 + 3600):
+            self.client.get(self.url)
+        self.assertEqual(self.client.session['_session_refreshed_at'], 1_000_000 + 3600)
+
+
+class RateLimitTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        settings = GlobalSettings.get_settings()
+        settings.api_requests_per_minute = 5
+        settings.save()
+        user = get_user_model().objects.create_user(phone_number='+1234567897', password='testpass123', name='Busy User')
+        self.client.force_login(user)
+
+    def test_requests_over_the_limit_get_429_with_retry_after(self):
+        url = reverse('get_user_sessions')
+        with patch('core.rate_limit.time.time', return_value=6_000_000):
+            statuses = [self.client.get(url).status_code for _ in range(6)]
+            rejected = self.client.get(url)
+        self.assertEqual(statuses, [200] * 5 + [429])
+        self.assertEqual(rejected.status_code, 429)
+        # At 5 requests per minute the weighted window drops by one request every 12 seconds
+        self.assertEqual(rejected['Retry-After'], '12')
+
+    def test_weights_and_refill(self):
+        start = 6_000_000
+        self.assertEqual(RateLimiter.consume('user:test', 5, 5, now=start), (True, 0))
+        allowed, retry_after = RateLimiter.consume('user:test', 1, 5, now=start + 1)
+        self.assertFalse(allowed)
+        # Half a minute later only half of the previous minute is still inside the window
+        self.assertEqual(RateLimiter.consume('user:test', 2, 5, now=start + 60 + 30), (True, 0))
+
+
+    @override_settings(CLIENT_IP_HEADER='X-Forwarded-For', TRUSTED_PROXIES=['127.0.0.1', '10.0.0.0/8'])
+    def test_anonymous_clients_are_identified_behind_the_proxy(self):
+        factory = RequestFactory()
+
+        def identity(remote_addr, forwarded=None):
+            headers = {'HTTP_X_FORWARDED_FOR': forwarded} if forwarded else {}
+            return RateLimiter.get_identity(factory.get('/', REMOTE_ADDR=remote_addr, **headers))
+
+        self.assertEqual(identity('127.0.0.1', '203.0.113.7'), 'ip:203.0.113.7')
+        # Addresses the client prepends itself are skipped; trusted hops are walked through
+        self.assertEqual(identity('127.0.0.1', '1.2.3.4, 203.0.113.7, 10.0.0.5'), 'ip:203.0.113.7')
+        # The header is ignored from untrusted peers
+        self.assertEqual(identity('198.51.100.2', '203.0.113.7'), 'ip:198.51.100.2')
+        self.assertEqual(identity('127.0.0.1'), 'ip:127.0.0.1')
+
+
+class LargeTableAdminTestCase(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin_user = User.objects.create_superuser(phone_number='+1234567880', password='testpass123', name='Admin')
+        self.user = User.objects.create_user(phone_number='+1234567881', password='testpass123', name='Chat User')
+        chatbot = Chatbot._default_manager.create(name='Admin Bot', is_active=True)
+        session = ChatSession._default_manager.create(user=self.user, chatbot=chatbot, title='Admin')
+        for i in range(3):
+            ChatMessage._default_manager.create(session=session, message_type='user', content=f'message {i}')
+        self.client.force_login(self.admin_user)
+
+    def test_estimated_count_only_for_unfiltered_querysets(self):
+        with patch('core.admin_tools.estimated_row_count', return_value=5000000):
+            self.assertEqual(EstimatedCountPaginator(ChatMessage.objects.all(), 100).count, 5000000)
+            self.assertEqual(EstimatedCountPaginator(ChatMessage.objects.filter(message_type='user'), 100).count, 3)
+        # SQLite keeps no statistics, so the count is exact
+        self.assertEqual(EstimatedCountPaginator(ChatMessage.objects.all(), 100).count, 3)
+
+    def test_change_lists_with_user_autocomplete_filter(self):
+        url = reverse('admin:chatbot_chatmessage_changelist')
+        response = self.client.get(url, {'q': '+1234567881'})
+        self.assertContains(response, 'message 2')
+
+        url = reverse('admin:chatbot_chatsession_changelist')
+        response = self.client.get(url, {'user__id__exact': self.user.pk})
+        self.assertContains(response, 'data-field-name="user"')
+        self.assertContains(response, 'Chat User')
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'chatbot', 'model_name': 'chatsession', 'field_name': 'user', 'term': 'Chat',
+        })
+        self.assertEqual(response.json()['results'][0]['id'], str(self.user.pk))
+
+        for name in ('openrouterrequestcost', 'uploadedfile', 'uploadedimage', 'fileuploadusage', 'imagegenerationusage'):
+            response = self.client.get(reverse(f'admin:chatbot_{name}_changelist'), {'user__id__exact': self.user.pk})
+            self.assertEqual(response.status_code, 200)
+
+
+class ReplicaRouterTestCase(SimpleTestCase):
+    def test_only_opted_in_reads_use_the_replica(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(ChatMessage))
+        with patch.dict(settings.DATABASES, {'replica': settings.DATABASES['default']}):
+            self.assertIsNone(router.db_for_read(ChatMessage))
+            with use_replica():
+                self.assertEqual(router.db_for_read(ChatMessage), 'replica')
+                self.assertEqual(router.db_for_write(ChatMessage), 'default')
+                # A write earlier in the request pins the rest of it to the primary
+                token = _wrote.set(True)
+                self.assertEqual(router.db_for_read(ChatMessage), 'default')
+                _wrote.reset(token)
+
+
+@skipUnless('replica' in settings.DATABASES, 'Run with SQLITE_REPLICA=True to route between two SQLite files')
+class ReplicaRoutingTestCase(TransactionTestCase):
+    # Without a replica alias the class is skipped, but the runner still collects its databases
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+
+    def setUp(self):
+        cache.clear()
+        ConfigCache.invalidate()
+        # Created on first use otherwise, which would count as the request's own write
+        GlobalSettings.load_settings()
+        User = get_user_model()
+        self.user = User.objects.create_user(phone_number='+1234567882', password='testpass123', name='Replica User')
+        # Rows that only exist on the replica
+        self.user.save(using='replica', force_insert=True)
+        chatbot = Chatbot.objects.db_manager('replica').create(name='Replica Bot', is_active=True)
+        session = ChatSession.objects.db_manager('replica').create(user=self.user, chatbot=chatbot, title='Replica')
+        subscription_type = SubscriptionType.objects.db_manager('replica').create(name='Replica', sku='replica', price=1)
+        OpenRouterRequestCost.objects.db_manager('replica').create(
+            user=self.user, session=session, subscription_type=subscription_type, model_id='replica/model', model_name='replica/model', total_tokens=10,
+        )
+
+    def test_analytics_reads_hit_the_replica_until_the_user_writes(self):
+        self.assertFalse(OpenRouterRequestCost.objects.exists())
+        self.client.force_login(self.user)
+        url = reverse('user_openrouter_costs_data')
+        self.assertEqual(self.client.get(url).json()['summary']['total_requests'], 1)
+
+        # A request that writes makes the user's reads sticky to the primary
+        def write(request):
+            get_user_model().objects.filter(pk=self.user.pk).update(name='Renamed')
+            return HttpResponse()
+        request = RequestFactory().post('/')
+        request.user = self.user
+        ReplicaStickinessMiddleware(write)(request)
+        self.assertEqual(self.client.get(url).json()['summary']['total_requests'], 0)
+
+        cache.delete(sticky_key(self.user.pk))
+        self.assertEqual(self.client.get(url).json()['summary']['total_requests'], 1)
+
+
+class MetricsTestCase(TestCase):
+    def test_middleware_records_view_latency_and_queries(self):
+        before = metrics.REQUESTS.get(view='terms_and_conditions', method='GET', status=200)
+        response = self.client.get(reverse('terms_and_conditions'), HTTP_X_REQUEST_START=f't={time.time() - 0.05:.3f}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(metrics.REQUESTS.get(view='terms_and_conditions', method='GET', status=200), before + 1)
+        self.assertGreater(metrics.DB_QUERIES.count(view='terms_and_conditions'), 0)
+        self.assertGreater(metrics.REQUEST_QUEUE_WAIT_SECONDS.count(), 0)
+
+        with override_settings(METRICS_TOKEN='secret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_request_duration_seconds_bucket{view="terms_and_conditions",method="GET",le="+Inf"}', response.content.decode())
+
+    def test_endpoint_requires_the_token(self):
+        # Disabled without a token, even for requests from localhost
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 404)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_snapshots_of_all_processes_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROC_DIR=directory):
+            other_process = {'cache_requests_total': {
+                'type': 'counter', 'help': 'Cache lookups', 'labelnames': ['cache', 'result'],
+                'samples': {json.dumps(['config', 'hit']): 5},
+            }}
+            with open(os.path.join(directory, 'metrics-999999.json'), 'w') as snapshot_file:
+                json.dump(other_process, snapshot_file)
+            local = metrics.CACHE_REQUESTS.get(cache='config', result='hit')
+            output = metrics.render()
+        self.assertIn(f'cache_requests_total{{cache="config",result="hit"}} {local + 5}', output)
+
+
+# Budgets are for production, where the shared cache makes sessions cached_db
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class QueryBudgetTestCase(TestCase):
+    """
+    Hot views stay within their @query_budget, and their query count does not grow with the data
+    """
+    SMALL = 2
+    LARGE = 10
+
+    def setUp(self):
+        cache.clear()
+        GlobalSettings.get_settings()
+        self.gold = SubscriptionType._default_manager.create(name='Gold', sku='gold', price=1)
+        self.silver = SubscriptionType._default_manager.create(name='Silver', sku='silver', price=1)
+        self.user = get_user_model().objects.create_user(phone_number='+1234567896', password='testpass123', name='Budget User')
+        UserSubscription._default_manager.create(user=self.user, subscription_type=self.gold)
+        self.admin_user = get_user_model().objects.create_superuser(phone_number='+1234567897', password='testpass123', name='Admin')
+        self.free_model = AIModel._default_manager.create(
+            model_id='budget/free', name='Budget Free', is_active=True, is_free=True, model_type='text'
+        )
+        self.session = ChatSession._default_manager.create(user=self.user, ai_model=self.free_model, title='Budget')
+        self.created = 0
+        self._add_data(self.SMALL)
+        self.client.force_login(self.user)
+
+    def _add_data(self, count):
+        """Chatbots and models across subscription types, and sessions with messages, files and costs"""
+        for index in range(self.created, self.created + count):
+            subscription_type = self.gold if index % 2 else self.silver
+            chatbot = Chatbot._default_manager.create(name=f'Bot {index}', is_active=True)
+            chatbot.subscription_types.add(subscription_type)
+            model = AIModel._default_manager.create(
+                model_id=f'budget/premium-{index}', name=f'Premium {index}', is_active=True, is_free=False, model_type='text'
+            )
+            ModelSubscription._default_manager.create(ai_model=model).subscription_types.add(subscription_type)
+            session = ChatSession._default_manager.create(user=self.user, chatbot=chatbot, title=f'Session {index}')
+            for target in (session, self.session):
+                question = ChatMessage._default_manager.create(session=target, message_type='user', content=f'question {index}')
+                ChatMessage._default_manager.create(session=target, message_type='assistant', content=f'answer {index}')
+                uploaded_file = UploadedFile._default_manager.create(
+                    user=self.user, session=target, filename=f'budget-{index}-{target.pk}.txt',
+                    original_filename='notes.txt', mimetype='text/plain', size=1
+                )
+                MessageFile._default_manager.create(message=question, uploaded_file=uploaded_file)
+            OpenRouterRequestCost.objects.create(
+                user=self.user, session=session, subscription_type=self.gold, model_id=model.model_id,
+                model_name=model.name, prompt_tokens=10, completion_tokens=5, total_tokens=15,
+            )
+            FinancialTransaction._default_manager.create(
+                user=self.user, subscription_type=subscription_type, transaction_type='subscription_purchase',
+                amount=1000, authority=f'budget-{index}',
+            )
+        self.created += count
+
+    def _count_queries(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+            self.assertLess(response.status_code, 400)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return len(queries)
+
+    def assertWithinQueryBudget(self, url, request):
+        """
+        Cold requests (after new data invalidated the caches) stay within the budget,
+        and warm requests run as many queries on large data as on small data
+        """
+        budget = get_query_budget(resolve(url).func)
+        self.assertIsNotNone(budget, f'{url} declares no @query_budget')
+        cold_small = self._count_queries(request)
+        small = self._count_queries(request)
+        self._add_data(self.LARGE)
+        cold_large = self._count_queries(request)
+        large = self._count_queries(request)
+        self.assertLessEqual(max(cold_small, cold_large), budget)
+        self.assertEqual(large, small, f'{url}: query count grows with the data')
+
+    def test_chat_page(self):
+        url = reverse('chat')
+        self.assertWithinQueryBudget(url, lambda: self.client.get(url))
+
+    def test_sidebar_sessions(self):
+        url = reverse('get_user_sessions')
+        self.assertWithinQueryBudget(url, lambda: self.client.get(url, {'page_size': 50}))
+
+    def test_session_messages(self):
+        url = reverse('get_session_messages', args=[self.session.id])
+        self.assertWithinQueryBudget(url, lambda: self.client.get(url))
+
+    def test_dashboard(self):
+        url = reverse('dashboard')
+        self.assertWithinQueryBudget(url, lambda: self.client.get(url))
+
+    def test_reports_dashboard(self):
+        self.client.force_login(self.admin_user)
+        url = reverse('reports_admin:reports_dashboard')
+        self.assertWithinQueryBudget(url, lambda: self.client.get(url))
+
+    @patch('chatbot.views.OpenRouterService')
+    def test_send_message(self, mock_openrouter_service):
+        mock_openrouter_service.return_value.stream_text_response.side_effect = lambda *args, **kwargs: iter(['ok'])
+        url = reverse('send_message', args=[self.session.id])
+
+        def send():
+            return self.client.post(url, {'message': 'hello'})
+
+        # The session's first reply also generates its title; the budget covers later replies
+        b''.join(send().streaming_content)
+        self.assertWithinQueryBudget(url, send)
+
+    @override_settings(QUERY_BUDGET_CHECKS=True)
+    def test_middleware_logs_requests_over_budget(self):
+        request = RequestFactory().get(reverse('get_user_sessions'))
+        request.resolver_match = resolve(request.path)
+        budget = get_query_budget(request.resolver_match.func)
+
+        def view(request):
+            for _ in range(budget + 1):
+                GlobalSettings.objects.exists()
+            return HttpResponse()
+
+        with self.assertLogs('core.query_budget', 'WARNING') as logs:
+            QueryBudgetMiddleware(view)(request)
+        self.assertIn(f'get_user_sessions ran {budget + 1} queries (budget {budget})', logs.output[0])
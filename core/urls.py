@@ -8,4 +8,5 @@ urlpatterns = [
     path('terms-and-conditions/', views.terms_and_conditions, name='terms_and_conditions'),
     path('sidebar-menu-items/', views.get_sidebar_menu_items, name='get_sidebar_menu_items'),
     path('random-advertising-banner/', views.get_random_advertising_banner, name='get_random_advertising_banner'),
+    path('metrics', views.metrics_endpoint, name='metrics'),
 ]
@@ -1,13 +1,20 @@
+import hmac
+
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.db.models import Count
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.core.paginator import Paginator
 from django.apps import apps
 from django.urls import reverse
 from subscriptions.services import UsageService
 from subscriptions.usage_stats import UserUsageStatsService
+from django.conf import settings
+from . import metrics
+from .config_cache import ConfigCache
+from .db_router import use_replica
+from .query_budget import query_budget
 from .models import TermsAndConditions
 from chatbot.models import SidebarMenuItem
 
@@ -18,6 +25,7 @@ def home(request):
     return redirect('login')
 
 @login_required
+@query_budget(24)
 def dashboard(request):
     """
     Dashboard page view with real-time user information
@@ -37,48 +45,50 @@ def dashboard(request):
     except UserSubscription.DoesNotExist:
         user_subscription = None
     
-    # Get user's chat sessions count
-    session_count = ChatSession.objects.filter(
-        user=request.user,
-        is_active=True
-    ).count()
+    # Statistics are read-only and may come from the read replica
+    with use_replica():
+        # Get user's chat sessions count
+        session_count = ChatSession.objects.filter(
+            user=request.user,
+            is_active=True
+        ).count()
     
-    # Get user's message count
-    message_count = ChatMessage.objects.filter(
-        session__user=request.user
-    ).count()
+        # Get user's message count
+        message_count = ChatMessage.objects.filter(
+            session__user=request.user
+        ).count()
     
-    # Get user's last activity (last message time)
-    last_message = ChatMessage.objects.filter(
-        session__user=request.user
-    ).order_by('-created_at').first()
+        # Get user's last activity (last message time)
+        last_message = ChatMessage.objects.filter(
+            session__user=request.user
+        ).order_by('-created_at').first()
     
-    last_activity = last_message.created_at if last_message else request.user.date_joined
+        last_activity = last_message.created_at if last_message else request.user.date_joined
     
-    # Get user's recent sessions (last 5)
-    recent_sessions = ChatSession.objects.filter(
-        user=request.user,
-        is_active=True
-    ).order_by('-updated_at')[:5]
+        # Get user's recent sessions (last 5)
+        recent_sessions = list(ChatSession.objects.filter(
+            user=request.user,
+            is_active=True
+        ).select_related('chatbot').order_by('-updated_at')[:5])
     
-    # Get user's recent financial transactions (last 5)
-    recent_transactions = FinancialTransaction.objects.filter(
-        user=request.user
-    ).order_by('-created_at')[:5]
+        # Get user's recent financial transactions (last 5)
+        recent_transactions = list(FinancialTransaction.objects.filter(
+            user=request.user
+        ).order_by('-created_at')[:5])
     
-    # Get comprehensive usage statistics
-    usage_stats = UserUsageStatsService.get_user_usage_statistics(request.user)
-    usage_summary = UserUsageStatsService.get_usage_summary_for_dashboard(request.user)
-    usage_cards = UserUsageStatsService.get_usage_cards_data(request.user)
+        # Get comprehensive usage statistics
+        usage_stats = UserUsageStatsService.get_user_usage_statistics(request.user)
+        usage_summary = UserUsageStatsService.get_usage_summary_for_dashboard(request.user, usage_stats)
+        usage_cards = UserUsageStatsService.get_usage_cards_data(request.user, usage_stats)
     
-    # Get user's token usage information (for backward compatibility)
-    user_tokens_used = 0
-    if user_subscription:
-        # Calculate total tokens used using the new ChatSessionUsage method
-        total_tokens_used, free_model_tokens_used = UsageService.get_user_total_tokens_from_chat_sessions(
-            request.user, user_subscription.subscription_type
-        )
-        user_tokens_used = total_tokens_used
+        # Get user's token usage information (for backward compatibility)
+        user_tokens_used = 0
+        if user_subscription:
+            # Calculate total tokens used from the usage ledger
+            total_tokens_used, free_model_tokens_used = UsageService.get_user_total_tokens_from_chat_sessions(
+                request.user, user_subscription.subscription_type
+            )
+            user_tokens_used = total_tokens_used
     
     context = {
         'user_subscription': user_subscription,
@@ -249,10 +259,8 @@ def get_sidebar_menu_items(request):
         return JsonResponse({'error': 'Invalid request method'}, status=400)
     
     try:
-        SidebarMenuItem = apps.get_model('chatbot', 'SidebarMenuItem')
-        
         # Get all active menu items ordered by display order
-        menu_items = SidebarMenuItem.objects.filter(is_active=True).order_by('order')
+        menu_items = ConfigCache.get('sidebar_menu_items')
         
         # Filter items based on user permissions and authentication status
         user_menu_items = []
@@ -293,4 +301,19 @@ def get_sidebar_menu_items(request):
         })
         
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def metrics_endpoint(request):
+    """
+    شاخص‌های عملکرد با قالب متنی Prometheus
+    Prometheus scrape endpoint. Requires the METRICS_TOKEN bearer token; without a
+    configured token the endpoint does not exist (behind a local reverse proxy
+    every request would look like it came from localhost).
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
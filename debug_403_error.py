@@ -113,17 +113,18 @@ def debug_403_error(user_id, model_id=None):
         print(f"محدودیت ماهانه: {subscription.monthly_max_tokens:,}")
         
         # 8. بررسی usage records اخیر
-        from subscriptions.models import UserUsage
-        recent_usage = UserUsage.objects.filter(
+        from chatbot.models import OpenRouterRequestCost
+        recent_usage = OpenRouterRequestCost.objects.filter(
             user=user, 
             subscription_type=subscription,
             created_at__gte=timezone.now() - timedelta(hours=24)
-        ).order_by('-created_at')[:5]
+        ).counted().order_by('-created_at')[:5]
         
         print(f"\n--- استفاده‌های اخیر (24 ساعت گذشته) ---")
         if recent_usage:
             for usage in recent_usage:
-                print(f"{usage.created_at.strftime('%H:%M:%S')}: {usage.messages_count} پیام, {usage.tokens_count} توکن")
+                tokens = usage.total_tokens if usage.is_free_model else usage.effective_cost_tokens
+                print(f"{usage.created_at.strftime('%H:%M:%S')}: {usage.messages_count} پیام, {tokens} توکن")
         else:
             print("هیچ استفاده‌ای در 24 ساعت گذشته ثبت نشده")
         
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 from decouple import config, Csv
+from django.core.exceptions import ImproperlyConfigured
 
 # Import dj_database_url at the top for better error handling
 try:
@@ -66,12 +67,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",  # First, so latency and query counts cover the whole stack
+    "core.query_budget.QueryBudgetMiddleware",  # Only active with QUERY_BUDGET_CHECKS (DEBUG)
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.db_router.ReplicaStickinessMiddleware",  # Read-your-writes for use_replica() reads
     "core.middleware.SubscriptionMiddleware",  # Custom middleware for subscription caching
+    "core.middleware.SlidingSessionMiddleware",  # Session expiry from GlobalSettings.session_timeout_hours
+    "core.middleware.RateLimitMiddleware",  # GlobalSettings.api_requests_per_minute, before any view code
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -151,6 +157,65 @@ else:
         }
     }
 
+# Optional read replica for analytics and statistics reads. Only code wrapped in
+# core.db_router.use_replica() reads from it, and a user's own writes keep their
+# reads on the primary for REPLICA_STICKY_SECONDS.
+default_engine = DATABASES["default"]["ENGINE"]
+if config("MYSQL_REPLICA_HOST", default=None) and default_engine == "django.db.backends.mysql":
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": config("MYSQL_REPLICA_HOST"),
+        "PORT": config("MYSQL_REPLICA_PORT", default=DATABASES["default"]["PORT"]),
+        "USER": config("MYSQL_REPLICA_USER", default=DATABASES["default"]["USER"]),
+        "PASSWORD": config("MYSQL_REPLICA_PASSWORD", default=DATABASES["default"]["PASSWORD"]),
+        "TEST": {**DATABASES["default"]["TEST"], "MIRROR": "default"},
+    }
+elif config("DATABASE_REPLICA_URL", default=None) and dj_database_url and default_engine != "django.db.backends.sqlite3":
+    DATABASES["replica"] = {
+        **dj_database_url.parse(config("DATABASE_REPLICA_URL")),
+        "TEST": {"MIRROR": "default"},
+    }
+elif config("SQLITE_REPLICA", default=False, cast=bool) and default_engine == "django.db.backends.sqlite3":
+    # Two independent SQLite files, so the routing can be exercised offline:
+    #   SQLITE_REPLICA=True python manage.py test core.tests.ReplicaRoutingTestCase
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db_replica.sqlite3",
+        # Tables are created from the models; the data migrations only target the primary
+        "TEST": {"MIGRATE": False},
+    }
+
+DATABASE_ROUTERS = ["core.db_router.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=10, cast=int)
+
+# Cache shared by every worker process (CACHE_URL: redis://host:6379/0 or memcached://host:11211).
+# The configuration and access-matrix version stamps, cached subscriptions and the
+# rate-limit counters must be seen by all workers, so production refuses to start
+# without it (system check core.E001; REQUIRE_SHARED_CACHE=False for a single process).
+CACHE_URL = config("CACHE_URL", default="")
+if CACHE_URL.startswith(("redis://", "rediss://", "unix://")):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+            "KEY_PREFIX": config("CACHE_KEY_PREFIX", default="mobixai"),
+        }
+    }
+elif CACHE_URL.startswith("memcached://"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": CACHE_URL[len("memcached://"):].split(","),
+            "KEY_PREFIX": config("CACHE_KEY_PREFIX", default="mobixai"),
+        }
+    }
+elif CACHE_URL:
+    raise ImproperlyConfigured("CACHE_URL must start with redis://, rediss://, unix:// or memcached://")
+else:
+    # Process-local: only correct with a single worker process (development, tests)
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+REQUIRE_SHARED_CACHE = config("REQUIRE_SHARED_CACHE", default=not DEBUG, cast=bool)
+
 # Logging configuration
 LOGGING = {
     "version": 1,
@@ -292,6 +357,14 @@ ZARINPAL_SANDBOX = config("ZARINPAL_SANDBOX", default=True, cast=bool)
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# User files are delivered by chatbot.views.serve_media after an ownership check;
+# the web server must not serve MEDIA_ROOT's uploaded_files/, uploads/ and image_uploads/
+# at MEDIA_URL (Django's own /media/ route skips them).
+# "nginx" answers with X-Accel-Redirect to MEDIA_ACCEL_REDIRECT_PREFIX (an internal
+# location aliased to MEDIA_ROOT), "apache" with X-Sendfile, "django" with FileResponse.
+MEDIA_DELIVERY_BACKEND = config("MEDIA_DELIVERY_BACKEND", default="django")
+MEDIA_ACCEL_REDIRECT_PREFIX = config("MEDIA_ACCEL_REDIRECT_PREFIX", default="/protected-media/")
+
 # Production Security Settings
 if not DEBUG:
     # Security settings for production
@@ -314,8 +387,43 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 
 # Session settings
-SESSION_COOKIE_AGE = 1209600  # 2 weeks
-SESSION_SAVE_EVERY_REQUEST = True
+# cached_db reads sessions from the cache and writes through to the database only when
+# a session changes; SlidingSessionMiddleware refreshes the expiry instead of saving the
+# session on every request (see `manage.py benchmark_session_writes`). It is only used
+# with the shared cache: a logout on one worker could not remove another worker's
+# process-local copy, which would keep the logged-out cookie valid (core.W002).
+SESSION_ENGINE = config(
+    "SESSION_ENGINE",
+    default="django.contrib.sessions.backends.cached_db" if CACHE_URL else "django.contrib.sessions.backends.db",
+)
+SESSION_COOKIE_AGE = 1209600  # 2 weeks (authenticated sessions use GlobalSettings.session_timeout_hours)
+SESSION_SAVE_EVERY_REQUEST = False
+# Re-save a session once less than this fraction of its lifetime remains
+SESSION_REFRESH_THRESHOLD = config("SESSION_REFRESH_THRESHOLD", default=0.5, cast=float)
+
+# API rate limiting (limit per user and minute: GlobalSettings.api_requests_per_minute)
+RATE_LIMIT_ENABLED = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+RATE_LIMIT_EXEMPT_PATHS = ["/admin/", "/static/", "/media/", "/chat/media/"]
+# Client address behind the reverse proxy: CLIENT_IP_HEADER (X-Forwarded-For or X-Real-IP)
+# is only trusted for requests coming from TRUSTED_PROXIES (addresses or networks)
+CLIENT_IP_HEADER = config("CLIENT_IP_HEADER", default="X-Forwarded-For")
+TRUSTED_PROXIES = config("TRUSTED_PROXIES", default="127.0.0.1,::1", cast=Csv())
+
+# Usage reservations (subscriptions.reservations): a request's estimated usage counts
+# towards the quotas from the quota check until its reply is recorded, at most this long
+USAGE_RESERVATION_SECONDS = config("USAGE_RESERVATION_SECONDS", default=600, cast=int)
+# Completion tokens assumed for a reply when the model has no recent replies to average
+USAGE_RESERVATION_COMPLETION_TOKENS = config("USAGE_RESERVATION_COMPLETION_TOKENS", default=500, cast=int)
+
+# Metrics (/metrics, Prometheus text format). With several Gunicorn workers point
+# METRICS_MULTIPROC_DIR at a directory shared by them and empty it on start.
+METRICS_MULTIPROC_DIR = config("METRICS_MULTIPROC_DIR", default=config("PROMETHEUS_MULTIPROC_DIR", default=""))
+METRICS_FLUSH_SECONDS = config("METRICS_FLUSH_SECONDS", default=5, cast=int)
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without a token /metrics is disabled
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Log requests that run more queries than their view's @query_budget (core.query_budget)
+QUERY_BUDGET_CHECKS = config("QUERY_BUDGET_CHECKS", default=DEBUG, cast=bool)
 
 # CSRF settings
 CSRF_COOKIE_SECURE = not DEBUG
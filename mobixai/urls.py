@@ -16,9 +16,12 @@ Including another URLconf
 """
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.static import serve
+from chatbot.media_delivery import PROTECTED_SUBDIRS
+import re
 from reports.admin import reports_admin_site
 import os
 from django.http import HttpResponse
@@ -59,7 +62,16 @@ urlpatterns = [
     path('sitemap-articles.xml', articles_sitemap, name='sitemap-articles'),
 ]
 
-# Serve media and static files during development
+# Serve media and static files during development. User files (PROTECTED_SUBDIRS)
+# are only reachable through chatbot.views.serve_media, after an ownership check.
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [
+        re_path(
+            r'^%s(?!(?:%s)/)(?P<path>.*)$' % (
+                re.escape(settings.MEDIA_URL.lstrip('/')), '|'.join(map(re.escape, PROTECTED_SUBDIRS))
+            ),
+            serve,
+            {'document_root': settings.MEDIA_ROOT},
+        ),
+    ]
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
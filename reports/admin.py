@@ -1,12 +1,13 @@
 from django.contrib import admin
 from django.urls import path
 from django.shortcuts import render
-from django.db.models import Sum, Count, Avg
-from django.apps import apps
 from django.contrib.admin import AdminSite
 from django.contrib.auth.models import User as DjangoUser
 from accounts.models import User
 from django.contrib.auth.admin import UserAdmin
+from core.query_budget import query_budget
+from .models import ReportFactState
+from .services import GRANULARITIES, ReportService
 
 
 class ReportsAdminSite(AdminSite):
@@ -21,6 +22,7 @@ class ReportsAdminSite(AdminSite):
         ]
         return custom_urls + urls
 
+    @query_budget(16)
     def reports_dashboard(self, request):
         # Check if user is superuser
         if not request.user.is_superuser:
@@ -28,91 +30,33 @@ class ReportsAdminSite(AdminSite):
             from django.http import HttpResponseForbidden
             return HttpResponseForbidden("Access denied. Superuser access required.")
         
-        # Get models using apps.get_model
-        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
-        AIModel = apps.get_model('ai_models', 'AIModel')
-        ChatSession = apps.get_model('chatbot', 'ChatSession')
-        Chatbot = apps.get_model('chatbot', 'Chatbot')
+        start_date, end_date, granularity = ReportService.parse_range(
+            request.GET.get('start'), request.GET.get('end'), request.GET.get('granularity')
+        )
         
         context = dict(
             self.each_context(request),
+            start_date=start_date,
+            end_date=end_date,
+            granularity=granularity,
+            granularities=GRANULARITIES,
+            fact_state=ReportFactState.objects.filter(pk=1).first(),
         )
         
         try:
-            # 1. Top users by OpenRouter cost
-            top_users_cost = OpenRouterRequestCost.objects.values(
-                'user__name',
-                'user__phone_number'
-            ).annotate(
-                total_cost=Sum('total_cost_usd'),
-                total_tokens=Sum('total_tokens'),
-                request_count=Count('id')
-            ).order_by('-total_cost')[:10]
-            
-            context['top_users_cost'] = list(top_users_cost)
-            
-            # 2. Top users by free model usage
-            free_models = AIModel.objects.filter(is_free=True).values_list('model_id', flat=True)
-            top_free_users = OpenRouterRequestCost.objects.filter(
-                model_id__in=free_models
-            ).values(
-                'user__name',
-                'user__phone_number'
-            ).annotate(
-                total_tokens=Sum('total_tokens'),
-                request_count=Count('id')
-            ).order_by('-total_tokens')[:10]
-            
-            context['top_free_users'] = list(top_free_users)
-            
-            # 3. Average token usage
-            avg_tokens = OpenRouterRequestCost.objects.aggregate(
-                avg_tokens=Avg('total_tokens')
-            )
-            
-            context['avg_tokens_per_request'] = avg_tokens['avg_tokens'] or 0
-            
-            # 4. Top chatbots by usage
-            top_chatbots = ChatSession.objects.values(
-                'chatbot__name'
-            ).annotate(
-                session_count=Count('id'),
-                total_messages=Count('messages')
-            ).order_by('-session_count')[:10]
-            
-            context['top_chatbots'] = list(top_chatbots)
-            
-            # 5. Top AI models by usage
-            top_models = OpenRouterRequestCost.objects.values(
-                'model_name'
-            ).annotate(
-                usage_count=Count('id'),
-                total_tokens=Sum('total_tokens'),
-                total_cost=Sum('total_cost_usd')
-            ).order_by('-usage_count')[:10]
-            
-            context['top_models'] = list(top_models)
-            
-            # 6. Top free AI models usage
-            top_free_models = OpenRouterRequestCost.objects.filter(
-                model_name__in=AIModel.objects.filter(is_free=True).values_list('name', flat=True)
-            ).values(
-                'model_name'
-            ).annotate(
-                usage_count=Count('id'),
-                total_tokens=Sum('total_tokens')
-            ).order_by('-usage_count')[:10]
-            
-            context['top_free_models'] = list(top_free_models)
+            # All reports come from the daily facts maintained by refresh_report_facts
+            context.update(ReportService.get_dashboard(start_date, end_date, granularity))
             
         except Exception as e:
             # Handle timezone or other database errors gracefully
+            context['time_series'] = []
             context['top_users_cost'] = []
             context['top_free_users'] = []
             context['avg_tokens_per_request'] = 0
             context['top_chatbots'] = []
             context['top_models'] = []
             context['top_free_models'] = []
+            context['model_latency'] = []
             context['report_error'] = str(e)
         
         return render(request, 'reports/dashboard.html', context)
@@ -0,0 +1,191 @@
+"""
+خروجی جریانی دفاتر هزینه و مصرف
+Streaming CSV/JSONL exports of the cost and usage ledgers.
+
+Rows are read in keyset batches (pk > last pk, ordered by pk, chunk_size rows
+per query) and encoded one at a time, optionally through an incremental gzip
+compressor, so memory use does not depend on the number of exported rows. A
+plain .iterator() would not do: PyMySQL has no server-side cursors and Django
+buffers the whole MySQL result set on the client. The same generators back the admin
+actions (StreamingHttpResponse) and the export_ledger management command.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.apps import apps
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_CHUNK_SIZE = 2000
+# gzip container (wbits 16 + 15) written incrementally
+GZIP_WBITS = 31
+
+# Exported ledgers: model, columns (values_list paths) and the fields used by the filters
+LEDGERS = {
+    'openrouter_costs': {
+        'model': ('chatbot', 'OpenRouterRequestCost'),
+        'fields': (
+            'id', 'created_at', 'user_id', 'user__phone_number', 'session_id', 'subscription_type__name',
+            'model_id', 'model_name', 'request_type', 'cached', 'prompt_tokens', 'completion_tokens',
+            'total_tokens', 'token_cost_multiplier', 'effective_cost_tokens', 'cost_per_million_tokens',
+            'total_cost_usd', 'request_started_at', 'time_to_first_token_ms', 'duration_ms', 'tokens_per_second',
+            'upstream_status', 'retry_count', 'provider',
+        ),
+        'date_field': 'created_at',
+        'model_field': 'model_id',
+    },
+    # Quota usage is a projection of the cost ledger
+    'user_usage': {
+        'model': ('chatbot', 'OpenRouterRequestCost'),
+        'fields': (
+            'id', 'created_at', 'user_id', 'user__phone_number', 'subscription_type__name', 'session_id',
+            'model_id', 'request_type', 'is_free_model', 'messages_count', 'total_tokens', 'effective_cost_tokens',
+            'excluded_from_quota',
+        ),
+        'date_field': 'created_at',
+        'model_field': 'model_id',
+    },
+    'financial_transactions': {
+        'model': ('subscriptions', 'FinancialTransaction'),
+        'fields': (
+            'id', 'created_at', 'user_id', 'user__phone_number', 'subscription_type__name', 'transaction_type',
+            'status', 'amount', 'original_amount', 'discount_amount', 'discount_code__code', 'authority',
+            'reference_id',
+        ),
+        'date_field': 'created_at',
+        'model_field': None,
+    },
+}
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands back each written line"""
+
+    def write(self, value):
+        return value
+
+
+class LedgerExportService:
+    """Filtered, chunked and streamed ledger exports"""
+
+    @staticmethod
+    def get_queryset(ledger, start=None, end=None, user_id=None, model_id=None, queryset=None):
+        """
+        Ledger rows filtered by [start, end) dates, user and AI model
+        ``queryset`` narrows an existing selection (e.g. the admin changelist)
+        """
+        spec = LEDGERS[ledger]
+        if queryset is None:
+            queryset = apps.get_model(*spec['model']).objects.all()
+        date_field = spec['date_field']
+        if start:
+            queryset = queryset.filter(**{f'{date_field}__gte': start})
+        if end:
+            queryset = queryset.filter(**{f'{date_field}__lt': end})
+        if user_id:
+            queryset = queryset.filter(user_id=user_id)
+        if model_id:
+            if not spec['model_field']:
+                raise ValueError(f'{ledger} cannot be filtered by model')
+            queryset = queryset.filter(**{spec['model_field']: model_id})
+        return queryset
+
+    @staticmethod
+    def iter_rows(ledger, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+        """Tuples of the ledger's columns in primary-key order, one keyset query per chunk"""
+        fields = LEDGERS[ledger]['fields']
+        rows = queryset.order_by('pk').values_list(*fields)
+        last_pk = None
+        while True:
+            batch = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+            batch = list(batch[:chunk_size])
+            yield from batch
+            if len(batch) < chunk_size:
+                return
+            # Every ledger's first column is its primary key
+            last_pk = batch[-1][0]
+
+    @staticmethod
+    def iter_encoded(ledger, rows, export_format):
+        """Encoded lines (bytes): a CSV header then one line per row, or one JSON object per line"""
+        fields = LEDGERS[ledger]['fields']
+        if export_format == 'csv':
+            writer = csv.writer(_LineBuffer())
+            yield writer.writerow(fields).encode('utf-8')
+            for row in rows:
+                yield writer.writerow(row).encode('utf-8')
+        elif export_format == 'jsonl':
+            for row in rows:
+                record = {field: _json_value(value) for field, value in zip(fields, row)}
+                yield (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        else:
+            raise ValueError(f'Unsupported export format: {export_format}')
+
+    @staticmethod
+    def iter_gzip(chunks):
+        """Compress a stream of byte chunks into one gzip stream on the fly"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    @staticmethod
+    def iter_export(ledger, queryset, export_format, compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+        chunks = LedgerExportService.iter_encoded(
+            ledger, LedgerExportService.iter_rows(ledger, queryset, chunk_size), export_format
+        )
+        return LedgerExportService.iter_gzip(chunks) if compress else chunks
+
+    @staticmethod
+    def filename(ledger, export_format, compress=False):
+        name = f"{ledger}-{timezone.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+        return f'{name}.gz' if compress else name
+
+    @staticmethod
+    def streaming_response(ledger, queryset, export_format, compress=False):
+        """StreamingHttpResponse downloading the export as an attachment"""
+        content_type = 'text/csv; charset=utf-8' if export_format == 'csv' else 'application/x-ndjson; charset=utf-8'
+        if compress:
+            content_type = 'application/gzip'
+        response = StreamingHttpResponse(
+            LedgerExportService.iter_export(ledger, queryset, export_format, compress),
+            content_type=content_type,
+        )
+        filename = LedgerExportService.filename(ledger, export_format, compress)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+def make_export_action(ledger, export_format, compress=False):
+    """Admin action streaming the selected (or all filtered) rows of a ledger"""
+    def export_action(modeladmin, request, queryset):
+        return LedgerExportService.streaming_response(ledger, queryset, export_format, compress)
+
+    suffix = ' (gzip)' if compress else ''
+    export_action.__name__ = f"export_{export_format}{'_gzip' if compress else ''}"
+    export_action.short_description = f'Export selected as {export_format.upper()}{suffix}'
+    return export_action
+
+
+def export_actions(ledger):
+    """CSV and JSONL export actions, plain and gzipped"""
+    return [
+        make_export_action(ledger, export_format, compress)
+        for export_format in EXPORT_FORMATS
+        for compress in (False, True)
+    ]
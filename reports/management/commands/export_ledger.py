@@ -0,0 +1,65 @@
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, LEDGERS, LedgerExportService
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream a cost or usage ledger (openrouter_costs, user_usage, financial_transactions) as CSV or '
+        'JSONL, optionally gzipped, to a file or stdout. Rows are read in chunks so memory use stays '
+        'constant, e.g. export_ledger openrouter_costs --month 2025-06 --gzip -o costs-2025-06.csv.gz'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ledger', choices=sorted(LEDGERS))
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help='Output format (default: csv)')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--month', help='Export one calendar month (YYYY-MM)')
+        parser.add_argument('--start', help='First day to export (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Day after the last exported day (YYYY-MM-DD)')
+        parser.add_argument('--user', type=int, help='Only rows of this user id')
+        parser.add_argument('--model', help='Only rows of this AI model id (openrouter_costs only)')
+        parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help=f'Rows fetched per database round trip (default: {EXPORT_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        start, end = self.parse_range(options)
+        try:
+            queryset = LedgerExportService.get_queryset(
+                options['ledger'], start=start, end=end, user_id=options['user'], model_id=options['model']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks = LedgerExportService.iter_export(
+            options['ledger'], queryset, options['format'], options['gzip'], options['chunk_size']
+        )
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Exported {options['ledger']} to {options['output']}"))
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+
+    def parse_range(self, options):
+        try:
+            if options['month']:
+                start = datetime.strptime(options['month'], '%Y-%m')
+                end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+                return start, end
+            start = datetime.strptime(options['start'], '%Y-%m-%d') if options['start'] else None
+            end = datetime.strptime(options['end'], '%Y-%m-%d') if options['end'] else None
+            return start, end
+        except ValueError:
+            raise CommandError('--month must be YYYY-MM and --start/--end YYYY-MM-DD')
@@ -0,0 +1,57 @@
+import logging
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.services import ReportFactService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the daily report facts (user x model x request type usage, chatbot sessions and '
+        'messages) from the last refreshed day through today. Run it from cron, e.g. every 15 minutes; '
+        'the first run backfills all history.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days-back',
+            type=int,
+            default=1,
+            help='Also rebuild this many days before the watermark to pick up late rows (default: 1)',
+        )
+        parser.add_argument(
+            '--since',
+            help='Rebuild from this date (YYYY-MM-DD) instead of the watermark',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild all history',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+
+        try:
+            result = ReportFactService.refresh_incremental(
+                days_back=max(options['days_back'], 0), since=since, full=options['full']
+            )
+        except Exception as e:
+            logger.error(f"Error refreshing report facts: {str(e)}")
+            raise CommandError(f'Error refreshing report facts: {e}')
+
+        if result is None:
+            self.stdout.write('No usage data to aggregate')
+            return
+        start_date, end_date, usage_rows, chatbot_rows = result
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {start_date}..{end_date}: {usage_rows} usage facts, {chatbot_rows} chatbot facts'
+        ))
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('chatbot', '0049_openrouter_cost_created_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportFactState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_refreshed_date', models.DateField(blank=True, help_text='Last day whose facts were rebuilt', null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Report Fact State',
+                'verbose_name_plural': 'Report Fact State',
+                'db_table': 'report_fact_state',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyChatbotFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('sessions_started', models.PositiveIntegerField(default=0)),
+                ('messages_count', models.PositiveIntegerField(default=0)),
+                ('chatbot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_facts', to='chatbot.chatbot')),
+            ],
+            options={
+                'verbose_name': 'Daily Chatbot Fact',
+                'verbose_name_plural': 'Daily Chatbot Facts',
+                'db_table': 'report_daily_chatbot_facts',
+                'indexes': [models.Index(fields=['date', 'chatbot'], name='report_chatbot_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyUsageFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('model_id', models.CharField(help_text='OpenRouter model ID', max_length=100)),
+                ('model_name', models.CharField(help_text='Human-readable model name', max_length=200)),
+                ('request_type', models.CharField(max_length=20)),
+                ('request_count', models.PositiveIntegerField(default=0)),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('completion_tokens', models.BigIntegerField(default=0)),
+                ('total_tokens', models.BigIntegerField(default=0)),
+                ('total_cost_usd', models.DecimalField(decimal_places=6, default=0, max_digits=16)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage_facts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Usage Fact',
+                'verbose_name_plural': 'Daily Usage Facts',
+                'db_table': 'report_daily_usage_facts',
+                'indexes': [models.Index(fields=['date', 'model_id'], name='report_usage_date_model_idx')],
+                'unique_together': {('date', 'user', 'model_id', 'request_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyModelLatencyFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('model_id', models.CharField(help_text='OpenRouter model ID', max_length=100)),
+                ('model_name', models.CharField(help_text='Human-readable model name', max_length=200)),
+                ('request_count', models.PositiveIntegerField(default=0, help_text='Requests with timing data')),
+                ('ttft_buckets', models.JSONField(default=list, help_text='Requests per time-to-first-token bucket')),
+                ('duration_buckets', models.JSONField(default=list, help_text='Requests per total duration bucket')),
+                ('tokens_per_second_sum', models.FloatField(default=0)),
+                ('tokens_per_second_count', models.PositiveIntegerField(default=0)),
+                ('retry_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Daily Model Latency Fact',
+                'verbose_name_plural': 'Daily Model Latency Facts',
+                'db_table': 'report_daily_model_latency_facts',
+                'unique_together': {('date', 'model_id')},
+            },
+        ),
+    ]
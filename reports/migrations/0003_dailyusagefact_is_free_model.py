@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+def rebuild_facts(apps, schema_editor):
+    # Existing facts have no free/paid split; the next refresh_report_facts run rebuilds them all
+    ReportFactState = apps.get_model('reports', 'ReportFactState')
+    ReportFactState.objects.update(last_refreshed_date=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_daily_model_latency_fact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyusagefact',
+            name='is_free_model',
+            field=models.BooleanField(default=False, help_text="The ledger rows' free/paid flag at request time"),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyusagefact',
+            unique_together={('date', 'user', 'model_id', 'request_type', 'is_free_model')},
+        ),
+        migrations.RunPython(rebuild_facts, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,106 @@
 from django.db import models
+from django.conf import settings
 
-# This app doesn't need any models as it's just for reporting
-# But we need this file for Django to recognize the app
\ No newline at end of file
+
+class DailyUsageFact(models.Model):
+    """
+    آمار روزانه مصرف هر کاربر به تفکیک مدل و نوع درخواست
+    Daily user x model x request_type x free/paid aggregate of OpenRouterRequestCost rows.
+    Filled by the refresh_report_facts command; the reports dashboard reads only these rows.
+    """
+    date = models.DateField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_usage_facts')
+    model_id = models.CharField(max_length=100, help_text="OpenRouter model ID")
+    model_name = models.CharField(max_length=200, help_text="Human-readable model name")
+    request_type = models.CharField(max_length=20)
+    is_free_model = models.BooleanField(default=False, help_text="The ledger rows' free/paid flag at request time")
+    request_count = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    total_tokens = models.BigIntegerField(default=0)
+    total_cost_usd = models.DecimalField(max_digits=16, decimal_places=6, default=0)
+
+    def __str__(self):
+        return f"{self.date} - {self.user_id} - {self.model_id} - {self.request_type}"
+
+    class Meta:
+        db_table = 'report_daily_usage_facts'
+        unique_together = ('date', 'user', 'model_id', 'request_type', 'is_free_model')
+        indexes = [
+            models.Index(fields=['date', 'model_id'], name='report_usage_date_model_idx'),
+        ]
+        verbose_name = "Daily Usage Fact"
+        verbose_name_plural = "Daily Usage Facts"
+
+
+class DailyChatbotFact(models.Model):
+    """
+    آمار روزانه جلسات و پیام‌های هر چت‌بات
+    Daily sessions started and messages sent per chatbot (null: sessions without a chatbot)
+    """
+    date = models.DateField()
+    chatbot = models.ForeignKey('chatbot.Chatbot', on_delete=models.CASCADE, null=True, blank=True, related_name='daily_facts')
+    sessions_started = models.PositiveIntegerField(default=0)
+    messages_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} - {self.chatbot_id}"
+
+    class Meta:
+        db_table = 'report_daily_chatbot_facts'
+        indexes = [
+            models.Index(fields=['date', 'chatbot'], name='report_chatbot_date_idx'),
+        ]
+        verbose_name = "Daily Chatbot Fact"
+        verbose_name_plural = "Daily Chatbot Facts"
+
+
+class DailyModelLatencyFact(models.Model):
+    """
+    هیستوگرام روزانه تأخیر هر مدل
+    Daily per-model latency histograms of the timed OpenRouterRequestCost rows.
+    Bucket counts (see reports.services.LATENCY_BUCKETS_MS) add up over any date
+    range, so the dashboard derives p50/p95 without reading the request log.
+    """
+    date = models.DateField()
+    model_id = models.CharField(max_length=100, help_text="OpenRouter model ID")
+    model_name = models.CharField(max_length=200, help_text="Human-readable model name")
+    request_count = models.PositiveIntegerField(default=0, help_text="Requests with timing data")
+    ttft_buckets = models.JSONField(default=list, help_text="Requests per time-to-first-token bucket")
+    duration_buckets = models.JSONField(default=list, help_text="Requests per total duration bucket")
+    tokens_per_second_sum = models.FloatField(default=0)
+    tokens_per_second_count = models.PositiveIntegerField(default=0)
+    retry_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} - {self.model_id}"
+
+    class Meta:
+        db_table = 'report_daily_model_latency_facts'
+        unique_together = ('date', 'model_id')
+        verbose_name = "Daily Model Latency Fact"
+        verbose_name_plural = "Daily Model Latency Facts"
+
+
+class ReportFactState(models.Model):
+    """
+    واترمارک به‌روزرسانی جداول آماری
+    Watermark of the refresh_report_facts command: facts are complete up to last_refreshed_date
+    """
+    last_refreshed_date = models.DateField(null=True, blank=True, help_text="Last day whose facts were rebuilt")
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Report facts refreshed through {self.last_refreshed_date}"
+
+    @classmethod
+    def get_state(cls):
+        """Get the single persisted watermark"""
+        state, created = cls.objects.get_or_create(pk=1)
+        return state
+
+    class Meta:
+        db_table = 'report_fact_state'
+        verbose_name = "Report Fact State"
+        verbose_name_plural = "Report Fact State"
@@ -0,0 +1,368 @@
+"""
+سرویس گزارشات مبتنی بر جداول آماری روزانه
+Reports built from pre-aggregated daily facts.
+
+ReportFactService rebuilds the facts of a date range from the raw
+OpenRouterRequestCost, ChatSession and ChatMessage rows (one GROUP BY per
+table over that range only). ReportService answers the dashboard from the
+facts, so a report over any date range touches a few thousand fact rows
+instead of the whole request log.
+
+Upstream latency is kept as per-day, per-model bucket counts: percentiles do
+not add up across days, histograms do. Changing LATENCY_BUCKETS_MS requires a
+full refresh (``refresh_report_facts --full``).
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from core.db_router import use_replica
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+DEFAULT_GRANULARITY = 'day'
+DEFAULT_RANGE_DAYS = 30
+TOP_N = 10
+FACT_BATCH_SIZE = 1000
+
+# Upper bounds of the latency histogram buckets; one more bucket counts slower requests
+LATENCY_BUCKETS_MS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 30000, 60000, 120000)
+
+
+def _bucket_counts(field):
+    """Count() aggregates of ``field`` per LATENCY_BUCKETS_MS bucket, keyed by bucket index"""
+    aggregates = {}
+    lower = None
+    for index, upper in enumerate(LATENCY_BUCKETS_MS + (None,)):
+        condition = Q(**{f'{field}__isnull': False})
+        if lower is not None:
+            condition &= Q(**{f'{field}__gt': lower})
+        if upper is not None:
+            condition &= Q(**{f'{field}__lte': upper})
+        aggregates[f'{field}_{index}'] = Count('id', filter=condition)
+        lower = upper
+    return aggregates
+
+
+def histogram_percentile(buckets, quantile):
+    """
+    Percentile (ms) of LATENCY_BUCKETS_MS bucket counts, interpolated within the bucket
+    None without observations; the slowest bucket reports its lower bound
+    """
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = quantile * total
+    cumulative = 0
+    lower = 0
+    for index, count in enumerate(buckets):
+        if count and cumulative + count >= rank:
+            if index >= len(LATENCY_BUCKETS_MS):
+                return LATENCY_BUCKETS_MS[-1]
+            upper = LATENCY_BUCKETS_MS[index]
+            return round(lower + (upper - lower) * (rank - cumulative) / count)
+        cumulative += count
+        if index < len(LATENCY_BUCKETS_MS):
+            lower = LATENCY_BUCKETS_MS[index]
+    return LATENCY_BUCKETS_MS[-1]
+
+
+class ReportFactService:
+    """Incremental rebuild of the daily fact tables"""
+
+    @staticmethod
+    def earliest_source_date():
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        ChatSession = apps.get_model('chatbot', 'ChatSession')
+        candidates = [
+            OpenRouterRequestCost.objects.aggregate(first=Min('created_at'))['first'],
+            ChatSession.objects.aggregate(first=Min('created_at'))['first'],
+        ]
+        candidates = [value.date() for value in candidates if value]
+        return min(candidates) if candidates else None
+
+    @staticmethod
+    def refresh(start_date, end_date):
+        """
+        Rebuild the facts of [start_date, end_date] from the source tables
+        Days are replaced as a whole, so a refresh can be repeated safely
+        Returns (usage_fact_rows, chatbot_fact_rows)
+        """
+        DailyUsageFact = apps.get_model('reports', 'DailyUsageFact')
+        DailyChatbotFact = apps.get_model('reports', 'DailyChatbotFact')
+        DailyModelLatencyFact = apps.get_model('reports', 'DailyModelLatencyFact')
+        range_start = datetime.combine(start_date, time.min)
+        range_end = datetime.combine(end_date + timedelta(days=1), time.min)
+
+        usage_facts = ReportFactService._usage_facts(range_start, range_end)
+        chatbot_facts = ReportFactService._chatbot_facts(range_start, range_end)
+        latency_facts = ReportFactService._latency_facts(range_start, range_end)
+
+        with transaction.atomic():
+            DailyUsageFact.objects.filter(date__gte=start_date, date__lte=end_date).delete()
+            DailyChatbotFact.objects.filter(date__gte=start_date, date__lte=end_date).delete()
+            DailyModelLatencyFact.objects.filter(date__gte=start_date, date__lte=end_date).delete()
+            DailyUsageFact.objects.bulk_create(usage_facts, batch_size=FACT_BATCH_SIZE)
+            DailyChatbotFact.objects.bulk_create(chatbot_facts, batch_size=FACT_BATCH_SIZE)
+            DailyModelLatencyFact.objects.bulk_create(latency_facts, batch_size=FACT_BATCH_SIZE)
+
+        logger.info(
+            f"Rebuilt report facts for {start_date}..{end_date}: "
+            f"{len(usage_facts)} usage rows, {len(chatbot_facts)} chatbot rows, {len(latency_facts)} latency rows"
+        )
+        return len(usage_facts), len(chatbot_facts)
+
+    @staticmethod
+    def _usage_facts(range_start, range_end):
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        DailyUsageFact = apps.get_model('reports', 'DailyUsageFact')
+        # Only settled rows: a reservation still holds an estimate
+        rows = OpenRouterRequestCost.objects.filter(
+            created_at__gte=range_start, created_at__lt=range_end, reserved_until__isnull=True
+        ).annotate(day=TruncDate('created_at')).values(
+            'day', 'user_id', 'model_id', 'request_type', 'is_free_model'
+        ).annotate(
+            model_name=Max('model_name'),
+            request_count=Count('id'),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+            total_tokens=Sum('total_tokens'),
+            total_cost_usd=Sum('total_cost_usd'),
+        ).order_by()
+        return [
+            DailyUsageFact(
+                date=row['day'],
+                user_id=row['user_id'],
+                model_id=row['model_id'],
+                model_name=row['model_name'],
+                request_type=row['request_type'],
+                is_free_model=row['is_free_model'],
+                request_count=row['request_count'],
+                prompt_tokens=row['prompt_tokens'] or 0,
+                completion_tokens=row['completion_tokens'] or 0,
+                total_tokens=row['total_tokens'] or 0,
+                total_cost_usd=row['total_cost_usd'] or 0,
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def _latency_facts(range_start, range_end):
+        """Per-day, per-model histograms of the upstream requests that carry timing data"""
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        DailyModelLatencyFact = apps.get_model('reports', 'DailyModelLatencyFact')
+        bucket_count = len(LATENCY_BUCKETS_MS) + 1
+        rows = OpenRouterRequestCost.objects.filter(
+            created_at__gte=range_start, created_at__lt=range_end, cached=False, duration_ms__isnull=False
+        ).annotate(day=TruncDate('created_at')).values('day', 'model_id').annotate(
+            model_name=Max('model_name'),
+            request_count=Count('id'),
+            tokens_per_second_sum=Sum('tokens_per_second'),
+            tokens_per_second_count=Count('tokens_per_second'),
+            retry_count=Sum('retry_count'),
+            **_bucket_counts('time_to_first_token_ms'),
+            **_bucket_counts('duration_ms'),
+        ).order_by()
+        return [
+            DailyModelLatencyFact(
+                date=row['day'],
+                model_id=row['model_id'],
+                model_name=row['model_name'],
+                request_count=row['request_count'],
+                ttft_buckets=[row[f'time_to_first_token_ms_{index}'] for index in range(bucket_count)],
+                duration_buckets=[row[f'duration_ms_{index}'] for index in range(bucket_count)],
+                tokens_per_second_sum=row['tokens_per_second_sum'] or 0,
+                tokens_per_second_count=row['tokens_per_second_count'],
+                retry_count=row['retry_count'] or 0,
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def _chatbot_facts(range_start, range_end):
+        ChatSession = apps.get_model('chatbot', 'ChatSession')
+        ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+        DailyChatbotFact = apps.get_model('reports', 'DailyChatbotFact')
+
+        facts = {}
+        sessions = ChatSession.objects.filter(
+            created_at__gte=range_start, created_at__lt=range_end
+        ).annotate(day=TruncDate('created_at')).values('day', 'chatbot_id').annotate(count=Count('id')).order_by()
+        for row in sessions:
+            facts[(row['day'], row['chatbot_id'])] = DailyChatbotFact(
+                date=row['day'], chatbot_id=row['chatbot_id'], sessions_started=row['count']
+            )
+
+        messages = ChatMessage.objects.filter(
+            created_at__gte=range_start, created_at__lt=range_end
+        ).annotate(day=TruncDate('created_at')).values('day', 'session__chatbot_id').annotate(count=Count('id')).order_by()
+        for row in messages:
+            key = (row['day'], row['session__chatbot_id'])
+            if key not in facts:
+                facts[key] = DailyChatbotFact(date=row['day'], chatbot_id=row['session__chatbot_id'])
+            facts[key].messages_count = row['count']
+        return list(facts.values())
+
+    @staticmethod
+    def refresh_incremental(days_back=1, since=None, full=False):
+        """
+        Rebuild from the watermark (minus ``days_back`` days for late rows) through today
+        Returns (start_date, end_date, usage_fact_rows, chatbot_fact_rows) or None when there is no data
+        """
+        ReportFactState = apps.get_model('reports', 'ReportFactState')
+        state = ReportFactState.get_state()
+        today = timezone.now().date()
+
+        if since:
+            start_date = since
+        elif state.last_refreshed_date and not full:
+            start_date = state.last_refreshed_date - timedelta(days=days_back)
+        else:
+            start_date = ReportFactService.earliest_source_date()
+        if start_date is None:
+            return None
+
+        usage_rows, chatbot_rows = ReportFactService.refresh(start_date, today)
+        state.last_refreshed_date = today
+        state.last_run_at = timezone.now()
+        state.save()
+        return start_date, today, usage_rows, chatbot_rows
+
+
+class ReportService:
+    """Dashboard reports computed from the daily facts"""
+
+    @staticmethod
+    def parse_range(start_value, end_value, granularity):
+        """Validated (start_date, end_date, granularity); defaults to the last DEFAULT_RANGE_DAYS days"""
+        today = timezone.now().date()
+        try:
+            end_date = datetime.strptime(end_value, '%Y-%m-%d').date() if end_value else today
+        except ValueError:
+            end_date = today
+        try:
+            start_date = datetime.strptime(start_value, '%Y-%m-%d').date() if start_value else None
+        except ValueError:
+            start_date = None
+        if start_date is None or start_date > end_date:
+            start_date = end_date - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+        if granularity not in GRANULARITIES:
+            granularity = DEFAULT_GRANULARITY
+        return start_date, end_date, granularity
+
+    @staticmethod
+    def _model_latency(start_date, end_date, top_n):
+        """p50/p95 time to first token and duration, tokens per second and retries of the busiest models"""
+        DailyModelLatencyFact = apps.get_model('reports', 'DailyModelLatencyFact')
+        models = {}
+        facts = DailyModelLatencyFact.objects.filter(date__gte=start_date, date__lte=end_date).values(
+            'model_id', 'model_name', 'request_count', 'ttft_buckets', 'duration_buckets',
+            'tokens_per_second_sum', 'tokens_per_second_count', 'retry_count',
+        )
+        for fact in facts:
+            model = models.setdefault(fact['model_id'], {
+                'model_name': fact['model_name'], 'request_count': 0, 'retry_count': 0,
+                'tokens_per_second_sum': 0, 'tokens_per_second_count': 0,
+                'ttft_buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                'duration_buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            })
+            for key in ('request_count', 'retry_count', 'tokens_per_second_sum', 'tokens_per_second_count'):
+                model[key] += fact[key]
+            for key in ('ttft_buckets', 'duration_buckets'):
+                model[key] = [total + count for total, count in zip(model[key], fact[key])]
+
+        busiest = sorted(models.values(), key=lambda model: model['request_count'], reverse=True)[:top_n]
+        return [
+            {
+                'model_name': model['model_name'],
+                'request_count': model['request_count'],
+                'ttft_p50_ms': histogram_percentile(model['ttft_buckets'], 0.5),
+                'ttft_p95_ms': histogram_percentile(model['ttft_buckets'], 0.95),
+                'duration_p50_ms': histogram_percentile(model['duration_buckets'], 0.5),
+                'duration_p95_ms': histogram_percentile(model['duration_buckets'], 0.95),
+                'avg_tokens_per_second': (
+                    model['tokens_per_second_sum'] / model['tokens_per_second_count']
+                    if model['tokens_per_second_count'] else None
+                ),
+                'retry_count': model['retry_count'],
+            }
+            for model in busiest
+        ]
+
+    @staticmethod
+    @use_replica()
+    def get_dashboard(start_date, end_date, granularity=DEFAULT_GRANULARITY, top_n=TOP_N):
+        DailyUsageFact = apps.get_model('reports', 'DailyUsageFact')
+        DailyChatbotFact = apps.get_model('reports', 'DailyChatbotFact')
+
+        usage = DailyUsageFact.objects.filter(date__gte=start_date, date__lte=end_date)
+        # Free/paid as recorded on the ledger, not the model's current flag
+        free_usage = usage.filter(is_free_model=True)
+        trunc = GRANULARITIES[granularity]
+
+        time_series = list(
+            usage.annotate(period=trunc('date')).values('period').annotate(
+                request_count=Sum('request_count'),
+                total_tokens=Sum('total_tokens'),
+                total_cost=Sum('total_cost_usd'),
+                active_users=Count('user', distinct=True),
+            ).order_by('period')
+        )
+
+        # Bar width relative to the busiest period
+        busiest = max((point['request_count'] or 0 for point in time_series), default=0)
+        for point in time_series:
+            point['share'] = round(100 * (point['request_count'] or 0) / busiest) if busiest else 0
+
+        totals = usage.aggregate(request_count=Sum('request_count'), total_tokens=Sum('total_tokens'))
+        request_count = totals['request_count'] or 0
+
+        return {
+            'time_series': time_series,
+            'top_users_cost': list(
+                usage.values('user__name', 'user__phone_number').annotate(
+                    total_cost=Sum('total_cost_usd'),
+                    total_tokens=Sum('total_tokens'),
+                    request_count=Sum('request_count'),
+                ).order_by('-total_cost')[:top_n]
+            ),
+            'top_free_users': list(
+                free_usage.values('user__name', 'user__phone_number').annotate(
+                    total_tokens=Sum('total_tokens'),
+                    request_count=Sum('request_count'),
+                ).order_by('-total_tokens')[:top_n]
+            ),
+            'avg_tokens_per_request': (totals['total_tokens'] or 0) / request_count if request_count else 0,
+            'top_chatbots': list(
+                DailyChatbotFact.objects.filter(date__gte=start_date, date__lte=end_date).values(
+                    'chatbot__name'
+                ).annotate(
+                    session_count=Sum('sessions_started'),
+                    total_messages=Sum('messages_count'),
+                ).order_by('-session_count')[:top_n]
+            ),
+            'top_models': list(
+                usage.values('model_name').annotate(
+                    usage_count=Sum('request_count'),
+                    total_tokens=Sum('total_tokens'),
+                    total_cost=Sum('total_cost_usd'),
+                ).order_by('-usage_count')[:top_n]
+            ),
+            'top_free_models': list(
+                free_usage.values('model_name').annotate(
+                    usage_count=Sum('request_count'),
+                    total_tokens=Sum('total_tokens'),
+                ).order_by('-usage_count')[:top_n]
+            ),
+            'model_latency': ReportService._model_latency(start_date, end_date, top_n),
+        }
@@ -0,0 +1,104 @@
+import gzip
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from ai_models.models import AIModel
+from chatbot.models import ChatMessage, ChatSession, Chatbot, OpenRouterRequestCost
+from subscriptions.models import SubscriptionType
+from .models import DailyChatbotFact, DailyModelLatencyFact, DailyUsageFact, ReportFactState
+from .exports import LedgerExportService
+from .services import LATENCY_BUCKETS_MS, ReportFactService, ReportService, histogram_percentile
+
+User = get_user_model()
+
+
+class ReportDataMixin:
+    def setUp(self):
+        self.user = User.objects.create_user(phone_number='+1234567897', password='testpass123', name='Report User')
+        self.subscription_type = SubscriptionType._default_manager.create(name='Gold', sku='gold', price=1)
+        AIModel._default_manager.create(model_id='free/model', name='Free', is_active=True, is_free=True, model_type='text')
+        self.chatbot = Chatbot._default_manager.create(name='Report Bot', is_active=True)
+        self.session = ChatSession._default_manager.create(user=self.user, chatbot=self.chatbot, title='Report')
+        ChatMessage._default_manager.create(session=self.session, message_type='user', content='hello')
+        self.now = timezone.now()
+        for days_ago, model_id in ((0, 'free/model'), (0, 'free/model'), (3, 'paid/model')):
+            OpenRouterRequestCost.objects.create(
+                user=self.user, session=self.session, subscription_type=self.subscription_type,
+                model_id=model_id, model_name=model_id, is_free_model=model_id == 'free/model', prompt_tokens=10, completion_tokens=5, total_tokens=15,
+                total_cost_usd=Decimal('0.5'), created_at=self.now - timedelta(days=days_ago),
+                time_to_first_token_ms=400, duration_ms=1200, tokens_per_second=20, upstream_status=200,
+            )
+
+
+class ReportFactTestCase(ReportDataMixin, TestCase):
+    def test_incremental_refresh_and_dashboard(self):
+        ReportFactService.refresh_incremental()
+        self.assertEqual(ReportFactState.get_state().last_refreshed_date, self.now.date())
+        self.assertEqual(DailyUsageFact.objects.count(), 2)
+        self.assertEqual(DailyUsageFact.objects.get(model_id='free/model').request_count, 2)
+        self.assertEqual(DailyChatbotFact.objects.get(chatbot=self.chatbot).messages_count, 1)
+
+        # Re-running rebuilds the recent days without double counting
+        ReportFactService.refresh_incremental()
+        self.assertEqual(DailyUsageFact.objects.get(model_id='free/model').request_count, 2)
+
+        # The free/paid split follows the ledger, not the model's current flag
+        AIModel._default_manager.filter(model_id='free/model').update(is_free=False)
+        dashboard = ReportService.get_dashboard(self.now.date() - timedelta(days=1), self.now.date())
+        self.assertEqual(len(dashboard['time_series']), 1)
+        self.assertEqual(dashboard['time_series'][0]['request_count'], 2)
+        self.assertEqual(dashboard['top_free_models'][0]['usage_count'], 2)
+        self.assertEqual(dashboard['top_chatbots'][0]['chatbot__name'], 'Report Bot')
+        self.assertEqual(dashboard['avg_tokens_per_request'], 15)
+
+        latency = {row['model_name']: row for row in dashboard['model_latency']}
+        self.assertEqual(latency['free/model']['request_count'], 2)
+        self.assertTrue(250 < latency['free/model']['ttft_p50_ms'] <= 500)
+        self.assertTrue(1000 < latency['free/model']['duration_p95_ms'] <= 1500)
+        self.assertEqual(latency['free/model']['avg_tokens_per_second'], 20)
+        self.assertEqual(DailyModelLatencyFact.objects.get(model_id='paid/model').request_count, 1)
+
+    def test_histogram_percentile(self):
+        buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.assertIsNone(histogram_percentile(buckets, 0.5))
+        buckets[0], buckets[1] = 50, 50
+        self.assertEqual(histogram_percentile(buckets, 0.5), 100)
+        self.assertEqual(histogram_percentile(buckets, 0.95), 235)
+        buckets[-1] = 1000
+        self.assertEqual(histogram_percentile(buckets, 0.95), LATENCY_BUCKETS_MS[-1])
+
+
+class LedgerExportTestCase(ReportDataMixin, TestCase):
+    def test_streamed_csv_jsonl_and_gzip(self):
+        queryset = LedgerExportService.get_queryset('openrouter_costs', model_id='free/model')
+        lines = b''.join(LedgerExportService.iter_export('openrouter_costs', queryset, 'csv')).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('id,created_at,user_id'))
+
+        jsonl = b''.join(LedgerExportService.iter_export('openrouter_costs', queryset, 'jsonl')).decode().splitlines()
+        self.assertEqual(json.loads(jsonl[0])['total_cost_usd'], '0.500000')
+
+        compressed = b''.join(LedgerExportService.iter_export('openrouter_costs', queryset, 'jsonl', compress=True))
+        self.assertEqual(gzip.decompress(compressed).decode().splitlines(), jsonl)
+
+    def test_keyset_batches(self):
+        queryset = LedgerExportService.get_queryset('openrouter_costs')
+        expected = list(queryset.order_by('pk').values_list('pk', flat=True))
+        with self.assertNumQueries(len(expected) // 2 + 1):
+            rows = list(LedgerExportService.iter_rows('openrouter_costs', queryset, chunk_size=2))
+        self.assertEqual([row[0] for row in rows], expected)
+
+    def test_admin_action_streams(self):
+        admin_user = User.objects.create_superuser(phone_number='+1234567898', password='testpass123', name='Admin')
+        self.client.force_login(admin_user)
+        response = self.client.post('/admin/chatbot/openrouterrequestcost/', {
+            'action': 'export_csv_gzip',
+            '_selected_action': list(OpenRouterRequestCost.objects.values_list('pk', flat=True)),
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(gzip.decompress(b''.join(response.streaming_content)).splitlines()), 4)
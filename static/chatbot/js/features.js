@@ -28,101 +28,113 @@ function toggleWebSearch() {
     }
 }
 
-// Check if user has access to web search functionality in welcome area (no session yet)
-function checkWebSearchAccessForWelcome() {
-    // Make a request to check if user has access to web search functionality
-    fetch('/chat/web-search-access/')
-        .then(response => response.json())
-        .then(data => {
-            const webSearchBtn = document.getElementById('welcome-web-search-btn');
-            const webSearchContainer = document.getElementById('welcome-web-search-container');
-            
-            if (!webSearchBtn || !webSearchContainer) return;
-            
-            // Show the web search container
-            webSearchContainer.style.display = 'block';
-            
-            if (data.has_access) {
-                // User has access, enable the button
-                webSearchBtn.disabled = false;
-                webSearchBtn.classList.remove('btn-secondary');
-                webSearchBtn.classList.add('btn-outline-secondary');
-                webSearchBtn.innerHTML = '<i class="fas fa-search"></i> جستجو وب';
-                webSearchBtn.title = 'فعال کردن جستجو وب';
-            } else {
-                // User doesn't have access, disable the button and show special message
-                webSearchBtn.disabled = true;
-                webSearchBtn.classList.remove('btn-outline-secondary');
-                webSearchBtn.classList.add('btn-secondary');
-                webSearchBtn.innerHTML = '<i class="fas fa-search"></i> جستجو وب (فقط برای اشتراک ویژه)';
-                webSearchBtn.title = 'این ویژگی فقط برای کاربران با اشتراک ویژه در دسترس است';
+// Refresh the quota status after something may have changed it (e.g. a sent message)
+// and re-apply the feature buttons that depend on it
+function refreshQuotaStatus() {
+    return fetch(CHAT_URLS.quotaStatus)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Quota status request failed with status ${response.status}`);
             }
+            return response.json();
         })
-        .catch(error => {
-            console.error('Error checking web search access:', error);
-            // Hide the web search container if there's an error
-            const webSearchContainer = document.getElementById('welcome-web-search-container');
-            if (webSearchContainer) {
-                webSearchContainer.style.display = 'none';
-            }
-        });
-}
-
-// Check if user has access to web search functionality
-function checkWebSearchAccess(sessionId) {
-    fetch(`/chat/session/${sessionId}/web-search-access/`)
-        .then(response => response.json())
         .then(data => {
-            const webSearchBtn = document.getElementById('web-search-btn');
-            if (!webSearchBtn) return;
-            
-            // Check if this is an image editing chatbot
-            const sessionData = JSON.parse(localStorage.getItem(`session_${sessionId}`) || '{}');
-            if (sessionData.chatbot_type === 'image_editing') {
-                // Hide web search for image editing chatbots
-                webSearchBtn.style.display = 'none';
-                return;
-            }
-            
-            if (data.has_access) {
-                // User has access, show the button
-                webSearchBtn.style.display = 'inline-block';
-                
-                // Restore web search state for this session
-                const webSearchState = sessionStorage.getItem(`webSearch_${sessionId}`);
-                if (webSearchState === 'true') {
-                    // Enable web search
-                    webSearchBtn.classList.remove('btn-outline-secondary');
-                    webSearchBtn.classList.add('btn-success');
-                    webSearchBtn.innerHTML = '<i class="fas fa-search"></i>';
-                    webSearchBtn.title = 'غیرفعال کردن جستجو وب';
-                } else {
-                    // Disable web search
-                    webSearchBtn.classList.remove('btn-success');
-                    webSearchBtn.classList.add('btn-outline-secondary');
-                    webSearchBtn.innerHTML = '<i class="fas fa-search"></i>';
-                    webSearchBtn.title = 'فعال کردن جستجو وب';
-                }
+            chatQuotaStatus = data;
+            if (currentSessionId) {
+                applyFeatureAccess(currentSessionId);
             } else {
-                // User doesn't have access, show button as disabled with appropriate message
-                webSearchBtn.style.display = 'inline-block';
-                webSearchBtn.classList.remove('btn-outline-secondary', 'btn-success');
-                webSearchBtn.classList.add('btn-secondary');
-                webSearchBtn.disabled = true;
-                webSearchBtn.innerHTML = '<i class="fas fa-search"></i>';
-                webSearchBtn.title = 'این ویژگی فقط برای کاربران با اشتراک ویژه در دسترس است';
+                applyWelcomeWebSearchAccess(data.web_search_access);
             }
         })
         .catch(error => {
-            console.error('Error checking web search access:', error);
-            // Hide the button if there's an error
-            const webSearchBtn = document.getElementById('web-search-btn');
-            if (webSearchBtn) {
-                webSearchBtn.style.display = 'none';
-            }
+            console.error('Error loading quota status:', error);
         });
 }
 
+// Web search access of the user, from the quota status (false until it is loaded)
+function hasWebSearchAccess() {
+    return Boolean(chatQuotaStatus && chatQuotaStatus.web_search_access);
+}
+
+// Show the welcome-area web search button according to the user's access
+function applyWelcomeWebSearchAccess(hasAccess) {
+    const webSearchBtn = document.getElementById('welcome-web-search-btn');
+    const webSearchContainer = document.getElementById('welcome-web-search-container');
+    
+    if (!webSearchBtn || !webSearchContainer) return;
+    
+    // Show the web search container
+    webSearchContainer.style.display = 'block';
+    
+    if (hasAccess) {
+        // User has access, enable the button
+        webSearchBtn.disabled = false;
+        webSearchBtn.classList.remove('btn-secondary');
+        webSearchBtn.classList.add('btn-outline-secondary');
+        webSearchBtn.innerHTML = '<i class="fas fa-search"></i> جستجو وب';
+        webSearchBtn.title = 'فعال کردن جستجو وب';
+    } else {
+        // User doesn't have access, disable the button and show special message
+        webSearchBtn.disabled = true;
+        webSearchBtn.classList.remove('btn-outline-secondary');
+        webSearchBtn.classList.add('btn-secondary');
+        webSearchBtn.innerHTML = '<i class="fas fa-search"></i> جستجو وب (فقط برای اشتراک ویژه)';
+        webSearchBtn.title = 'این ویژگی فقط برای کاربران با اشتراک ویژه در دسترس است';
+    }
+}
+
+// Show the web search and image generation buttons of a session
+// Web search access comes from the quota status; image generation is automatic in
+// image editing chatbots and not offered elsewhere
+function applyFeatureAccess(sessionId, chatbotType) {
+    if (chatbotType === undefined) {
+        const sessionData = JSON.parse(localStorage.getItem(`session_${sessionId}`) || '{}');
+        chatbotType = sessionData.chatbot_type;
+    }
+    applyWebSearchAccess(sessionId, chatbotType);
+    applyImageGenerationAccess(sessionId, chatbotType);
+}
+
+// Show the session's web search button according to the user's access
+function applyWebSearchAccess(sessionId, chatbotType) {
+    const webSearchBtn = document.getElementById('web-search-btn');
+    if (!webSearchBtn) return;
+    
+    if (chatbotType === 'image_editing') {
+        // Hide web search for image editing chatbots
+        webSearchBtn.style.display = 'none';
+        return;
+    }
+    
+    webSearchBtn.style.display = 'inline-block';
+    if (hasWebSearchAccess()) {
+        webSearchBtn.disabled = false;
+        
+        // Restore web search state for this session
+        const webSearchState = sessionStorage.getItem(`webSearch_${sessionId}`);
+        if (webSearchState === 'true') {
+            // Enable web search
+            webSearchBtn.classList.remove('btn-outline-secondary', 'btn-secondary');
+            webSearchBtn.classList.add('btn-success');
+            webSearchBtn.innerHTML = '<i class="fas fa-search"></i>';
+            webSearchBtn.title = 'غیرفعال کردن جستجو وب';
+        } else {
+            // Disable web search
+            webSearchBtn.classList.remove('btn-success', 'btn-secondary');
+            webSearchBtn.classList.add('btn-outline-secondary');
+            webSearchBtn.innerHTML = '<i class="fas fa-search"></i>';
+            webSearchBtn.title = 'فعال کردن جستجو وب';
+        }
+    } else {
+        // User doesn't have access, show button as disabled with appropriate message
+        webSearchBtn.classList.remove('btn-outline-secondary', 'btn-success');
+        webSearchBtn.classList.add('btn-secondary');
+        webSearchBtn.disabled = true;
+        webSearchBtn.innerHTML = '<i class="fas fa-search"></i>';
+        webSearchBtn.title = 'این ویژگی فقط برای کاربران با اشتراک ویژه در دسترس است';
+    }
+}
+
 // Add image generation toggle
 function toggleImageGeneration() {
     if (!currentSessionId) return;
@@ -149,65 +161,16 @@ function toggleImageGeneration() {
     }
 }
 
-// Check if user has access to image generation functionality
-function checkImageGenerationAccess(sessionId) {
-    fetch(`/chat/session/${sessionId}/image-generation-access/`)
-        .then(response => response.json())
-        .then(data => {
-            const imageGenBtn = document.getElementById('image-generation-btn');
-            const webSearchBtn = document.getElementById('web-search-btn');
-            if (!imageGenBtn) return;
-            
-            if (data.has_access) {
-                // Check if this is an image editing chatbot
-                const sessionData = JSON.parse(localStorage.getItem(`session_${sessionId}`) || '{}');
-                if (sessionData.chatbot_type === 'image_editing') {
-                    // For image editing chatbots:
-                    // 1. Hide the image generation button (it's automatic)
-                    imageGenBtn.style.display = 'none';
-                    // 2. Enable image generation by default
-                    sessionStorage.setItem(`imageGen_${currentSessionId}`, 'true');
-                    // 3. Hide the web search button
-                    if (webSearchBtn) {
-                        webSearchBtn.style.display = 'none';
-                    }
-                } else {
-                    // For other chatbots:
-                    // 1. Show the image generation button
-                    imageGenBtn.style.display = 'inline-block';
-                    // 2. Show the web search button
-                    if (webSearchBtn) {
-                        webSearchBtn.style.display = 'inline-block';
-                    }
-                    // 3. Restore image generation state for this session
-                    const imageGenState = sessionStorage.getItem(`imageGen_${sessionId}`);
-                    if (imageGenState === 'true') {
-                        // Enable image generation
-                        imageGenBtn.classList.remove('btn-outline-primary');
-                        imageGenBtn.classList.add('btn-primary');
-                        imageGenBtn.innerHTML = '<i class="fas fa-image"></i> تولید تصویر فعال';
-                        imageGenBtn.title = 'غیرفعال کردن تولید تصویر';
-                    } else {
-                        // Disable image generation
-                        imageGenBtn.classList.remove('btn-primary');
-                        imageGenBtn.classList.add('btn-outline-primary');
-                        imageGenBtn.innerHTML = '<i class="fas fa-image"></i> تولید تصویر';
-                        imageGenBtn.title = 'فعال کردن تولید تصویر';
-                    }
-                }
-            } else {
-                // User doesn't have access, hide the button
-                imageGenBtn.style.display = 'none';
-            }
-        })
-        .catch(error => {
-            console.error('Error checking image generation access:', error);
-            // Hide the button if there's an error
-            const imageGenBtn = document.getElementById('image-generation-btn');
-            if (imageGenBtn) {
-                imageGenBtn.style.display = 'none';
-            }
-        });
+// Show the session's image generation button (only image editing chatbots generate images)
+function applyImageGenerationAccess(sessionId, chatbotType) {
+    const imageGenBtn = document.getElementById('image-generation-btn');
+    if (!imageGenBtn) return;
+    
+    // The button is never shown: image editing chatbots generate automatically
+    imageGenBtn.style.display = 'none';
+    if (chatbotType === 'image_editing') {
+        sessionStorage.setItem(`imageGen_${sessionId}`, 'true');
+    }
 }
 
 // Load models for a specific chatbot
@@ -9,6 +9,12 @@ let isWebSearchEnabledForNewSession = false;
 let availableModelsData = [];
 // Store current selected model for the floating selection
 let currentSelectedModel = null;
+// Global settings (upload limits, page size) delivered with the bootstrap payload
+let chatGlobalSettings = null;
+// Chatbots grouped by type from the bootstrap payload
+let bootstrapChatbots = null;
+// Usage windows of the user's subscription (used/limit/remaining/reset_at)
+let chatQuotaStatus = null;
 
 // Event listeners
 document.addEventListener('DOMContentLoaded', function() {
@@ -100,19 +106,13 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    loadSessions();
+    // Sessions, models, menu items, settings and web search access in one request
+    loadChatBootstrap();
     checkInitialSession(); // Check if we should load a specific session
     
     // Initialize multiple file upload functionality
     initializeMultiFileUpload();
 
-    // Load available models for user
-    loadAvailableModelsForUser();
-
-    // Load sidebar menu items for both desktop and mobile
-    loadDesktopSidebarMenuItems();
-    loadSidebarMenuItems();
-
     // Input event listener is now handled by MultiFileUploadManager
     // This prevents conflicts between multiple event listeners
 
@@ -138,11 +138,6 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    // Check web search access for welcome screen (when no session is active)
-    if (!currentSessionId) {
-        checkWebSearchAccessForWelcome();
-    }
-
     // Add event listeners for automatic session creation
     // Message input box
     const messageInput = document.getElementById('message-input');
@@ -409,13 +404,18 @@ document.addEventListener('DOMContentLoaded', function() {
         if (emptyEl) emptyEl.classList.add('d-none');
         if (optionsList) optionsList.innerHTML = '';
         
-        fetch(`/chat/chatbots/${backendType}/`)
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error(`HTTP error! status: ${response.status}`);
-                }
-                return response.json();
-            })
+        // Chatbots delivered with the bootstrap payload need no extra request
+        const chatbotsRequest = bootstrapChatbots && bootstrapChatbots[backendType]
+            ? Promise.resolve({ chatbots: bootstrapChatbots[backendType] })
+            : fetch(`/chat/chatbots/${backendType}/`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP error! status: ${response.status}`);
+                    }
+                    return response.json();
+                });
+        
+        chatbotsRequest
             .then(data => {
                 console.log('Chatbots data received:', data);
                 const chatbots = data.chatbots || [];
@@ -1011,8 +1011,8 @@ document.addEventListener('DOMContentLoaded', function() {
             loadDesktopSidebarMenuItems();
             loadSidebarMenuItems();
             
-            // Check web search access for welcome screen
-            checkWebSearchAccessForWelcome();
+            // Web search access for the welcome screen
+            applyWelcomeWebSearchAccess(hasWebSearchAccess());
         }
     });
     
@@ -1042,6 +1042,48 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeFloatingModelSelection();
 });
 
+// Load everything the chat page needs on start-up with a single request
+// Falls back to the individual endpoints if the bootstrap request fails
+function loadChatBootstrap() {
+    fetch(CHAT_URLS.bootstrap)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Bootstrap request failed with status ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            chatGlobalSettings = data.global_settings;
+            if (chatFileUploadManager) {
+                chatFileUploadManager.applyGlobalSettings(chatGlobalSettings);
+            }
+            bootstrapChatbots = data.chatbots;
+            chatQuotaStatus = data.quota;
+            applyAvailableModels(data.models);
+            renderAllSidebarMenuItems(data.menu_items);
+            
+            // A session selected meanwhile (checkInitialSession) reloads the list itself
+            if (!isLoading) {
+                renderSessionsPage(data.sessions);
+            }
+            
+            // Feature buttons depend on the quota status (web search access)
+            if (currentSessionId) {
+                applyFeatureAccess(currentSessionId);
+            } else {
+                applyWelcomeWebSearchAccess(hasWebSearchAccess());
+            }
+        })
+        .catch(error => {
+            console.error('Error loading chat bootstrap:', error);
+            loadSessions();
+            loadAvailableModelsForUser();
+            loadDesktopSidebarMenuItems();
+            loadSidebarMenuItems();
+            refreshQuotaStatus();
+        });
+}
+
 // Load available models for user
 function loadAvailableModelsForUser() {
     fetch('/chat/models/')
@@ -1051,38 +1093,40 @@ function loadAvailableModelsForUser() {
                 console.error('Error loading models:', data.error);
                 return;
             }
-            
-            // Store model data for later use
-            availableModelsData = data.models;
-            
-            const webSearchContainer = document.getElementById('welcome-web-search-container');
-            
-            // Populate floating model selection grid
-            populateFloatingModelGrid(data.models);
-            
-            // If we have a current session, make sure the model name is displayed correctly
-            if (currentSessionId) {
-                const sessionData = JSON.parse(localStorage.getItem(`session_${currentSessionId}`) || '{}');
-                if (sessionData.ai_model_name) {
-                    const currentModelName = document.getElementById('current-model-name');
-                    if (currentModelName) {
-                        currentModelName.textContent = sessionData.ai_model_name;
-                    }
-                }
-            } else {
-                // If no session is selected, check if there's a default model and display it
-                const defaultModelName = localStorage.getItem('defaultModelName');
-                if (defaultModelName) {
-                    const currentModelName = document.getElementById('current-model-name');
-                    if (currentModelName) {
-                        currentModelName.textContent = defaultModelName;
-                    }
-                }
-            }
+            applyAvailableModels(data.models);
         })
         .catch(error => console.error('Error loading models:', error));
 }
 
+// Store the user's models and show them in the model selection grid
+function applyAvailableModels(models) {
+    // Store model data for later use
+    availableModelsData = models;
+    
+    // Populate floating model selection grid
+    populateFloatingModelGrid(models);
+    
+    // If we have a current session, make sure the model name is displayed correctly
+    if (currentSessionId) {
+        const sessionData = JSON.parse(localStorage.getItem(`session_${currentSessionId}`) || '{}');
+        if (sessionData.ai_model_name) {
+            const currentModelName = document.getElementById('current-model-name');
+            if (currentModelName) {
+                currentModelName.textContent = sessionData.ai_model_name;
+            }
+        }
+    } else {
+        // If no session is selected, check if there's a default model and display it
+        const defaultModelName = localStorage.getItem('defaultModelName');
+        if (defaultModelName) {
+            const currentModelName = document.getElementById('current-model-name');
+            if (currentModelName) {
+                currentModelName.textContent = defaultModelName;
+            }
+        }
+    }
+}
+
 // Initialize floating model selection functionality
 function initializeFloatingModelSelection() {
     // Add click event to model selection wrapper to show floating model selection
@@ -377,8 +377,8 @@ function handleEditStreamingResponse(response) {
                         const formattedImageUrls = imagesData.map(img => {
                             if (img.image_url && img.image_url.url) {
                                 let imageUrl = img.image_url.url;
-                                if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/media/')) {
-                                    imageUrl = '/media/' + imageUrl;
+                                if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/chat/media/')) {
+                                    imageUrl = '/chat/media/' + imageUrl.replace(/^\/?(media\/)?/, '');
                                 }
                                 return imageUrl;
                             }
@@ -900,9 +900,9 @@ function updateOrAddAssistantMessageWithImages(content, imagesData = null) {
                 if (img.image_url && img.image_url.url) {
                     // Handle both absolute URLs and relative paths
                     let imageUrl = img.image_url.url;
-                    // If it's a relative path, prepend the media URL
-                    if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/media/')) {
-                        imageUrl = '/media/' + imageUrl;
+                    // Paths of protected media go through the delivery view
+                    if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/chat/media/')) {
+                        imageUrl = '/chat/media/' + imageUrl.replace(/^\/?(media\/)?/, '');
                     }
                     imageContent += `<div class="image-container mt-2" data-image-index="${index}">
                         <img src="${imageUrl}" alt="Generated image" class="img-fluid rounded" style="max-width: 100%; height: auto;">
@@ -106,8 +106,8 @@ function addMessageToChat(message) {
                     imageUrls.forEach(url => {
                         if (url.trim()) {
                             let imageUrl = url.trim();
-                            if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/media/')) {
-                                imageUrl = '/media/' + imageUrl;
+                            if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/chat/media/')) {
+                                imageUrl = '/chat/media/' + imageUrl.replace(/^\/?(media\/)?/, '');
                             }
                             imageContent += `<div class="image-container mt-2">
                                 <img src="${imageUrl}" alt="Generated image" class="img-fluid rounded" style="max-width: 100%; height: auto;">
@@ -201,13 +201,9 @@ function addMessageToChat(message) {
             if (url.trim()) {
                 // Handle both absolute URLs and relative paths
                 let imageUrl = url.trim();
-                // If it's a relative path, prepend the media URL
-                if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/media/')) {
-                    imageUrl = '/media/' + imageUrl;
-                }
-                // If it already starts with /media/, make sure it's properly formatted
-                else if (imageUrl.startsWith('/media/')) {
-                    // It's already correctly formatted
+                // Paths of protected media go through the delivery view
+                if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/chat/media/')) {
+                    imageUrl = '/chat/media/' + imageUrl.replace(/^\/?(media\/)?/, '');
                 }
                 // If it's already an absolute URL, leave it as is
                 imageContent += `<div class="image-container mt-2">
@@ -950,9 +946,9 @@ function updateOrAddAssistantMessageWithImages(content, imagesData = null, messa
                 if (img.image_url && img.image_url.url) {
                     // Handle both absolute URLs and relative paths
                     let imageUrl = img.image_url.url;
-                    // If it's a relative path, prepend the media URL
-                    if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/media/')) {
-                        imageUrl = '/media/' + imageUrl;
+                    // Paths of protected media go through the delivery view
+                    if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/chat/media/')) {
+                        imageUrl = '/chat/media/' + imageUrl.replace(/^\/?(media\/)?/, '');
                     }
                     imageContent += `<div class="image-container mt-2">
                         <img src="${imageUrl}" alt="Generated image" class="img-fluid rounded" style="max-width: 100%; height: auto;">
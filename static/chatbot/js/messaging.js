@@ -181,8 +181,8 @@ function sendMessage() {
                         const formattedImageUrls = imagesData.map(img => {
                             if (img.image_url && img.image_url.url) {
                                 let imageUrl = img.image_url.url;
-                                if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/media/')) {
-                                    imageUrl = '/media/' + imageUrl;
+                                if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/chat/media/')) {
+                                    imageUrl = '/chat/media/' + imageUrl.replace(/^\/?(media\/)?/, '');
                                 }
                                 return imageUrl;
                             }
@@ -198,6 +198,9 @@ function sendMessage() {
                     addMessageToChat(messageData);
                     hideTypingIndicator();
                     
+                    // The message used part of the quota
+                    refreshQuotaStatus();
+                    
                     // Check if this is an image editing chatbot
                     const sessionData = JSON.parse(localStorage.getItem(`session_${currentSessionId}`) || '{}');
                     if (sessionData.chatbot_type === 'image_editing') {
@@ -465,9 +468,9 @@ function sendMessage() {
                             const formattedImageUrls = imagesData.map(img => {
                                 if (img.image_url && img.image_url.url) {
                                     let imageUrl = img.image_url.url;
-                                    // If it's a relative path, prepend the media URL
-                                    if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/media/')) {
-                                        imageUrl = '/media/' + imageUrl;
+                                    // Paths of protected media go through the delivery view
+                                    if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/chat/media/')) {
+                                        imageUrl = '/chat/media/' + imageUrl.replace(/^\/?(media\/)?/, '');
                                     }
                                     return imageUrl;
                                 }
@@ -558,9 +561,9 @@ function sendMessage() {
                     const formattedImageUrls = imagesData.map(img => {
                         if (img.image_url && img.image_url.url) {
                             let imageUrl = img.image_url.url;
-                            // If it's a relative path, prepend the media URL
-                            if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/media/')) {
-                                imageUrl = '/media/' + imageUrl;
+                            // Paths of protected media go through the delivery view
+                            if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/chat/media/')) {
+                                imageUrl = '/chat/media/' + imageUrl.replace(/^\/?(media\/)?/, '');
                             }
                             return imageUrl;
                         }
@@ -781,9 +784,9 @@ function updateOrAddAssistantMessageWithImages(content, imagesData = null) {
                 if (img.image_url && img.image_url.url) {
                     // Handle both absolute URLs and relative paths
                     let imageUrl = img.image_url.url;
-                    // If it's a relative path, prepend the media URL
-                    if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/media/')) {
-                        imageUrl = '/media/' + imageUrl;
+                    // Paths of protected media go through the delivery view
+                    if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/chat/media/')) {
+                        imageUrl = '/chat/media/' + imageUrl.replace(/^\/?(media\/)?/, '');
                     }
                     imageContent += `<div class="image-container mt-2" data-image-index="${index}">
                         <img src="${imageUrl}" alt="Generated image" class="img-fluid rounded" style="max-width: 100%; height: auto;">
@@ -1011,9 +1014,8 @@ async function createDefaultSession() {
             loadMessageInputModels(data.chatbot_id);
         }
         
-        // Check web search and image generation access
-        checkWebSearchAccess(currentSessionId);
-        checkImageGenerationAccess(currentSessionId);
+        // Web search and image generation buttons of the new session
+        applyFeatureAccess(currentSessionId, data.chatbot_type);
         
         // Set web search state if it was enabled for new session
         if (isWebSearchEnabledForNewSession) {
@@ -309,6 +309,20 @@ class ChatFileUploadManager {
         return true;
     }
     
+    /**
+     * اعمال تنظیمات سراسری آپلود
+     * Apply Global Upload Settings (from the chat bootstrap payload)
+     */
+    applyGlobalSettings(settings) {
+        if (!settings) return;
+        if (settings.max_file_size_mb) {
+            this.maxFileSize = settings.max_file_size_mb * 1024 * 1024;
+        }
+        if (settings.max_files_per_message) {
+            this.maxFileCount = settings.max_files_per_message;
+        }
+    }
+    
     /**
      * بروزرسانی پیشنمایش فایل‌ها
      * Update File Preview
@@ -562,6 +576,7 @@ let chatFileUploadManager = null;
  */
 function initializeMultiFileUpload() {
     chatFileUploadManager = new ChatFileUploadManager();
+    chatFileUploadManager.applyGlobalSettings(chatGlobalSettings);
 }
 
 /**
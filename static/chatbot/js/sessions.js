@@ -6,6 +6,7 @@
 let currentPage = 1;
 let isLoading = false;
 let hasMoreSessions = true;
+let nextSessionsCursor = null;
 let sessionsLoaded = false;
 
 // Load user sessions with pagination support
@@ -17,66 +18,21 @@ function loadSessions(page = 1, append = false) {
     if (!append) {
         currentPage = 1;
         hasMoreSessions = true;
+        nextSessionsCursor = null;
         sessionsLoaded = false;
     }
     
     isLoading = true;
     
-    fetch(`${CHAT_URLS.getUserSessions}?page=${page}&page_size=20`)
+    // Keyset pagination: later pages continue from the cursor of the previous one
+    let sessionsUrl = `${CHAT_URLS.getUserSessions}?page_size=20`;
+    if (append && nextSessionsCursor) {
+        sessionsUrl += `&cursor=${encodeURIComponent(nextSessionsCursor)}`;
+    }
+    
+    fetch(sessionsUrl)
         .then(response => response.json())
-        .then(data => {
-            const sessionsList = document.getElementById('sessions-list');
-            if (!sessionsList) {
-                console.warn('Sessions list element not found');
-                isLoading = false;
-                return;
-            }
-            
-            // If not appending, clear the list
-            if (!append) {
-                sessionsList.innerHTML = '';
-            }
-            
-            if (data.sessions.length === 0 && !append) {
-                sessionsList.innerHTML = '<div class="list-group-item text-center text-muted">چتی وجود ندارد</div>';
-                hasMoreSessions = false;
-                isLoading = false;
-                sessionsLoaded = true;
-                return;
-            }
-            
-            data.sessions.forEach(session => {
-                const sessionElement = document.createElement('div');
-                sessionElement.className = 'list-group-item session-item';
-                if (session.id == currentSessionId) {
-                    sessionElement.classList.add('active');
-                }
-                sessionElement.innerHTML = `
-                    <div class="d-flex justify-content-between align-items-center">
-                        <div>
-                            <strong>${session.title}</strong>
-                        </div>
-                        <div class="text-muted small">${new Date(session.updated_at).toLocaleTimeString('fa-IR')}</div>
-                    </div>
-                `;
-                sessionElement.addEventListener('click', () => loadSession(session.id));
-                sessionsList.appendChild(sessionElement);
-            });
-            
-            // Update pagination info
-            hasMoreSessions = data.has_more;
-            if (append) {
-                currentPage = page;
-            }
-            
-            isLoading = false;
-            sessionsLoaded = true;
-            
-            // If we're at the first page and there are more sessions, initialize scroll listener
-            if (page === 1 && hasMoreSessions) {
-                initInfiniteScroll();
-            }
-        })
+        .then(data => renderSessionsPage(data, page, append))
         .catch(error => {
             console.error('Error loading sessions:', error);
             isLoading = false;
@@ -84,6 +40,62 @@ function loadSessions(page = 1, append = false) {
         });
 }
 
+// Render one page of the session list (from the sessions endpoint or the bootstrap payload)
+function renderSessionsPage(data, page = 1, append = false) {
+    const sessionsList = document.getElementById('sessions-list');
+    if (!sessionsList) {
+        console.warn('Sessions list element not found');
+        isLoading = false;
+        return;
+    }
+    
+    // If not appending, clear the list
+    if (!append) {
+        sessionsList.innerHTML = '';
+    }
+    
+    if (data.sessions.length === 0 && !append) {
+        sessionsList.innerHTML = '<div class="list-group-item text-center text-muted">چتی وجود ندارد</div>';
+        hasMoreSessions = false;
+        isLoading = false;
+        sessionsLoaded = true;
+        return;
+    }
+    
+    data.sessions.forEach(session => {
+        const sessionElement = document.createElement('div');
+        sessionElement.className = 'list-group-item session-item';
+        if (session.id == currentSessionId) {
+            sessionElement.classList.add('active');
+        }
+        sessionElement.innerHTML = `
+            <div class="d-flex justify-content-between align-items-center">
+                <div>
+                    <strong>${session.title}</strong>
+                </div>
+                <div class="text-muted small">${new Date(session.updated_at).toLocaleTimeString('fa-IR')}</div>
+            </div>
+        `;
+        sessionElement.addEventListener('click', () => loadSession(session.id));
+        sessionsList.appendChild(sessionElement);
+    });
+    
+    // Update pagination info
+    hasMoreSessions = data.has_more;
+    nextSessionsCursor = data.next_cursor;
+    if (append) {
+        currentPage = page;
+    }
+    
+    isLoading = false;
+    sessionsLoaded = true;
+    
+    // If we're at the first page and there are more sessions, initialize scroll listener
+    if (page === 1 && hasMoreSessions) {
+        initInfiniteScroll();
+    }
+}
+
 // Load a specific session
 function loadSession(sessionId) {
     currentSessionId = sessionId;
@@ -109,11 +121,8 @@ function loadSession(sessionId) {
                 deleteSessionBtn.style.display = 'inline-block';
             }
             
-            // Check if user has access to web search functionality
-            checkWebSearchAccess(sessionId);
-            
-            // Check if user has access to image generation functionality
-            checkImageGenerationAccess(sessionId);
+            // Web search and image generation buttons of this session
+            applyFeatureAccess(sessionId, data.chatbot_type);
             
             // Store session data including AI model name
             const sessionData = {
@@ -420,8 +429,8 @@ function deleteSession() {
                 
                 loadSessions();
                 
-                // Check web search access for welcome screen
-                checkWebSearchAccessForWelcome();
+                // Web search access for the welcome screen
+                applyWelcomeWebSearchAccess(hasWebSearchAccess());
                 
                 // Hide sidebar on mobile
                 if (window.innerWidth < 768) {
@@ -80,50 +80,11 @@ function loadDesktopSidebarMenuItems() {
 
     fetch(CHAT_URLS.getSidebarMenuItems)
         .then(response => response.json())
-        .then(data => {
-            desktopNavMenu.innerHTML = ''; // Clear previous items
-            if (data.menu_items && data.menu_items.length > 0) {
-                data.menu_items.forEach(item => {
-                    const navItem = document.createElement('div');
-                    navItem.className = 'nav-item';
-                    navItem.innerHTML = `
-                        <a class="nav-link" href="${item.url}">
-                          <i class="${item.icon_class}"></i> ${item.name}
-                        </a>
-                    `;
-                    desktopNavMenu.appendChild(navItem);
-                });
-            } else {
-                // Show default menu items if none are configured
-                desktopNavMenu.innerHTML = `
-                    <div class="nav-item">
-                        <a class="nav-link" href="/chat/">
-                            <i class="fas fa-comments"></i> چت
-                        </a>
-                    </div>
-                    <div class="nav-item">
-                        <a class="nav-link" href="/accounts/profile/">
-                            <i class="fas fa-user"></i> پروفایل
-                        </a>
-                    </div>
-                `;
-            }
-        })
+        .then(data => renderNavMenuItems(desktopNavMenu, data.menu_items))
         .catch(error => {
             console.error('Error loading desktop menu items:', error);
             // Show default menu items if there's an error
-            desktopNavMenu.innerHTML = `
-                <div class="nav-item">
-                    <a class="nav-link" href="/chat/">
-                        <i class="fas fa-comments"></i> چت
-                    </a>
-                </div>
-                <div class="nav-item">
-                    <a class="nav-link" href="/accounts/profile/">
-                        <i class="fas fa-user"></i> پروفایل
-                    </a>
-                </div>
-            `;
+            renderNavMenuItems(desktopNavMenu, []);
         });
 }
 
@@ -134,51 +95,53 @@ function loadSidebarMenuItems() {
 
     fetch(CHAT_URLS.getSidebarMenuItems)
         .then(response => response.json())
-        .then(data => {
-            mobileNavMenu.innerHTML = ''; // Clear previous items
-            if (data.menu_items && data.menu_items.length > 0) {
-                data.menu_items.forEach(item => {
-                    const navItem = document.createElement('div');
-                    navItem.className = 'nav-item';
-                    navItem.innerHTML = `
-                        <a class="nav-link" href="${item.url}">
-                          <i class="${item.icon_class}"></i> ${item.name}
-                        </a>
-                    `;
-                    mobileNavMenu.appendChild(navItem);
-                });
-            } else {
-                // Show default menu items if none are configured
-                mobileNavMenu.innerHTML = `
-                    <div class="nav-item">
-                        <a class="nav-link" href="/chat/">
-                            <i class="fas fa-comments"></i> چت
-                        </a>
-                    </div>
-                    <div class="nav-item">
-                        <a class="nav-link" href="/accounts/profile/">
-                            <i class="fas fa-user"></i> پروفایل
-                        </a>
-                    </div>
-                `;
-            }
-        })
+        .then(data => renderNavMenuItems(mobileNavMenu, data.menu_items))
         .catch(error => {
             console.error('Error loading menu items:', error);
             // Show default menu items if there's an error
-            mobileNavMenu.innerHTML = `
-                <div class="nav-item">
-                    <a class="nav-link" href="/chat/">
-                        <i class="fas fa-comments"></i> چت
-                    </a>
-                </div>
-                <div class="nav-item">
-                    <a class="nav-link" href="/accounts/profile/">
-                        <i class="fas fa-user"></i> پروفایل
-                    </a>
-                </div>
+            renderNavMenuItems(mobileNavMenu, []);
+        });
+}
+
+// Render menu items into both the desktop and mobile menus (used by the bootstrap payload)
+function renderAllSidebarMenuItems(menuItems) {
+    ['desktop-nav-menu', 'mobile-nav-menu'].forEach(menuId => {
+        const navMenu = document.getElementById(menuId);
+        if (navMenu) {
+            renderNavMenuItems(navMenu, menuItems);
+        }
+    });
+}
+
+// Render menu items into a nav menu, falling back to the default items
+function renderNavMenuItems(navMenu, menuItems) {
+    navMenu.innerHTML = ''; // Clear previous items
+    if (menuItems && menuItems.length > 0) {
+        menuItems.forEach(item => {
+            const navItem = document.createElement('div');
+            navItem.className = 'nav-item';
+            navItem.innerHTML = `
+                <a class="nav-link" href="${item.url}">
+                  <i class="${item.icon_class}"></i> ${item.name}
+                </a>
             `;
+            navMenu.appendChild(navItem);
         });
+    } else {
+        // Show default menu items if none are configured
+        navMenu.innerHTML = `
+            <div class="nav-item">
+                <a class="nav-link" href="/chat/">
+                    <i class="fas fa-comments"></i> چت
+                </a>
+            </div>
+            <div class="nav-item">
+                <a class="nav-link" href="/accounts/profile/">
+                    <i class="fas fa-user"></i> پروفایل
+                </a>
+            </div>
+        `;
+    }
 }
 
 // Show loading indicator when creating a new session by clicking the input
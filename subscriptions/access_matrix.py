@@ -0,0 +1,146 @@
+"""
+ماتریس دسترسی نوع اشتراک به مدل‌ها و چت‌بات‌ها
+Precomputed access matrix: subscription type -> allowed AI model ids / chatbot ids.
+
+The matrix is built with two queries (the ModelSubscription and Chatbot
+subscription_types through tables) and kept in process memory. A version
+number in the shared cache (CACHE_URL, required in production by
+core/checks.py) is bumped by the signals in subscriptions/signals.py whenever
+a relevant row changes; every process rebuilds its copy lazily the next time
+it sees a newer version. While the cache is unreachable the matrix is built
+from the database on every call rather than trusting a copy nobody can
+invalidate.
+"""
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+ACCESS_MATRIX_VERSION_KEY = 'access_matrix:version'
+
+_lock = threading.Lock()
+_local_matrix = None
+
+
+class AccessMatrix:
+    """Immutable snapshot of which subscription types may use which models and chatbots"""
+
+    def __init__(self, version, model_ids_by_type, chatbot_ids_by_type, chatbot_subscription_types):
+        self.version = version
+        # {subscription_type_id: frozenset(ai_model pk)}
+        self.model_ids_by_type = model_ids_by_type
+        # {subscription_type_id: frozenset(chatbot pk)}
+        self.chatbot_ids_by_type = chatbot_ids_by_type
+        # {chatbot pk: ((subscription_type_id, name), ...)}; chatbots missing here are public
+        self.chatbot_subscription_types = chatbot_subscription_types
+
+    def allowed_model_ids(self, subscription_type_id):
+        return self.model_ids_by_type.get(subscription_type_id, frozenset())
+
+    def allowed_chatbot_ids(self, subscription_type_id):
+        return self.chatbot_ids_by_type.get(subscription_type_id, frozenset())
+
+    def model_allowed(self, subscription_type_id, ai_model):
+        """Free models are open to everyone; others need a ModelSubscription for the type"""
+        if ai_model.is_free:
+            return True
+        if not subscription_type_id:
+            return False
+        return ai_model.pk in self.allowed_model_ids(subscription_type_id)
+
+    def chatbot_is_restricted(self, chatbot_id):
+        return chatbot_id in self.chatbot_subscription_types
+
+    def chatbot_allowed(self, subscription_type_id, chatbot_id):
+        """Chatbots without subscription types are public"""
+        if not self.chatbot_is_restricted(chatbot_id):
+            return True
+        if not subscription_type_id:
+            return False
+        return chatbot_id in self.allowed_chatbot_ids(subscription_type_id)
+
+    def chatbot_subscription_type_names(self, chatbot_id):
+        return [name for _, name in self.chatbot_subscription_types.get(chatbot_id, ())]
+
+
+class AccessMatrixService:
+    """Process-wide cached access matrix with version-key invalidation"""
+
+    @staticmethod
+    def get_version():
+        """The shared version, or None when the cache cannot be reached"""
+        try:
+            version = cache.get(ACCESS_MATRIX_VERSION_KEY)
+            if version is None:
+                # A time-based start value never collides with a version another process already built
+                cache.add(ACCESS_MATRIX_VERSION_KEY, time.time_ns(), None)
+                version = cache.get(ACCESS_MATRIX_VERSION_KEY)
+            return version
+        except Exception as e:
+            logger.warning(f"Access matrix version unavailable: {str(e)}")
+            return None
+
+    @staticmethod
+    def get_matrix():
+        """Return the current matrix, rebuilding it only when the shared version moved"""
+        global _local_matrix
+        version = AccessMatrixService.get_version()
+        if version is None:
+            metrics.CACHE_REQUESTS.inc(cache='access_matrix', result='bypass')
+            return AccessMatrixService.build_matrix(None)
+        matrix = _local_matrix
+        if matrix is not None and matrix.version == version:
+            metrics.CACHE_REQUESTS.inc(cache='access_matrix', result='hit')
+            return matrix
+        metrics.CACHE_REQUESTS.inc(cache='access_matrix', result='miss')
+        with _lock:
+            if _local_matrix is None or _local_matrix.version != version:
+                _local_matrix = AccessMatrixService.build_matrix(version)
+            return _local_matrix
+
+    @staticmethod
+    def build_matrix(version):
+        ModelSubscription = apps.get_model('ai_models', 'ModelSubscription')
+        Chatbot = apps.get_model('chatbot', 'Chatbot')
+
+        model_ids_by_type = {}
+        model_links = ModelSubscription.subscription_types.through.objects.values_list(
+            'modelsubscription__ai_model_id', 'subscriptiontype_id'
+        )
+        for ai_model_id, subscription_type_id in model_links:
+            model_ids_by_type.setdefault(subscription_type_id, set()).add(ai_model_id)
+
+        chatbot_ids_by_type = {}
+        chatbot_subscription_types = {}
+        chatbot_links = Chatbot.subscription_types.through.objects.order_by('id').values_list(
+            'chatbot_id', 'subscriptiontype_id', 'subscriptiontype__name'
+        )
+        for chatbot_id, subscription_type_id, name in chatbot_links:
+            chatbot_ids_by_type.setdefault(subscription_type_id, set()).add(chatbot_id)
+            chatbot_subscription_types.setdefault(chatbot_id, []).append((subscription_type_id, name))
+
+        logger.debug(f"Built access matrix version {version}")
+        return AccessMatrix(
+            version=version,
+            model_ids_by_type={key: frozenset(ids) for key, ids in model_ids_by_type.items()},
+            chatbot_ids_by_type={key: frozenset(ids) for key, ids in chatbot_ids_by_type.items()},
+            chatbot_subscription_types={key: tuple(types) for key, types in chatbot_subscription_types.items()},
+        )
+
+    @staticmethod
+    def invalidate():
+        """Move the shared version so every process rebuilds its matrix on next use"""
+        global _local_matrix
+        _local_matrix = None
+        try:
+            cache.incr(ACCESS_MATRIX_VERSION_KEY)
+        except ValueError:
+            cache.set(ACCESS_MATRIX_VERSION_KEY, time.time_ns(), None)
+        except Exception as e:
+            logger.warning(f"Access matrix invalidation failed: {str(e)}")
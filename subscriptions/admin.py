@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import SubscriptionType, UserSubscription, UserUsage, DiscountCode, DiscountUse, FinancialTransaction
+from reports.exports import export_actions
+from .models import SubscriptionType, UserSubscription, DiscountCode, DiscountUse, FinancialTransaction
 
 @admin.register(SubscriptionType)
 class SubscriptionTypeAdmin(admin.ModelAdmin):
@@ -49,12 +50,6 @@ class UserSubscriptionAdmin(admin.ModelAdmin):
     list_filter = ('is_active', 'subscription_type', 'start_date')
     search_fields = ('user__name', 'user__phone_number')
 
-@admin.register(UserUsage)
-class UserUsageAdmin(admin.ModelAdmin):
-    list_display = ('user', 'subscription_type', 'messages_count', 'tokens_count', 'created_at')
-    list_filter = ('subscription_type', 'created_at')
-    search_fields = ('user__name',)
-
 @admin.register(DiscountCode)
 class DiscountCodeAdmin(admin.ModelAdmin):
     list_display = ('code', 'discount_type', 'discount_value', 'is_active', 'uses_count', 'max_uses', 'expires_at')
@@ -104,6 +99,7 @@ class FinancialTransactionAdmin(admin.ModelAdmin):
     list_filter = ('transaction_type', 'status', 'created_at')
     search_fields = ('user__name', 'user__phone_number', 'authority', 'reference_id')
     readonly_fields = ('created_at', 'updated_at')
+    actions = export_actions('financial_transactions')
     
     fieldsets = (
         ('Transaction Information', {
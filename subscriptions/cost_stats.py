@@ -0,0 +1,149 @@
+"""
+آمار هزینه‌های OpenRouter کاربر
+Per-user OpenRouter cost statistics for the costs page.
+
+Totals and the model / subscription / request-type breakdowns are GROUP BY
+aggregates on the (user, created_at) index, and the request list is
+keyset-paginated on (created_at, id), so the page does the same amount of
+work for a user with ten requests or a hundred thousand.
+"""
+import base64
+from datetime import datetime, timedelta
+
+from django.apps import apps
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from core.db_router import use_replica
+
+COST_PAGE_SIZE = 50
+MAX_COST_PAGE_SIZE = 200
+DAILY_SERIES_DAYS = 30
+
+REQUEST_FIELDS = (
+    'id', 'created_at', 'model_name', 'model_id', 'request_type', 'session__title', 'prompt_tokens',
+    'completion_tokens', 'total_tokens', 'token_cost_multiplier', 'effective_cost_tokens',
+)
+
+
+def _encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    """Return (timestamp, id) or None when the cursor is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeError):
+        return None
+
+
+class UserCostStatsService:
+    """
+    سرویس آمار هزینه‌های کاربر
+    Aggregated cost statistics and paginated request list of one user
+    """
+
+    @staticmethod
+    def _costs(user):
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        return OpenRouterRequestCost.objects.filter(user=user).live()
+
+    @staticmethod
+    def _request_type_labels():
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        return dict(OpenRouterRequestCost._meta.get_field('request_type').choices)
+
+    @staticmethod
+    def _grouped(queryset, *fields):
+        return list(
+            queryset.values(*fields).annotate(
+                count=Count('id'),
+                total_tokens=Coalesce(Sum('total_tokens'), 0),
+                effective_cost_tokens=Coalesce(Sum('effective_cost_tokens'), 0),
+            ).order_by('-count')
+        )
+
+    @staticmethod
+    @use_replica()
+    def get_summary(user, days=DAILY_SERIES_DAYS):
+        """
+        خلاصه هزینه‌ها: مجموع، تفکیک بر اساس مدل، اشتراک و نوع درخواست و سری روزانه
+        Totals, per-model / per-subscription / per-request-type groups and a daily series
+        """
+        costs = UserCostStatsService._costs(user)
+
+        totals = costs.aggregate(
+            total_requests=Count('id'),
+            total_tokens=Coalesce(Sum('total_tokens'), 0),
+            total_effective_cost_tokens=Coalesce(Sum('effective_cost_tokens'), 0),
+        )
+
+        by_model = UserCostStatsService._grouped(costs, 'model_name', 'model_id')
+
+        by_subscription = UserCostStatsService._grouped(costs, 'subscription_type__name')
+        for row in by_subscription:
+            row['subscription_name'] = row.pop('subscription_type__name') or 'Unknown'
+
+        request_type_labels = UserCostStatsService._request_type_labels()
+        by_request_type = UserCostStatsService._grouped(costs, 'request_type')
+        for row in by_request_type:
+            row['label'] = request_type_labels.get(row['request_type'], row['request_type'])
+
+        since = (timezone.now() - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        daily = [
+            {
+                'date': row['day'].isoformat(),
+                'count': row['count'],
+                'total_tokens': row['total_tokens'],
+                'effective_cost_tokens': row['effective_cost_tokens'],
+            }
+            for row in costs.filter(created_at__gte=since).annotate(day=TruncDate('created_at')).values('day').annotate(
+                count=Count('id'),
+                total_tokens=Coalesce(Sum('total_tokens'), 0),
+                effective_cost_tokens=Coalesce(Sum('effective_cost_tokens'), 0),
+            ).order_by('day')
+        ]
+
+        return {
+            **totals,
+            'by_model': by_model,
+            'by_subscription': by_subscription,
+            'by_request_type': by_request_type,
+            'daily': daily,
+        }
+
+    @staticmethod
+    @use_replica()
+    def get_requests_page(user, page_size=COST_PAGE_SIZE, cursor=None):
+        """
+        یک صفحه از فهرست درخواست‌ها، جدیدترین ابتدا
+        One page of requests, newest first, keyset-paginated on (created_at, id)
+        Raises ValueError for an invalid cursor
+        """
+        page_size = max(1, min(page_size, MAX_COST_PAGE_SIZE))
+        costs = UserCostStatsService._costs(user)
+        if cursor:
+            decoded = _decode_cursor(cursor)
+            if not decoded:
+                raise ValueError('invalid cursor')
+            created_at, cost_pk = decoded
+            costs = costs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=cost_pk))
+
+        # One extra row tells whether another page exists
+        rows = list(costs.order_by('-created_at', '-id').values(*REQUEST_FIELDS)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        request_type_labels = UserCostStatsService._request_type_labels()
+        for row in rows:
+            row['request_type_label'] = request_type_labels.get(row['request_type'], row['request_type'])
+        return {
+            'requests': rows,
+            'page_size': page_size,
+            'has_more': has_more,
+            'next_cursor': _encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None,
+        }
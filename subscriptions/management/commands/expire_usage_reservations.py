@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from subscriptions.reservations import UsageReservationService
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Delete usage reservations that expired without being settled (run every few minutes)'
+
+    def handle(self, *args, **options):
+        try:
+            expired_count = UsageReservationService.expire_stale()
+            if expired_count:
+                logger.info(f"Deleted {expired_count} expired usage reservations")
+
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully deleted {expired_count} expired usage reservations')
+            )
+
+        except Exception as e:
+            logger.error(f"Error expiring usage reservations: {str(e)}")
+            self.stdout.write(
+                self.style.ERROR(f'Error expiring usage reservations: {str(e)}')
+            )
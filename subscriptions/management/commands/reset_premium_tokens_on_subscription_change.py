@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from subscriptions.models import UserSubscription, UserUsage
+from subscriptions.models import UserSubscription
 from subscriptions.services import UsageService
 import logging
 
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:49
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0054_legacy_usage_ledger_rows'),
+        ('subscriptions', '0018_subscriptiontype_max_openrouter_cost_usd'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='UserUsage',
+        ),
+    ]
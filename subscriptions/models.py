@@ -66,22 +66,6 @@ class UserSubscription(models.Model):
     class Meta:
         db_table = 'user_subscriptions'
 
-class UserUsage(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='usage_records')
-    subscription_type = models.ForeignKey(SubscriptionType, on_delete=models.CASCADE)
-    messages_count = models.IntegerField(default=0)
-    tokens_count = models.IntegerField(default=0)
-    free_model_messages_count = models.IntegerField(default=0)
-    free_model_tokens_count = models.IntegerField(default=0)
-    created_at = models.DateTimeField(default=timezone.now)
-    updated_at = models.DateTimeField(auto_now=True)
-    
-    def __str__(self):
-        return f"{self.user.name} - {self.subscription_type.name} - {self.created_at}"
-    
-    class Meta:
-        db_table = 'user_usage'
-
 class DiscountCode(models.Model):
     DISCOUNT_TYPES = [
         ('percentage', 'Percentage'),
@@ -0,0 +1,242 @@
+"""
+وضعیت سهمیه مصرف کاربر
+Unified quota status: every usage window of a user's subscription in one evaluation.
+
+All message/token windows (hourly through monthly and the monthly free-model
+window), the lifetime token totals and the OpenRouter cost come from a single
+conditional aggregate over the usage ledger (OpenRouterRequestCost); the image
+counters take one more query and the file upload windows two (settings and usage).
+The result is cached per user for QUOTA_STATUS_CACHE_SECONDS and dropped by
+the signals in subscriptions/signals.py whenever usage is recorded, so the UI
+can poll it instead of probing each limit separately.
+
+The status is informational: send_message still enforces the limits itself.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Min, Q, Sum
+from django.utils import timezone
+
+from core import metrics
+from core.config_cache import ConfigCache
+from .subscription_cache import SubscriptionResolver
+
+logger = logging.getLogger(__name__)
+
+QUOTA_STATUS_CACHE_PREFIX = 'quota_status'
+QUOTA_STATUS_CACHE_SECONDS = 5
+
+# (window name, rolling length or None for calendar windows, messages limit field, tokens limit field)
+USAGE_WINDOWS = (
+    ('hourly', timedelta(hours=1), 'hourly_max_messages', 'hourly_max_tokens'),
+    ('three_hours', timedelta(hours=3), 'three_hours_max_messages', 'three_hours_max_tokens'),
+    ('twelve_hours', timedelta(hours=12), 'twelve_hours_max_messages', 'twelve_hours_max_tokens'),
+    ('daily', None, 'daily_max_messages', 'daily_max_tokens'),
+    ('weekly', None, 'weekly_max_messages', 'weekly_max_tokens'),
+    ('monthly', None, 'monthly_max_messages', 'monthly_max_tokens'),
+)
+
+
+def _calendar_period(name, now):
+    """(start, end) of the calendar day/week/month containing ``now``, as UsageService computes them"""
+    if name == 'daily':
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start, start + timedelta(days=1)
+    if name == 'weekly':
+        start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+        return start, start + timedelta(weeks=1)
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if now.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def _limit_entry(used, limit, reset_at=None):
+    """used/limit/remaining for one limit; a limit of 0 means unlimited"""
+    unlimited = not limit or limit <= 0
+    return {
+        'used': used,
+        'limit': None if unlimited else limit,
+        'remaining': None if unlimited else max(limit - used, 0),
+        'exceeded': False if unlimited else used >= limit,
+        'reset_at': reset_at.isoformat() if reset_at else None,
+    }
+
+
+class QuotaStatusService:
+    """Evaluate and cache the complete quota status of a user"""
+
+    @staticmethod
+    def cache_key(user_id):
+        # The config version covers SubscriptionType limit edits
+        return f"{QUOTA_STATUS_CACHE_PREFIX}:{ConfigCache.current_version()}:{user_id}"
+
+    @staticmethod
+    def get_status(user):
+        """
+        Quota status of the user's active subscription (JSON-ready dict)
+        Inside a transaction the status is evaluated without the cache
+        """
+        use_cache = not connection.in_atomic_block
+        if use_cache:
+            status = cache.get(QuotaStatusService.cache_key(user.pk))
+            metrics.CACHE_REQUESTS.inc(cache='quota_status', result='hit' if status is not None else 'miss')
+            if status is not None:
+                return status
+
+        status = QuotaStatusService.evaluate(user, SubscriptionResolver.get_subscription_type(user))
+
+        if use_cache:
+            cache.set(QuotaStatusService.cache_key(user.pk), status, QUOTA_STATUS_CACHE_SECONDS)
+        return status
+
+    @staticmethod
+    def invalidate(user_id):
+        try:
+            cache.delete(QuotaStatusService.cache_key(user_id))
+        except Exception as e:
+            logger.warning(f"Quota status cache invalidation failed: {str(e)}")
+
+    @staticmethod
+    def evaluate(user, subscription_type, now=None):
+        now = now or timezone.now()
+        global_settings = ConfigCache.get('global_settings')
+        web_search_settings = ConfigCache.get('web_search_settings')
+        status = {
+            'subscription_type': subscription_type.name if subscription_type else None,
+            'file_uploads': {
+                'max_file_size_mb': global_settings.max_file_size_mb,
+                'max_files_per_message': global_settings.max_files_per_message,
+            },
+            'web_search_access': bool(web_search_settings and web_search_settings.is_enabled_for(subscription_type)),
+        }
+        if not subscription_type:
+            status.update({'windows': {}, 'free_model': None, 'totals': {}, 'images': {}, 'cost': None})
+            return status
+
+        status['windows'], status['free_model'], status['totals'], status['cost'] = QuotaStatusService._ledger_usage(
+            user, subscription_type, now
+        )
+        status['images'] = QuotaStatusService._image_windows(user, subscription_type, now)
+        status['file_uploads'].update(QuotaStatusService._file_windows(user, subscription_type, now))
+        return status
+
+    @staticmethod
+    def _ledger_usage(user, subscription_type, now):
+        """
+        Windows, free-model window, lifetime token totals and cost with one aggregate
+        over the user's ledger rows
+        """
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        projection = OpenRouterRequestCost.objects.usage_aggregates
+        starts = {}
+        ends = {}
+        for name, length, _, _ in USAGE_WINDOWS:
+            if length:
+                starts[name], ends[name] = now - length, None
+            else:
+                starts[name], ends[name] = _calendar_period(name, now)
+
+        aggregates = {}
+        for name, length, _, _ in USAGE_WINDOWS:
+            in_window = Q(created_at__gte=starts[name])
+            window = projection(in_window)
+            aggregates[f'{name}_messages'] = window['messages_count']
+            aggregates[f'{name}_tokens'] = window['tokens_count']
+            aggregates[f'{name}_free_tokens'] = window['free_model_tokens_count']
+            if length:
+                aggregates[f'{name}_oldest'] = Min(
+                    'created_at', filter=in_window & Q(excluded_from_quota=False) & OpenRouterRequestCost.objects.live_filter()
+                )
+        free_window = projection(Q(created_at__gte=starts['monthly']))
+        aggregates['free_model_messages'] = free_window['free_model_messages_count']
+        aggregates['free_model_tokens'] = free_window['free_model_tokens_count']
+        lifetime = projection()
+        aggregates['lifetime_tokens'] = lifetime['tokens_count']
+        aggregates['lifetime_free_tokens'] = lifetime['free_model_tokens_count']
+        aggregates['total_cost'] = Sum('total_cost_usd', filter=OpenRouterRequestCost.objects.live_filter())
+
+        usage = OpenRouterRequestCost.objects.filter(
+            user=user, subscription_type=subscription_type
+        ).aggregate(**aggregates)
+
+        windows = {}
+        for name, length, messages_field, tokens_field in USAGE_WINDOWS:
+            if length:
+                # A rolling window frees up when its oldest record ages out
+                oldest = usage[f'{name}_oldest']
+                reset_at = oldest + length if oldest else None
+            else:
+                reset_at = ends[name]
+            tokens_used = (usage[f'{name}_tokens'] or 0) + (usage[f'{name}_free_tokens'] or 0)
+            windows[name] = {
+                'messages': _limit_entry(usage[f'{name}_messages'] or 0, getattr(subscription_type, messages_field), reset_at),
+                'tokens': _limit_entry(tokens_used, getattr(subscription_type, tokens_field), reset_at),
+            }
+
+        free_model = {
+            'messages': _limit_entry(usage['free_model_messages'] or 0, subscription_type.monthly_free_model_messages, ends['monthly']),
+            'tokens': _limit_entry(usage['free_model_tokens'] or 0, subscription_type.monthly_free_model_tokens, ends['monthly']),
+        }
+        totals = {
+            'tokens': _limit_entry(usage['lifetime_tokens'] or 0, subscription_type.max_tokens),
+            'free_tokens': _limit_entry(usage['lifetime_free_tokens'] or 0, subscription_type.max_tokens_free),
+        }
+        total_cost = usage['total_cost'] or Decimal('0')
+        cost = _limit_entry(float(total_cost), float(subscription_type.max_openrouter_cost_usd))
+        return windows, free_model, totals, cost
+
+    @staticmethod
+    def _image_windows(user, subscription_type, now):
+        """Image counters read without creating the usage row; counters of a past period count as 0"""
+        ImageGenerationUsage = apps.get_model('chatbot', 'ImageGenerationUsage')
+        image_usage = ImageGenerationUsage.objects.filter(user=user, subscription_type=subscription_type).first()
+
+        images = {}
+        for name, limit in (
+            ('daily', subscription_type.daily_image_generation_limit),
+            ('weekly', subscription_type.weekly_image_generation_limit),
+            ('monthly', subscription_type.monthly_image_generation_limit),
+        ):
+            start, end = _calendar_period(name, now)
+            used = 0
+            if image_usage:
+                period_start = getattr(image_usage, f'{name}_period_start')
+                if period_start and period_start >= start:
+                    used = getattr(image_usage, f'{name}_images_count')
+            images[name] = _limit_entry(used, limit, end)
+        return images
+
+    @staticmethod
+    def _file_windows(user, subscription_type, now):
+        """
+        File upload windows of the subscription's FileUploadSettings; counters of a past period
+        count as 0. Without active settings uploads are not limited per period.
+        """
+        FileUploadSettings = apps.get_model('chatbot', 'FileUploadSettings')
+        FileUploadUsage = apps.get_model('chatbot', 'FileUploadUsage')
+        settings = FileUploadSettings.objects.filter(subscription_type=subscription_type, is_active=True).first()
+        if not settings:
+            return {}
+        file_usage = FileUploadUsage.objects.filter(user=user, subscription_type=subscription_type).first()
+
+        windows = {}
+        for name, limit in (
+            ('daily', settings.daily_file_limit),
+            ('weekly', settings.weekly_file_limit),
+            ('monthly', settings.monthly_file_limit),
+        ):
+            start, end = _calendar_period(name, now)
+            used = 0
+            if file_usage:
+                period_start = getattr(file_usage, f'{name}_period_start')
+                if period_start and period_start >= start:
+                    used = getattr(file_usage, f'{name}_files_count')
+            windows[name] = _limit_entry(used, limit, end)
+        windows['per_chat'] = _limit_entry(file_usage.session_files_count if file_usage else 0, settings.max_files_per_chat)
+        return windows
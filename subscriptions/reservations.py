@@ -0,0 +1,176 @@
+"""
+رزرو اتمیک مصرف کاربر پیش از ارسال درخواست
+Atomic per-user usage reservations.
+
+The quota checks run before a reply is streamed and the usage is recorded
+when the stream ends, so parallel requests of one user (several tabs) could
+all pass the checks before any of them was recorded. reserve() closes that
+gap: in one transaction it locks the user's row (SELECT ... FOR UPDATE, so
+only requests of the same user wait for each other), runs the quota and cost
+checks and inserts a usage ledger row (OpenRouterRequestCost) holding an
+estimate of the request's tokens and cost. Every quota query counts that row,
+so the next request of the user already sees it.
+
+When the reply is complete, settle() overwrites the row with the actual usage
+and release() removes it when nothing was sent. A reservation that is never
+settled (worker killed, client gone before the stream started) stops counting
+at its reserved_until and is deleted by the expire_usage_reservations command.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core import metrics
+from .quota_status import QuotaStatusService
+from .services import UsageService
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_ESTIMATE_PREFIX = 'usage_estimate'
+ESTIMATE_CACHE_SECONDS = 300
+# Recent replies of a model averaged for the estimate
+ESTIMATE_SAMPLE_SIZE = 50
+DEFAULT_RESERVATION_SECONDS = 600
+DEFAULT_COMPLETION_TOKENS = 500
+
+# Reasons reserve() can refuse a request
+LIMIT_USAGE = 'usage'
+LIMIT_COST = 'cost'
+
+
+class UsageReservationService:
+    """
+    سرویس رزرو مصرف
+    Reserve, settle and release the estimated usage of one request
+    """
+
+    @staticmethod
+    def _model_averages(ai_model):
+        """Average tokens and cost per token of the model's recent replies (cached)"""
+        key = f"{RESERVATION_ESTIMATE_PREFIX}:{ai_model.model_id}"
+        averages = cache.get(key)
+        metrics.CACHE_REQUESTS.inc(cache='usage_estimate', result='hit' if averages is not None else 'miss')
+        if averages is not None:
+            return averages
+
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        rows = list(
+            OpenRouterRequestCost.objects.filter(
+                model_id=ai_model.model_id, request_type='chat', cached=False, reserved_until__isnull=True
+            ).order_by('-created_at').values_list('total_tokens', 'total_cost_usd')[:ESTIMATE_SAMPLE_SIZE]
+        )
+        priced = [(tokens, cost) for tokens, cost in rows if cost is not None and tokens]
+        averages = {
+            'tokens': sum(tokens for tokens, _ in rows) // len(rows) if rows else 0,
+            'cost_per_token': (
+                sum(cost for _, cost in priced) / sum(tokens for tokens, _ in priced) if priced else Decimal('0')
+            ),
+        }
+        cache.set(key, averages, ESTIMATE_CACHE_SECONDS)
+        return averages
+
+    @staticmethod
+    def estimate(ai_model, prompt_tokens=0):
+        """
+        (tokens, cost_usd) expected for one reply of the model
+        The larger of the model's recent average and the prompt plus a default completion
+        """
+        averages = UsageReservationService._model_averages(ai_model)
+        completion_tokens = getattr(settings, 'USAGE_RESERVATION_COMPLETION_TOKENS', DEFAULT_COMPLETION_TOKENS)
+        tokens = max(averages['tokens'], prompt_tokens + completion_tokens)
+        cost = (averages['cost_per_token'] * tokens).quantize(Decimal('0.000001'))
+        return tokens, cost
+
+    @staticmethod
+    def _lock_user(user):
+        """Per-user critical section: lock the user's row until the transaction ends"""
+        User = get_user_model()
+        list(User._default_manager.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+
+    @staticmethod
+    @metrics.QUOTA_CHECK_SECONDS.time(check='reservation')
+    def reserve(user, subscription_type, ai_model, session=None, prompt_tokens=0, is_free_model=None, request_type='chat'):
+        """
+        Check the quotas and reserve the estimated usage of one request atomically
+        Returns (reservation, None, '') or (None, LIMIT_USAGE / LIMIT_COST, message)
+        """
+        if is_free_model is None:
+            is_free_model = ai_model.is_free
+        tokens, cost = UsageReservationService.estimate(ai_model, prompt_tokens)
+        cost_multiplier = float(ai_model.token_cost_multiplier)
+        reservation_seconds = getattr(settings, 'USAGE_RESERVATION_SECONDS', DEFAULT_RESERVATION_SECONDS)
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+
+        with transaction.atomic():
+            UsageReservationService._lock_user(user)
+
+            # Other in-flight requests of the user are counted through their reservations
+            within_limit, message = UsageService.comprehensive_check(user, ai_model, subscription_type)
+            if not within_limit:
+                return None, LIMIT_USAGE, message
+            within_limit, message = UsageService.check_openrouter_cost_limit(user, subscription_type, cost)
+            if not within_limit:
+                return None, LIMIT_COST, message
+
+            now = timezone.now()
+            reservation = OpenRouterRequestCost.objects.create(
+                user=user,
+                session=session,
+                subscription_type=subscription_type,
+                model_id=ai_model.model_id,
+                model_name=ai_model.name,
+                prompt_tokens=prompt_tokens,
+                total_tokens=tokens,
+                token_cost_multiplier=cost_multiplier,
+                effective_cost_tokens=int(tokens * cost_multiplier),
+                total_cost_usd=cost,
+                request_type=request_type,
+                is_free_model=is_free_model,
+                created_at=now,
+                reserved_until=now + timedelta(seconds=reservation_seconds),
+            )
+        logger.debug(f"Reserved {tokens} tokens (${cost}) for user {user.id}: reservation {reservation.pk}")
+        return reservation, None, ''
+
+    @staticmethod
+    def settle(reservation, row):
+        """
+        Replace the reservation with the actual ledger row (unsaved) of the request
+        A reservation already expired and deleted is recorded as a new row
+        """
+        row.reserved_until = None
+        if reservation is not None:
+            row.created_at = reservation.created_at
+            row.updated_at = timezone.now()
+            values = {field.attname: getattr(row, field.attname) for field in row._meta.concrete_fields if not field.primary_key}
+            # A plain UPDATE: a failed forced save() would break the caller's transaction
+            if type(row)._default_manager.filter(pk=reservation.pk).update(**values):
+                row.pk = reservation.pk
+                # update() sends no post_save
+                transaction.on_commit(lambda: QuotaStatusService.invalidate(row.user_id))
+                return row
+            logger.warning(f"Reservation {reservation.pk} expired before it was settled")
+        row.save()
+        return row
+
+    @staticmethod
+    def release(reservation):
+        """Drop a reservation whose request sent nothing upstream"""
+        if reservation is None:
+            return
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        OpenRouterRequestCost.objects.filter(pk=reservation.pk, reserved_until__isnull=False).delete()
+
+    @staticmethod
+    def expire_stale():
+        """Delete reservations that were never settled; returns the number of rows"""
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        deleted, _ = OpenRouterRequestCost.objects.stale_reservations().delete()
+        return deleted
@@ -4,6 +4,9 @@ from datetime import timedelta
 from django.apps import apps
 from django.db.models import Sum
 import tiktoken
+from core import metrics
+from .quota_status import QuotaStatusService
+from .subscription_cache import SubscriptionResolver
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -42,6 +45,7 @@ class UsageService:
         return total_tokens
     
     @staticmethod
+    @metrics.QUOTA_CHECK_SECONDS.time(check='usage_limit')
     def check_usage_limit(user, subscription_type, tokens_count=1, is_free_model=False):
         """
         Check if user has exceeded usage limits across ALL time periods
@@ -223,21 +227,13 @@ class UsageService:
         """
         logger.debug(f"Getting user usage for period: {start_time} to {end_time}")
         
-        UserUsage = apps.get_model('subscriptions', 'UserUsage')
-        
-        usage_data = UserUsage.objects.filter(
-            user=user,
-            subscription_type=subscription_type,
+        usage_data = UsageService._ledger(user, subscription_type).filter(
             created_at__gte=start_time,
             created_at__lte=end_time
-        ).aggregate(
-            total_messages=Sum('messages_count'),
-            total_tokens=Sum('tokens_count'),
-            total_free_tokens=Sum('free_model_tokens_count')
-        )
+        ).user_usage()
         
-        total_messages = usage_data['total_messages'] or 0
-        total_tokens = (usage_data['total_tokens'] or 0) + (usage_data['total_free_tokens'] or 0)
+        total_messages = usage_data['messages_count']
+        total_tokens = usage_data['tokens_count'] + usage_data['free_model_tokens_count']
         
         logger.debug(f"Period usage data - Messages: {total_messages}, Tokens: {total_tokens}")
         return total_messages, total_tokens
@@ -250,86 +246,59 @@ class UsageService:
         """
         logger.debug(f"Getting user free model usage for period: {start_time} to {end_time}")
         
-        UserUsage = apps.get_model('subscriptions', 'UserUsage')
-        
-        usage_data = UserUsage.objects.filter(
-            user=user,
-            subscription_type=subscription_type,
+        usage_data = UsageService._ledger(user, subscription_type).filter(
             created_at__gte=start_time,
             created_at__lte=end_time
-        ).aggregate(
-            total_messages=Sum('free_model_messages_count'),
-            total_tokens=Sum('free_model_tokens_count')
-        )
+        ).user_usage()
         
-        total_messages = usage_data['total_messages'] or 0
-        total_tokens = usage_data['total_tokens'] or 0
+        total_messages = usage_data['free_model_messages_count']
+        total_tokens = usage_data['free_model_tokens_count']
         
         logger.debug(f"Free model period usage data - Messages: {total_messages}, Tokens: {total_tokens}")
         return total_messages, total_tokens
     
+    @staticmethod
+    def _ledger(user, subscription_type):
+        """Usage ledger rows (OpenRouterRequestCost) of a user for a subscription type"""
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        return OpenRouterRequestCost.objects.filter(user=user, subscription_type=subscription_type)
+    
     @staticmethod
     def get_user_total_tokens_from_chat_sessions(user, subscription_type):
         """
         Get total tokens used by user across all chat sessions for a subscription type
-        Returns (total_tokens, free_model_tokens)
+        Returns (total_tokens, free_model_tokens); paid tokens include the model cost multiplier
         """
-        ChatSessionUsage = apps.get_model('chatbot', 'ChatSessionUsage')
-        chat_session_usages = ChatSessionUsage.objects.filter(
-            user=user,
-            subscription_type=subscription_type
-        )
-        
-        total_tokens = 0
-        free_model_tokens = 0
-        for usage in chat_session_usages:
-            total_tokens += usage.tokens_count
-            free_model_tokens += usage.free_model_tokens_count
-        
-        return total_tokens, free_model_tokens
+        usage_data = UsageService._ledger(user, subscription_type).user_usage()
+        return usage_data['tokens_count'], usage_data['free_model_tokens_count']
     
     @staticmethod
-    def increment_usage(user, subscription_type, messages_count=1, tokens_count=1, is_free_model=False, ai_model=None):
+    def increment_usage(user, subscription_type, messages_count=1, tokens_count=1, is_free_model=False, ai_model=None, session=None):
         """
-        Create a new usage record for each event with proper token separation and cost calculation.
+        Record usage outside a chat request as a single ledger row.
+        Chat requests write their ledger row (with the request cost) themselves.
         """
         logger.info(f"Incrementing usage for user {user.id}, is_free_model: {is_free_model}")
         
         # Calculate effective token cost
-        effective_tokens_cost = tokens_count
+        cost_multiplier = 1.0
         if ai_model and not is_free_model:  # Only apply multiplier for paid models
             cost_multiplier = float(ai_model.token_cost_multiplier)
-            effective_tokens_cost = int(tokens_count * cost_multiplier)
-            logger.info(f"Applying cost multiplier of {cost_multiplier}. Original tokens: {tokens_count}, Effective cost: {effective_tokens_cost}")
-
+        effective_tokens_cost = int(tokens_count * cost_multiplier)
         logger.debug(f"Messages count: {messages_count}, Effective Tokens count: {effective_tokens_cost}")
         
-        UserUsage = apps.get_model('subscriptions', 'UserUsage')
-        
-        # Default all values to zero
-        defaults = {
-            'messages_count': 0,
-            'tokens_count': 0,
-            'free_model_messages_count': 0,
-            'free_model_tokens_count': 0
-        }
-        
-        # Separate tracking for free vs paid models
-        if is_free_model:
-            # For free models (don't use effective cost)
-            defaults['free_model_messages_count'] = messages_count
-            defaults['free_model_tokens_count'] = tokens_count  # Record original tokens for free models
-            logger.debug(f"Setting free model usage - Messages: {messages_count}, Tokens: {tokens_count}")
-        else:
-            # For paid models (use effective cost)
-            defaults['messages_count'] = messages_count
-            defaults['tokens_count'] = effective_tokens_cost  # Record effective cost
-            logger.debug(f"Setting paid model usage - Messages: {messages_count}, Tokens: {effective_tokens_cost}")
-            
-        usage_record = UserUsage.objects.create(
+        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
+        usage_record = OpenRouterRequestCost.objects.create(
             user=user,
+            session=session,
             subscription_type=subscription_type,
-            **defaults
+            model_id=ai_model.model_id if ai_model else '',
+            model_name=ai_model.name if ai_model else '',
+            total_tokens=tokens_count,
+            token_cost_multiplier=cost_multiplier,
+            effective_cost_tokens=effective_tokens_cost,
+            is_free_model=is_free_model,
+            messages_count=messages_count,
         )
         
         # Detailed logging for tracking
@@ -341,27 +310,17 @@ class UsageService:
     def reset_user_usage(user, subscription_type):
         """
         Reset user's usage counters for a subscription type without deleting data
-        This method sets all counters to zero while preserving the usage records
+        The ledger rows are kept for costs and reports but no longer count towards the quotas
         """
         logger.info(f"Resetting user usage for user {user.id}")
         
-        # Get all usage records for this user and subscription type
-        UserUsage = apps.get_model('subscriptions', 'UserUsage')
-        usage_records = UserUsage.objects.filter(
-            user=user,
-            subscription_type=subscription_type
-        )
-        
-        # Reset all counters to zero
-        for record in usage_records:
-            record.messages_count = 0
-            record.tokens_count = 0
-            record.free_model_messages_count = 0
-            record.free_model_tokens_count = 0
-            record.save()
-            logger.debug(f"Reset usage record ID: {record.id}")
+        reset_count = UsageService._ledger(user, subscription_type).exclude_from_quota()
+        QuotaStatusService.invalidate(user.id)
+        logger.debug(f"Reset {reset_count} usage records for user {user.id}")
+        return reset_count
 
     @staticmethod
+    @metrics.QUOTA_CHECK_SECONDS.time(check='image_generation')
     def check_image_generation_limit(user, subscription_type):
         """
         Check if user has exceeded image generation limits
@@ -476,6 +435,7 @@ class UsageService:
         logger.debug("Image generation usage incremented successfully")
 
     @staticmethod
+    @metrics.QUOTA_CHECK_SECONDS.time(check='openrouter_cost')
     def check_openrouter_cost_limit(user, subscription_type, cost_usd=0.0):
         """
         Check if user has exceeded the maximum OpenRouter API cost limit for their subscription
@@ -518,13 +478,8 @@ class UsageService:
         from decimal import Decimal
         logger = logging.getLogger(__name__)
         
-        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
-        
-        # Sum all costs for this user and subscription type
-        cost_data = OpenRouterRequestCost.objects.filter(
-            user=user,
-            subscription_type=subscription_type
-        ).aggregate(
+        # Sum all costs for this user and subscription type (in-flight reservations hold their estimate)
+        cost_data = UsageService._ledger(user, subscription_type).live().aggregate(
             total_cost=Sum('total_cost_usd')
         )
         
@@ -539,6 +494,7 @@ class UsageService:
         return total_cost
     
     @staticmethod
+    @metrics.QUOTA_CHECK_SECONDS.time(check='comprehensive')
     def comprehensive_check(user, ai_model, subscription_type):
         """
         Comprehensive check before sending any message to AI
@@ -878,7 +834,7 @@ class UsageService:
         Get comprehensive usage statistics for a user across all time periods and models
         """
         # Get user's current subscription
-        subscription_type = user.get_subscription_type()
+        subscription_type = SubscriptionResolver.get_subscription_type(user)
         if not subscription_type:
             return {}
         
@@ -982,20 +938,14 @@ class UsageService:
     def reset_chat_session_usage(user, subscription_type):
         """
         Reset user's chat session usage for a subscription type.
-        This method deletes all ChatSessionUsage records for the user and subscription type
-        to ensure tokens are properly reset after payment or subscription changes.
+        Session totals are derived from the same ledger rows as the usage counters,
+        so this resets them the same way to ensure tokens are properly reset after
+        payment or subscription changes.
         """
         logger.info(f"Resetting chat session usage for user {user.id}, subscription {subscription_type.name}")
         
         try:
-            ChatSessionUsage = apps.get_model('chatbot', 'ChatSessionUsage')
-            deleted_count, _ = ChatSessionUsage.objects.filter(
-                user=user,
-                subscription_type=subscription_type
-            ).delete()
-            
-            logger.debug(f"Deleted {deleted_count} chat session usage records for user {user.id}")
-            return deleted_count
+            return UsageService.reset_user_usage(user, subscription_type)
         except Exception as e:
             logger.error(f"Error resetting chat session usage for user {user.id}: {str(e)}")
             return 0
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from ai_models.models import AIModel, ModelSubscription
+from chatbot.models import Chatbot, FileUploadUsage, ImageGenerationUsage, OpenRouterRequestCost
+from .access_matrix import AccessMatrixService
+from .models import SubscriptionType, UserSubscription
+from .quota_status import QuotaStatusService
+from .subscription_cache import SubscriptionResolver
+
+
+@receiver(post_save, sender=ModelSubscription)
+@receiver(post_delete, sender=ModelSubscription)
+@receiver(post_save, sender=AIModel)
+@receiver(post_delete, sender=AIModel)
+@receiver(post_delete, sender=Chatbot)
+@receiver(post_delete, sender=SubscriptionType)
+@receiver(m2m_changed, sender=ModelSubscription.subscription_types.through)
+@receiver(m2m_changed, sender=Chatbot.subscription_types.through)
+def invalidate_access_matrix(sender, **kwargs):
+    """
+    Invalidate the access matrix when model/chatbot subscription links change
+    Invalidated again after commit so other processes cannot cache pre-commit rows
+    """
+    if kwargs.get('action', 'post_').startswith('pre_'):
+        return
+    AccessMatrixService.invalidate()
+    transaction.on_commit(AccessMatrixService.invalidate)
+
+
+@receiver(post_save, sender=UserSubscription)
+@receiver(post_delete, sender=UserSubscription)
+def invalidate_user_subscription(sender, instance, **kwargs):
+    """
+    Drop the cached subscription of the affected user
+    The memo on the User object the subscription was loaded with is cleared as well
+    """
+    user = instance._state.fields_cache.get('user')
+    SubscriptionResolver.invalidate(instance.user_id, user)
+    QuotaStatusService.invalidate(instance.user_id)
+    transaction.on_commit(lambda: SubscriptionResolver.invalidate(instance.user_id))
+    transaction.on_commit(lambda: QuotaStatusService.invalidate(instance.user_id))
+
+
+@receiver(post_save, sender=FileUploadUsage)
+@receiver(post_save, sender=ImageGenerationUsage)
+@receiver(post_save, sender=OpenRouterRequestCost)
+@receiver(post_delete, sender=OpenRouterRequestCost)
+def invalidate_quota_status(sender, instance, **kwargs):
+    """Drop the cached quota status of a user whenever their usage is recorded"""
+    QuotaStatusService.invalidate(instance.user_id)
+    transaction.on_commit(lambda: QuotaStatusService.invalidate(instance.user_id))
@@ -0,0 +1,107 @@
+"""
+کش اشتراک فعال کاربر
+Cached resolution of a user's active subscription.
+
+The UserSubscription row (with its SubscriptionType) is loaded once per user
+object and kept in the Django cache, keyed by user and by the configuration
+version stamp so SubscriptionType edits are picked up too. Signals in
+subscriptions/signals.py drop the entry when the subscription changes; the
+cache must be shared by all workers for that to reach them (CACHE_URL,
+core.E001). With a process-local cache entries only live a few seconds, so a
+purchase handled by another worker is never missed for long.
+
+Reads never write: an expired subscription is simply treated as inactive and
+left for the check_expired_subscriptions command, which deactivates it and
+resets its usage counters.
+"""
+import logging
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from core import metrics
+from core.checks import cache_is_shared
+from core.config_cache import ConfigCache
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_CACHE_PREFIX = 'user_subscription'
+SUBSCRIPTION_CACHE_MAX_TTL = 24 * 60 * 60
+# Cap when the cache is process-local and other workers' invalidations cannot reach it
+PROCESS_LOCAL_CACHE_MAX_TTL = 5
+
+# Attribute used to memoize the resolution on a User instance
+RESOLVED_ATTRIBUTE = '_resolved_subscription'
+_UNRESOLVED = object()
+
+
+class SubscriptionResolver:
+    """Resolve a user's active, unexpired subscription once and cache it"""
+
+    @staticmethod
+    def cache_key(user_id):
+        return f"{SUBSCRIPTION_CACHE_PREFIX}:{ConfigCache.current_version()}:{user_id}"
+
+    @staticmethod
+    def get_subscription(user):
+        """Return the user's active UserSubscription, or None"""
+        if not user or not user.is_authenticated:
+            return None
+        subscription = getattr(user, RESOLVED_ATTRIBUTE, _UNRESOLVED)
+        if subscription is _UNRESOLVED:
+            subscription = SubscriptionResolver.fetch(user.pk)
+            setattr(user, RESOLVED_ATTRIBUTE, subscription)
+        if not subscription or not subscription.is_active:
+            return None
+        if subscription.end_date and subscription.end_date < timezone.now():
+            # Expired: inactive from now on, deactivated later by check_expired_subscriptions
+            return None
+        return subscription
+
+    @staticmethod
+    def get_subscription_type(user):
+        subscription = SubscriptionResolver.get_subscription(user)
+        return subscription.subscription_type if subscription else None
+
+    @staticmethod
+    def fetch(user_id):
+        """
+        Load the subscription row through the shared cache
+        Inside a transaction the database is read directly so uncommitted rows are never cached
+        """
+        use_cache = not connection.in_atomic_block
+        key = SubscriptionResolver.cache_key(user_id) if use_cache else None
+        if use_cache:
+            entry = cache.get(key)
+            metrics.CACHE_REQUESTS.inc(cache='subscription', result='hit' if entry is not None else 'miss')
+            if entry is not None:
+                # Entries are 1-tuples so "no subscription" is cached too
+                return entry[0]
+
+        UserSubscription = apps.get_model('subscriptions', 'UserSubscription')
+        subscription = UserSubscription.objects.select_related('subscription_type').filter(user_id=user_id).first()
+
+        if use_cache:
+            cache.set(key, (subscription,), SubscriptionResolver.cache_timeout(subscription))
+        return subscription
+
+    @staticmethod
+    def cache_timeout(subscription):
+        """Keep an entry until the subscription ends, capped at SUBSCRIPTION_CACHE_MAX_TTL"""
+        max_ttl = SUBSCRIPTION_CACHE_MAX_TTL if cache_is_shared() else PROCESS_LOCAL_CACHE_MAX_TTL
+        if subscription and subscription.is_active and subscription.end_date:
+            seconds_left = (subscription.end_date - timezone.now()).total_seconds()
+            return max(1, min(max_ttl, int(seconds_left) + 1))
+        return max_ttl
+
+    @staticmethod
+    def invalidate(user_id, user=None):
+        """Forget the cached subscription of a user (and the memo on ``user`` if given)"""
+        if user is not None and hasattr(user, RESOLVED_ATTRIBUTE):
+            delattr(user, RESOLVED_ATTRIBUTE)
+        try:
+            cache.delete(SubscriptionResolver.cache_key(user_id))
+        except Exception as e:
+            logger.warning(f"Subscription cache invalidation failed: {str(e)}")
@@ -1,3 +1,275 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ai_models.models import AIModel, ModelSubscription
+from chatbot.models import ChatSession, Chatbot, OpenRouterRequestCost
+from .access_matrix import ACCESS_MATRIX_VERSION_KEY, AccessMatrixService
+from .cost_stats import UserCostStatsService
+from .models import SubscriptionType, UserSubscription
+from .quota_status import QuotaStatusService
+from .reservations import LIMIT_USAGE, UsageReservationService
+from .services import UsageService
+from .subscription_cache import PROCESS_LOCAL_CACHE_MAX_TTL, SUBSCRIPTION_CACHE_MAX_TTL, SubscriptionResolver
+
+User = get_user_model()
+
+
+class AccessMatrixTestCase(TestCase):
+    def setUp(self):
+        self.gold = SubscriptionType._default_manager.create(name='Gold', sku='gold', price=1)
+        self.silver = SubscriptionType._default_manager.create(name='Silver', sku='silver', price=1)
+        self.premium_model = AIModel._default_manager.create(
+            model_id='premium-model', name='Premium', is_active=True, is_free=False, model_type='text'
+        )
+        self.free_model = AIModel._default_manager.create(
+            model_id='free-model', name='Free', is_active=True, is_free=True, model_type='text'
+        )
+        self.link = ModelSubscription._default_manager.create(ai_model=self.premium_model)
+        self.link.subscription_types.add(self.gold)
+        self.user = User.objects.create_user(phone_number='+1234567894', password='testpass123', name='Matrix User')
+        UserSubscription._default_manager.create(user=self.user, subscription_type=self.silver)
+
+    def test_model_access_is_read_from_matrix_and_invalidated(self):
+        AccessMatrixService.get_matrix()
+        with self.assertNumQueries(0):
+            matrix = AccessMatrixService.get_matrix()
+            self.assertTrue(matrix.model_allowed(self.gold.id, self.premium_model))
+            self.assertFalse(matrix.model_allowed(self.silver.id, self.premium_model))
+            self.assertTrue(matrix.model_allowed(None, self.free_model))
+
+        self.assertFalse(self.user.has_access_to_model(self.premium_model))
+        self.link.subscription_types.add(self.silver)
+        self.user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(self.user.has_access_to_model(self.premium_model))
+
+    def test_chatbot_restrictions(self):
+        public_bot = Chatbot._default_manager.create(name='Public', is_active=True)
+        gold_bot = Chatbot._default_manager.create(name='Gold Bot', is_active=True)
+        gold_bot.subscription_types.add(self.gold)
+
+        matrix = AccessMatrixService.get_matrix()
+        self.assertTrue(matrix.chatbot_allowed(None, public_bot.id))
+        self.assertTrue(matrix.chatbot_allowed(self.gold.id, gold_bot.id))
+        self.assertFalse(matrix.chatbot_allowed(self.silver.id, gold_bot.id))
+        self.assertEqual(matrix.chatbot_subscription_type_names(gold_bot.id), ['Gold'])
+
+        gold_bot.subscription_types.clear()
+        self.assertTrue(AccessMatrixService.get_matrix().chatbot_allowed(self.silver.id, gold_bot.id))
+
+    def test_version_moved_by_another_process_and_cache_outage(self):
+        matrix = AccessMatrixService.get_matrix()
+        # Another worker changed a link: only the shared version moves, this process keeps its copy
+        ModelSubscription.subscription_types.through.objects.filter(modelsubscription=self.link).delete()
+        cache.incr(ACCESS_MATRIX_VERSION_KEY)
+        self.assertIsNot(AccessMatrixService.get_matrix(), matrix)
+        self.assertFalse(AccessMatrixService.get_matrix().model_allowed(self.gold.id, self.premium_model))
+
+        with patch('subscriptions.access_matrix.cache.get', side_effect=ConnectionError('cache down')):
+            with self.assertNumQueries(2):
+                self.assertFalse(AccessMatrixService.get_matrix().model_allowed(self.gold.id, self.premium_model))
+
+
+class SubscriptionResolverTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gold = SubscriptionType._default_manager.create(name='Gold', sku='gold', price=1)
+        self.user = User.objects.create_user(phone_number='+1234567895', password='testpass123', name='Resolver User')
+        self.subscription = UserSubscription._default_manager.create(
+            user=self.user, subscription_type=self.gold, end_date=timezone.now() + timedelta(days=3)
+        )
+
+    def test_resolved_once_per_user_object(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.get_subscription_type(), self.gold)
+            self.assertEqual(user.get_subscription_info(), self.subscription)
+            self.assertEqual(SubscriptionResolver.get_subscription_type(user), self.gold)
+
+    def test_entries_are_short_lived_without_a_shared_cache(self):
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379/0'}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(SubscriptionResolver.cache_timeout(self.subscription), SUBSCRIPTION_CACHE_MAX_TTL)
+        self.assertEqual(SubscriptionResolver.cache_timeout(self.subscription), PROCESS_LOCAL_CACHE_MAX_TTL)
+
+    def test_expired_subscription_is_inactive_without_a_write(self):
+        UserSubscription._default_manager.filter(pk=self.subscription.pk).update(end_date=timezone.now() - timedelta(minutes=1))
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertIsNone(user.get_subscription_type())
+        self.subscription.refresh_from_db()
+        self.assertTrue(self.subscription.is_active)
+
+    def test_request_subscription_is_lazy(self):
+        self.client.login(username='+1234567895', password='testpass123')
+        response = self.client.get('/')
+        self.assertEqual(response.wsgi_request.subscription.subscription_type, self.gold)
+
+
+class QuotaStatusTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gold = SubscriptionType._default_manager.create(
+            name='Gold', sku='gold', price=1, hourly_max_messages=5, daily_max_tokens=1000, monthly_free_model_messages=3
+        )
+        self.user = User.objects.create_user(phone_number='+1234567896', password='testpass123', name='Quota User')
+        UserSubscription._default_manager.create(user=self.user, subscription_type=self.gold)
+
+    def test_all_windows_in_one_evaluation(self):
+        UsageService.increment_usage(self.user, self.gold, messages_count=1, tokens_count=300)
+        UsageService.increment_usage(self.user, self.gold, messages_count=1, tokens_count=20, is_free_model=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            status = QuotaStatusService.evaluate(self.user, self.gold)
+        # Config rows are re-read inside the test transaction; usage data costs one query on the ledger and one for images
+        usage_tables = ('image_generation_usage', 'openrouter_request_costs')
+        self.assertEqual(len([q for q in queries if any(f'FROM "{table}"' in q['sql'] for table in usage_tables)]), 2)
+        self.assertEqual(status['windows']['hourly']['messages'], {
+            'used': 1, 'limit': 5, 'remaining': 4, 'exceeded': False,
+            'reset_at': status['windows']['hourly']['messages']['reset_at'],
+        })
+        self.assertIsNotNone(status['windows']['hourly']['messages']['reset_at'])
+        self.assertEqual(status['windows']['daily']['tokens']['used'], 320)
+        self.assertIsNone(status['windows']['weekly']['messages']['limit'])
+        self.assertEqual(status['free_model']['messages']['remaining'], 2)
+        self.assertEqual(status['images']['daily']['limit'], self.gold.daily_image_generation_limit)
+
+    def test_usage_ledger_projections_and_reset(self):
+        chatbot = Chatbot._default_manager.create(name='Ledger Bot', is_active=True)
+        session = ChatSession._default_manager.create(user=self.user, chatbot=chatbot, title='Ledger')
+        UsageService.increment_usage(self.user, self.gold, tokens_count=300, session=session)
+        UsageService.increment_usage(self.user, self.gold, tokens_count=20, is_free_model=True, session=session)
+        # Title requests only count towards the cost
+        OpenRouterRequestCost.objects.create(
+            user=self.user, session=session, subscription_type=self.gold, request_type='title',
+            total_tokens=50, effective_cost_tokens=50, messages_count=0, excluded_from_quota=True,
+        )
+
+        now = timezone.now()
+        self.assertEqual(UsageService.get_user_usage_for_period(self.user, self.gold, now - timedelta(hours=1), now), (1, 320))
+        self.assertEqual(UsageService.get_user_free_model_usage_for_period(self.user, self.gold, now - timedelta(hours=1), now), (1, 20))
+        self.assertEqual(UsageService.get_user_total_tokens_from_chat_sessions(self.user, self.gold), (300, 20))
+        self.assertEqual(
+            [(row['session_id'], row['tokens_count'], row['free_model_tokens_count']) for row in OpenRouterRequestCost.objects.session_usage()],
+            [(session.id, 300, 20)],
+        )
+
+        QuotaStatusService.get_status(self.user)
+        self.assertEqual(UsageService.reset_user_usage(self.user, self.gold), 2)
+        status = QuotaStatusService.get_status(self.user)
+        self.assertEqual(status['windows']['hourly']['messages']['used'], 0)
+        self.assertEqual(status['totals']['tokens']['used'], 0)
+        self.assertEqual(OpenRouterRequestCost.objects.filter(user=self.user).count(), 3)
+
+    def test_file_upload_windows(self):
+        from chatbot.file_services import FileUploadService
+        from chatbot.models import FileUploadSettings
+        FileUploadSettings._default_manager.create(
+            subscription_type=self.gold, max_file_size=0, allowed_extensions='txt', max_files_per_chat=3, daily_file_limit=2
+        )
+        with patch('subscriptions.signals.QuotaStatusService.invalidate') as invalidate:
+            FileUploadService.increment_file_upload_usage(self.user, self.gold)
+        invalidate.assert_called_with(self.user.id)
+
+        file_uploads = QuotaStatusService.evaluate(self.user, self.gold)['file_uploads']
+        self.assertEqual(file_uploads['daily']['used'], 1)
+        self.assertEqual(file_uploads['daily']['remaining'], 1)
+        self.assertIsNotNone(file_uploads['daily']['reset_at'])
+        self.assertIsNone(file_uploads['monthly']['limit'])
+        self.assertEqual(file_uploads['per_chat']['remaining'], 2)
+        self.assertIn('max_file_size_mb', file_uploads)
+
+    def test_endpoint(self):
+        self.client.login(username='+1234567896', password='testpass123')
+        response = self.client.get(reverse('quota_status'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['subscription_type'], 'Gold')
+
+
+class UsageReservationTestCase(TestCase):
+    def setUp(self):
+        self.gold = SubscriptionType._default_manager.create(name='Gold', sku='gold', price=1, hourly_max_messages=2)
+        self.model = AIModel._default_manager.create(
+            model_id='reserved-model', name='Reserved', is_active=True, is_free=False, model_type='text'
+        )
+        ModelSubscription._default_manager.create(ai_model=self.model).subscription_types.add(self.gold)
+        self.user = User.objects.create_user(phone_number='+1234567897', password='testpass123', name='Reservation User')
+        UserSubscription._default_manager.create(user=self.user, subscription_type=self.gold)
+
+    def test_in_flight_reservations_count_towards_the_quota(self):
+        first, _, _ = UsageReservationService.reserve(self.user, self.gold, self.model, prompt_tokens=10)
+        second, _, _ = UsageReservationService.reserve(self.user, self.gold, self.model, prompt_tokens=10)
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        # Neither request has answered yet, but the hourly quota is already taken
+        refused, reason, _ = UsageReservationService.reserve(self.user, self.gold, self.model)
+        self.assertIsNone(refused)
+        self.assertEqual(reason, LIMIT_USAGE)
+
+        UsageReservationService.release(second)
+        settled = UsageReservationService.settle(first, OpenRouterRequestCost(
+            user=self.user, subscription_type=self.gold, model_id=self.model.model_id, model_name=self.model.name,
+            total_tokens=42, effective_cost_tokens=42,
+        ))
+        self.assertEqual(settled.pk, first.pk)
+        row = OpenRouterRequestCost.objects.get(user=self.user)
+        self.assertEqual((row.total_tokens, row.reserved_until, row.created_at), (42, None, first.created_at))
+        self.assertIsNotNone(UsageReservationService.reserve(self.user, self.gold, self.model)[0])
+
+    def test_stale_reservations_stop_counting_and_expire(self):
+        for _ in range(2):
+            UsageReservationService.reserve(self.user, self.gold, self.model)
+        OpenRouterRequestCost.objects.update(reserved_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertIsNotNone(UsageReservationService.reserve(self.user, self.gold, self.model)[0])
+        self.assertEqual(UsageReservationService.expire_stale(), 2)
+        self.assertEqual(OpenRouterRequestCost.objects.filter(user=self.user).count(), 1)
+
+
+class UserCostStatsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gold = SubscriptionType._default_manager.create(name='Gold', sku='gold', price=1)
+        self.user = User.objects.create_user(phone_number='+1234567895', password='testpass123', name='Cost User')
+        chatbot = Chatbot._default_manager.create(name='Cost Bot', is_active=True)
+        session = ChatSession._default_manager.create(user=self.user, chatbot=chatbot, title='Costs')
+        now = timezone.now()
+        for i, (model_id, request_type) in enumerate((('a/model', 'chat'), ('a/model', 'title'), ('b/model', 'chat'))):
+            OpenRouterRequestCost.objects.create(
+                user=self.user, session=session, subscription_type=self.gold, model_id=model_id, model_name=model_id,
+                request_type=request_type, total_tokens=10, effective_cost_tokens=15,
+                created_at=now - timedelta(minutes=i),
+            )
+
+    def test_summary_is_aggregated_in_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            summary = UserCostStatsService.get_summary(self.user)
+        self.assertEqual(len(queries), 5)
+        self.assertEqual(summary['total_requests'], 3)
+        self.assertEqual(summary['total_effective_cost_tokens'], 45)
+        self.assertEqual(summary['by_model'][0], {'model_name': 'a/model', 'model_id': 'a/model', 'count': 2, 'total_tokens': 20, 'effective_cost_tokens': 30})
+        self.assertEqual(summary['by_subscription'][0]['subscription_name'], 'Gold')
+        self.assertEqual(summary['by_request_type'][0]['label'], 'Chat Message')
+        self.assertEqual(sum(day['count'] for day in summary['daily']), 3)
+
+    def test_keyset_pages_and_json_variant(self):
+        first = UserCostStatsService.get_requests_page(self.user, page_size=2)
+        self.assertTrue(first['has_more'])
+        second = UserCostStatsService.get_requests_page(self.user, page_size=2, cursor=first['next_cursor'])
+        self.assertEqual([row['model_id'] for row in first['requests'] + second['requests']], ['a/model', 'a/model', 'b/model'])
+        self.assertFalse(second['has_more'])
+
+        self.client.login(username='+1234567895', password='testpass123')
+        data = self.client.get(reverse('user_openrouter_costs_data'), {'page_size': 2}).json()
+        self.assertEqual(data['summary']['total_requests'], 3)
+        self.assertEqual(data['next_cursor'], first['next_cursor'])
+        self.assertEqual(self.client.get(reverse('user_openrouter_costs_data'), {'cursor': 'bad'}).status_code, 400)
+        response = self.client.get(reverse('user_openrouter_costs'), {'cursor': first['next_cursor']})
+        self.assertContains(response, 'b/model')
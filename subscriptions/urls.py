@@ -12,4 +12,6 @@ urlpatterns = [
     path('intelligent-upgrade/<int:new_subscription_id>/', views.intelligent_subscription_upgrade, name='intelligent_subscription_upgrade'),
     path('complete-upgrade/', views.complete_intelligent_upgrade, name='complete_intelligent_upgrade'),
     path('costs/', views.user_openrouter_costs, name='user_openrouter_costs'),
+    path('costs/data/', views.user_openrouter_costs_data, name='user_openrouter_costs_data'),
+    path('quota-status/', views.quota_status, name='quota_status'),
 ]
\ No newline at end of file
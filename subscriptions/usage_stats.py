@@ -3,7 +3,9 @@ from django.utils import timezone
 from datetime import timedelta
 from django.apps import apps
 from django.db.models import Sum, Count
+from core.db_router import use_replica
 from .services import UsageService
+from .subscription_cache import SubscriptionResolver
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -15,6 +17,7 @@ class UserUsageStatsService:
     """
 
     @staticmethod
+    @use_replica()
     def get_user_usage_statistics(user):
         """
         دریافت آمارهای کامل مصرف کاربر برای نمایش در داشبورد و صفحات خرید
@@ -23,7 +26,7 @@ class UserUsageStatsService:
         logger.info(f"Getting comprehensive usage statistics for user {user.id}")
         
         # Get user's subscription type
-        subscription_type = user.get_subscription_type()
+        subscription_type = SubscriptionResolver.get_subscription_type(user)
         if not subscription_type:
             logger.warning(f"No active subscription found for user {user.id}")
             return UserUsageStatsService._get_empty_stats()
@@ -56,24 +59,11 @@ class UserUsageStatsService:
         """محاسبه آمارهای توکن (رایگان و پولی)"""
         logger.debug("Calculating token statistics")
         
-        # Get total tokens from chat sessions
+        # Lifetime tokens from the usage ledger
         total_paid_tokens, total_free_tokens = UsageService.get_user_total_tokens_from_chat_sessions(
             user, subscription_type
         )
-        
-        # Add usage from the old UserUsage model for backward compatibility
-        try:
-            UserUsage = apps.get_model('subscriptions', 'UserUsage')
-            user_usage_records = UserUsage.objects.filter(user=user, subscription_type=subscription_type)
-            
-            for record in user_usage_records:
-                total_paid_tokens += record.tokens_count
-                total_free_tokens += record.free_model_tokens_count
-            
-            logger.info(f"User {user.id} combined tokens - Paid: {total_paid_tokens}, Free: {total_free_tokens}")
-            
-        except Exception as e:
-            logger.error(f"Error getting UserUsage records for user {user.id} in stats: {str(e)}")
+        logger.info(f"User {user.id} tokens - Paid: {total_paid_tokens}, Free: {total_free_tokens}")
 
         # Calculate remaining tokens
         max_paid_tokens = subscription_type.max_tokens
@@ -250,12 +240,14 @@ class UserUsageStatsService:
         }
 
     @staticmethod
-    def get_usage_summary_for_dashboard(user):
+    def get_usage_summary_for_dashboard(user, stats=None):
         """
         خلاصه مصرف برای نمایش در داشبورد
         Usage summary for dashboard display
+        Pass ``stats`` from get_user_usage_statistics to avoid computing them again
         """
-        stats = UserUsageStatsService.get_user_usage_statistics(user)
+        if stats is None:
+            stats = UserUsageStatsService.get_user_usage_statistics(user)
         
         return {
             'tokens_summary': {
@@ -280,12 +272,14 @@ class UserUsageStatsService:
         }
 
     @staticmethod
-    def get_usage_cards_data(user):
+    def get_usage_cards_data(user, stats=None):
         """
         داده‌های کارت‌های مصرف برای نمایش در UI
         Usage cards data for UI display
+        Pass ``stats`` from get_user_usage_statistics to avoid computing them again
         """
-        stats = UserUsageStatsService.get_user_usage_statistics(user)
+        if stats is None:
+            stats = UserUsageStatsService.get_user_usage_statistics(user)
         
         cards = []
         
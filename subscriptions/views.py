@@ -7,6 +7,8 @@ from django.utils import timezone
 from django.conf import settings
 from django.apps import apps
 from decimal import Decimal
+from .cost_stats import COST_PAGE_SIZE, UserCostStatsService
+from .quota_status import QuotaStatusService
 from .services import UsageService
 from .usage_stats import UserUsageStatsService
 from accounts.models import User
@@ -107,8 +109,8 @@ def purchase_subscription(request):
     
     # Get comprehensive usage statistics for the user
     usage_stats = UserUsageStatsService.get_user_usage_statistics(request.user)
-    usage_summary = UserUsageStatsService.get_usage_summary_for_dashboard(request.user)
-    usage_cards = UserUsageStatsService.get_usage_cards_data(request.user)
+    usage_summary = UserUsageStatsService.get_usage_summary_for_dashboard(request.user, usage_stats)
+    usage_cards = UserUsageStatsService.get_usage_cards_data(request.user, usage_stats)
     
     context = {
         'subscriptions': subscriptions,
@@ -167,17 +169,9 @@ def apply_discount_code(request):
         amount_after_remaining_value = original_price
 
         if user_subscription:
-            # Combine tokens from both ChatSessionUsage and UserUsage
+            # Lifetime tokens from the usage ledger
             total_tokens_used, free_model_tokens_used = UsageService.get_user_total_tokens_from_chat_sessions(user, user_subscription)
-            
-            UserUsage = apps.get_model('subscriptions', 'UserUsage')
-            user_usage_records = UserUsage.objects.filter(user=user, subscription_type=user_subscription)
-            
-            total_user_usage_tokens = 0
-            for record in user_usage_records:
-                total_user_usage_tokens += record.tokens_count
-                
-            combined_total_tokens_used = total_tokens_used + total_user_usage_tokens
+            combined_total_tokens_used = total_tokens_used
 
             # Use the subscription's max_tokens field
             total_token_limit = user_subscription.max_tokens
@@ -260,12 +254,7 @@ def initiate_payment(request, subscription_id):
         if user_subscription:
             # Consistent remaining value calculation
             total_tokens_used, _ = UsageService.get_user_total_tokens_from_chat_sessions(user, user_subscription)
-            
-            UserUsage = apps.get_model('subscriptions', 'UserUsage')
-            user_usage_records = UserUsage.objects.filter(user=user, subscription_type=user_subscription)
-            
-            total_user_usage_tokens = sum(record.tokens_count for record in user_usage_records)
-            combined_total_tokens_used = total_tokens_used + total_user_usage_tokens
+            combined_total_tokens_used = total_tokens_used
 
             total_token_limit = user_subscription.max_tokens or 1000000
             remaining_tokens = max(0, total_token_limit - combined_total_tokens_used)
@@ -667,22 +656,10 @@ def calculate_remaining_subscription_value(request):
         if not user_subscription:
             return JsonResponse({'error': 'No active subscription found'}, status=400)
         
-        # Calculate total tokens used using the new ChatSessionUsage method
+        # Lifetime tokens from the usage ledger
         total_tokens_used, free_model_tokens_used = UsageService.get_user_total_tokens_from_chat_sessions(user, user_subscription)
-        
-        # Also get tokens from UserUsage for backward compatibility
-        UserUsage = apps.get_model('subscriptions', 'UserUsage')
-        user_usage_records = UserUsage.objects.filter(user=user, subscription_type=user_subscription)
-        
-        total_user_usage_tokens = 0
-        total_user_usage_free_tokens = 0
-        for record in user_usage_records:
-            total_user_usage_tokens += record.tokens_count
-            total_user_usage_free_tokens += record.free_model_tokens_count
-        
-        # Combine tokens from both sources
-        combined_total_tokens_used = total_tokens_used + total_user_usage_tokens
-        combined_free_model_tokens_used = free_model_tokens_used + total_user_usage_free_tokens
+        combined_total_tokens_used = total_tokens_used
+        combined_free_model_tokens_used = free_model_tokens_used
         
         # Use the subscription's max_tokens field for total limit
         total_token_limit = user_subscription.max_tokens
@@ -768,22 +745,10 @@ def intelligent_subscription_upgrade(request, new_subscription_id):
     
     # Calculate remaining value from current subscription using the new method
     try:
-        # Calculate total tokens used using the new ChatSessionUsage method
+        # Lifetime tokens from the usage ledger
         total_tokens_used, free_model_tokens_used = UsageService.get_user_total_tokens_from_chat_sessions(user, current_subscription)
-        
-        # Also get tokens from UserUsage for backward compatibility
-        UserUsage = apps.get_model('subscriptions', 'UserUsage')
-        user_usage_records = UserUsage.objects.filter(user=user, subscription_type=current_subscription)
-        
-        total_user_usage_tokens = 0
-        total_user_usage_free_tokens = 0
-        for record in user_usage_records:
-            total_user_usage_tokens += record.tokens_count
-            total_user_usage_free_tokens += record.free_model_tokens_count
-        
-        # Combine tokens from both sources
-        combined_total_tokens_used = total_tokens_used + total_user_usage_tokens
-        combined_free_model_tokens_used = free_model_tokens_used + total_user_usage_free_tokens
+        combined_total_tokens_used = total_tokens_used
+        combined_free_model_tokens_used = free_model_tokens_used
         
         # Use the subscription's max_tokens field
         total_token_limit = current_subscription.max_tokens
@@ -922,75 +887,76 @@ def public_subscription_comparison(request):
 
 @login_required
 def user_openrouter_costs(request):
-    """Display OpenRouter API usage costs for the logged-in user"""
+    """
+    نمایش هزینه‌های استفاده کاربر از OpenRouter
+    Display OpenRouter API usage costs for the logged-in user.
+    Summaries are SQL aggregates and the request list is keyset-paginated with ?cursor=.
+    """
     try:
-        # Get the user's OpenRouter request costs
-        OpenRouterRequestCost = apps.get_model('chatbot', 'OpenRouterRequestCost')
-        costs = OpenRouterRequestCost.objects.filter(user=request.user).select_related(
-            'session', 'subscription_type'
-        ).order_by('-created_at')
-        
-        # Calculate summary statistics
-        total_requests = costs.count()
-        total_tokens = sum(cost.total_tokens for cost in costs)
-        total_effective_cost_tokens = sum(cost.effective_cost_tokens for cost in costs)
-        
-        # Group by model
-        model_stats = {}
-        for cost in costs:
-            if cost.model_name not in model_stats:
-                model_stats[cost.model_name] = {
-                    'count': 0,
-                    'total_tokens': 0,
-                    'effective_cost_tokens': 0,
-                    'model_id': cost.model_id,
-                    'requests': []
-                }
-            model_stats[cost.model_name]['count'] += 1
-            model_stats[cost.model_name]['total_tokens'] += cost.total_tokens
-            model_stats[cost.model_name]['effective_cost_tokens'] += cost.effective_cost_tokens
-            model_stats[cost.model_name]['requests'].append(cost)
-        
-        # Group by subscription type
-        subscription_stats = {}
-        for cost in costs:
-            subscription_name = cost.subscription_type.name if cost.subscription_type else "Unknown"
-            if subscription_name not in subscription_stats:
-                subscription_stats[subscription_name] = {
-                    'count': 0,
-                    'total_tokens': 0,
-                    'effective_cost_tokens': 0,
-                    'subscription_type': cost.subscription_type
-                }
-            subscription_stats[subscription_name]['count'] += 1
-            subscription_stats[subscription_name]['total_tokens'] += cost.total_tokens
-            subscription_stats[subscription_name]['effective_cost_tokens'] += cost.effective_cost_tokens
-        
-        # Group by request type
-        request_type_stats = {}
-        for cost in costs:
-            request_type = cost.get_request_type_display()
-            if request_type not in request_type_stats:
-                request_type_stats[request_type] = {
-                    'count': 0,
-                    'total_tokens': 0,
-                    'effective_cost_tokens': 0
-                }
-            request_type_stats[request_type]['count'] += 1
-            request_type_stats[request_type]['total_tokens'] += cost.total_tokens
-            request_type_stats[request_type]['effective_cost_tokens'] += cost.effective_cost_tokens
+        summary = UserCostStatsService.get_summary(request.user)
+        try:
+            page = UserCostStatsService.get_requests_page(request.user, cursor=request.GET.get('cursor'))
+        except ValueError:
+            page = UserCostStatsService.get_requests_page(request.user)
         
         context = {
-            'costs': costs,
-            'total_requests': total_requests,
-            'total_tokens': total_tokens,
-            'total_effective_cost_tokens': total_effective_cost_tokens,
-            'model_stats': model_stats,
-            'subscription_stats': subscription_stats,
-            'request_type_stats': request_type_stats,
+            'costs': page['requests'],
+            'next_cursor': page['next_cursor'],
+            'is_first_page': not request.GET.get('cursor'),
+            'total_requests': summary['total_requests'],
+            'total_tokens': summary['total_tokens'],
+            'total_effective_cost_tokens': summary['total_effective_cost_tokens'],
+            'model_stats': summary['by_model'],
+            'subscription_stats': summary['by_subscription'],
+            'request_type_stats': summary['by_request_type'],
         }
         return render(request, 'subscriptions/user_openrouter_costs.html', context)
     except Exception as e:
         logger.error(f"Error fetching user OpenRouter costs: {str(e)}")
         messages.error(request, 'خطا در بارگذاری اطلاعات هزینه‌ها')
         return redirect('purchase_subscription')
+
+
+@login_required
+def user_openrouter_costs_data(request):
+    """
+    نسخه JSON آمار هزینه‌ها برای نمودارها
+    JSON variant of the costs page: the summary with a daily series, plus one page of
+    requests (?cursor=, ?page_size=)
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'روش درخواست نامعتبر است'}, status=405)
+    
+    try:
+        page_size = int(request.GET.get('page_size', COST_PAGE_SIZE))
+    except ValueError:
+        page_size = COST_PAGE_SIZE
+    
+    try:
+        page = UserCostStatsService.get_requests_page(request.user, page_size, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'error': 'نشانگر صفحه نامعتبر است'}, status=400)
+    
+    try:
+        summary = UserCostStatsService.get_summary(request.user)
+    except Exception as e:
+        logger.error(f"Error fetching OpenRouter cost data for user {request.user.id}: {str(e)}")
+        return JsonResponse({'error': 'خطا در بارگذاری اطلاعات هزینه‌ها'}, status=500)
+    
+    return JsonResponse({'summary': summary, **page})
+
+
+@login_required
+def quota_status(request):
+    """
+    وضعیت کامل سهمیه کاربر
+    Every usage window of the user's subscription (used/limit/remaining/reset_at) in one response
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'روش درخواست نامعتبر است'}, status=405)
+    
+    try:
+        return JsonResponse(QuotaStatusService.get_status(request.user))
+    except Exception as e:
+        logger.error(f"Error evaluating quota status for user {request.user.id}: {str(e)}")
+        return JsonResponse({'error': 'خطا در دریافت وضعیت سهمیه'}, status=500)
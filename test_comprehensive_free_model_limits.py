@@ -20,7 +20,6 @@ def test_comprehensive_free_model_limits():
     User = apps.get_model('accounts', 'User')
     AIModel = apps.get_model('ai_models', 'AIModel')
     SubscriptionType = apps.get_model('subscriptions', 'SubscriptionType')
-    UserUsage = apps.get_model('subscriptions', 'UserUsage')
     
     # Get the first user
     user = User.objects.first()
@@ -79,11 +78,13 @@ def test_comprehensive_free_model_limits():
         subscription_type.save()
         
         # Create a usage record to trigger the limit
-        UserUsage.objects.create(
+        usage_record = UsageService.increment_usage(
             user=user,
             subscription_type=subscription_type,
-            free_model_tokens_count=2,  # Exceed the limit
-            free_model_messages_count=1
+            messages_count=1,
+            tokens_count=2,  # Exceed the limit
+            is_free_model=True,
+            ai_model=ai_model
         )
         
         print(f"Testing with artificially low hourly_max_tokens limit: {subscription_type.hourly_max_tokens}")
@@ -92,11 +93,7 @@ def test_comprehensive_free_model_limits():
         print(f"Message: {message}")
         
         # Clean up test usage record
-        UserUsage.objects.filter(
-            user=user,
-            subscription_type=subscription_type,
-            free_model_tokens_count=2
-        ).delete()
+        usage_record.delete()
         
         # Restore original value
         subscription_type.hourly_max_tokens = original_hourly_max_tokens
@@ -118,12 +115,13 @@ def test_comprehensive_free_model_limits():
         else:
             monthly_end = monthly_start.replace(month=monthly_start.month + 1)
         
-        UserUsage.objects.create(
+        usage_record = UsageService.increment_usage(
             user=user,
             subscription_type=subscription_type,
-            free_model_messages_count=2,  # Exceed the limit
-            free_model_tokens_count=0,
-            created_at=now
+            messages_count=2,  # Exceed the limit
+            tokens_count=0,
+            is_free_model=True,
+            ai_model=ai_model
         )
         
         print(f"Testing with artificially low monthly_free_model_messages limit: {subscription_type.monthly_free_model_messages}")
@@ -132,12 +130,7 @@ def test_comprehensive_free_model_limits():
         print(f"Message: {message}")
         
         # Clean up test usage record
-        UserUsage.objects.filter(
-            user=user,
-            subscription_type=subscription_type,
-            free_model_messages_count=2,
-            created_at=now
-        ).delete()
+        usage_record.delete()
         
         # Restore original value
         subscription_type.monthly_free_model_messages = original_monthly_free_model_messages
@@ -14,8 +14,8 @@ django.setup()
 
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from subscriptions.models import SubscriptionType, UserSubscription, UserUsage
-from chatbot.models import ChatSession, ChatMessage, ChatSessionUsage
+from subscriptions.models import SubscriptionType, UserSubscription
+from chatbot.models import ChatSession, ChatMessage
 from ai_models.models import AIModel
 from subscriptions.services import UsageService
 from subscriptions.usage_stats import UserUsageStatsService
@@ -15,7 +15,7 @@ django.setup()
 
 from ai_models.models import AIModel
 from subscriptions.services import UsageService
-from subscriptions.models import SubscriptionType, UserUsage
+from subscriptions.models import SubscriptionType
 from accounts.models import User
 from django.utils import timezone
 
@@ -52,10 +52,7 @@ def test_cost_multiplier():
     ai_model.token_cost_multiplier = 1.0
     ai_model.save()
     
-    # Clear any existing usage records
-    UserUsage.objects.filter(user=user, subscription_type=subscription_type).delete()
-    
-    UsageService.increment_usage(
+    usage = UsageService.increment_usage(
         user=user,
         subscription_type=subscription_type,
         messages_count=1,
@@ -64,17 +61,16 @@ def test_cost_multiplier():
         ai_model=ai_model
     )
     
-    # Check the usage record
-    usage = UserUsage.objects.filter(user=user, subscription_type=subscription_type).first()
-    print(f"Tokens recorded: {usage.tokens_count}")
-    print(f"Expected: 100, Actual: {usage.tokens_count}, Test 1: {'PASS' if usage.tokens_count == 100 else 'FAIL'}")
+    # Check the ledger row
+    print(f"Tokens recorded: {usage.effective_cost_tokens}")
+    print(f"Expected: 100, Actual: {usage.effective_cost_tokens}, Test 1: {'PASS' if usage.effective_cost_tokens == 100 else 'FAIL'}")
     
     # Test 2: Usage with cost multiplier of 2.0 (should be 200 tokens)
     print("\n--- Test 2: Usage with multiplier = 2.0 ---")
     ai_model.token_cost_multiplier = 2.0
     ai_model.save()
     
-    UsageService.increment_usage(
+    usage = UsageService.increment_usage(
         user=user,
         subscription_type=subscription_type,
         messages_count=1,
@@ -83,17 +79,16 @@ def test_cost_multiplier():
         ai_model=ai_model
     )
     
-    # Check the latest usage record
-    usage = UserUsage.objects.filter(user=user, subscription_type=subscription_type).order_by('-created_at').first()
-    print(f"Tokens recorded: {usage.tokens_count}")
-    print(f"Expected: 200, Actual: {usage.tokens_count}, Test 2: {'PASS' if usage.tokens_count == 200 else 'FAIL'}")
+    # Check the ledger row
+    print(f"Tokens recorded: {usage.effective_cost_tokens}")
+    print(f"Expected: 200, Actual: {usage.effective_cost_tokens}, Test 2: {'PASS' if usage.effective_cost_tokens == 200 else 'FAIL'}")
     
     # Test 3: Usage with cost multiplier of 1.5 (should be 150 tokens)
     print("\n--- Test 3: Usage with multiplier = 1.5 ---")
     ai_model.token_cost_multiplier = 1.5
     ai_model.save()
     
-    UsageService.increment_usage(
+    usage = UsageService.increment_usage(
         user=user,
         subscription_type=subscription_type,
         messages_count=1,
@@ -102,17 +97,16 @@ def test_cost_multiplier():
         ai_model=ai_model
     )
     
-    # Check the latest usage record
-    usage = UserUsage.objects.filter(user=user, subscription_type=subscription_type).order_by('-created_at').first()
-    print(f"Tokens recorded: {usage.tokens_count}")
-    print(f"Expected: 150, Actual: {usage.tokens_count}, Test 3: {'PASS' if usage.tokens_count == 150 else 'FAIL'}")
+    # Check the ledger row
+    print(f"Tokens recorded: {usage.effective_cost_tokens}")
+    print(f"Expected: 150, Actual: {usage.effective_cost_tokens}, Test 3: {'PASS' if usage.effective_cost_tokens == 150 else 'FAIL'}")
     
     # Test 4: Free model (should ignore multiplier and record original tokens)
     print("\n--- Test 4: Free model (should ignore multiplier) ---")
     ai_model.token_cost_multiplier = 3.0  # Set high multiplier
     ai_model.save()
     
-    UsageService.increment_usage(
+    usage = UsageService.increment_usage(
         user=user,
         subscription_type=subscription_type,
         messages_count=1,
@@ -121,10 +115,9 @@ def test_cost_multiplier():
         ai_model=ai_model
     )
     
-    # Check the latest usage record (should be in free_model_tokens_count)
-    usage = UserUsage.objects.filter(user=user, subscription_type=subscription_type).order_by('-created_at').first()
-    print(f"Free model tokens recorded: {usage.free_model_tokens_count}")
-    print(f"Expected: 100, Actual: {usage.free_model_tokens_count}, Test 4: {'PASS' if usage.free_model_tokens_count == 100 else 'FAIL'}")
+    # Check the ledger row (free-model rows count their raw tokens)
+    print(f"Free model tokens recorded: {usage.total_tokens}")
+    print(f"Expected: 100, Actual: {usage.total_tokens}, Test 4: {'PASS' if usage.total_tokens == 100 else 'FAIL'}")
     
     print("\n--- Test Summary ---")
     print("All tests completed. Check results above.")